@@ -0,0 +1,115 @@
+"""
+Storage for generated files (eg, printed PDFs), so we don't regenerate them.
+
+Artifacts are stored under a key that changes whenever their inputs change,
+so there is nothing to invalidate: a new revision of a document just means a
+new key. In deployed environments artifacts live in the general S3 bucket.
+Locally (no GENERAL_S3_BUCKET_URL) they live under ARTIFACT_STORAGE_DIR.
+"""
+
+import logging
+import os
+import tempfile
+
+from bloom_nofos.s3.utils import get_artifact_from_s3, upload_artifact_to_s3
+from django.conf import settings
+
+logger = logging.getLogger("artifacts")
+
+ARTIFACT_CHUNK_SIZE = 64 * 1024
+
+
+class LocalArtifactStorage:
+    """Artifacts as files on the local filesystem, for development."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(
+                "Artifact key escapes the storage directory: {}".format(key)
+            )
+        return path
+
+    def open(self, key):
+        """Return a readable binary file for this key, or None."""
+        try:
+            return open(self._path(key), "rb")
+        except FileNotFoundError:
+            return None
+
+    def save(self, key, fileobj, content_type):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write next to the final file and rename, so readers never see half a file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in iter(lambda: fileobj.read(ARTIFACT_CHUNK_SIZE), b""):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return key
+
+
+class S3ArtifactStorage:
+    """Artifacts as objects in the general S3 bucket."""
+
+    prefix = "artifacts"
+
+    def open(self, key):
+        """Return a readable binary stream for this key, or None."""
+        return get_artifact_from_s3("{}/{}".format(self.prefix, key))
+
+    def save(self, key, fileobj, content_type):
+        upload_artifact_to_s3(fileobj, "{}/{}".format(self.prefix, key), content_type)
+        return key
+
+
+def get_artifact_storage():
+    if settings.GENERAL_S3_BUCKET_URL:
+        return S3ArtifactStorage()
+    return LocalArtifactStorage(settings.ARTIFACT_STORAGE_DIR)
+
+
+def open_artifact(key):
+    """
+    Return a readable stream for a stored artifact, or None on a miss.
+
+    Storage errors are logged and treated as a miss: a broken cache should
+    never stop someone from getting their document.
+    """
+    try:
+        return get_artifact_storage().open(key)
+    except Exception as e:
+        logger.warning(
+            "Artifact read failed", extra={"artifact_key": key, "error": str(e)}
+        )
+        return None
+
+
+def save_artifact(key, fileobj, content_type):
+    """
+    Store an artifact. Returns the key, or None if it could not be stored.
+    """
+    try:
+        return get_artifact_storage().save(key, fileobj, content_type)
+    except Exception as e:
+        logger.warning(
+            "Artifact write failed", extra={"artifact_key": key, "error": str(e)}
+        )
+        return None
+
+
+def iter_artifact(stream, chunk_size=ARTIFACT_CHUNK_SIZE):
+    """Yield an artifact in chunks, closing it when done."""
+    try:
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            yield chunk
+    finally:
+        stream.close()
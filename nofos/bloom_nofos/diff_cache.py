@@ -0,0 +1,88 @@
+"""
+Memoized HTML diffs.
+
+html_diff always gives the same answer for the same inputs, so diffs are
+cached under hashes of the two inputs and the diff engine version. Comparing
+the same two bodies again (the compare page, then its CSV download, or the
+history page, then one of its diffs) reads the diff back instead of running
+markdownify and html_diff again.
+
+Each entry holds all three views of a diff (combined, old-only and new-only,
+see html_diff.DiffViews), so side-by-side pages come from the cache too.
+Degraded diffs (cut short by their time budget) are not cached, so they are
+worked out again next time.
+"""
+
+import hashlib
+
+from django.core.cache import caches
+from martor.utils import markdownify
+
+from .html_diff import HTML_DIFF_VERSION, html_diff
+
+DIFF_CACHE_ALIAS = "diffs"
+
+
+def _hash(value):
+    return hashlib.sha256((value or "").encode("utf-8")).hexdigest()
+
+
+def get_diff_cache_key(original, modified, kind="html"):
+    """
+    The cache key for a diff: `kind` says what the inputs are ("html", or
+    "markdown" for bodies that are rendered with markdownify first).
+    """
+    return "html_diff:{}:{}:{}:{}".format(
+        HTML_DIFF_VERSION, kind, _hash(original), _hash(modified)
+    )
+
+
+def cached_diff(key, compute):
+    """Return the value cached under `key`, computing and caching it if needed."""
+    cache = caches[DIFF_CACHE_ALIAS]
+    diff = cache.get(key)
+    if diff is None:
+        diff = compute()
+        if not diff.degraded:
+            cache.set(key, diff)
+    return diff
+
+
+def prime_diff_cache(diffs):
+    """Cache diffs computed elsewhere (eg, in a process pool), as {key: diff}."""
+    caches[DIFF_CACHE_ALIAS].set_many(
+        {key: diff for key, diff in diffs.items() if not diff.degraded}
+    )
+
+
+def html_diff_views(original_html, modified_html):
+    """html_diff(side_by_side=True), memoized."""
+    return cached_diff(
+        get_diff_cache_key(original_html, modified_html),
+        lambda: html_diff(original_html, modified_html, side_by_side=True),
+    )
+
+
+def cached_html_diff(original_html, modified_html):
+    """html_diff, memoized."""
+    return html_diff_views(original_html, modified_html).combined
+
+
+def markdown_diff_views(original_markdown, modified_markdown):
+    """
+    The diff of two markdown bodies, rendered to HTML, as DiffViews: memoized
+    html_diff(markdownify(original), markdownify(modified), side_by_side=True).
+    """
+    return cached_diff(
+        get_diff_cache_key(original_markdown, modified_markdown, kind="markdown"),
+        lambda: html_diff(
+            markdownify(original_markdown or ""),
+            markdownify(modified_markdown or ""),
+            side_by_side=True,
+        ),
+    )
+
+
+def markdown_diff(original_markdown, modified_markdown):
+    """The combined diff of two markdown bodies, rendered to HTML (memoized)."""
+    return markdown_diff_views(original_markdown, modified_markdown).combined
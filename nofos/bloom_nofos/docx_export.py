@@ -0,0 +1,238 @@
+"""NOFO Builder integration boundary for GrabzIt DOCX conversion."""
+
+import hashlib
+import logging
+import tempfile
+from urllib.parse import urlparse
+
+from bloom_nofos.artifacts import open_artifact, save_artifact
+from bloom_nofos.docx_writer import build_docx, get_docx_data
+from bloom_nofos.version import get_version
+from django.conf import settings
+from django.http import FileResponse, HttpResponseServerError
+from GrabzIt import GrabzItClient, GrabzItDOCXOptions
+
+logger = logging.getLogger("artifacts")
+
+DOCX_CONTENT_TYPE = (
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+)
+
+# DOCX files bigger than this are spooled to disk instead of kept in memory
+DOCX_SPOOL_MAX_SIZE = 10 * 1024 * 1024
+
+COOKIE_LABELS = {"sessionid": "session", "csrftoken": "csrf"}
+
+
+class DocxExportError(RuntimeError):
+    """GrabzIt could not convert the document."""
+
+
+def get_grabzit_client():
+    return GrabzItClient.GrabzItClient(
+        settings.GRABZIT_APPLICATION_KEY,
+        settings.GRABZIT_APPLICATION_SECRET,
+    )
+
+
+def _spool(content):
+    docx_file = tempfile.SpooledTemporaryFile(max_size=DOCX_SPOOL_MAX_SIZE)
+    docx_file.write(content)
+    docx_file.seek(0)
+    return docx_file
+
+
+def get_docx_engine(document):
+    """
+    Which exporter to use for a document: "grabzit" or "native".
+
+    The native exporter rebuilds the NOFO export page from the section tree,
+    so it is only used for NOFOs, and only when DOCX_EXPORT_ENGINE asks for it.
+    """
+    if (
+        settings.DOCX_EXPORT_ENGINE == "native"
+        and document is not None
+        and document._meta.label_lower == "nofos.nofo"
+    ):
+        return "native"
+    return "grabzit"
+
+
+def get_docx_cache_key(document, target_element):
+    """
+    The artifact storage key for an exported DOCX.
+
+    Documents (NOFOs, content guides, and their instances) bump `updated`
+    whenever they or their subsections change, so the key follows the
+    revision. The app version is included because our export templates are
+    part of the output.
+    """
+    options_hash = hashlib.sha256(
+        "|".join(
+            [
+                target_element,
+                get_docx_engine(document),
+                get_version(),
+                settings.GITHUB_SHA or "",
+            ]
+        ).encode("utf-8")
+    ).hexdigest()[:16]
+
+    return "docx/{}/{}/{}/{}.docx".format(
+        document._meta.label_lower,
+        document.pk,
+        int(document.updated.timestamp() * 1_000_000),
+        options_hash,
+    )
+
+
+class DocxExportJob:
+    """
+    One conversion of an export page to DOCX.
+
+    Each job spools its result into its own anonymous temp file, so
+    concurrent exports of the same document never share a path and nothing
+    is left behind in /tmp. Large results spill from memory to disk.
+    """
+
+    def __init__(self, *, export_url, target_element, cookies, grabzit=None):
+        self.export_url = export_url
+        self.target_element = target_element
+        self.cookies = cookies
+        self.grabzit = grabzit or get_grabzit_client()
+
+    @property
+    def export_host(self):
+        return urlparse(self.export_url).hostname
+
+    def run(self):
+        """Convert the export page and return an open binary file of the DOCX."""
+        # Set cookies only for the exact host GrabzIt will request.
+        for name, value in self.cookies.items():
+            if not self.grabzit.SetCookie(name, self.export_host, value):
+                raise DocxExportError(
+                    "Failed to set {} cookie for GrabzIt conversion.".format(
+                        COOKIE_LABELS.get(name, name)
+                    )
+                )
+
+        options = GrabzItDOCXOptions.GrabzItDOCXOptions()
+        options.targetElement = self.target_element
+        self.grabzit.URLToDOCX(self.export_url, options)
+
+        # With no path, SaveTo hands back the bytes instead of writing a file
+        content = self.grabzit.SaveTo()
+        if not content:
+            raise DocxExportError("GrabzIt did not return a DOCX file.")
+
+        return _spool(content)
+
+
+class NativeDocxExportJob:
+    """
+    One in-process conversion of a NOFO's section tree to DOCX.
+
+    No remote round trip: see bloom_nofos/docx_writer.py.
+    """
+
+    def __init__(self, *, document):
+        self.document = document
+
+    def run(self):
+        """Build the DOCX and return an open binary file of it."""
+        return _spool(build_docx(get_docx_data(self.document)))
+
+
+def generate_docx_download_response(
+    *,
+    request,
+    export_url: str,
+    target_element: str,
+    filename_base: str,
+    document=None,
+    grabzit=None,
+):
+    """
+    Convert a URL to DOCX using GrabzIt and stream it back as an attachment.
+
+    If `document` is given, the DOCX is stored by document revision and later
+    exports of the same revision are served from storage without GrabzIt.
+    NOFOs can also be exported in-process (see get_docx_engine).
+    """
+    filename = f"{filename_base}.docx"
+
+    cache_key = None
+    if document is not None and settings.DOCX_CACHE_ENABLED:
+        cache_key = get_docx_cache_key(document, target_element)
+        cached_docx = open_artifact(cache_key)
+        if cached_docx:
+            logger.info(
+                "DOCX cache hit",
+                extra={"artifact_key": cache_key, "docx_cache": "hit"},
+            )
+            return FileResponse(
+                cached_docx,
+                as_attachment=True,
+                filename=filename,
+                content_type=DOCX_CONTENT_TYPE,
+            )
+
+    if get_docx_engine(document) == "native":
+        return _docx_file_response(
+            NativeDocxExportJob(document=document).run(), filename, cache_key
+        )
+
+    session_value = request.COOKIES.get("sessionid")
+    csrf_value = request.COOKIES.get("csrftoken")
+
+    if not session_value or not csrf_value:
+        return HttpResponseServerError(
+            "Missing session/csrf cookies for DOCX conversion."
+        )
+
+    parsed = urlparse(export_url)
+    export_host = parsed.hostname
+    export_scheme = parsed.scheme
+
+    if not export_host or export_scheme != "https":
+        return HttpResponseServerError("Invalid export URL for DOCX conversion.")
+
+    request_host = request.get_host().split(":")[0]
+
+    # Defensive check: the cookies we are copying came from this incoming request,
+    # so the request host should match the host GrabzIt will fetch.
+    if request_host != export_host:
+        return HttpResponseServerError(
+            f"Host mismatch for DOCX conversion. request_host={request_host}, export_host={export_host}"
+        )
+
+    job = DocxExportJob(
+        export_url=export_url,
+        target_element=target_element,
+        cookies={"sessionid": session_value, "csrftoken": csrf_value},
+        grabzit=grabzit,
+    )
+
+    try:
+        docx_file = job.run()
+    except DocxExportError as e:
+        return HttpResponseServerError(str(e))
+
+    return _docx_file_response(docx_file, filename, cache_key)
+
+
+def _docx_file_response(docx_file, filename, cache_key=None):
+    if cache_key:
+        if save_artifact(cache_key, docx_file, DOCX_CONTENT_TYPE):
+            logger.info(
+                "DOCX cache miss",
+                extra={"artifact_key": cache_key, "docx_cache": "miss"},
+            )
+        docx_file.seek(0)
+
+    return FileResponse(
+        docx_file,
+        as_attachment=True,
+        filename=filename,
+        content_type=DOCX_CONTENT_TYPE,
+    )
@@ -0,0 +1,723 @@
+"""
+Build Word (DOCX) documents in-process, without GrabzIt.
+
+The writer walks a document's sections and subsections, converts each
+subsection's rendered HTML into WordprocessingML, and zips up the result.
+It handles the things NOFOs actually contain: headings, paragraphs with
+inline formatting, links, bulleted and numbered lists, tables, callout
+boxes, footnote references and page breaks.
+
+Building a DOCX happens in two steps so that the slow part can run in
+other processes:
+
+1. get_docx_data(document) reads the database and renders subsection
+   HTML, returning plain (picklable) data.
+2. build_docx(data) turns that data into DOCX bytes. It needs neither
+   Django nor the database, so build_docx_batch can hand it to a process pool.
+"""
+
+import io
+import multiprocessing
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape, quoteattr
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+
+HEADING_TAGS = ["h1", "h2", "h3", "h4", "h5", "h6", "h7"]
+
+# Paragraphs that the editors type to force a page break
+PAGE_BREAK_PARAGRAPHS = ["page-break", "page-break-before", "page-break-after"]
+IGNORED_BREAK_PARAGRAPHS = ["column-break-before", "column-break-after"]
+
+# Word bookmark names can be at most 40 characters long
+MAX_BOOKMARK_LENGTH = 40
+
+# Characters that are not allowed in XML 1.0 documents
+INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+INLINE_FORMATS = {
+    "strong": "<w:b/>",
+    "b": "<w:b/>",
+    "em": "<w:i/>",
+    "i": "<w:i/>",
+    "u": '<w:u w:val="single"/>',
+    "ins": '<w:u w:val="single"/>',
+    "s": "<w:strike/>",
+    "del": "<w:strike/>",
+    "sup": '<w:vertAlign w:val="superscript"/>',
+    "sub": '<w:vertAlign w:val="subscript"/>',
+    "code": '<w:rFonts w:ascii="Consolas" w:hAnsi="Consolas"/>',
+}
+
+W_NAMESPACES = (
+    'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+)
+
+HYPERLINK_REL_TYPE = (
+    "http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink"
+)
+
+
+###########################################################
+################## COLLECTING THE DATA ####################
+###########################################################
+
+
+# Django-dependent imports happen inside the functions that read the database,
+# so that build_docx can run in pool processes that never set up Django.
+
+
+def render_subsection_html(subsection):
+    """The subsection body as HTML, with the same filters as the export page."""
+    from martor.utils import markdownify
+
+    from nofos.templatetags.add_footnote_ids import add_footnote_ids
+    from nofos.templatetags.utils import truncate_anchor_links
+
+    if not subsection.body:
+        return ""
+    return truncate_anchor_links(str(add_footnote_ids(markdownify(subsection.body))))
+
+
+def get_basic_information(document):
+    """The metadata lines shown at the top of the first section of an export."""
+    fields = [
+        ("Opdiv", "opdiv"),
+        ("Agency", "agency"),
+        ("Subagency", "subagency"),
+        ("Subagency 2", "subagency2"),
+        ("Opportunity name", "name"),
+        ("Opportunity number", "number"),
+        ("Application deadline", "application_deadline"),
+        ("Tagline", "tagline"),
+        ("Metadata author", "author"),
+        ("Metadata subject", "subject"),
+        ("Metadata keywords", "keywords"),
+    ]
+    # Only NOFOs have an opdiv, and it is always shown (even if empty)
+    if not hasattr(document, "opdiv"):
+        return []
+
+    lines = ["Opdiv: {}".format(document.opdiv)]
+    for label, field in fields[1:]:
+        value = getattr(document, field, None)
+        if value:
+            lines.append("{}: {}".format(label, value))
+    return lines
+
+
+def get_docx_data(document):
+    """
+    Read a document's section tree into plain data for build_docx.
+
+    Works for anything with `sections` that have `subsections` (NOFOs,
+    content guides), ordered the same way as the export page.
+    """
+    from nofos.templatetags.utils import truncate_heading_ids
+
+    sections = []
+    for section_index, section in enumerate(
+        document.sections.prefetch_related("subsections").order_by("order")
+    ):
+        subsections = []
+        for subsection_index, subsection in enumerate(
+            sorted(section.subsections.all(), key=lambda s: s.order)
+        ):
+            # The export page replaces a leading "Basic information" subsection
+            # with the NOFO's own metadata (see get_basic_information)
+            if (
+                section_index == 0
+                and subsection_index == 0
+                and (subsection.name or "").lower() == "basic information"
+            ):
+                continue
+
+            subsections.append(
+                {
+                    "name": subsection.name or "",
+                    "tag": subsection.tag or "",
+                    "html_id": truncate_heading_ids(subsection.html_id or ""),
+                    "callout_box": bool(subsection.callout_box),
+                    "page_break_before": "page-break-before"
+                    in (subsection.html_class or ""),
+                    "html": render_subsection_html(subsection),
+                }
+            )
+
+        sections.append(
+            {
+                "name": section.name,
+                "html_id": truncate_heading_ids(section.html_id or ""),
+                "basic_information": (
+                    get_basic_information(document) if section_index == 0 else []
+                ),
+                "subsections": subsections,
+            }
+        )
+
+    return {
+        "title": getattr(document, "title", "") or "",
+        "sections": sections,
+    }
+
+
+###########################################################
+#################### WRITING THE DOCX #####################
+###########################################################
+
+
+def _clean_text(text):
+    return INVALID_XML_CHARS.sub("", text)
+
+
+def _bookmark_name(value):
+    return re.sub(r"[^A-Za-z0-9_\-]", "_", value)[:MAX_BOOKMARK_LENGTH]
+
+
+class _DocxBuilder:
+    """Accumulates the XML parts of one DOCX while walking its HTML."""
+
+    def __init__(self):
+        self.body = []
+        self.relationships = []
+        self.numbering_instances = []  # (numId, "bullet" | "decimal")
+        self.bookmark_id = 0
+        self.bookmark_names = set()
+
+    # -- relationships, lists and bookmarks -------------------------------
+
+    def add_hyperlink_relationship(self, url):
+        rel_id = "rIdLink{}".format(len(self.relationships) + 1)
+        self.relationships.append((rel_id, url))
+        return rel_id
+
+    def new_list(self, ordered):
+        num_id = len(self.numbering_instances) + 1
+        self.numbering_instances.append((num_id, "decimal" if ordered else "bullet"))
+        return num_id
+
+    def bookmark(self, name):
+        name = _bookmark_name(name or "")
+        # Word expects bookmark names to be unique: the first one wins
+        if not name or name in self.bookmark_names:
+            return "", ""
+        self.bookmark_names.add(name)
+        self.bookmark_id += 1
+        return (
+            '<w:bookmarkStart w:id="{0}" w:name={1}/>'.format(
+                self.bookmark_id, quoteattr(name)
+            ),
+            '<w:bookmarkEnd w:id="{}"/>'.format(self.bookmark_id),
+        )
+
+    # -- runs -------------------------------------------------------------
+
+    def text_run(self, text, formats):
+        text = _clean_text(text)
+        if not text:
+            return ""
+        run_properties = "".join(formats)
+        if run_properties:
+            run_properties = "<w:rPr>{}</w:rPr>".format(run_properties)
+        return '<w:r>{}<w:t xml:space="preserve">{}</w:t></w:r>'.format(
+            run_properties, escape(text)
+        )
+
+    def inline_runs(self, node, formats=()):
+        """Convert inline HTML (text, formatting, links, line breaks) to runs."""
+        if isinstance(node, NavigableString):
+            text = re.sub(r"\s+", " ", str(node))
+            return self.text_run(text, formats)
+
+        if not isinstance(node, Tag):
+            return ""
+
+        if node.name == "br":
+            return "<w:r><w:br/></w:r>"
+
+        if node.name == "img":
+            alt = node.get("alt")
+            return self.text_run("[{}]".format(alt), formats) if alt else ""
+
+        child_formats = formats
+        if node.name in INLINE_FORMATS:
+            child_formats = formats + (INLINE_FORMATS[node.name],)
+
+        if node.name == "a":
+            return self.hyperlink(node, child_formats)
+
+        runs = "".join(
+            self.inline_runs(child, child_formats) for child in node.children
+        )
+
+        start, end = self.bookmark(node.get("id")) if node.get("id") else ("", "")
+        return start + runs + end
+
+    def hyperlink(self, a_tag, formats):
+        href = (a_tag.get("href") or "").strip()
+        link_formats = formats + ('<w:rStyle w:val="Hyperlink"/>',)
+
+        # footnote references ("[1]") are superscript, like in Word
+        text = a_tag.get_text().strip()
+        if re.fullmatch(r"\[\d+\]", text) and href.startswith("#"):
+            link_formats += ('<w:vertAlign w:val="superscript"/>',)
+
+        runs = "".join(
+            self.inline_runs(child, link_formats) for child in a_tag.children
+        )
+        start, end = self.bookmark(a_tag.get("id")) if a_tag.get("id") else ("", "")
+
+        if href.startswith("#") and len(href) > 1:
+            link = "<w:hyperlink w:anchor={}>{}</w:hyperlink>".format(
+                quoteattr(_bookmark_name(href[1:])), runs
+            )
+        elif href:
+            link = "<w:hyperlink r:id={}>{}</w:hyperlink>".format(
+                quoteattr(self.add_hyperlink_relationship(href)), runs
+            )
+        else:
+            link = runs
+
+        return start + link + end
+
+    # -- paragraphs -------------------------------------------------------
+
+    def paragraph(self, runs, style=None, numbering=None, bookmark_name=None):
+        properties = ""
+        if style:
+            properties += '<w:pStyle w:val="{}"/>'.format(style)
+        if numbering:
+            properties += (
+                '<w:numPr><w:ilvl w:val="{}"/><w:numId w:val="{}"/></w:numPr>'.format(
+                    *numbering
+                )
+            )
+        if properties:
+            properties = "<w:pPr>{}</w:pPr>".format(properties)
+
+        start, end = self.bookmark(bookmark_name)
+        return "<w:p>{}{}{}{}</w:p>".format(properties, start, runs, end)
+
+    def page_break(self):
+        return '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+
+    def heading(self, text, tag, bookmark_name=None):
+        level = min(int(tag[1:]), 7) if tag in HEADING_TAGS else 7
+        return self.paragraph(
+            self.text_run(text, ()),
+            style="Heading{}".format(level),
+            bookmark_name=bookmark_name,
+        )
+
+    # -- blocks -----------------------------------------------------------
+
+    def blocks(self, nodes, list_level=0, formats=()):
+        """Convert a sequence of block-level HTML nodes to body XML."""
+        xml = []
+        inline_buffer = []
+
+        def flush_inline():
+            runs = "".join(inline_buffer).strip()
+            inline_buffer.clear()
+            if runs:
+                xml.append(self.paragraph(runs))
+
+        for node in nodes:
+            if isinstance(node, NavigableString):
+                if str(node).strip():
+                    inline_buffer.append(self.inline_runs(node, formats))
+                continue
+            if not isinstance(node, Tag):
+                continue
+
+            if node.name in ["p", "div", "section", "blockquote", "span"] and (
+                node.find(["p", "ul", "ol", "table", "div"] + HEADING_TAGS)
+            ):
+                flush_inline()
+                xml.append(self.blocks(node.children, list_level, formats))
+
+            elif node.name == "p":
+                flush_inline()
+                text = node.get_text().strip()
+                if text in PAGE_BREAK_PARAGRAPHS:
+                    xml.append(self.page_break())
+                elif text in IGNORED_BREAK_PARAGRAPHS:
+                    continue
+                else:
+                    xml.append(self.paragraph(self.inline_runs(node, formats)))
+
+            elif node.name in HEADING_TAGS or (
+                node.get("role") == "heading" and node.get("aria-level")
+            ):
+                flush_inline()
+                tag = node.name if node.name in HEADING_TAGS else "h7"
+                xml.append(
+                    self.paragraph(
+                        self.inline_runs(node),
+                        style="Heading{}".format(min(int(tag[1:]), 7)),
+                    )
+                )
+
+            elif node.name in ["ul", "ol"]:
+                flush_inline()
+                xml.append(self.list(node, list_level))
+
+            elif node.name == "table":
+                flush_inline()
+                xml.append(self.table(node))
+
+            elif node.name == "hr":
+                flush_inline()
+                xml.append(self.paragraph("", style="HorizontalRule"))
+
+            elif node.name == "pre":
+                flush_inline()
+                for line in node.get_text().split("\n"):
+                    xml.append(
+                        self.paragraph(self.text_run(line, ()), style="Preformatted")
+                    )
+
+            else:
+                inline_buffer.append(self.inline_runs(node, formats))
+
+        flush_inline()
+        return "".join(xml)
+
+    def list(self, list_tag, level):
+        num_id = self.new_list(ordered=list_tag.name == "ol")
+        xml = []
+
+        for li in list_tag.find_all("li", recursive=False):
+            inline_nodes = []
+            nested = []
+            for child in li.children:
+                if isinstance(child, Tag) and child.name in ["ul", "ol"]:
+                    nested.append(child)
+                elif isinstance(child, Tag) and child.name == "p":
+                    # loose lists wrap items in paragraphs
+                    inline_nodes.extend(child.children)
+                    inline_nodes.append(NavigableString(" "))
+                else:
+                    inline_nodes.append(child)
+
+            runs = "".join(self.inline_runs(child) for child in inline_nodes)
+            xml.append(
+                self.paragraph(
+                    runs,
+                    style="ListParagraph",
+                    numbering=(min(level, 8), num_id),
+                    bookmark_name=li.get("id"),
+                )
+            )
+            for nested_list in nested:
+                xml.append(self.list(nested_list, level + 1))
+
+        return "".join(xml)
+
+    def table_cell(self, cell, is_header=False):
+        properties = ""
+        colspan = cell.get("colspan")
+        if colspan and str(colspan).isdigit() and int(colspan) > 1:
+            properties += '<w:gridSpan w:val="{}"/>'.format(int(colspan))
+        if is_header:
+            properties += '<w:shd w:val="clear" w:color="auto" w:fill="F0F0F0"/>'
+
+        content = self.blocks(
+            cell.children, formats=(INLINE_FORMATS["strong"],) if is_header else ()
+        )
+        # every cell needs at least one paragraph
+        if not content.endswith(("</w:p>", "<w:p/>")):
+            content += "<w:p/>"
+
+        return "<w:tc>{}{}</w:tc>".format(
+            "<w:tcPr>{}</w:tcPr>".format(properties) if properties else "", content
+        )
+
+    def table(self, table_tag):
+        rows = []
+        column_count = 1
+
+        for tr in table_tag.find_all("tr"):
+            # skip rows of nested tables
+            if tr.find_parent("table") is not table_tag:
+                continue
+
+            in_head = tr.find_parent("thead") is not None
+            cells = tr.find_all(["td", "th"], recursive=False)
+            column_count = max(
+                column_count,
+                sum(
+                    int(c.get("colspan")) if str(c.get("colspan", "")).isdigit() else 1
+                    for c in cells
+                ),
+            )
+            row_properties = "<w:trPr><w:tblHeader/></w:trPr>" if in_head else ""
+            rows.append(
+                "<w:tr>{}{}</w:tr>".format(
+                    row_properties,
+                    "".join(
+                        self.table_cell(c, is_header=in_head or c.name == "th")
+                        for c in cells
+                    ),
+                )
+            )
+
+        caption = table_tag.find("caption")
+        caption_xml = (
+            self.paragraph(self.inline_runs(caption), style="Caption")
+            if caption
+            else ""
+        )
+
+        grid = "".join("<w:gridCol/>" for _ in range(column_count))
+        return (
+            '{}<w:tbl><w:tblPr><w:tblStyle w:val="TableGrid"/>'
+            '<w:tblW w:w="5000" w:type="pct"/></w:tblPr>'
+            "<w:tblGrid>{}</w:tblGrid>{}</w:tbl><w:p/>".format(
+                caption_xml, grid, "".join(rows)
+            )
+        )
+
+    def callout_box(self, content):
+        """A one-cell shaded, bordered table, like the callout boxes on the page."""
+        return (
+            '<w:tbl><w:tblPr><w:tblStyle w:val="CalloutBox"/>'
+            '<w:tblW w:w="5000" w:type="pct"/></w:tblPr>'
+            "<w:tblGrid><w:gridCol/></w:tblGrid>"
+            "<w:tr><w:tc><w:tcPr>"
+            '<w:shd w:val="clear" w:color="auto" w:fill="F0F0F0"/>'
+            "</w:tcPr>{}</w:tc></w:tr></w:tbl><w:p/>".format(content or "<w:p/>")
+        )
+
+    # -- the document -----------------------------------------------------
+
+    def add_subsection(self, subsection):
+        xml = ""
+        if subsection.get("page_break_before"):
+            xml += self.page_break()
+
+        if subsection.get("name"):
+            xml += self.heading(
+                subsection["name"], subsection.get("tag"), subsection.get("html_id")
+            )
+
+        if subsection.get("html"):
+            soup = BeautifulSoup(subsection["html"], "html.parser")
+            xml += self.blocks(soup.children)
+
+        if subsection.get("callout_box"):
+            xml = self.callout_box(xml)
+
+        self.body.append(xml)
+
+    def add_section(self, section):
+        self.body.append(self.heading(section["name"], "h2", section.get("html_id")))
+
+        if section.get("basic_information"):
+            self.body.append(self.heading("Basic information", "h3"))
+            for line in section["basic_information"]:
+                self.body.append(self.paragraph(self.text_run(line, ())))
+        for subsection in section.get("subsections", []):
+            self.add_subsection(subsection)
+
+    def document_xml(self):
+        return (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            "<w:document {}><w:body>{}"
+            '<w:sectPr><w:pgSz w:w="12240" w:h="15840"/>'
+            '<w:pgMar w:top="1440" w:right="1440" w:bottom="1440" w:left="1440" '
+            'w:header="720" w:footer="720" w:gutter="0"/></w:sectPr>'
+            "</w:body></w:document>".format(W_NAMESPACES, "".join(self.body))
+        )
+
+    def document_rels_xml(self):
+        rels = [
+            '<Relationship Id="rIdStyles" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+            'Target="styles.xml"/>',
+            '<Relationship Id="rIdNumbering" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/numbering" '
+            'Target="numbering.xml"/>',
+        ]
+        for rel_id, url in self.relationships:
+            rels.append(
+                '<Relationship Id={} Type="{}" Target={} TargetMode="External"/>'.format(
+                    quoteattr(rel_id), HYPERLINK_REL_TYPE, quoteattr(_clean_text(url))
+                )
+            )
+        return (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            "{}</Relationships>".format("".join(rels))
+        )
+
+    def numbering_xml(self):
+        def abstract_num(abstract_id, num_format):
+            levels = []
+            for level in range(9):
+                text = "%{}.".format(level + 1) if num_format == "decimal" else "•"
+                levels.append(
+                    '<w:lvl w:ilvl="{0}"><w:start w:val="1"/>'
+                    '<w:numFmt w:val="{1}"/><w:lvlText w:val="{2}"/>'
+                    '<w:lvlJc w:val="left"/><w:pPr><w:ind w:left="{3}" w:hanging="360"/>'
+                    "</w:pPr></w:lvl>".format(
+                        level, num_format, text, 720 * (level + 1)
+                    )
+                )
+            return '<w:abstractNum w:abstractNumId="{}">{}</w:abstractNum>'.format(
+                abstract_id, "".join(levels)
+            )
+
+        # one abstract definition per list, so that numbered lists restart at 1
+        abstracts = []
+        nums = []
+        for num_id, num_format in self.numbering_instances:
+            abstracts.append(abstract_num(num_id, num_format))
+            nums.append(
+                '<w:num w:numId="{0}"><w:abstractNumId w:val="{0}"/></w:num>'.format(
+                    num_id
+                )
+            )
+
+        return (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            "<w:numbering {}>{}{}</w:numbering>".format(
+                W_NAMESPACES, "".join(abstracts), "".join(nums)
+            )
+        )
+
+
+STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<w:styles xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    '<w:docDefaults><w:rPrDefault><w:rPr><w:rFonts w:ascii="Calibri" w:hAnsi="Calibri"/>'
+    '<w:sz w:val="22"/></w:rPr></w:rPrDefault>'
+    '<w:pPrDefault><w:pPr><w:spacing w:after="160"/></w:pPr></w:pPrDefault></w:docDefaults>'
+    '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/></w:style>'
+    + "".join(
+        '<w:style w:type="paragraph" w:styleId="Heading{0}"><w:name w:val="heading {0}"/>'
+        '<w:basedOn w:val="Normal"/><w:next w:val="Normal"/><w:qFormat/>'
+        '<w:pPr><w:keepNext/><w:spacing w:before="240" w:after="120"/>'
+        '<w:outlineLvl w:val="{1}"/></w:pPr>'
+        '<w:rPr><w:b/><w:sz w:val="{2}"/></w:rPr></w:style>'.format(
+            level, level - 1, size
+        )
+        for level, size in [
+            (1, 40),
+            (2, 36),
+            (3, 30),
+            (4, 26),
+            (5, 24),
+            (6, 22),
+            (7, 22),
+        ]
+    )
+    + '<w:style w:type="paragraph" w:styleId="ListParagraph"><w:name w:val="List Paragraph"/>'
+    '<w:basedOn w:val="Normal"/><w:pPr><w:spacing w:after="60"/></w:pPr></w:style>'
+    '<w:style w:type="paragraph" w:styleId="Caption"><w:name w:val="caption"/>'
+    '<w:basedOn w:val="Normal"/><w:rPr><w:b/></w:rPr></w:style>'
+    '<w:style w:type="paragraph" w:styleId="Preformatted"><w:name w:val="Preformatted"/>'
+    '<w:basedOn w:val="Normal"/><w:pPr><w:spacing w:after="0"/></w:pPr>'
+    '<w:rPr><w:rFonts w:ascii="Consolas" w:hAnsi="Consolas"/></w:rPr></w:style>'
+    '<w:style w:type="paragraph" w:styleId="HorizontalRule"><w:name w:val="Horizontal Rule"/>'
+    '<w:basedOn w:val="Normal"/><w:pPr><w:pBdr><w:bottom w:val="single" w:sz="6" w:space="1" w:color="auto"/>'
+    "</w:pBdr></w:pPr></w:style>"
+    '<w:style w:type="character" w:styleId="Hyperlink"><w:name w:val="Hyperlink"/>'
+    '<w:rPr><w:color w:val="0563C1"/><w:u w:val="single"/></w:rPr></w:style>'
+    '<w:style w:type="table" w:styleId="TableGrid"><w:name w:val="Table Grid"/>'
+    "<w:tblPr><w:tblBorders>"
+    + "".join(
+        '<w:{} w:val="single" w:sz="4" w:space="0" w:color="auto"/>'.format(side)
+        for side in ["top", "left", "bottom", "right", "insideH", "insideV"]
+    )
+    + "</w:tblBorders></w:tblPr></w:style>"
+    '<w:style w:type="table" w:styleId="CalloutBox"><w:name w:val="Callout Box"/>'
+    "<w:tblPr><w:tblBorders>"
+    + "".join(
+        '<w:{} w:val="single" w:sz="8" w:space="0" w:color="5C5C5C"/>'.format(side)
+        for side in ["top", "left", "bottom", "right"]
+    )
+    + '</w:tblBorders><w:tblCellMar><w:top w:w="144" w:type="dxa"/>'
+    '<w:left w:w="144" w:type="dxa"/><w:bottom w:w="144" w:type="dxa"/>'
+    '<w:right w:w="144" w:type="dxa"/></w:tblCellMar></w:tblPr></w:style>'
+    "</w:styles>"
+)
+
+CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    '<Override PartName="/word/numbering.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.numbering+xml"/>'
+    '<Override PartName="/docProps/core.xml" '
+    'ContentType="application/vnd.openxmlformats-package.core-properties+xml"/>'
+    "</Types>"
+)
+
+ROOT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties" '
+    'Target="docProps/core.xml"/>'
+    "</Relationships>"
+)
+
+
+def _core_properties_xml(title):
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/">'
+        "<dc:title>{}</dc:title></cp:coreProperties>".format(escape(_clean_text(title)))
+    )
+
+
+def build_docx(data):
+    """Turn the output of get_docx_data into the bytes of a .docx file."""
+    builder = _DocxBuilder()
+    for section in data.get("sections", []):
+        builder.add_section(section)
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr("[Content_Types].xml", CONTENT_TYPES_XML)
+        docx.writestr("_rels/.rels", ROOT_RELS_XML)
+        docx.writestr("docProps/core.xml", _core_properties_xml(data.get("title", "")))
+        docx.writestr("word/document.xml", builder.document_xml())
+        docx.writestr("word/styles.xml", STYLES_XML)
+        docx.writestr("word/numbering.xml", builder.numbering_xml())
+        docx.writestr("word/_rels/document.xml.rels", builder.document_rels_xml())
+
+    return buffer.getvalue()
+
+
+def build_docx_batch(datas, processes=None):
+    """
+    Build several DOCX files, in the same order as `datas`.
+
+    With `processes` > 1 the documents are built in a process pool, which
+    helps with batch exports because converting HTML is CPU-bound.
+    """
+    # Daemon processes (eg, parallel test runners) are not allowed children
+    if (
+        not processes
+        or processes <= 1
+        or len(datas) <= 1
+        or multiprocessing.current_process().daemon
+    ):
+        return [build_docx(data) for data in datas]
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(build_docx, datas))
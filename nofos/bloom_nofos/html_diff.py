@@ -1,4 +1,10 @@
 import difflib
+import re
+import threading
+import time
+from contextlib import contextmanager
+from html import escape
+from typing import NamedTuple
 
 from bs4 import BeautifulSoup
 from diff_match_patch import diff_match_patch
@@ -7,29 +13,113 @@ STRUCTURAL_TAGS = {"table", "thead", "tbody", "tr", "ul", "ol"}
 DIFFABLE_TAGS = {"p", "li", "td", "th", "h1", "h2", "h3", "h4", "h5", "h6", "div"}
 BLOCK_WRAPPER_UNSAFE_TAGS = {"li", "td", "th", "tr", "thead", "tbody"}
 
+# Bump this whenever a change here changes the output of html_diff: stored
+# and cached diffs are keyed by it (see bloom_nofos/diff_cache.py)
+HTML_DIFF_VERSION = "4"
+
+# CPU seconds one html_diff call may spend diffing text before it gives up
+# and shows changed nodes as replaced whole
+HTML_DIFF_TIME_BUDGET = 2.0
+
+# Texts shorter than this (together) are diffed by character only
+MIN_WORD_DIFF_LENGTH = 400
+
+# Replaced runs of words up to this long are diffed again by character
+MAX_REFINED_LENGTH = 80
+
+TAG_RE = re.compile(r"<[^>]*>")
+
+WORD_RE = re.compile(r"\w+|\s+|[^\w\s]", re.UNICODE)
+
+_local = threading.local()
+
 
 def has_diff(diff_string):
     return "<ins>" in diff_string or "<del>" in diff_string
 
 
-def html_diff(original_html, modified_html):
+class DiffViews(NamedTuple):
+    """
+    The three ways to show a diff: `combined` marks deletions and insertions,
+    `old` only has the deletions (for the "old" side of a side-by-side view)
+    and `new` only has the insertions.
+
+    `degraded` is True when the diff ran out of time, so some changed text is
+    shown as replaced whole: it is correct, but not the finest diff there is.
+    """
+
+    combined: str
+    old: str
+    new: str
+    degraded: bool = False
+
+
+def get_diff_deadline():
+    """The deadline set by diff_deadline for this thread, or None."""
+    return getattr(_local, "deadline", None)
+
+
+@contextmanager
+def diff_deadline(deadline):
+    """
+    Make every html_diff in this block stop diffing text at `deadline` (a
+    time.time() value) at the latest, on top of its own time budget, so that
+    a batch of diffs shares one budget. A nested block can only bring the
+    deadline forward. `deadline=None` changes nothing.
+    """
+    previous = get_diff_deadline()
+    if deadline is not None and previous is not None:
+        deadline = min(deadline, previous)
+    _local.deadline = previous if deadline is None else deadline
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def html_diff(
+    original_html,
+    modified_html,
+    time_budget=HTML_DIFF_TIME_BUDGET,
+    word_level=True,
+    side_by_side=False,
+):
+    """
+    Diff two HTML strings (or two plain strings), marking removed text with
+    <del> and added text with <ins>.
+
+    Text is diffed word by word, and only the words that changed are diffed
+    again character by character. Once `time_budget` seconds of CPU time are
+    used up (or the diff_deadline has passed), any remaining changed nodes are
+    shown as replaced whole. `word_level=False` diffs every node character by
+    character instead.
+
+    With `side_by_side=True`, returns DiffViews with the old-only and new-only
+    diffs too, built in the same pass, and whether the diff was degraded by
+    running out of time.
+    """
     # Input validation
     if original_html is None:
         original_html = ""
     if modified_html is None:
         modified_html = ""
 
+    views = _diff_views(original_html, modified_html, time_budget, word_level)
+    return views if side_by_side else views.combined
+
+
+def _diff_views(original_html, modified_html, time_budget, word_level):
     # Handle identical content early
     if original_html == modified_html:
-        return original_html
+        return DiffViews(original_html, original_html, original_html)
 
-    dmp = diff_match_patch()
+    differ = TextDiffer(time_budget=time_budget, word_level=word_level)
 
     # Treat as plain text if no tags
     if not original_html.strip().startswith(
         "<"
     ) and not modified_html.strip().startswith("<"):
-        return diff_plaintext_normalize_whitespace(original_html, modified_html, dmp)
+        return diff_plaintext_normalize_whitespace(original_html, modified_html, differ)
 
     soup1 = BeautifulSoup(original_html, "html.parser")
     soup2 = BeautifulSoup(modified_html, "html.parser")
@@ -37,21 +127,197 @@ def html_diff(original_html, modified_html):
     tags1 = extract_diffable_nodes(soup1)
     tags2 = extract_diffable_nodes(soup2)
 
-    return "".join(diff_node_lists(tags1, tags2, dmp))
+    views = join_views(diff_node_lists(tags1, tags2, differ))
+    return views._replace(degraded=differ.degraded)
+
+
+def join_views(views):
+    """Join a list of DiffViews into one."""
+    return DiffViews(
+        "".join(v.combined for v in views),
+        "".join(v.old for v in views),
+        "".join(v.new for v in views),
+        any(v.degraded for v in views),
+    )
+
+
+def same_views(html):
+    return DiffViews(html, html, html)
 
 
-def diff_plaintext_normalize_whitespace(text1, text2, dmp):
+def has_text(html):
+    """
+    Whether an HTML fragment shows anything: empty paragraphs and list items
+    are left out of the old-only and new-only views.
+    """
+    return bool(TAG_RE.sub("", html).strip()) or "<img" in html
+
+
+def wrap_views(name, views):
+    """Wrap each view in a tag, leaving out paragraphs and list items with no text."""
+
+    def wrap(html):
+        if name in ("p", "li") and not has_text(html):
+            return ""
+        return f"<{name}>{html}</{name}>"
+
+    return DiffViews(
+        f"<{name}>{views.combined}</{name}>",
+        wrap(views.old),
+        wrap(views.new),
+        views.degraded,
+    )
+
+
+class TextDiffer:
+    """
+    Diffs the text of leaf nodes for one html_diff call, keeping track of the
+    CPU time it has left (and of the diff_deadline, if there is one).
+    `degraded` is set once it has cut a diff short.
+    """
+
+    def __init__(self, time_budget=HTML_DIFF_TIME_BUDGET, word_level=True):
+        self.dmp = diff_match_patch()
+        self.word_level = word_level
+        self.time_budget = time_budget
+        self.cpu_deadline = (
+            time.process_time() + time_budget if time_budget is not None else None
+        )
+        self.deadline = get_diff_deadline()
+        self.degraded = False
+
+    def is_over_budget(self):
+        return (
+            self.cpu_deadline is not None and time.process_time() >= self.cpu_deadline
+        ) or (self.deadline is not None and time.time() >= self.deadline)
+
+    def _deadline(self):
+        """The deadline for one diff_match_patch call (which uses wall time)."""
+        timeout = self.dmp.Diff_Timeout
+        if self.cpu_deadline is not None:
+            timeout = min(timeout, max(self.cpu_deadline - time.process_time(), 0))
+        deadline = time.time() + timeout
+        if self.deadline is not None:
+            deadline = min(deadline, self.deadline)
+        return deadline
+
+    def _diff_main(self, text1, text2):
+        """diff_match_patch.diff_main, noting if it ran out of time."""
+        deadline = self._deadline()
+        diffs = self.dmp.diff_main(text1, text2, False, deadline)
+        if time.time() >= deadline:
+            self.degraded = True
+        return diffs
+
+    def diff(self, text1, text2):
+        """A list of (op, text) tuples, like diff_match_patch.diff_main."""
+        if text1 == text2:
+            return [(0, text1)] if text1 else []
+
+        if self.is_over_budget():
+            # Out of time: replace the whole text
+            self.degraded = True
+            return [(op, text) for op, text in [(-1, text1), (1, text2)] if text]
+
+        # Short texts are quicker to diff by character straight away
+        if not self.word_level or len(text1) + len(text2) <= MIN_WORD_DIFF_LENGTH:
+            return self._diff_chars(text1, text2)
+
+        diffs = self._diff_words(text1, text2)
+
+        # Diff the words that were replaced character by character, so that
+        # "colour" to "color" is shown as one deleted letter
+        result = []
+        i = 0
+        while i < len(diffs):
+            op, text = diffs[i]
+            if (
+                op == -1
+                and i + 1 < len(diffs)
+                and diffs[i + 1][0] == 1
+                and len(text) + len(diffs[i + 1][1]) <= MAX_REFINED_LENGTH
+            ):
+                if not self.is_over_budget():
+                    result.extend(self._diff_chars(text, diffs[i + 1][1]))
+                    i += 2
+                    continue
+                self.degraded = True
+            result.append((op, text))
+            i += 1
+
+        # Drop empty runs and join neighbouring runs of the same kind
+        merged = []
+        for op, text in result:
+            if not text:
+                continue
+            if merged and merged[-1][0] == op:
+                merged[-1] = (op, merged[-1][1] + text)
+            else:
+                merged.append((op, text))
+        return merged
+
+    def _diff_chars(self, text1, text2):
+        diffs = self._diff_main(text1, text2)
+        self.dmp.diff_cleanupSemantic(diffs)
+        return diffs
+
+    def _diff_words(self, text1, text2):
+        # Encode each distinct word (or run of whitespace, or punctuation mark)
+        # as one character, diff those, then turn them back into words
+        words = [""]
+        word_chars = {}
+
+        def encode(text):
+            chars = []
+            for word in WORD_RE.findall(text):
+                if word not in word_chars:
+                    word_chars[word] = chr(len(words))
+                    words.append(word)
+                chars.append(word_chars[word])
+            return "".join(chars)
+
+        chars1, chars2 = encode(text1), encode(text2)
+        diffs = self._diff_main(chars1, chars2)
+        # Clean up before decoding, so that edits never start or end mid-word
+        self.dmp.diff_cleanupSemantic(diffs)
+        self.dmp.diff_charsToLines(diffs, words)
+        return diffs
+
+    def views(self, text1, text2, is_text=True):
+        """
+        The diff of two strings, with <del> and <ins> tags, as DiffViews.
+
+        When the strings are text (rather than HTML), the old-only and new-only
+        views escape it.
+        """
+        combined, old, new = [], [], []
+        for op, data in self.diff(text1, text2):
+            html = escape(data, quote=False) if is_text else data
+            if op == 0:
+                combined.append(data)
+                old.append(html)
+                new.append(html)
+            elif op == -1:
+                combined.append(f"<del>{data}</del>")
+                old.append(f"<del>{html}</del>")
+            elif op == 1:
+                combined.append(f"<ins>{data}</ins>")
+                new.append(f"<ins>{html}</ins>")
+        return DiffViews("".join(combined), "".join(old), "".join(new), self.degraded)
+
+
+def diff_plaintext_normalize_whitespace(text1, text2, differ):
     # Normalize whitespace (collapse internal, trim ends)
     normalized_text1 = " ".join(text1.split())
     normalized_text2 = " ".join(text2.split())
 
     if normalized_text1 == normalized_text2:
-        return normalized_text1
+        return same_views(normalized_text1)
 
-    return diff_text_nodes(normalized_text1, normalized_text2, dmp)
+    return differ.views(normalized_text1, normalized_text2, is_text=False)
 
 
-def diff_node_lists(nodes1, nodes2, dmp):
+def diff_node_lists(nodes1, nodes2, differ):
     seq1 = [get_node_text(n) for n in nodes1]
     seq2 = [get_node_text(n) for n in nodes2]
     matcher = difflib.SequenceMatcher(None, seq1, seq2)
@@ -60,31 +326,32 @@ def diff_node_lists(nodes1, nodes2, dmp):
     for tag, i1, i2, j1, j2 in matcher.get_opcodes():
         if tag == "equal":
             for n1, n2 in zip(nodes1[i1:i2], nodes2[j1:j2]):
-                result.append(diff_tags(n1, n2, dmp))
+                result.append(diff_tags(n1, n2, differ))
         elif tag == "replace":
             for n1, n2 in zip(nodes1[i1:i2], nodes2[j1:j2]):
-                result.append(diff_tags(n1, n2, dmp))
+                result.append(diff_tags(n1, n2, differ))
             # Handle extras
             for n1 in nodes1[i1 + (j2 - j1) : i2]:
-                result.append(wrap_any(n1, "del"))
+                result.append(deleted_views(n1))
             for n2 in nodes2[j1 + (i2 - i1) : j2]:
-                result.append(wrap_any(n2, "ins"))
+                result.append(inserted_views(n2))
         elif tag == "delete":
             for n1 in nodes1[i1:i2]:
-                result.append(wrap_any(n1, "del"))
+                result.append(deleted_views(n1))
         elif tag == "insert":
             for n2 in nodes2[j1:j2]:
-                result.append(wrap_any(n2, "ins"))
+                result.append(inserted_views(n2))
 
     return result
 
 
-def diff_tags(tag1, tag2, dmp):
-    if isinstance(tag1, str) or isinstance(tag2, str):
-        return diff_text_nodes(str(tag1), str(tag2), dmp)
+def diff_tags(tag1, tag2, differ):
+    if isinstance(tag1, str) and isinstance(tag2, str):
+        return diff_text_nodes(tag1, tag2, differ)
 
-    if tag1.name != tag2.name:
-        return wrap_tag(tag1, "del") + wrap_tag(tag2, "ins")
+    # Text on one side and a tag on the other: the markup is not text to diff
+    if isinstance(tag1, str) or isinstance(tag2, str) or tag1.name != tag2.name:
+        return join_views([deleted_views(tag1), inserted_views(tag2)])
 
     children1 = [c for c in tag1.children if not is_empty_string(c)]
     children2 = [c for c in tag2.children if not is_empty_string(c)]
@@ -95,25 +362,15 @@ def diff_tags(tag1, tag2, dmp):
         or has_diffable_children(tag1)
         or has_diffable_children(tag2)
     ):
-        return f"<{tag2.name}>{''.join(diff_node_lists(children1, children2, dmp))}</{tag2.name}>"
+        return wrap_views(
+            tag2.name, join_views(diff_node_lists(children1, children2, differ))
+        )
 
-    return diff_leaf(tag1, tag2, dmp)
+    return diff_leaf(tag1, tag2, differ)
 
 
-def diff_leaf(tag1, tag2, dmp):
-    diffs = dmp.diff_main(tag1.get_text(), tag2.get_text())
-    dmp.diff_cleanupSemantic(diffs)
-
-    content = ""
-    for op, data in diffs:
-        if op == 0:
-            content += data
-        elif op == -1:
-            content += f"<del>{data}</del>"
-        elif op == 1:
-            content += f"<ins>{data}</ins>"
-
-    return f"<{tag2.name}>{content}</{tag2.name}>"
+def diff_leaf(tag1, tag2, differ):
+    return wrap_views(tag2.name, differ.views(tag1.get_text(), tag2.get_text()))
 
 
 def wrap_tag(tag, wrapper):
@@ -143,19 +400,44 @@ def wrap_any(node, wrapper):
     return f"<{wrapper}>{str(node)}</{wrapper}>"
 
 
-def diff_text_nodes(text1, text2, dmp):
-    diffs = dmp.diff_main(str(text1), str(text2))
-    dmp.diff_cleanupSemantic(diffs)
+def empty_tag(node):
+    """
+    What is left of a wrapped node on the side of a side-by-side diff that
+    doesn't show it: table parts keep their (empty) cells, everything else goes.
+    """
+    if not hasattr(node, "name") or node.name not in BLOCK_WRAPPER_UNSAFE_TAGS:
+        return ""
+    if node.name == "li":
+        return ""
+    if node.name == "tr":
+        cells = [
+            (
+                f"<{child.name}></{child.name}>"
+                if getattr(child, "name", None) in ("td", "th")
+                else str(child)
+            )
+            for child in node.children
+        ]
+        return f"<tr>{''.join(cells)}</tr>"
+    return f"<{node.name}></{node.name}>"
+
+
+def deleted_views(node):
+    wrapped = wrap_any(node, "del")
+    if isinstance(node, str):
+        return DiffViews(wrapped, f"<del>{escape(node, quote=False)}</del>", "")
+    return DiffViews(wrapped, wrapped, empty_tag(node))
+
+
+def inserted_views(node):
+    wrapped = wrap_any(node, "ins")
+    if isinstance(node, str):
+        return DiffViews(wrapped, "", f"<ins>{escape(node, quote=False)}</ins>")
+    return DiffViews(wrapped, empty_tag(node), wrapped)
+
 
-    out = ""
-    for op, data in diffs:
-        if op == 0:
-            out += data
-        elif op == -1:
-            out += f"<del>{data}</del>"
-        elif op == 1:
-            out += f"<ins>{data}</ins>"
-    return out
+def diff_text_nodes(text1, text2, differ):
+    return differ.views(str(text1), str(text2))
 
 
 def get_node_text(node):
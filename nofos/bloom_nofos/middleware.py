@@ -10,6 +10,8 @@ from django.http import HttpResponseBadRequest, HttpResponseForbidden
 from django.template import loader
 from django.utils.deprecation import MiddlewareMixin
 
+from .request_metrics import measure_request
+
 _local = threading.local()
 
 
@@ -45,6 +47,11 @@ class CurrentUserMiddleware:
 class JSONRequestLoggingMiddleware(MiddlewareMixin):
     """
     Middleware to log HTTP requests with timing and filtering
+
+    With REQUEST_METRICS on, logs also have query counts, DB and template
+    time, parse and render counts and memory (see request_metrics.py), and
+    superusers get them in a Server-Timing header. For streaming responses
+    they only cover building the response, and the log says "streamed".
     """
 
     # Define patterns for static assets to exclude
@@ -77,6 +84,14 @@ class JSONRequestLoggingMiddleware(MiddlewareMixin):
         self.logger = logging.getLogger("django.request")
         super().__init__(get_response)
 
+    def __call__(self, request):
+        if not settings.REQUEST_METRICS:
+            return super().__call__(request)
+
+        with measure_request() as metrics:
+            request._metrics = metrics
+            return super().__call__(request)
+
     def _build_log_metadata(self, request, status, response_time_ms):
         metadata = {
             "method": request.method,
@@ -94,6 +109,10 @@ class JSONRequestLoggingMiddleware(MiddlewareMixin):
             # Referrer - shows where users came from
             metadata["referrer"] = request.META.get("HTTP_REFERER", "")
 
+        metrics = getattr(request, "_metrics", None)
+        if metrics:
+            metadata.update(metrics.get_log_data())
+
         return metadata
 
     def process_request(self, request):
@@ -149,6 +168,14 @@ class JSONRequestLoggingMiddleware(MiddlewareMixin):
 
         extra_data = self._build_log_metadata(request, status_code, response_time_ms)
 
+        metrics = getattr(request, "_metrics", None)
+        if metrics and response.streaming:
+            # The body is written after this, so its queries, parses and
+            # renders aren't in the metrics: they only cover the view
+            extra_data["streamed"] = True
+        if metrics and getattr(request, "user", None) and request.user.is_superuser:
+            response["Server-Timing"] = metrics.get_server_timing(response_time_ms)
+
         # Log at appropriate level
         if status_code >= 500:
             # catch exceptions we have already processed
@@ -0,0 +1,151 @@
+"""
+Per-request performance metrics, for JSONRequestLoggingMiddleware.
+
+With REQUEST_METRICS on, each request logged by the middleware also records:
+
+- how many SQL queries it ran, and how long they took (a connection execute
+  wrapper)
+- how long it spent rendering templates
+- how many times it parsed HTML with BeautifulSoup and rendered markdown
+- how much it raised the peak memory (RSS) of the process
+
+The template, BeautifulSoup and markdown numbers come from hooks on
+Template.render, BeautifulSoup and Markdown.convert, installed the first time
+a request is measured. Outside a measured request they only check a
+thread-local.
+"""
+
+import functools
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import markdown
+from bs4 import BeautifulSoup
+from django.db import connection
+from django.template.backends.django import Template
+
+_local = threading.local()
+_hooks_lock = threading.Lock()
+_hooks_installed = False
+
+
+def get_max_rss_kb():
+    """The peak resident memory of this process so far, in KB."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return max_rss // 1024 if sys.platform == "darwin" else max_rss
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.soup_parses = 0
+        self.markdown_renders = 0
+        self.template_depth = 0
+        self.start_max_rss_kb = get_max_rss_kb()
+
+    def __call__(self, execute, sql, params, many, context):
+        """The connection execute wrapper: counts and times queries."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_time += time.perf_counter() - start
+
+    @property
+    def memory_peak_delta_kb(self):
+        # Process-wide: only grows when this request pushes the peak higher
+        return get_max_rss_kb() - self.start_max_rss_kb
+
+    def get_log_data(self):
+        return {
+            "db_queries": self.db_queries,
+            "db_time": f"{self.db_time * 1000:.3f}ms",
+            "template_time": f"{self.template_time * 1000:.3f}ms",
+            "soup_parses": self.soup_parses,
+            "markdown_renders": self.markdown_renders,
+            "memory_peak_delta_kb": self.memory_peak_delta_kb,
+        }
+
+    def get_server_timing(self, response_time_ms):
+        """A Server-Timing header value, eg for the browser's network panel."""
+        return ", ".join(
+            [
+                f'db;dur={self.db_time * 1000:.3f};desc="{self.db_queries} queries"',
+                f"template;dur={self.template_time * 1000:.3f}",
+                f'soup;desc="{self.soup_parses} parses"',
+                f'markdown;desc="{self.markdown_renders} renders"',
+                f'memory;desc="{self.memory_peak_delta_kb} KB peak"',
+                f"total;dur={response_time_ms:.3f}",
+            ]
+        )
+
+
+def get_request_metrics():
+    """The metrics of the request being measured in this thread, or None."""
+    return getattr(_local, "metrics", None)
+
+
+@contextmanager
+def measure_request():
+    """Collect RequestMetrics for everything run in this block."""
+    install_hooks()
+    metrics = RequestMetrics()
+    _local.metrics = metrics
+    try:
+        with connection.execute_wrapper(metrics):
+            yield metrics
+    finally:
+        _local.metrics = None
+
+
+def _count_calls(func, counter):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        metrics = get_request_metrics()
+        if metrics is not None:
+            setattr(metrics, counter, getattr(metrics, counter) + 1)
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+def _time_template_render(render):
+    @functools.wraps(render)
+    def wrapper(*args, **kwargs):
+        metrics = get_request_metrics()
+        # Templates rendered inside another one are timed as part of it
+        if metrics is None or metrics.template_depth:
+            return render(*args, **kwargs)
+
+        metrics.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(*args, **kwargs)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+            metrics.template_depth -= 1
+
+    return wrapper
+
+
+def install_hooks():
+    """Count BeautifulSoup parses and markdown renders, and time templates."""
+    global _hooks_installed
+    with _hooks_lock:
+        if _hooks_installed:
+            return
+        _hooks_installed = True
+
+        BeautifulSoup.__init__ = _count_calls(BeautifulSoup.__init__, "soup_parses")
+        # markdown.markdown and martor's markdownify both end up here
+        markdown.Markdown.convert = _count_calls(
+            markdown.Markdown.convert, "markdown_renders"
+        )
+        Template.render = _time_template_render(Template.render)
@@ -0,0 +1,105 @@
+"""
+Checking a body for a list of required strings ("diff strings").
+
+A string counts as present if, ignoring case and runs of whitespace, it is
+somewhere in the body. RequiredStrings is compiled once per list of strings
+(when a CompareSubsection is saved) and then checks any body in one pass per
+distinct string that isn't already known to be present:
+
+- strings are normalized and de-duplicated up front
+- longer strings are checked first, and finding one marks every shorter
+  string inside it as found too, like the output links of an Aho–Corasick
+  automaton, so those are never searched for
+- each search is a C-level substring search over the normalized body,
+  which is faster in CPython than walking an automaton character by character
+"""
+
+from functools import lru_cache
+
+# Bump this when RequiredStrings.to_data changes shape
+REQUIRED_STRINGS_VERSION = 1
+
+
+def normalize_text(text):
+    """Lowercase `text`, strip it and collapse runs of whitespace into single spaces."""
+    return " ".join((text or "").split()).lower()
+
+
+class RequiredStrings:
+    def __init__(self, strings, patterns=None, contains=None, string_patterns=None):
+        self.strings = list(strings)
+        if patterns is None:
+            patterns, contains, string_patterns = self._compile(self.strings)
+        self.patterns = patterns
+        # Positions of the (shorter) patterns inside each pattern
+        self.contains = contains
+        # Position of each string's pattern
+        self.string_patterns = string_patterns
+
+    @staticmethod
+    def _compile(strings):
+        normalized = [normalize_text(s) for s in strings]
+        # Longest first, so that finding a pattern can settle the ones inside it
+        patterns = sorted(set(normalized), key=lambda p: (-len(p), p))
+        contains = [
+            [j for j in range(i + 1, len(patterns)) if patterns[j] in pattern]
+            for i, pattern in enumerate(patterns)
+        ]
+        positions = {pattern: i for i, pattern in enumerate(patterns)}
+        return patterns, contains, [positions[n] for n in normalized]
+
+    def to_data(self):
+        """A JSON-friendly version, for CompareSubsection.compiled_diff_strings."""
+        return {
+            "version": REQUIRED_STRINGS_VERSION,
+            "strings": self.strings,
+            "patterns": self.patterns,
+            "contains": self.contains,
+            "string_patterns": self.string_patterns,
+        }
+
+    @classmethod
+    def from_data(cls, data, strings):
+        """
+        Rebuild from to_data, if it was compiled from `strings` by this version;
+        otherwise compile `strings` again.
+        """
+        if (
+            data
+            and data.get("version") == REQUIRED_STRINGS_VERSION
+            and data.get("strings") == list(strings)
+        ):
+            return cls(
+                strings, data["patterns"], data["contains"], data["string_patterns"]
+            )
+        return cls(strings)
+
+    def find_missing(self, body):
+        """The required strings that aren't in `body`, in order (with any repeats)."""
+        if not self.strings:
+            return []
+
+        normalized_body = normalize_text(body)
+        found = set()
+        for i, pattern in enumerate(self.patterns):
+            if i in found:
+                continue
+            if pattern in normalized_body:
+                found.add(i)
+                found.update(self.contains[i])
+
+        return [
+            s
+            for s, position in zip(self.strings, self.string_patterns)
+            if position not in found
+        ]
+
+
+@lru_cache(maxsize=1024)
+def _get_required_strings(strings):
+    return RequiredStrings(strings)
+
+
+def get_required_strings(strings):
+    """RequiredStrings for a list of strings, compiled once per process."""
+    return _get_required_strings(tuple(strings))
@@ -6,9 +6,11 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase, override_settings
 
 from .utils import (
+    get_artifact_from_s3,
     get_image_url_from_s3,
     remove_file_from_s3,
     strip_s3_hostname_suffix,
+    upload_artifact_to_s3,
     upload_file_to_s3,
 )
 
@@ -396,3 +398,68 @@ class RemoveFileFromS3Test(TestCase):
 
         with self.assertRaisesMessage(Exception, "File removal failed: Delete failed"):
             remove_file_from_s3("test-key")
+
+
+class UploadArtifactToS3Test(TestCase):
+    @override_settings(GENERAL_S3_BUCKET_URL="test-bucket.s3.amazonaws.com")
+    @patch("bloom_nofos.s3.utils.boto3.client")
+    def test_successful_upload_uses_exact_key(self, mock_boto_client):
+        mock_s3_client = MagicMock()
+        mock_boto_client.return_value = mock_s3_client
+        fileobj = BytesIO(b"%PDF-1.4")
+
+        result = upload_artifact_to_s3(
+            fileobj, "artifacts/pdfs/abc/1/theme/test/hash.pdf", "application/pdf"
+        )
+
+        self.assertEqual(result, "artifacts/pdfs/abc/1/theme/test/hash.pdf")
+        call_args = mock_s3_client.upload_fileobj.call_args
+        self.assertEqual(call_args[0][0], fileobj)
+        self.assertEqual(call_args[0][1], "test-bucket")
+        self.assertEqual(call_args[0][2], "artifacts/pdfs/abc/1/theme/test/hash.pdf")
+        self.assertEqual(call_args[1]["ExtraArgs"]["ContentType"], "application/pdf")
+
+    @override_settings(GENERAL_S3_BUCKET_URL="")
+    def test_empty_bucket_url_raises_exception(self):
+        with self.assertRaisesMessage(Exception, "No AWS bucket configured."):
+            upload_artifact_to_s3(BytesIO(b""), "key", "application/pdf")
+
+
+class GetArtifactFromS3Test(TestCase):
+    @override_settings(GENERAL_S3_BUCKET_URL="test-bucket.s3.amazonaws.com")
+    @patch("bloom_nofos.s3.utils.boto3.client")
+    def test_returns_body(self, mock_boto_client):
+        mock_s3_client = MagicMock()
+        body = BytesIO(b"%PDF-1.4")
+        mock_s3_client.get_object.return_value = {"Body": body}
+        mock_boto_client.return_value = mock_s3_client
+
+        self.assertEqual(get_artifact_from_s3("artifacts/key.pdf"), body)
+        mock_s3_client.get_object.assert_called_once_with(
+            Bucket="test-bucket", Key="artifacts/key.pdf"
+        )
+
+    @override_settings(GENERAL_S3_BUCKET_URL="test-bucket.s3.amazonaws.com")
+    @patch("bloom_nofos.s3.utils.boto3.client")
+    def test_missing_key_returns_none(self, mock_boto_client):
+        mock_s3_client = MagicMock()
+        mock_s3_client.get_object.side_effect = ClientError(
+            error_response={"Error": {"Code": "NoSuchKey", "Message": "Not found"}},
+            operation_name="GetObject",
+        )
+        mock_boto_client.return_value = mock_s3_client
+
+        self.assertIsNone(get_artifact_from_s3("artifacts/missing.pdf"))
+
+    @override_settings(GENERAL_S3_BUCKET_URL="test-bucket.s3.amazonaws.com")
+    @patch("bloom_nofos.s3.utils.boto3.client")
+    def test_other_client_errors_raise(self, mock_boto_client):
+        mock_boto_client.side_effect = ClientError(
+            error_response={
+                "Error": {"Code": "AccessDenied", "Message": "Access denied"}
+            },
+            operation_name="GetObject",
+        )
+
+        with self.assertRaisesMessage(Exception, "File download failed"):
+            get_artifact_from_s3("artifacts/key.pdf")
@@ -215,3 +215,93 @@ def remove_file_from_s3(key):
     except Exception as e:
         logger.error(f"Unexpected error removing file from S3: {e}")
         raise Exception(f"File removal failed: {e}")
+
+
+def upload_artifact_to_s3(fileobj, key, content_type):
+    """
+    Upload a generated file (eg, a printed PDF) to S3 under an exact key.
+
+    Unlike upload_file_to_s3, the key is used as-is so that it can be looked
+    up again later with get_artifact_from_s3.
+
+    Raises:
+        Exception: Various S3-related exceptions for proper error handling in callers
+    """
+    bucket_name = strip_s3_hostname_suffix(settings.GENERAL_S3_BUCKET_URL)
+
+    if not bucket_name:
+        raise Exception(
+            "No AWS bucket configured. Please set GENERAL_S3_BUCKET_URL in your environment."
+        )
+
+    try:
+        s3 = boto3.client("s3", config=Config(signature_version="s3v4"))
+        s3.upload_fileobj(
+            fileobj,
+            bucket_name,
+            key,
+            ExtraArgs={
+                "ContentType": content_type,
+                "Metadata": {"generated_at": datetime.now().isoformat()},
+            },
+        )
+        return key
+
+    except TokenRetrievalError:
+        logger.error("AWS SSO token has expired.")
+        raise Exception("AWS authentication failed. Please contact an administrator.")
+
+    except SSOTokenLoadError:
+        logger.error("No AWS SSO token found.")
+        raise Exception("AWS authentication failed. Please contact an administrator.")
+
+    except ClientError as e:
+        logger.warning(
+            f"An error occurred while accessing the AWS bucket: {e}",
+        )
+        raise Exception(f"File upload failed: {e}")
+
+    except Exception as e:
+        logger.error(f"Unexpected error uploading to S3: {e}")
+        raise Exception(f"File upload failed: {e}")
+
+
+def get_artifact_from_s3(key):
+    """
+    Return a streaming body for an object in S3, or None if there is no such key.
+
+    The body has a `.iter_chunks()` method and should be closed when done.
+
+    Raises:
+        Exception: Various S3-related exceptions for proper error handling in callers
+    """
+    bucket_name = strip_s3_hostname_suffix(settings.GENERAL_S3_BUCKET_URL)
+
+    if not bucket_name:
+        raise Exception(
+            "No AWS bucket configured. Please set GENERAL_S3_BUCKET_URL in your environment."
+        )
+
+    try:
+        s3 = boto3.client("s3", config=Config(signature_version="s3v4"))
+        return s3.get_object(Bucket=bucket_name, Key=key)["Body"]
+
+    except TokenRetrievalError:
+        logger.error("AWS SSO token has expired.")
+        raise Exception("AWS authentication failed. Please contact an administrator.")
+
+    except SSOTokenLoadError:
+        logger.error("No AWS SSO token found.")
+        raise Exception("AWS authentication failed. Please contact an administrator.")
+
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ["NoSuchKey", "404"]:
+            return None
+        logger.warning(
+            f"An error occurred while accessing the AWS bucket: {e}",
+        )
+        raise Exception(f"File download failed: {e}")
+
+    except Exception as e:
+        logger.error(f"Unexpected error downloading from S3: {e}")
+        raise Exception(f"File download failed: {e}")
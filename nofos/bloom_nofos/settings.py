@@ -14,6 +14,7 @@ import json
 import logging
 import os
 import sys
+import tempfile
 import warnings
 from datetime import datetime
 from pathlib import Path
@@ -91,6 +92,14 @@ if aws_dns_name:
 GENERAL_S3_BUCKET_URL = env("GENERAL_S3_BUCKET_URL", default=None)
 AWS_REGION = env("AWS_REGION", default="us-east-1")
 
+# Generated files (eg, printed PDFs) are kept in the S3 bucket above, or in
+# this directory when no bucket is configured
+ARTIFACT_STORAGE_DIR = env.get_value(
+    "ARTIFACT_STORAGE_DIR", default=os.path.join(BASE_DIR, "artifacts")
+)
+if "test" in sys.argv:
+    ARTIFACT_STORAGE_DIR = tempfile.mkdtemp(prefix="nofos-artifacts-")
+
 # SECURITY HEADERS
 SECURE_SSL_REDIRECT = is_prod
 SECURE_REDIRECT_EXEMPT = [r"^health/?$"]
@@ -240,6 +249,11 @@ else:
                 "level": "INFO",
                 "propagate": False,
             },
+            "artifacts": {
+                "handlers": ["console"],
+                "level": "INFO",
+                "propagate": False,
+            },
             # Suppress ALL other loggers aggressively
             "": {
                 "handlers": ["null"],
@@ -298,9 +312,26 @@ CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
         "LOCATION": "unique-uploads-cache",
-    }
+    },
+    # Memoized HTML diffs (see bloom_nofos/diff_cache.py)
+    "diffs": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "html-diffs",
+        "TIMEOUT": 60 * 60 * 24,
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
 }
 
+# Compare pages run their diffs in this many processes (1 means no process pool)...
+COMPARE_DIFF_WORKERS = int(env.get_value("COMPARE_DIFF_WORKERS", default=1))
+# ...but only when a comparison needs at least this many diffs
+COMPARE_PARALLEL_THRESHOLD = int(
+    env.get_value("COMPARE_PARALLEL_THRESHOLD", default=200)
+)
+# Seconds one comparison may spend diffing text: after that, the rest of its
+# changes are shown as replaced whole (and the comparison isn't stored)
+COMPARE_DIFF_TIME_BUDGET = float(env.get_value("COMPARE_DIFF_TIME_BUDGET", default=30))
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -554,6 +585,30 @@ ALLOWED_HTML_ATTRIBUTES = [
 
 DJANGO_EASY_AUDIT_READONLY_EVENTS = True
 DJANGO_EASY_AUDIT_WATCH_REQUEST_EVENTS = False
+# Tables built from audit events aren't audited themselves
+DJANGO_EASY_AUDIT_UNREGISTERED_CLASSES_EXTRA = [
+    "nofos.AuditEventDocument",
+    "nofos.AuditEventArchive",
+    "nofos.AuditEventDiff",
+    "nofos.AuditBodySnapshot",
+]
+# Logs subsection updates as compact body snapshots if AUDIT_COMPACT_SNAPSHOTS is on
+DJANGO_EASY_AUDIT_LOGGING_BACKEND = "nofos.audit_snapshots.CompactSnapshotBackend"
+
+# Audit retention (`python manage.py compact_audit_log`): same-day updates to an
+# object are compacted into one event after this many days...
+AUDIT_COMPACT_AFTER_DAYS = int(env.get_value("AUDIT_COMPACT_AFTER_DAYS", default=90))
+# ...and the JSON of events is compressed into the archive after this many days
+AUDIT_ARCHIVE_AFTER_DAYS = int(env.get_value("AUDIT_ARCHIVE_AFTER_DAYS", default=365))
+
+# Compact audit snapshots (see nofos/audit_snapshots.py): subsection updates store a
+# patch to the body instead of full copies of it, with a full checkpoint every so often
+AUDIT_COMPACT_SNAPSHOTS = cast_to_boolean(
+    env.get_value("AUDIT_COMPACT_SNAPSHOTS", default=False)
+)
+AUDIT_SNAPSHOT_CHECKPOINT_EVERY = int(
+    env.get_value("AUDIT_SNAPSHOT_CHECKPOINT_EVERY", default=20)
+)
 
 # If the header is set it must be available on the request or an Error will be thrown
 if is_prod:
@@ -562,10 +617,26 @@ if is_prod:
 # Document IPs for our PDF generating app
 DOCRAPTOR_IPS = env.get_value("DOCRAPTOR_IPS", default="")
 DOCRAPTOR_API_KEY = env.get_value("DOCRAPTOR_API_KEY", default="")
+# Point this at a local fake DocRaptor server to exercise print jobs offline
+DOCRAPTOR_API_URL = env.get_value(
+    "DOCRAPTOR_API_URL", default="https://api.docraptor.com"
+)
+# Serve a stored PDF when the same revision of a NOFO is printed again
+PDF_CACHE_ENABLED = cast_to_boolean(env.get_value("PDF_CACHE_ENABLED", default=True))
+# How often (in seconds) the print job page checks on an asynchronous PDF
+DOCRAPTOR_POLL_INTERVAL = int(env.get_value("DOCRAPTOR_POLL_INTERVAL", default=2))
 
 # Grabzit API keys for DOCX conversion
 GRABZIT_APPLICATION_KEY = env.get_value("GRABZIT_APPLICATION_KEY", default="")
 GRABZIT_APPLICATION_SECRET = env.get_value("GRABZIT_APPLICATION_SECRET", default="")
+# "grabzit" converts the export page remotely, "native" builds NOFO DOCX files in-process
+DOCX_EXPORT_ENGINE = env.get_value("DOCX_EXPORT_ENGINE", default="grabzit")
+# Serve a stored DOCX when the same revision of a document is exported again
+DOCX_CACHE_ENABLED = cast_to_boolean(env.get_value("DOCX_CACHE_ENABLED", default=True))
+
+# Add query counts, DB and template time, parse counts and memory to request
+# logs, and a Server-Timing header for superusers (see request_metrics.py)
+REQUEST_METRICS = cast_to_boolean(env.get_value("REQUEST_METRICS", default=False))
 
 # Provisional, source-native readability metrics integration. The package is
 # pinned, but each environment opts into the feature explicitly.
@@ -1,6 +1,7 @@
-// This JS file does 2 things:
+// This JS file does 3 things:
 // 1. Highlights the right nav item based on the viewport's scroll position (taking offset into account because of sticky headers)
 // 2. Activates the "next section"/"previous section" buttons as we scroll
+// 3. Loads the sections of the comparison as they get close to the viewport (or when their nav links are clicked)
 document.addEventListener("DOMContentLoaded", function () {
   const OFFSET = 200; // 5px more than scroll-margin-top
   const navLinks = Array.from(
@@ -14,13 +15,18 @@ document.addEventListener("DOMContentLoaded", function () {
   const prevBtn = document.querySelector(".usa-button--expand_less");
   const nextBtn = document.querySelector(".usa-button--expand_more");
 
-  const sections = navLinks
-    .map((link) => {
-      const id = link.getAttribute("href").substring(1);
-      const heading = document.querySelector(`#${CSS.escape(id)}`);
-      return { link, heading };
-    })
-    .filter((item) => item.heading);
+  let sections = [];
+
+  function findSections() {
+    sections = navLinks
+      .map((link) => {
+        const id = link.getAttribute("href").substring(1);
+        const heading = document.querySelector(`#${CSS.escape(id)}`);
+        return { link, heading };
+      })
+      .filter((item) => item.heading);
+  }
+  findSections();
 
   let lastActiveLI = null;
 
@@ -133,4 +139,82 @@ document.addEventListener("DOMContentLoaded", function () {
   // "passive: true" improves scroll performance
   window.addEventListener("scroll", updateActiveNav, { passive: true });
   updateActiveNav(); // run on page load
+
+  // Sections that haven't loaded yet only have their heading and a "data-section-url"
+  function loadSection(table) {
+    if (!table.loading) {
+      table.loading = fetch(table.dataset.sectionUrl, {
+        credentials: "same-origin",
+      })
+        .then((response) => {
+          if (!response.ok) throw new Error(response.status);
+          return response.text();
+        })
+        .then((html) => {
+          const template = document.createElement("template");
+          template.innerHTML = html.trim();
+          table.replaceWith(template.content);
+          findSections();
+          updateActiveNav();
+        })
+        .catch(() => {
+          const cell = table.querySelector(".section--loading td");
+          if (cell) {
+            cell.innerHTML =
+              '<p class="text-base">This section didn’t load. <a href="">Reload the page</a> to try again.</p>';
+          }
+        });
+    }
+    return table.loading;
+  }
+
+  const lazySections = Array.from(
+    document.querySelectorAll("table[data-section-url]")
+  );
+
+  if ("IntersectionObserver" in window) {
+    const observer = new IntersectionObserver(
+      (entries) => {
+        entries.forEach((entry) => {
+          if (entry.isIntersecting) {
+            observer.unobserve(entry.target);
+            loadSection(entry.target);
+          }
+        });
+      },
+      { rootMargin: "1500px 0px" }
+    );
+    lazySections.forEach((table) => observer.observe(table));
+  } else {
+    lazySections.forEach(loadSection);
+  }
+
+  // Load the section a nav link points to before jumping to it
+  function goTo(id, sectionId) {
+    const table = sectionId && document.getElementById(sectionId);
+    if (document.getElementById(id) || !table || !table.dataset.sectionUrl) {
+      return false;
+    }
+    loadSection(table).then(() => {
+      const target = document.getElementById(id);
+      if (target) {
+        history.replaceState(null, "", `#${id}`);
+        target.scrollIntoView({ behavior: prefersReduced ? "auto" : "smooth" });
+      }
+    });
+    return true;
+  }
+
+  navLinks.forEach((link) => {
+    link.addEventListener("click", (event) => {
+      const id = link.getAttribute("href").substring(1);
+      if (goTo(id, link.dataset.section)) event.preventDefault();
+    });
+  });
+
+  if (window.location.hash) {
+    const id = decodeURIComponent(window.location.hash.substring(1));
+    const link = navLinks.find((l) => l.getAttribute("href") === `#${id}`);
+    if (link) goTo(id, link.dataset.section);
+  }
 });
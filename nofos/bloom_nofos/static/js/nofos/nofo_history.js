@@ -1,4 +1,4 @@
-// This JS file returns more audit events if available, appends them to the table of existing audit events, and then resets the button with the next offset
+// This JS file returns more audit events if available, appends them to the table of existing audit events, and then resets the button with the next cursor
 const btn = document.getElementById("load-more-btn");
 btn?.addEventListener("click", async (e) => {
   const button = e.currentTarget;
@@ -8,8 +8,9 @@ btn?.addEventListener("click", async (e) => {
   button.textContent = "Loading...";
 
   try {
-    // Fetch the next page using the current offset
-    const response = await fetch(`?offset=${button.dataset.nextOffset}`);
+    // Fetch the events after the last one shown
+    const params = new URLSearchParams({ after: button.dataset.nextCursor });
+    const response = await fetch(`?${params}`);
     const html = await response.text();
 
     // Parse response once and grab the new rows
@@ -24,7 +25,7 @@ btn?.addEventListener("click", async (e) => {
 
     const hasMore = doc.getElementById("load-more-btn");
     if (nextButton) {
-      button.dataset.nextOffset = hasMore.dataset.nextOffset;
+      button.dataset.nextCursor = hasMore.dataset.nextCursor;
       button.disabled = false;
       button.textContent = "Load More Events";
     } else {
@@ -0,0 +1,67 @@
+(() => {
+  const container = document.getElementById("print-job");
+  const stateElement = document.getElementById("print-job-state");
+  if (!container || !stateElement) return;
+
+  const pollInterval = Number(container.dataset.pollInterval) || 2000;
+  const working = document.getElementById("print-job-state-working");
+  const completed = document.getElementById("print-job-state-completed");
+  const failed = document.getElementById("print-job-state-failed");
+  const errorText = document.getElementById("print-job-error");
+  const status = document.getElementById("print-job-status");
+  const downloadLink = document.getElementById("print-job-download");
+
+  const showState = (job) => {
+    working.hidden = job.is_finished;
+    completed.hidden = job.status !== "completed";
+    failed.hidden = job.status !== "failed";
+    status.textContent = job.status_display;
+
+    if (job.status === "failed" && job.error_message) {
+      errorText.textContent = job.error_message;
+    }
+  };
+
+  const finish = (job) => {
+    showState(job);
+    if (job.status === "completed" && job.download_url) {
+      downloadLink.href = job.download_url;
+      // Inline PDFs replace this page, attachments download and leave it in place
+      window.location.assign(job.download_url);
+    }
+  };
+
+  const poll = async (job) => {
+    if (job.is_finished) {
+      finish(job);
+      return;
+    }
+
+    try {
+      const response = await fetch(job.status_url, {
+        headers: { Accept: "application/json" },
+        credentials: "same-origin",
+      });
+      if (!response.ok) throw new Error(`HTTP ${response.status}`);
+      job = await response.json();
+    } catch (err) {
+      // A dropped request shouldn't stop the job: try again on the next tick
+      console.error(err);
+    }
+
+    if (job.is_finished) {
+      finish(job);
+    } else {
+      showState(job);
+      setTimeout(() => poll(job), pollInterval);
+    }
+  };
+
+  const initialState = JSON.parse(stateElement.textContent);
+  // Don't re-download a finished PDF every time someone revisits this page
+  if (initialState.is_finished) {
+    showState(initialState);
+  } else {
+    setTimeout(() => poll(initialState), pollInterval);
+  }
+})();
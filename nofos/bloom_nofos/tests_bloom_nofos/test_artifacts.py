@@ -0,0 +1,81 @@
+import tempfile
+from io import BytesIO
+from unittest.mock import patch
+
+from bloom_nofos.artifacts import (
+    LocalArtifactStorage,
+    S3ArtifactStorage,
+    get_artifact_storage,
+    iter_artifact,
+    open_artifact,
+    save_artifact,
+)
+from django.test import SimpleTestCase, override_settings
+
+
+class LocalArtifactStorageTest(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.storage = LocalArtifactStorage(self.root)
+
+    def test_open_missing_key_returns_none(self):
+        self.assertIsNone(self.storage.open("pdfs/missing.pdf"))
+
+    def test_save_then_open(self):
+        self.storage.save("pdfs/a/b.pdf", BytesIO(b"%PDF-1.4"), "application/pdf")
+
+        with self.storage.open("pdfs/a/b.pdf") as f:
+            self.assertEqual(f.read(), b"%PDF-1.4")
+
+    def test_save_overwrites(self):
+        self.storage.save("a.pdf", BytesIO(b"one"), "application/pdf")
+        self.storage.save("a.pdf", BytesIO(b"two"), "application/pdf")
+
+        with self.storage.open("a.pdf") as f:
+            self.assertEqual(f.read(), b"two")
+
+    def test_keys_cannot_escape_the_root(self):
+        with self.assertRaises(ValueError):
+            self.storage.open("../outside.pdf")
+
+
+class GetArtifactStorageTest(SimpleTestCase):
+    @override_settings(GENERAL_S3_BUCKET_URL=None)
+    def test_local_storage_without_bucket(self):
+        self.assertIsInstance(get_artifact_storage(), LocalArtifactStorage)
+
+    @override_settings(GENERAL_S3_BUCKET_URL="test-bucket.s3.amazonaws.com")
+    def test_s3_storage_with_bucket(self):
+        self.assertIsInstance(get_artifact_storage(), S3ArtifactStorage)
+
+    @override_settings(GENERAL_S3_BUCKET_URL="test-bucket.s3.amazonaws.com")
+    @patch("bloom_nofos.artifacts.get_artifact_from_s3")
+    def test_s3_storage_prefixes_keys(self, mock_get):
+        S3ArtifactStorage().open("pdfs/a.pdf")
+        mock_get.assert_called_once_with("artifacts/pdfs/a.pdf")
+
+
+class ArtifactHelpersTest(SimpleTestCase):
+    @override_settings(GENERAL_S3_BUCKET_URL="test-bucket.s3.amazonaws.com")
+    @patch("bloom_nofos.artifacts.get_artifact_from_s3")
+    def test_storage_errors_are_a_miss(self, mock_get):
+        mock_get.side_effect = Exception("AWS authentication failed.")
+
+        with self.assertLogs("artifacts", level="WARNING"):
+            self.assertIsNone(open_artifact("pdfs/a.pdf"))
+
+    @override_settings(GENERAL_S3_BUCKET_URL="test-bucket.s3.amazonaws.com")
+    @patch("bloom_nofos.artifacts.upload_artifact_to_s3")
+    def test_failed_save_returns_none(self, mock_upload):
+        mock_upload.side_effect = Exception("File upload failed")
+
+        with self.assertLogs("artifacts", level="WARNING"):
+            self.assertIsNone(save_artifact("a.pdf", BytesIO(b""), "application/pdf"))
+
+    def test_iter_artifact_chunks_and_closes(self):
+        stream = BytesIO(b"abcdefg")
+
+        self.assertEqual(
+            list(iter_artifact(stream, chunk_size=3)), [b"abc", b"def", b"g"]
+        )
+        self.assertTrue(stream.closed)
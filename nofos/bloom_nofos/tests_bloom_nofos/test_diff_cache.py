@@ -0,0 +1,136 @@
+from unittest.mock import patch
+
+from bloom_nofos import diff_cache
+from bloom_nofos.diff_cache import (
+    cached_html_diff,
+    get_diff_cache_key,
+    markdown_diff,
+    markdown_diff_views,
+)
+from bloom_nofos.html_diff import diff_deadline, html_diff
+from compare.models import CompareDocument, CompareSection, CompareSubsection
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from martor.utils import markdownify
+from users.models import BloomUser
+
+from nofos.models import Nofo, Section, Subsection
+
+
+class DiffCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        caches[diff_cache.DIFF_CACHE_ALIAS].clear()
+
+    def _count_diffs(self):
+        return patch("bloom_nofos.diff_cache.html_diff", wraps=html_diff)
+
+
+class DiffCacheTest(DiffCacheTestCase):
+    def test_cached_html_diff_matches_html_diff(self):
+        old, new = "<p>Hello world</p>", "<p>Hello there world</p>"
+        self.assertEqual(cached_html_diff(old, new), html_diff(old, new))
+
+    def test_markdown_diff_matches_markdownify_then_html_diff(self):
+        old, new = "Some **bold** text", "Some **bold** new text"
+        self.assertEqual(
+            markdown_diff(old, new), html_diff(markdownify(old), markdownify(new))
+        )
+
+    def test_second_diff_of_the_same_inputs_is_free(self):
+        with self._count_diffs() as mock_diff:
+            first = markdown_diff("Old body", "New body")
+            second = markdown_diff("Old body", "New body")
+
+        self.assertEqual(first, second)
+        self.assertEqual(mock_diff.call_count, 1)
+
+    def test_empty_diffs_are_cached_too(self):
+        with self._count_diffs() as mock_diff:
+            cached_html_diff("", "")
+            cached_html_diff("", "")
+
+        self.assertEqual(mock_diff.call_count, 1)
+
+    def test_degraded_diffs_are_not_cached(self):
+        with self._count_diffs() as mock_diff:
+            with diff_deadline(0):
+                degraded = markdown_diff_views("Old body", "New body")
+            full = markdown_diff_views("Old body", "New body")
+            markdown_diff_views("Old body", "New body")
+
+        self.assertTrue(degraded.degraded)
+        self.assertFalse(full.degraded)
+        self.assertIn("<del>Old</del>", full.combined)
+        self.assertEqual(mock_diff.call_count, 2)
+
+    def test_key_depends_on_inputs_kind_and_engine_version(self):
+        key = get_diff_cache_key("a", "b")
+
+        self.assertNotEqual(key, get_diff_cache_key("b", "a"))
+        self.assertNotEqual(key, get_diff_cache_key("a", "b", kind="markdown"))
+        with patch("bloom_nofos.diff_cache.HTML_DIFF_VERSION", "next"):
+            self.assertNotEqual(key, get_diff_cache_key("a", "b"))
+
+
+class CompareViewsShareDiffsTest(TestCase):
+    def setUp(self):
+        caches[diff_cache.DIFF_CACHE_ALIAS].clear()
+
+        BloomUser.objects.create_user(
+            email="test@example.com",
+            password="testpass123",
+            group="bloom",
+            force_password_reset=False,
+        )
+        self.client.login(email="test@example.com", password="testpass123")
+
+        self.document = CompareDocument.objects.create(
+            title="Older", group="bloom", opdiv="CDC"
+        )
+        old_section = CompareSection.objects.create(
+            document=self.document, name="Step 1", order=1, html_id="step-1"
+        )
+        self.new_nofo = Nofo.objects.create(title="Newer", group="bloom", opdiv="CDC")
+        new_section = Section.objects.create(
+            nofo=self.new_nofo, name="Step 1", order=1, html_id="step-1"
+        )
+        for order, (old_body, new_body) in enumerate(
+            [("Same body", "Same body"), ("Old body", "New body")], start=1
+        ):
+            CompareSubsection.objects.create(
+                section=old_section,
+                name="Subsection {}".format(order),
+                tag="h3",
+                body=old_body,
+                order=order,
+            )
+            Subsection.objects.create(
+                section=new_section,
+                name="Subsection {}".format(order),
+                tag="h3",
+                body=new_body,
+                order=order,
+            )
+
+    def test_csv_after_html_view_does_no_diffing(self):
+        args = [self.document.pk, self.new_nofo.pk]
+
+        with patch("bloom_nofos.diff_cache.html_diff", wraps=html_diff) as mock_diff:
+            response = self.client.get(
+                reverse("compare:compare_document_result", args=args)
+            )
+            self.assertContains(response, "CHANGED")
+            response = self.client.get(
+                reverse("compare:compare_document_result_section", args=args + [0])
+            )
+            self.assertContains(response, "<del>Old</del>")
+            diffs_for_page = mock_diff.call_count
+
+            response = self.client.get(
+                reverse("compare:compare_document_result_csv", args=args)
+            )
+            self.assertContains(response, "UPDATE")
+
+        self.assertGreater(diffs_for_page, 0)
+        self.assertEqual(mock_diff.call_count, diffs_for_page)
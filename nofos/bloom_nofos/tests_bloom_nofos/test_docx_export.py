@@ -0,0 +1,206 @@
+from unittest.mock import patch
+
+from bloom_nofos.docx_export import (
+    DOCX_CONTENT_TYPE,
+    DocxExportJob,
+    generate_docx_download_response,
+    get_docx_cache_key,
+)
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from users.models import BloomUser
+
+from nofos.models import Nofo
+
+FAKE_DOCX = b"PK\x03\x04 fake docx"
+
+
+class StubGrabzIt:
+    """Stands in for GrabzItClient: records calls and returns fixed bytes."""
+
+    def __init__(self, content=FAKE_DOCX, cookies_ok=True):
+        self.content = content
+        self.cookies_ok = cookies_ok
+        self.cookies = {}
+        self.conversions = []
+
+    def SetCookie(self, name, domain, value):
+        self.cookies[name] = (domain, value)
+        return self.cookies_ok
+
+    def URLToDOCX(self, url, options):
+        self.conversions.append((url, options.targetElement))
+
+    def SaveTo(self, saveToFile=""):
+        return self.content
+
+
+class DocxExportTestCase(TestCase):
+    def setUp(self):
+        self.nofo = Nofo.objects.create(
+            title="Test NOFO",
+            short_name="test-nofo",
+            number="NOFO-TEST-001",
+            opdiv="TEST",
+            group="bloom",
+        )
+        self.export_url = "https://testserver/nofos/{}/export".format(self.nofo.pk)
+
+    def _request(self, cookies=True):
+        request = RequestFactory().post(self.export_url, secure=True)
+        if cookies:
+            request.COOKIES = {"sessionid": "session-123", "csrftoken": "csrf-123"}
+        return request
+
+    def _export(self, grabzit, request=None, **kwargs):
+        kwargs.setdefault("document", self.nofo)
+        return generate_docx_download_response(
+            request=request or self._request(),
+            export_url=self.export_url,
+            target_element="#download_target",
+            filename_base="test-nofo",
+            grabzit=grabzit,
+            **kwargs,
+        )
+
+
+class DocxExportJobTest(DocxExportTestCase):
+    def test_run_returns_open_file_and_sets_cookies_for_export_host(self):
+        grabzit = StubGrabzIt()
+        job = DocxExportJob(
+            export_url=self.export_url,
+            target_element="#download_target",
+            cookies={"sessionid": "session-123"},
+            grabzit=grabzit,
+        )
+
+        with job.run() as docx_file:
+            self.assertEqual(docx_file.read(), FAKE_DOCX)
+
+        self.assertEqual(grabzit.cookies, {"sessionid": ("testserver", "session-123")})
+        self.assertEqual(grabzit.conversions, [(self.export_url, "#download_target")])
+
+    def test_concurrent_jobs_do_not_share_a_file(self):
+        first = DocxExportJob(
+            export_url=self.export_url,
+            target_element="#download_target",
+            cookies={},
+            grabzit=StubGrabzIt(content=b"first"),
+        ).run()
+        second = DocxExportJob(
+            export_url=self.export_url,
+            target_element="#download_target",
+            cookies={},
+            grabzit=StubGrabzIt(content=b"second"),
+        ).run()
+
+        self.assertEqual(first.read(), b"first")
+        self.assertEqual(second.read(), b"second")
+
+
+class GenerateDocxDownloadResponseTest(DocxExportTestCase):
+    def test_streams_docx_as_attachment(self):
+        response = self._export(StubGrabzIt())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], DOCX_CONTENT_TYPE)
+        self.assertEqual(
+            response["Content-Disposition"], 'attachment; filename="test-nofo.docx"'
+        )
+        self.assertEqual(b"".join(response.streaming_content), FAKE_DOCX)
+
+    def test_same_revision_is_served_from_cache(self):
+        first_grabzit = StubGrabzIt()
+        b"".join(self._export(first_grabzit).streaming_content)
+
+        second_grabzit = StubGrabzIt(content=b"should not be used")
+        with self.assertLogs("artifacts", level="INFO") as logs:
+            response = self._export(second_grabzit)
+
+        self.assertEqual(b"".join(response.streaming_content), FAKE_DOCX)
+        self.assertEqual(second_grabzit.conversions, [])
+        self.assertIn("DOCX cache hit", "".join(logs.output))
+
+    def test_new_revision_is_converted_again(self):
+        b"".join(self._export(StubGrabzIt()).streaming_content)
+
+        self.nofo.title = "Test NOFO, revised"
+        self.nofo.save()
+
+        grabzit = StubGrabzIt(content=b"revised")
+        response = self._export(grabzit)
+
+        self.assertEqual(b"".join(response.streaming_content), b"revised")
+        self.assertEqual(len(grabzit.conversions), 1)
+
+    def test_without_a_document_nothing_is_cached(self):
+        b"".join(self._export(StubGrabzIt(), document=None).streaming_content)
+
+        grabzit = StubGrabzIt()
+        b"".join(self._export(grabzit, document=None).streaming_content)
+        self.assertEqual(len(grabzit.conversions), 1)
+
+    @override_settings(DOCX_CACHE_ENABLED=False)
+    def test_cache_can_be_turned_off(self):
+        b"".join(self._export(StubGrabzIt()).streaming_content)
+
+        grabzit = StubGrabzIt()
+        b"".join(self._export(grabzit).streaming_content)
+        self.assertEqual(len(grabzit.conversions), 1)
+
+    def test_missing_cookies_is_server_error(self):
+        response = self._export(StubGrabzIt(), request=self._request(cookies=False))
+
+        self.assertEqual(response.status_code, 500)
+        self.assertIn(b"Missing session/csrf cookies", response.content)
+
+    def test_failed_cookie_is_server_error(self):
+        response = self._export(StubGrabzIt(cookies_ok=False))
+
+        self.assertEqual(response.status_code, 500)
+        self.assertIn(b"Failed to set session cookie", response.content)
+
+    def test_empty_result_is_server_error(self):
+        response = self._export(StubGrabzIt(content=False))
+
+        self.assertEqual(response.status_code, 500)
+        self.assertIn(b"GrabzIt did not return a DOCX file", response.content)
+
+    def test_cache_key_is_per_document_revision(self):
+        key = get_docx_cache_key(self.nofo, "#download_target")
+
+        self.assertIn("nofos.nofo/{}/".format(self.nofo.pk), key)
+        self.assertNotEqual(key, get_docx_cache_key(self.nofo, "#other"))
+
+        self.nofo.touch_updated()
+        self.nofo.refresh_from_db()
+        self.assertNotEqual(key, get_docx_cache_key(self.nofo, "#download_target"))
+
+
+class NofoExportViewDocxTest(DocxExportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = BloomUser.objects.create_user(
+            email="test@example.com",
+            password="testpass123",
+            group="bloom",
+            force_password_reset=False,
+        )
+        self.client.login(email="test@example.com", password="testpass123")
+        self.client.cookies["csrftoken"] = "csrf-123"
+
+    def test_download_is_converted_once_per_revision(self):
+        grabzit = StubGrabzIt()
+        url = reverse("nofos:nofo_export", args=[self.nofo.pk])
+
+        with patch("bloom_nofos.docx_export.get_grabzit_client", return_value=grabzit):
+            for _ in range(2):
+                response = self.client.post(
+                    url, {"export_action": "download"}, secure=True
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(b"".join(response.streaming_content), FAKE_DOCX)
+
+        self.assertEqual(len(grabzit.conversions), 1)
+        self.assertEqual(grabzit.cookies["csrftoken"], ("testserver", "csrf-123"))
@@ -0,0 +1,219 @@
+import io
+import zipfile
+from xml.etree import ElementTree
+
+from bloom_nofos.docx_export import generate_docx_download_response
+from bloom_nofos.docx_writer import build_docx, build_docx_batch, get_docx_data
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from nofos.models import Nofo, Section, Subsection
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def read_docx(content):
+    """Every XML part of a DOCX, parsed."""
+    with zipfile.ZipFile(io.BytesIO(content)) as docx:
+        return {
+            name: ElementTree.fromstring(docx.read(name))
+            for name in docx.namelist()
+            if name.endswith(".xml") or name.endswith(".rels")
+        }
+
+
+def docx_data(html, **subsection):
+    return {
+        "title": "Test NOFO",
+        "sections": [
+            {
+                "name": "Step 1: Review the Opportunity",
+                "html_id": "step-1",
+                "basic_information": [],
+                "subsections": [
+                    dict({"name": "", "tag": "h3", "html": html}, **subsection)
+                ],
+            }
+        ],
+    }
+
+
+class BuildDocxTest(SimpleTestCase):
+    def _document(self, html, **subsection):
+        parts = read_docx(build_docx(docx_data(html, **subsection)))
+        return parts, parts["word/document.xml"]
+
+    def _styles(self, document):
+        return [el.get(W + "val") for el in document.iter(W + "pStyle")]
+
+    def test_package_has_all_parts(self):
+        parts, _ = self._document("<p>Hello</p>")
+
+        self.assertEqual(
+            sorted(parts),
+            [
+                "[Content_Types].xml",
+                "_rels/.rels",
+                "docProps/core.xml",
+                "word/_rels/document.xml.rels",
+                "word/document.xml",
+                "word/numbering.xml",
+                "word/styles.xml",
+            ],
+        )
+
+    def test_headings_and_inline_formatting(self):
+        _, document = self._document(
+            "<h4>Eligibility</h4><p>Some <strong>bold</strong> and <em>italic</em></p>",
+            name="Summary",
+            tag="h3",
+            html_id="summary",
+        )
+
+        self.assertEqual(self._styles(document), ["Heading2", "Heading3", "Heading4"])
+        texts = [t.text for t in document.iter(W + "t")]
+        self.assertIn("Summary", texts)
+        self.assertIn("bold", texts)
+
+        bookmarks = [b.get(W + "name") for b in document.iter(W + "bookmarkStart")]
+        self.assertEqual(bookmarks, ["step-1", "summary"])
+        self.assertEqual(len(list(document.iter(W + "b"))), 1)
+        self.assertEqual(len(list(document.iter(W + "i"))), 1)
+
+    def test_nested_lists_get_levels_and_numbering(self):
+        parts, document = self._document(
+            "<ol><li>One<ul><li>Nested</li></ul></li><li>Two</li></ol>"
+        )
+
+        levels = [el.get(W + "val") for el in document.iter(W + "ilvl")]
+        self.assertEqual(levels, ["0", "1", "0"])
+        self.assertEqual(len(list(parts["word/numbering.xml"].iter(W + "num"))), 2)
+
+    def test_tables_keep_headers_spans_and_captions(self):
+        _, document = self._document(
+            "<table><caption>Funding</caption>"
+            "<thead><tr><th>Year</th><th>Amount</th></tr></thead>"
+            "<tbody><tr><td colspan='2'>Total</td></tr></tbody></table>"
+        )
+
+        self.assertIn("Caption", self._styles(document))
+        self.assertEqual(len(list(document.iter(W + "tr"))), 2)
+        self.assertEqual(len(list(document.iter(W + "tblHeader"))), 1)
+        self.assertEqual(
+            [el.get(W + "val") for el in document.iter(W + "gridSpan")], ["2"]
+        )
+
+    def test_callout_box_is_a_shaded_table(self):
+        _, document = self._document("<p>Have questions?</p>", callout_box=True)
+
+        styles = [el.get(W + "val") for el in document.iter(W + "tblStyle")]
+        self.assertEqual(styles, ["CalloutBox"])
+
+    def test_footnote_references_link_to_their_notes(self):
+        _, document = self._document(
+            '<p>A claim<a href="#footnote-0" id="footnote-ref-0">[1]</a></p>'
+            '<ol><li id="footnote-0"><p>A source</p></li></ol>'
+        )
+
+        anchors = [el.get(W + "anchor") for el in document.iter(W + "hyperlink")]
+        self.assertEqual(anchors, ["footnote-0"])
+        bookmarks = [b.get(W + "name") for b in document.iter(W + "bookmarkStart")]
+        self.assertIn("footnote-0", bookmarks)
+        self.assertEqual(
+            [el.get(W + "val") for el in document.iter(W + "vertAlign")],
+            ["superscript"],
+        )
+
+    def test_page_breaks(self):
+        _, document = self._document(
+            "<p>Before</p><p>page-break</p><p>column-break-before</p><p>After</p>",
+            page_break_before=True,
+        )
+
+        breaks = [el.get(W + "type") for el in document.iter(W + "br")]
+        self.assertEqual(breaks, ["page", "page"])
+
+    def test_external_links_are_relationships(self):
+        parts, document = self._document(
+            '<p><a href="https://www.grants.gov/?a=1&amp;b=2">Grants.gov</a></p>'
+        )
+
+        rel_id = next(document.iter(W + "hyperlink")).get(
+            "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+        )
+        rels = parts["word/_rels/document.xml.rels"]
+        targets = {rel.get("Id"): rel.get("Target") for rel in rels}
+        self.assertEqual(targets[rel_id], "https://www.grants.gov/?a=1&b=2")
+
+    def test_invalid_xml_characters_are_dropped(self):
+        _, document = self._document("<p>Bad\x01character</p>")
+
+        self.assertIn("Badcharacter", [t.text for t in document.iter(W + "t")])
+
+    def test_batch_preserves_order_in_a_process_pool(self):
+        datas = [docx_data("<p>Document {}</p>".format(i)) for i in range(3)]
+
+        self.assertEqual(build_docx_batch(datas, processes=2), build_docx_batch(datas))
+
+
+class GetDocxDataTest(TestCase):
+    def setUp(self):
+        self.nofo = Nofo.objects.create(
+            title="Test NOFO",
+            number="NOFO-TEST-001",
+            opdiv="TEST",
+            agency="Test Agency",
+            group="bloom",
+        )
+        section = Section.objects.create(
+            nofo=self.nofo, name="Step 1", html_id="1--step-1", order=1
+        )
+        Subsection.objects.create(
+            section=section, name="Basic information", tag="h3", order=1
+        )
+        Subsection.objects.create(
+            section=section,
+            name="Summary",
+            tag="h3",
+            html_id="1--step-1--summary",
+            html_class="page-break-before",
+            body="Some **bold** text",
+            order=2,
+        )
+
+    def test_section_tree_as_plain_data(self):
+        data = get_docx_data(self.nofo)
+
+        self.assertEqual(data["title"], "Test NOFO")
+        section = data["sections"][0]
+        self.assertEqual(section["name"], "Step 1")
+        self.assertEqual(
+            section["basic_information"],
+            [
+                "Opdiv: TEST",
+                "Agency: Test Agency",
+                "Opportunity number: NOFO-TEST-001",
+            ],
+        )
+
+        # "Basic information" is replaced by the NOFO's own metadata
+        self.assertEqual([s["name"] for s in section["subsections"]], ["Summary"])
+        subsection = section["subsections"][0]
+        self.assertTrue(subsection["page_break_before"])
+        self.assertIn("<strong>bold</strong>", subsection["html"])
+
+    @override_settings(DOCX_EXPORT_ENGINE="native")
+    def test_native_engine_needs_no_grabzit(self):
+        # no cookies: the native engine doesn't fetch the export page
+        request = RequestFactory().post("/nofos/export", secure=True)
+
+        response = generate_docx_download_response(
+            request=request,
+            export_url="https://testserver/nofos/export",
+            target_element="#download_target",
+            filename_base="test-nofo",
+            document=self.nofo,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        document = read_docx(b"".join(response.streaming_content))["word/document.xml"]
+        self.assertIn("Summary", [t.text for t in document.iter(W + "t")])
@@ -1,6 +1,12 @@
+import random
+import time
+
 from django.test import TestCase
+from martor.utils import markdownify
+
+from nofos.nofo_compare import extract_new_diff, extract_old_diff
 
-from ..html_diff import html_diff
+from ..html_diff import diff_deadline, get_diff_deadline, html_diff
 
 
 class TestHtmlDiffStrings(TestCase):
@@ -815,3 +821,198 @@ class TestHtmlDiffHTMLStructure(TestCase):
         expected = "<p>Groundhog <ins>        </ins>Day!</p>"
 
         self.assertEqual(html_diff(original, modified), expected)
+
+
+class TestHtmlDiffWordLevel(TestCase):
+    sentence = "Applicants must submit a project narrative and a budget justification. "
+
+    def test_long_text_is_diffed_by_word(self):
+        original = "<p>{}The colour of the form is blue.</p>".format(self.sentence * 6)
+        modified = "<p>{}The color of the page is blue.</p>".format(self.sentence * 6)
+
+        self.assertEqual(
+            html_diff(original, modified),
+            "<p>{}The colo<del>u</del>r of the <del>form</del><ins>page</ins> is blue.</p>".format(
+                self.sentence * 6
+            ),
+        )
+
+    def test_long_replaced_runs_are_not_split_into_letters(self):
+        original = "<p>{}Old: {}</p>".format(self.sentence * 6, "alpha beta " * 10)
+        modified = "<p>{}Old: {}</p>".format(self.sentence * 6, "gamma delta " * 10)
+
+        diff = html_diff(original, modified)
+
+        self.assertIn("<del>{}</del>".format(("alpha beta " * 10).strip()), diff)
+        self.assertIn("<ins>{}</ins>".format(("gamma delta " * 10).strip()), diff)
+
+    def test_same_result_as_character_diff_for_short_text(self):
+        original = "<p>This list item has been changed</p>"
+        modified = "<p>This list item has been altered</p>"
+
+        self.assertEqual(
+            html_diff(original, modified),
+            html_diff(original, modified, word_level=False),
+        )
+
+    def test_over_budget_nodes_are_replaced_whole(self):
+        original = "<ul><li>Same item</li><li>Groundhog Day!</li></ul>"
+        modified = "<ul><li>Same item</li><li>Valentines Day!</li></ul>"
+
+        self.assertEqual(
+            html_diff(original, modified, time_budget=0),
+            "<ul><li>Same item</li>"
+            "<li><del>Groundhog Day!</del><ins>Valentines Day!</ins></li></ul>",
+        )
+
+    def test_over_budget_diffs_are_degraded(self):
+        original = "<ul><li>Same item</li><li>Groundhog Day!</li></ul>"
+        modified = "<ul><li>Same item</li><li>Valentines Day!</li></ul>"
+
+        self.assertTrue(
+            html_diff(original, modified, time_budget=0, side_by_side=True).degraded
+        )
+        self.assertFalse(html_diff(original, modified, side_by_side=True).degraded)
+
+    def test_a_passed_diff_deadline_stops_diffing(self):
+        original = "<p>Groundhog Day!</p>"
+        modified = "<p>Valentines Day!</p>"
+
+        with diff_deadline(time.time() - 1):
+            views = html_diff(original, modified, side_by_side=True)
+
+        self.assertEqual(
+            views.combined,
+            "<p><del>Groundhog Day!</del><ins>Valentines Day!</ins></p>",
+        )
+        self.assertTrue(views.degraded)
+
+    def test_nested_diff_deadlines_keep_the_earliest(self):
+        with diff_deadline(100):
+            with diff_deadline(200):
+                self.assertEqual(get_diff_deadline(), 100)
+            with diff_deadline(None):
+                self.assertEqual(get_diff_deadline(), 100)
+            with diff_deadline(50):
+                self.assertEqual(get_diff_deadline(), 50)
+            self.assertEqual(get_diff_deadline(), 100)
+        self.assertIsNone(get_diff_deadline())
+
+
+class TestHtmlDiffSideBySide(TestCase):
+    def test_old_and_new_views(self):
+        views = html_diff(
+            "<p>Start old middle</p>", "<p>Start new middle</p>", side_by_side=True
+        )
+
+        self.assertEqual(
+            views.combined, "<p>Start <del>old</del><ins>new</ins> middle</p>"
+        )
+        self.assertEqual(views.old, "<p>Start <del>old</del> middle</p>")
+        self.assertEqual(views.new, "<p>Start <ins>new</ins> middle</p>")
+
+    def test_combined_view_is_the_plain_diff(self):
+        original = "<ul><li>Same item</li><li>Groundhog Day!</li></ul>"
+        modified = "<ul><li>Same item</li><li>Valentines Day!</li></ul>"
+
+        self.assertEqual(
+            html_diff(original, modified, side_by_side=True).combined,
+            html_diff(original, modified),
+        )
+
+    def test_inserted_list_item_is_left_out_of_the_old_view(self):
+        views = html_diff(
+            "<ul><li>One</li></ul>",
+            "<ul><li>One</li><li>Two</li></ul>",
+            side_by_side=True,
+        )
+
+        self.assertEqual(views.old, "<ul><li>One</li></ul>")
+        self.assertEqual(views.new, "<ul><li>One</li><li><ins>Two</ins></li></ul>")
+
+    def test_inserted_table_row_keeps_empty_cells_in_the_old_view(self):
+        views = html_diff(
+            "<table><tr><td>A</td><td>B</td></tr></table>",
+            "<table><tr><td>A</td><td>B</td></tr><tr><td>C</td><td>D</td></tr></table>",
+            side_by_side=True,
+        )
+
+        self.assertEqual(
+            views.old,
+            "<table><tr><td>A</td><td>B</td></tr><tr><td></td><td></td></tr></table>",
+        )
+
+    def test_text_is_escaped_in_the_old_and_new_views(self):
+        views = html_diff(
+            "<p>Fish &amp; chips</p>", "<p>Fish &amp; peas</p>", side_by_side=True
+        )
+
+        self.assertEqual(views.old, "<p>Fish &amp; <del>chip</del>s</p>")
+        self.assertEqual(views.new, "<p>Fish &amp; <ins>pea</ins>s</p>")
+
+    def test_text_replaced_by_a_tag_is_not_shown_as_markup(self):
+        views = html_diff(
+            "<ul><li>Merit review</li><li>Funds</li></ul>",
+            "<ul><li><p>Citizen</p></li><li><p>Merit review</p></li><li><p>Funds</p></li></ul>",
+            side_by_side=True,
+        )
+
+        self.assertNotIn("&lt;p&gt;", views.old)
+        self.assertNotIn("&lt;p&gt;", views.new)
+        self.assertIn("<ins><p>Merit review</p></ins>", views.combined)
+        self.assertIn("<ins><p>Merit review</p></ins>", views.new)
+
+
+class TestHtmlDiffViewsMatchCombined(TestCase):
+    """
+    The old and new views are what the combined diff shows once its
+    insertions (or deletions) are taken out, for any edit.
+    """
+
+    WORDS = ["Merit", "review", "Funds", "Citizen", "budget", "apply", "&", "<"]
+
+    def random_words(self, rng):
+        return " ".join(rng.choice(self.WORDS) for _ in range(rng.randint(1, 6)))
+
+    def random_block(self, rng):
+        return rng.choice(
+            [
+                lambda: self.random_words(rng),
+                lambda: "## " + self.random_words(rng),
+                lambda: "- " + self.random_words(rng),
+                lambda: "1. " + self.random_words(rng),
+                lambda: "| A | B |\n|---|---|\n| {} | {} |".format(
+                    self.random_words(rng), self.random_words(rng)
+                ),
+            ]
+        )()
+
+    def random_edit(self, rng, markdown):
+        lines = markdown.split("\n")
+        for _ in range(rng.randint(1, 3)):
+            i = rng.randrange(len(lines))
+            edit = rng.randrange(4)
+            if edit == 0:
+                lines[i] += " " + rng.choice(self.WORDS)
+            elif edit == 1:
+                lines.insert(i, "- " + rng.choice(self.WORDS))
+            elif edit == 2:
+                # A blank line turns a tight list into a loose one (with <p>s)
+                lines.insert(i, "")
+            else:
+                lines[i] = lines[i].replace(
+                    rng.choice(self.WORDS), rng.choice(self.WORDS)
+                )
+        return "\n".join(lines)
+
+    def test_views_match_the_combined_diff(self):
+        rng = random.Random(36)
+        for _ in range(500):
+            old = "\n\n".join(self.random_block(rng) for _ in range(rng.randint(1, 4)))
+            new = self.random_edit(rng, old)
+
+            views = html_diff(markdownify(old), markdownify(new), side_by_side=True)
+
+            with self.subTest(old=old, new=new):
+                self.assertEqual(views.old, extract_old_diff(views.combined))
+                self.assertEqual(views.new, extract_new_diff(views.combined))
@@ -0,0 +1,228 @@
+"""
+Query and timing budgets for the main pages, at different document sizes.
+
+Each test loads a page for documents with 10, 100 and 1,000 subsections and
+checks that it runs no more than its budget of queries, the same number
+whatever the size: a query per section or subsection (an N+1) fails it.
+
+Set QUERY_BUDGET_REPORT to a file path to write the query counts and
+timings as JSON, eg to diff with a baseline in CI:
+
+    QUERY_BUDGET_REPORT=query-budgets.json python manage.py test \\
+        bloom_nofos.tests_bloom_nofos.test_query_budgets
+"""
+
+import json
+import os
+import time
+
+from compare.models import CompareDocument, CompareSection, CompareSubsection
+from composer.models import ContentGuide, ContentGuideSection, ContentGuideSubsection
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from easyaudit.models import CRUDEvent
+
+from nofos.audits import AuditEventDocumentResolver, save_audit_event_indexes
+from nofos.models import Nofo, Section, Subsection
+
+User = get_user_model()
+
+SCALES = [10, 100, 1000]
+SUBSECTIONS_PER_SECTION = 10
+
+BODY = (
+    "Applicants must describe their **approach** in a [project narrative]"
+    "(https://www.grants.gov). Budgets are due 30 days after the award.\n\n"
+    "- Eligible entities\n- Program requirements\n- Reporting\n"
+)
+
+
+def create_sections(section_model, subsection_model, parent, subsections, **kwargs):
+    """Sections of 10 subsections each (`subsections` in all) for a document."""
+    sections = section_model.objects.bulk_create(
+        section_model(
+            name="Step {}: Section".format(i + 1),
+            html_id="{}-step-{}".format(parent.pk, i + 1),
+            order=i + 1,
+            **{kwargs.get("parent_field", "nofo"): parent},
+        )
+        for i in range(subsections // SUBSECTIONS_PER_SECTION)
+    )
+    subsection_model.objects.bulk_create(
+        subsection_model(
+            section=sections[i // SUBSECTIONS_PER_SECTION],
+            name="Subsection {}".format(i + 1),
+            html_id="{}-subsection-{}".format(parent.pk, i + 1),
+            order=i % SUBSECTIONS_PER_SECTION + 1,
+            tag="h3",
+            body=BODY,
+        )
+        for i in range(subsections)
+    )
+    return sections
+
+
+class QueryBudgetTests(TestCase):
+    report = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        path = os.environ.get("QUERY_BUDGET_REPORT")
+        if path and cls.report:
+            with open(path, "w") as f:
+                json.dump({"scales": SCALES, "views": cls.report}, f, indent=2)
+                f.write("\n")
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test@example.com",
+            password="testpass123",
+            group="bloom",
+            force_password_reset=False,
+            is_composer_admin=True,
+        )
+        self.client.login(email="test@example.com", password="testpass123")
+
+    def create_nofo(self, subsections, title="Budget NOFO"):
+        nofo = Nofo.objects.create(
+            title="{} {}".format(title, subsections),
+            number="HRSA-24-{:03d}".format(subsections % 1000),
+            group="bloom",
+            opdiv="HRSA",
+            theme="portrait-hrsa-blue",
+        )
+        create_sections(Section, Subsection, nofo, subsections)
+        return nofo
+
+    def measure(self, name, get_response):
+        """
+        Load a page at every scale, recording its queries and time. Returns
+        the number of queries at each scale.
+        """
+        # Fill the per-process caches (content types, settings) with a page
+        # for a throwaway document first
+        get_response(SCALES[0])()
+
+        counts = []
+        for scale in SCALES:
+            response_for = get_response(scale)
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = response_for()
+                ms = round((time.perf_counter() - start) * 1000, 1)
+
+            self.assertIn(response.status_code, [200, 201], name)
+            counts.append(len(queries))
+            self.report.setdefault(name, {})[str(scale)] = {
+                "queries": len(queries),
+                "ms": ms,
+            }
+        return counts
+
+    def assertBudget(self, counts, budget):
+        """Queries stay within the budget, and don't grow with the document."""
+        self.assertLessEqual(max(counts), budget, counts)
+        self.assertEqual(len(set(counts)), 1, counts)
+
+    def test_nofo_edit(self):
+        def get_response(scale):
+            nofo = self.create_nofo(scale)
+            url = reverse("nofos:nofo_edit", args=[nofo.id])
+            return lambda: self.client.get(url)
+
+        self.assertBudget(self.measure("nofo_edit", get_response), 10)
+
+    def test_nofo_view(self):
+        def get_response(scale):
+            nofo = self.create_nofo(scale)
+            url = reverse("nofos:nofo_view", args=[nofo.id])
+            return lambda: self.client.get(url)
+
+        self.assertBudget(self.measure("nofo_view", get_response), 12)
+
+    def test_nofo_history(self):
+        def get_response(scale):
+            nofo = self.create_nofo(scale)
+            content_type = ContentType.objects.get_for_model(Subsection)
+            subsections = list(Subsection.objects.filter(section__nofo=nofo))
+            # At least a full page of events (25), so every scale fills one
+            subsections = (subsections * 3)[: max(scale, 30)]
+            events = CRUDEvent.objects.bulk_create(
+                CRUDEvent(
+                    event_type=CRUDEvent.UPDATE,
+                    object_id=str(subsection.id),
+                    content_type=content_type,
+                    object_repr=str(subsection),
+                    object_json_repr=json.dumps(
+                        [{"fields": {"section": str(subsection.section_id)}}]
+                    ),
+                    changed_fields=json.dumps({"body": ["Old body", subsection.body]}),
+                    user=self.user,
+                )
+                for subsection in subsections
+            )
+            resolver = AuditEventDocumentResolver()
+            save_audit_event_indexes([resolver.build_index(e) for e in events])
+            url = reverse("nofos:nofo_history", args=[nofo.id])
+            return lambda: self.client.get(url)
+
+        self.assertBudget(self.measure("nofo_history", get_response), 40)
+
+    def test_compare_document(self):
+        def get_response(scale):
+            nofo = self.create_nofo(scale)
+            document = CompareDocument.objects.create(
+                title="Budget compare {}".format(scale), group="bloom", opdiv="HRSA"
+            )
+            create_sections(
+                CompareSection,
+                CompareSubsection,
+                document,
+                scale,
+                parent_field="document",
+            )
+            url = reverse(
+                "compare:compare_document_result", args=[document.id, nofo.id]
+            )
+            return lambda: self.client.get(url)
+
+        self.assertBudget(self.measure("compare_document", get_response), 25)
+
+    def test_composer_section(self):
+        def get_response(scale):
+            guide = ContentGuide.objects.create(
+                title="Budget guide {}".format(scale), group="bloom", opdiv="CDC"
+            )
+            section = ContentGuideSection.objects.create(
+                content_guide=guide, order=1, name="Step 1", html_id="step-1"
+            )
+            ContentGuideSubsection.objects.bulk_create(
+                ContentGuideSubsection(
+                    section=section,
+                    name="Subsection {}".format(i + 1),
+                    order=i + 1,
+                    tag="h4",
+                    body=BODY,
+                )
+                for i in range(scale)
+            )
+            url = reverse("composer:section_view", args=[guide.id, section.id])
+            return lambda: self.client.get(url)
+
+        self.assertBudget(self.measure("composer_section", get_response), 24)
+
+    @override_settings(API_TOKEN="test-token")
+    def test_api_get_nofo(self):
+        def get_response(scale):
+            nofo = self.create_nofo(scale)
+            return lambda: self.client.get(
+                "/api/nofos/{}".format(nofo.id),
+                HTTP_AUTHORIZATION="Bearer test-token",
+            )
+
+        self.assertBudget(self.measure("api_get_nofo", get_response), 6)
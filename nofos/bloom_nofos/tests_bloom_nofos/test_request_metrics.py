@@ -0,0 +1,138 @@
+from bloom_nofos.middleware import JSONRequestLoggingMiddleware
+from bloom_nofos.request_metrics import measure_request
+from bs4 import BeautifulSoup
+from django.http import StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from martor.utils import markdownify
+from users.models import BloomUser
+
+from nofos.models import Nofo, Section, Subsection
+
+
+class MeasureRequestTest(TestCase):
+    def test_counts_queries_parses_and_renders(self):
+        with measure_request() as metrics:
+            list(Nofo.objects.all())
+            BeautifulSoup("<p>Hello</p>", "html.parser")
+            markdownify("Some **bold** text")
+            render_to_string("400.html", {"error_message": "Oops"})
+
+        self.assertEqual(metrics.db_queries, 1)
+        self.assertGreater(metrics.db_time, 0)
+        self.assertEqual(metrics.soup_parses, 1)
+        self.assertEqual(metrics.markdown_renders, 1)
+        self.assertGreater(metrics.template_time, 0)
+
+    def test_nothing_is_counted_outside_a_request(self):
+        with measure_request() as metrics:
+            pass
+        BeautifulSoup("<p>Hello</p>", "html.parser")
+        list(Nofo.objects.all())
+
+        self.assertEqual(metrics.soup_parses, 0)
+        self.assertEqual(metrics.db_queries, 0)
+
+
+class RequestMetricsMiddlewareTest(TestCase):
+    def setUp(self):
+        self.user = BloomUser.objects.create_user(
+            email="test@example.com",
+            password="testpass123",
+            group="bloom",
+            force_password_reset=False,
+        )
+        self.superuser = BloomUser.objects.create_user(
+            email="admin@example.com",
+            password="testpass123",
+            group="bloom",
+            force_password_reset=False,
+            is_superuser=True,
+            is_staff=True,
+        )
+        self.nofo = Nofo.objects.create(
+            title="Test NOFO",
+            number="HRSA-24-001",
+            group="bloom",
+            opdiv="HRSA",
+            theme="portrait-hrsa-blue",
+        )
+        section = Section.objects.create(
+            nofo=self.nofo, name="Step 1", html_id="step-1", order=1
+        )
+        Subsection.objects.create(
+            section=section,
+            name="Subsection 1",
+            html_id="subsection-1",
+            order=1,
+            tag="h3",
+            body="Some **bold** text",
+        )
+        self.url = reverse("nofos:nofo_view", args=[self.nofo.id])
+
+    def get(self, email):
+        self.client.login(email=email, password="testpass123")
+        with self.assertLogs("django.request", level="INFO") as logs:
+            response = self.client.get(self.url)
+        return response, logs.records[-1]
+
+    @override_settings(REQUEST_METRICS=True)
+    def test_logs_metrics_and_sends_server_timing_to_superusers(self):
+        response, record = self.get("admin@example.com")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(record.db_queries, 0)
+        self.assertGreater(record.markdown_renders, 0)
+        self.assertTrue(record.template_time.endswith("ms"))
+        self.assertIn("memory_peak_delta_kb", record.__dict__)
+
+        server_timing = response["Server-Timing"]
+        self.assertIn(
+            'db;dur={:.3f};desc="{} queries"'.format(
+                float(record.db_time[:-2]), record.db_queries
+            ),
+            server_timing,
+        )
+        self.assertIn("template;dur=", server_timing)
+        self.assertIn("total;dur=", server_timing)
+
+    @override_settings(REQUEST_METRICS=True)
+    def test_no_server_timing_for_other_users(self):
+        response, record = self.get("test@example.com")
+
+        self.assertGreater(record.db_queries, 0)
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(REQUEST_METRICS=True)
+    def test_streamed_responses_are_marked_in_the_log(self):
+        def stream():
+            yield "nofo_id\n"
+            yield from (str(nofo.id) + "\n" for nofo in Nofo.objects.all())
+
+        middleware = JSONRequestLoggingMiddleware(
+            lambda request: StreamingHttpResponse(stream())
+        )
+        request = RequestFactory().get("/nofos/export")
+        request.user = self.user
+
+        with self.assertLogs("django.request", level="INFO") as logs:
+            response = middleware(request)
+        record = logs.records[-1]
+
+        self.assertTrue(record.streamed)
+        # The body's query runs after the metrics are logged
+        self.assertEqual(record.db_queries, 0)
+        self.assertIn(str(self.nofo.id), b"".join(response.streaming_content).decode())
+
+    @override_settings(REQUEST_METRICS=True)
+    def test_other_responses_are_not_marked_as_streamed(self):
+        response, record = self.get("test@example.com")
+
+        self.assertFalse(hasattr(record, "streamed"))
+
+    def test_off_by_default(self):
+        response, record = self.get("admin@example.com")
+
+        self.assertFalse(hasattr(record, "db_queries"))
+        self.assertNotIn("Server-Timing", response)
@@ -0,0 +1,116 @@
+import random
+import re
+
+from bloom_nofos.required_strings import (
+    REQUIRED_STRINGS_VERSION,
+    RequiredStrings,
+    get_required_strings,
+)
+from compare.models import CompareDocument, CompareSection, CompareSubsection
+from django.test import SimpleTestCase, TestCase
+
+
+def find_missing_one_by_one(strings, body):
+    """How missing diff strings were found before RequiredStrings."""
+
+    def normalize(text):
+        return re.sub(r"\s+", " ", text.strip()).lower()
+
+    normalized_body = normalize(body)
+    return [s for s in strings if normalize(s) not in normalized_body]
+
+
+class RequiredStringsTest(SimpleTestCase):
+    def test_finds_missing_strings_in_order(self):
+        required = RequiredStrings(["data", "banana", "Program"])
+        self.assertEqual(
+            required.find_missing("This data program is working."), ["banana"]
+        )
+
+    def test_ignores_case_and_whitespace(self):
+        required = RequiredStrings(["  Data\n\tProgram  "])
+        self.assertEqual(required.find_missing("This DATA   program works."), [])
+
+    def test_strings_inside_other_strings(self):
+        required = RequiredStrings(["program", "data program", "gram", "data"])
+        self.assertEqual(required.find_missing("A data program."), [])
+        self.assertEqual(required.find_missing("A program."), ["data program", "data"])
+        self.assertEqual(required.patterns[0], "data program")
+        self.assertEqual(
+            [required.patterns[i] for i in required.contains[0]],
+            ["program", "data", "gram"],
+        )
+
+    def test_repeated_strings_are_reported_each_time(self):
+        required = RequiredStrings(["Banana", "banana", "data"])
+        self.assertEqual(len(required.patterns), 2)
+        self.assertEqual(required.find_missing("Some data."), ["Banana", "banana"])
+
+    def test_empty_strings_are_always_found(self):
+        required = RequiredStrings(["", "   ", "data"])
+        self.assertEqual(required.find_missing(""), ["data"])
+
+    def test_no_strings(self):
+        self.assertEqual(RequiredStrings([]).find_missing("Anything"), [])
+
+    def test_same_results_as_checking_strings_one_by_one(self):
+        rng = random.Random(1)
+        words = ["data", "Program", "plan", "work", "a", "budget", "  ", "\n"]
+        for _ in range(500):
+            strings = [
+                " ".join(rng.choice(words) for _ in range(rng.randint(0, 3)))
+                for _ in range(rng.randint(0, 8))
+            ]
+            body = " ".join(rng.choice(words) for _ in range(rng.randint(0, 15)))
+            self.assertEqual(
+                RequiredStrings(strings).find_missing(body),
+                find_missing_one_by_one(strings, body),
+                (strings, body),
+            )
+
+    def test_from_data_round_trip(self):
+        strings = ["Data program", "data"]
+        data = RequiredStrings(strings).to_data()
+        required = RequiredStrings.from_data(data, strings)
+        self.assertEqual(required.patterns, data["patterns"])
+        self.assertEqual(required.find_missing("data"), ["Data program"])
+
+    def test_from_data_recompiles_stale_data(self):
+        data = RequiredStrings(["data"]).to_data()
+        for stale, strings in [
+            (data, ["banana"]),
+            ({**data, "version": REQUIRED_STRINGS_VERSION - 1}, ["data"]),
+            ({}, ["data"]),
+        ]:
+            required = RequiredStrings.from_data(stale, strings)
+            self.assertEqual(required.patterns, strings)
+            self.assertEqual(required.find_missing(""), strings)
+
+    def test_get_required_strings_compiles_once(self):
+        self.assertIs(
+            get_required_strings(["data", "plan"]),
+            get_required_strings(("data", "plan")),
+        )
+
+
+class CompareSubsectionCompiledDiffStringsTest(TestCase):
+    def test_diff_strings_are_compiled_on_save(self):
+        document = CompareDocument.objects.create(title="Older", opdiv="CDC")
+        section = CompareSection.objects.create(
+            document=document, name="Step 1", order=1, html_id="step-1"
+        )
+        subsection = CompareSubsection.objects.create(
+            section=section,
+            name="Subsection 1",
+            tag="h3",
+            order=1,
+            comparison_type="diff_strings",
+            diff_strings=["Data  Program"],
+        )
+        self.assertEqual(subsection.compiled_diff_strings["patterns"], ["data program"])
+
+        subsection.diff_strings = ["Banana"]
+        subsection.save()
+        subsection.refresh_from_db()
+        self.assertEqual(subsection.compiled_diff_strings["strings"], ["Banana"])
+        self.assertEqual(subsection.compiled_diff_strings["patterns"], ["banana"])
@@ -1,13 +1,12 @@
+import csv
 import os
 import re
 import sys
 from socket import gaierror, gethostbyname, gethostname
-from urllib.parse import urlparse
 
 from django.conf import settings
-from django.http import HttpResponse, HttpResponseServerError
+from django.http import StreamingHttpResponse
 from google.cloud import secretmanager
-from GrabzIt import GrabzItClient, GrabzItDOCXOptions
 
 
 def cast_to_boolean(value_str):
@@ -35,6 +34,26 @@ def cast_to_boolean(value_str):
         raise ValueError(f"Value '{value_str}' is not a valid boolean string")
 
 
+class Echo:
+    """A file-like object that hands back whatever is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def streaming_csv_response(rows, filename):
+    """
+    A CSV download that writes each row as it comes out of `rows`, so big
+    exports start downloading right away and never sit in memory in full.
+    """
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in rows), content_type="text/csv"
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
 def get_internal_ip():
     try:
         return gethostbyname(gethostname())
@@ -102,79 +121,3 @@ def get_login_gov_keys(environment: str = "dev", testing: bool = "test" in sys.a
         public_key = ""
 
     return private_key, public_key
-
-
-def generate_docx_download_response(
-    *,
-    request,
-    export_url: str,
-    target_element: str,
-    filename_base: str,
-    tmp_name: str,
-):
-    """
-    Convert a URL to DOCX using GrabzIt and return it as an attachment response.
-    """
-    session_value = request.COOKIES.get("sessionid")
-    csrf_value = request.COOKIES.get("csrftoken")
-
-    if not session_value or not csrf_value:
-        return HttpResponseServerError(
-            "Missing session/csrf cookies for DOCX conversion."
-        )
-
-    parsed = urlparse(export_url)
-    export_host = parsed.hostname
-    export_scheme = parsed.scheme
-
-    if not export_host or export_scheme != "https":
-        return HttpResponseServerError("Invalid export URL for DOCX conversion.")
-
-    request_host = request.get_host().split(":")[0]
-
-    # Defensive check: the cookies we are copying came from this incoming request,
-    # so the request host should match the host GrabzIt will fetch.
-    if request_host != export_host:
-        return HttpResponseServerError(
-            f"Host mismatch for DOCX conversion. request_host={request_host}, export_host={export_host}"
-        )
-
-    grabzit = GrabzItClient.GrabzItClient(
-        settings.GRABZIT_APPLICATION_KEY,
-        settings.GRABZIT_APPLICATION_SECRET,
-    )
-
-    # Set cookies only for the exact host GrabzIt will request.
-    if not grabzit.SetCookie("sessionid", export_host, session_value):
-        return HttpResponseServerError(
-            "Failed to set session cookie for GrabzIt conversion."
-        )
-
-    if not grabzit.SetCookie("csrftoken", export_host, csrf_value):
-        return HttpResponseServerError(
-            "Failed to set csrf cookie for GrabzIt conversion."
-        )
-
-    options = GrabzItDOCXOptions.GrabzItDOCXOptions()
-    options.targetElement = target_element
-
-    grabzit.URLToDOCX(export_url, options)
-
-    file_path = f"/tmp/{tmp_name}.docx"
-    grabzit.SaveTo(file_path)
-
-    with open(file_path, "rb") as f:
-        content = f.read()
-
-    # Optional cleanup (safe even if it fails)
-    try:
-        os.remove(file_path)
-    except OSError:
-        pass
-
-    response = HttpResponse(
-        content,
-        content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-    )
-    response["Content-Disposition"] = f'attachment; filename="{filename_base}.docx"'
-    return response
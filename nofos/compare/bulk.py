@@ -0,0 +1,134 @@
+"""
+Comparing one document with many NOFOs at once.
+
+The document is loaded once (see Baseline), every NOFO is matched against
+it, and then the diffs for all of them run together in one process pool
+before each comparison is built. Comparisons with a Compare Document are
+stored like the compare page's, so NOFOs that were already compared with the
+current revision of the document are not compared again.
+"""
+
+import time
+
+from bloom_nofos.html_diff import diff_deadline
+from django.conf import settings
+
+from nofos.nofo_compare import (
+    Baseline,
+    annotate_side_by_side_diffs,
+    get_compare_deadline,
+    get_parallel_threshold,
+    run_diffs_in_parallel,
+)
+
+from .models import CompareDocument
+from .results import get_stored_comparison, store_comparison
+
+STATUSES = ["MATCH", "UPDATE", "ADD", "DELETE"]
+
+SUMMARY_CSV_HEADER = [
+    "NOFO ID",
+    "Title",
+    "Number",
+    "Updated",
+    "Added",
+    "Deleted",
+    "Unchanged",
+    "Missing strings",
+]
+
+
+def summarize_comparison(comparison):
+    """Counts subsections by status, and the diff strings that weren't found."""
+    summary = {status: 0 for status in STATUSES}
+    summary["missing_strings"] = 0
+    for section in comparison:
+        for subsection in section["subsections"]:
+            summary[subsection.status] += 1
+            summary["missing_strings"] += len(
+                getattr(subsection, "missing_strings", None) or []
+            )
+    return summary
+
+
+def bulk_compare(document, nofos, workers=1, parallel_threshold=None):
+    """
+    Compares `document` (a Compare Document or a NOFO) with each of `nofos`.
+
+    Returns a dict per NOFO, in order, with the "nofo", its "comparison" (with
+    side-by-side diffs), its summary counts, "duration_ms" and whether the
+    comparison was "stored" already.
+    """
+    is_compare_doc = isinstance(document, CompareDocument)
+
+    results = []
+    to_compare = []
+    for nofo in nofos:
+        start = time.perf_counter()
+        comparison = get_stored_comparison(document, nofo) if is_compare_doc else None
+        result = {
+            "nofo": nofo,
+            "comparison": comparison,
+            "stored": comparison is not None,
+            "duration_ms": (time.perf_counter() - start) * 1000,
+        }
+        results.append(result)
+        if comparison is None:
+            to_compare.append(result)
+
+    if to_compare:
+        baseline = Baseline(document)
+        for result in to_compare:
+            start = time.perf_counter()
+            result["matched_sections"] = baseline.match(result["nofo"])
+            result["duration_ms"] += (time.perf_counter() - start) * 1000
+
+        # One pool for every NOFO's diffs, so small NOFOs still fill it. It
+        # gets the time budget of all of their comparisons together.
+        diffs = None
+        if workers > 1:
+            budget = settings.COMPARE_DIFF_TIME_BUDGET * len(to_compare)
+            with diff_deadline(time.time() + budget):
+                diffs = run_diffs_in_parallel(
+                    [
+                        pair
+                        for result in to_compare
+                        for _, _, pairs in result["matched_sections"]
+                        for pair in pairs
+                    ],
+                    workers,
+                    threshold=get_parallel_threshold(parallel_threshold),
+                )
+
+        for result in to_compare:
+            start = time.perf_counter()
+            with diff_deadline(get_compare_deadline()):
+                comparison = baseline.compare(
+                    result.pop("matched_sections"), diffs=diffs
+                )
+            result["comparison"] = annotate_side_by_side_diffs(comparison)
+            if is_compare_doc:
+                store_comparison(document, result["nofo"], result["comparison"])
+            result["duration_ms"] += (time.perf_counter() - start) * 1000
+
+    for result in results:
+        result["duration_ms"] = round(result["duration_ms"], 2)
+        result.update(summarize_comparison(result["comparison"]))
+
+    return results
+
+
+def get_summary_csv_rows(results):
+    """One row per NOFO from bulk_compare, after SUMMARY_CSV_HEADER."""
+    for result in results:
+        nofo = result["nofo"]
+        yield [
+            str(nofo.pk),
+            nofo.title,
+            nofo.number,
+            result["UPDATE"],
+            result["ADD"],
+            result["DELETE"],
+            result["MATCH"],
+            result["missing_strings"],
+        ]
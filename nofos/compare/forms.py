@@ -1,3 +1,7 @@
+import uuid
+
+from django import forms
+
 from nofos.forms import create_object_model_form
 
 from .models import CompareDocument
@@ -6,3 +10,31 @@ create_compare_form_class = create_object_model_form(CompareDocument)
 
 CompareTitleForm = create_compare_form_class(["title"])
 CompareGroupForm = create_compare_form_class(["group"])
+
+# More than this is better done with `python manage.py bulk_compare`
+MAX_BULK_COMPARE_NOFOS = 50
+
+
+class CompareBulkForm(forms.Form):
+    nofos = forms.CharField(
+        label="NOFO IDs",
+        widget=forms.Textarea(attrs={"rows": 5}),
+        help_text="Comma-separated or one per line.",
+    )
+
+    def clean_nofos(self):
+        ids = [
+            nofo_id.strip()
+            for nofo_id in self.cleaned_data["nofos"].replace("\n", ",").split(",")
+            if nofo_id.strip()
+        ]
+        try:
+            ids = list(dict.fromkeys(str(uuid.UUID(nofo_id)) for nofo_id in ids))
+        except ValueError:
+            raise forms.ValidationError("NOFO IDs must be UUIDs.")
+
+        if len(ids) > MAX_BULK_COMPARE_NOFOS:
+            raise forms.ValidationError(
+                "Compare up to {} NOFOs at a time.".format(MAX_BULK_COMPARE_NOFOS)
+            )
+        return ids
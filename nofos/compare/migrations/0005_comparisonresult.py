@@ -0,0 +1,70 @@
+# Generated by Django 6.0.9 on 2026-10-19 07:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("compare", "0004_alter_comparedocument_group"),
+        ("nofos", "0131_printjob_artifact_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ComparisonResult",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("document_updated", models.DateTimeField()),
+                ("nofo_updated", models.DateTimeField()),
+                ("engine_version", models.CharField(max_length=20)),
+                (
+                    "sections",
+                    models.JSONField(
+                        default=list,
+                        help_text="Serialized output of compare_nofos, with side-by-side diffs.",
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "document",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="comparison_results",
+                        to="compare.comparedocument",
+                    ),
+                ),
+                (
+                    "nofo",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="comparison_results",
+                        to="nofos.nofo",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=(
+                            "document",
+                            "document_updated",
+                            "nofo",
+                            "nofo_updated",
+                            "engine_version",
+                        ),
+                        name="unique_comparison_result",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 6.0.9 on 2026-10-19 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("compare", "0005_comparisonresult"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comparisonresult",
+            name="summary",
+            field=models.JSONField(
+                help_text="What the compare page shows up front (see get_page_summary).",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.9 on 2026-10-19 08:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("compare", "0006_comparisonresult_summary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comparesubsection",
+            name="compiled_diff_strings",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                help_text="diff_strings, compiled for checking bodies (see RequiredStrings).",
+            ),
+        ),
+    ]
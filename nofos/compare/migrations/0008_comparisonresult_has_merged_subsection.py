@@ -0,0 +1,21 @@
+# Generated by Django 6.0.9 on 2026-10-19 09:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("compare", "0007_comparesubsection_compiled_diff_strings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comparisonresult",
+            name="has_merged_subsection",
+            field=models.BooleanField(
+                help_text='Whether the CSV needs a "New section name" column.',
+                null=True,
+            ),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from bloom_nofos.required_strings import RequiredStrings
 from django.core.validators import MaxLengthValidator
 from django.db import models
 from django.urls import reverse
@@ -94,3 +95,70 @@ class CompareSubsection(BaseSubsection):
         blank=True,
         help_text="List of required strings that must be present in the body.",
     )
+
+    compiled_diff_strings = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="diff_strings, compiled for checking bodies (see RequiredStrings).",
+    )
+
+    def save(self, *args, **kwargs):
+        self.compiled_diff_strings = RequiredStrings(self.diff_strings or []).to_data()
+        super().save(*args, **kwargs)
+
+
+class ComparisonResult(models.Model):
+    """
+    The result of comparing a Compare Document with a NOFO, for one revision
+    of each. Any edit to either document changes its `updated` field, so a
+    stored result is only ever read back for the exact revisions it was built from.
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "document",
+                    "document_updated",
+                    "nofo",
+                    "nofo_updated",
+                    "engine_version",
+                ],
+                name="unique_comparison_result",
+            )
+        ]
+
+    document = models.ForeignKey(
+        CompareDocument,
+        on_delete=models.CASCADE,
+        related_name="comparison_results",
+    )
+    document_updated = models.DateTimeField()
+
+    nofo = models.ForeignKey(
+        Nofo,
+        on_delete=models.CASCADE,
+        related_name="comparison_results",
+    )
+    nofo_updated = models.DateTimeField()
+
+    engine_version = models.CharField(max_length=20)
+
+    sections = models.JSONField(
+        default=list,
+        help_text="Serialized output of compare_nofos, with side-by-side diffs.",
+    )
+    summary = models.JSONField(
+        null=True,
+        help_text="What the compare page shows up front (see get_page_summary).",
+    )
+    has_merged_subsection = models.BooleanField(
+        null=True,
+        help_text='Whether the CSV needs a "New section name" column.',
+    )
+
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"(Comparison {self.id}) {self.document_id} → {self.nofo_id}"
@@ -0,0 +1,306 @@
+"""
+Stored comparisons between a Compare Document and a NOFO.
+
+Comparing two big documents means diffing every subsection, so the compare
+page, its side-by-side mode and its CSV all share one ComparisonResult per
+pair of document revisions. A result is keyed by both documents' `updated`
+fields and the compare engine version, so editing either document (or
+changing how comparisons are built) means it is recomputed on the next visit.
+
+Each result also has a summary of the compare page (get_page_summary), so
+the page can show its list of changes without loading any diffs, and then
+load sections one at a time (get_stored_page_section). The CSV export reads
+sections one at a time too (get_stored_export).
+"""
+
+import logging
+from dataclasses import fields
+
+from bloom_nofos.html_diff import HTML_DIFF_VERSION
+from django.db import IntegrityError, transaction
+
+from nofos.models import Section
+from nofos.nofo_compare import COMPARE_ENGINE_VERSION, SubsectionDiff, is_degraded
+
+from .models import CompareSection, CompareSubsection, ComparisonResult
+from .utils import comparison_has_merged_subsection
+
+logger = logging.getLogger("compare")
+
+SECTION_MODELS = {model._meta.label_lower: model for model in [CompareSection, Section]}
+
+SUBSECTION_DIFF_FIELDS = [f.name for f in fields(SubsectionDiff) if f.name != "section"]
+
+
+def get_engine_version():
+    return "{}.{}".format(COMPARE_ENGINE_VERSION, HTML_DIFF_VERSION)
+
+
+def _result_key(compare_doc, new_nofo):
+    return {
+        "document": compare_doc,
+        "document_updated": compare_doc.updated,
+        "nofo": new_nofo,
+        "nofo_updated": new_nofo.updated,
+        "engine_version": get_engine_version(),
+    }
+
+
+def serialize_comparison(comparison):
+    """
+    Turn the output of compare_nofos into JSON-friendly data. Each diff points
+    at its section as [model label, id].
+
+    Raises TypeError for anything that isn't a list of sections of SubsectionDiffs.
+    """
+    sections = []
+    for section in comparison:
+        subsections = []
+        for subsection in section["subsections"]:
+            if not isinstance(subsection, SubsectionDiff):
+                raise TypeError("Can't store a {}".format(type(subsection).__name__))
+
+            data = {name: getattr(subsection, name) for name in SUBSECTION_DIFF_FIELDS}
+            data["section"] = (
+                [subsection.section._meta.label_lower, str(subsection.section.pk)]
+                if subsection.section
+                else None
+            )
+            subsections.append(data)
+
+        sections.append(
+            {
+                "name": section["name"],
+                "html_id": section.get("html_id", ""),
+                "subsections": subsections,
+            }
+        )
+    return sections
+
+
+def deserialize_comparison(sections, fetch_sections=True):
+    """
+    Rebuild the output of compare_nofos from serialize_comparison, fetching the
+    sections the diffs point at with one query per section model (or leaving
+    them as None, without `fetch_sections`).
+    """
+    section_ids = {}
+    for section in sections:
+        for subsection in section["subsections"]:
+            if fetch_sections and subsection["section"]:
+                label, pk = subsection["section"]
+                section_ids.setdefault(label, set()).add(pk)
+
+    section_objects = {}
+    for label, ids in section_ids.items():
+        for obj in SECTION_MODELS[label].objects.filter(pk__in=ids):
+            section_objects[(label, str(obj.pk))] = obj
+
+    comparison = []
+    for section in sections:
+        subsections = []
+        for data in section["subsections"]:
+            data = dict(data)
+            ref = data.pop("section")
+            subsections.append(
+                SubsectionDiff(
+                    section=section_objects.get(tuple(ref)) if ref else None, **data
+                )
+            )
+        comparison.append({**section, "subsections": subsections})
+    return comparison
+
+
+def count_compared_subsections(compare_doc):
+    return (
+        CompareSubsection.objects.filter(section__document=compare_doc)
+        .exclude(comparison_type="none")
+        .count()
+    )
+
+
+def get_page_summary(comparison, hide_intro=False):
+    """
+    What the compare page shows before any section is loaded: the sections it
+    shows, by position in the comparison, and the changes in each, numbered.
+
+    Sections with only added subsections are not shown. With `hide_intro`,
+    a "Basic information" and then a "Have questions?" subsection at the
+    start of the first section are skipped.
+    """
+    summary = []
+    counter = 0
+    for index, section in enumerate(comparison):
+        subsections = section["subsections"]
+
+        skip = 0
+        if index == 0 and hide_intro:
+            if (
+                subsections
+                and subsections[0].name.strip().lower() == "basic information"
+            ):
+                skip += 1
+            if (
+                len(subsections) > skip
+                and "have questions?"
+                in (subsections[skip].old_value or "").strip().lower()
+            ):
+                skip += 1
+        subsections = subsections[skip:]
+
+        # Filter out sections that contain ONLY "ADDs".
+        if all(
+            sub.comparison_type == "body" and sub.status == "ADD" for sub in subsections
+        ):
+            continue
+
+        changes = []
+        for sub in subsections:
+            if sub.status != "MATCH":
+                counter += 1
+                changes.append(
+                    {
+                        "name": sub.name,
+                        "status": sub.status,
+                        "html_id": sub.html_id,
+                        "index_counter": counter,
+                    }
+                )
+
+        summary.append(
+            {
+                "index": index,
+                "name": section["name"],
+                "html_id": section.get("html_id", ""),
+                "skip": skip,
+                "changes": changes,
+            }
+        )
+    return summary
+
+
+def get_stored_summary(compare_doc, new_nofo):
+    """The page summary stored for the current revisions of both documents, or None."""
+    return (
+        ComparisonResult.objects.filter(**_result_key(compare_doc, new_nofo))
+        .values_list("summary", flat=True)
+        .first()
+    )
+
+
+def get_stored_page_section(compare_doc, new_nofo, index):
+    """
+    One section of the stored comparison, as the compare page shows it, and
+    its number on the page. Only that section is read from the database.
+
+    Returns None if there is no stored comparison for the current revisions
+    of both documents, or if the page doesn't show that section.
+    """
+    row = (
+        ComparisonResult.objects.filter(**_result_key(compare_doc, new_nofo))
+        .values_list("summary", "sections__{}".format(index))
+        .first()
+    )
+    if not row or not row[0] or not row[1]:
+        return None
+
+    summary, section = row
+    number = next(
+        (n for n, entry in enumerate(summary, start=1) if entry["index"] == index),
+        None,
+    )
+    if number is None:
+        return None
+
+    section = deserialize_comparison([section])[0]
+    section["subsections"] = section["subsections"][summary[number - 1]["skip"] :]
+    return section, number
+
+
+def get_stored_export(compare_doc, new_nofo):
+    """
+    What the CSV export needs from the stored comparison: whether it has
+    merged subsections, and an iterator over its sections that reads them
+    one query at a time (without the sections their diffs point at).
+
+    Returns None if there is no stored comparison for the current revisions
+    of both documents.
+    """
+    row = (
+        ComparisonResult.objects.filter(**_result_key(compare_doc, new_nofo))
+        .values_list("pk", "has_merged_subsection")
+        .first()
+    )
+    if not row or row[1] is None:
+        return None
+
+    def iter_sections(pk):
+        result = ComparisonResult.objects.filter(pk=pk)
+        index = 0
+        while True:
+            section = result.values_list(
+                "sections__{}".format(index), flat=True
+            ).first()
+            if not section:
+                return
+            yield deserialize_comparison([section], fetch_sections=False)[0]
+            index += 1
+
+    pk, has_merged_subsection = row
+    return has_merged_subsection, iter_sections(pk)
+
+
+def get_stored_comparison(compare_doc, new_nofo):
+    """The stored comparison for the current revisions of both documents, or None."""
+    result = ComparisonResult.objects.filter(
+        **_result_key(compare_doc, new_nofo)
+    ).first()
+    if not result:
+        return None
+    return deserialize_comparison(result.sections)
+
+
+def store_comparison(compare_doc, new_nofo, comparison):
+    """
+    Store a comparison for the current revisions of both documents, replacing
+    results for older revisions. Returns False if it could not be stored.
+
+    Comparisons with degraded diffs (see compare_nofos) are not stored, so the
+    next visit tries again for the full diff.
+    """
+    try:
+        sections = serialize_comparison(comparison)
+        summary = get_page_summary(
+            comparison, hide_intro=count_compared_subsections(compare_doc) > 1
+        )
+        has_merged_subsection = comparison_has_merged_subsection(comparison)
+    except (TypeError, KeyError) as e:
+        logger.info(
+            "Comparison not stored",
+            extra={"document_id": str(compare_doc.pk), "error": str(e)},
+        )
+        return False
+
+    if is_degraded(comparison):
+        logger.info(
+            "Comparison not stored",
+            extra={"document_id": str(compare_doc.pk), "error": "degraded diff"},
+        )
+        return False
+
+    key = _result_key(compare_doc, new_nofo)
+    try:
+        with transaction.atomic():
+            ComparisonResult.objects.filter(
+                document=compare_doc, nofo=new_nofo
+            ).delete()
+            ComparisonResult.objects.create(
+                sections=sections,
+                summary=summary,
+                has_merged_subsection=has_merged_subsection,
+                **key,
+            )
+    except IntegrityError:
+        # Someone else stored the same comparison at the same time
+        return False
+    return True
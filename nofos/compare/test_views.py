@@ -5,16 +5,35 @@ import os
 import uuid
 from unittest.mock import MagicMock, patch
 
+from bloom_nofos.diff_cache import DIFF_CACHE_ALIAS
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 
 from nofos.models import Nofo, Section, Subsection
+from nofos.nofo_compare import (
+    SubsectionDiff,
+    annotate_side_by_side_diffs,
+    compare_nofos,
+    is_degraded,
+)
 
-from .models import CompareDocument, CompareSection, CompareSubsection
+from .models import (
+    CompareDocument,
+    CompareSection,
+    CompareSubsection,
+    ComparisonResult,
+)
+from .results import (
+    deserialize_comparison,
+    get_page_summary,
+    get_stored_comparison,
+    store_comparison,
+)
 from .views import duplicate_compare_doc
 
 User = get_user_model()
@@ -1029,7 +1048,7 @@ class CompareDocumentCSVViewTests(TestCase):
             response["Content-Disposition"],
         )
 
-        rows = self.parse_csv(response.content)
+        rows = self.parse_csv(response.getvalue())
         self.assertEqual(
             rows[0], ["Status", "Step name", "Section name", "Old value", "New value"]
         )
@@ -1070,7 +1089,7 @@ class CompareDocumentCSVViewTests(TestCase):
             response["Content-Disposition"],
         )
 
-        rows = self.parse_csv(response.content)
+        rows = self.parse_csv(response.getvalue())
         self.assertEqual(
             rows[0], ["Status", "Step name", "Section name", "Old value", "New value"]
         )
@@ -1117,7 +1136,7 @@ class CompareDocumentCSVViewTests(TestCase):
             response["Content-Disposition"],
         )
 
-        rows = self.parse_csv(response.content)
+        rows = self.parse_csv(response.getvalue())
         self.assertEqual(
             rows[0], ["Status", "Step name", "Section name", "Old value", "New value"]
         )
@@ -1157,7 +1176,7 @@ class CompareDocumentCSVViewTests(TestCase):
         )
         response = self.client.get(url)
 
-        rows = self.parse_csv(response.content)
+        rows = self.parse_csv(response.getvalue())
         self.assertEqual(
             rows[0],
             [
@@ -1180,3 +1199,398 @@ class CompareDocumentCSVViewTests(TestCase):
                 "New body",
             ],
         )
+
+
+class StoredComparisonTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test@example.com",
+            password="testpass123",
+            force_password_reset=False,
+            group="bloom",
+        )
+        self.client.login(email="test@example.com", password="testpass123")
+
+        self.document = CompareDocument.objects.create(
+            title="Older", group="bloom", opdiv="CDC"
+        )
+        old_section = CompareSection.objects.create(
+            document=self.document, name="Step 1", order=1, html_id="step-1"
+        )
+        self.new_nofo = Nofo.objects.create(title="Newer", group="bloom", opdiv="CDC")
+        new_section = Section.objects.create(
+            nofo=self.new_nofo, name="Step 1", order=1, html_id="step-1"
+        )
+        for order, (old_body, new_body) in enumerate(
+            [("Same body", "Same body"), ("Old body", "New body")], start=1
+        ):
+            self.old_subsection = CompareSubsection.objects.create(
+                section=old_section,
+                name="Subsection {}".format(order),
+                tag="h3",
+                body=old_body,
+                order=order,
+            )
+            Subsection.objects.create(
+                section=new_section,
+                name="Subsection {}".format(order),
+                tag="h3",
+                body=new_body,
+                order=order,
+            )
+        CompareSubsection.objects.create(
+            section=old_section, name="Removed", tag="h3", body="Gone", order=3
+        )
+
+        self.args = [self.document.pk, self.new_nofo.pk]
+
+    def _get(self, name, **params):
+        return self.client.get(reverse(name, args=self.args), params)
+
+    def _get_section(self, index=0, **params):
+        return self.client.get(
+            reverse(
+                "compare:compare_document_result_section", args=self.args + [index]
+            ),
+            params,
+        )
+
+    def test_stored_comparison_is_identical(self):
+        self.document.refresh_from_db()
+        comparison = annotate_side_by_side_diffs(
+            compare_nofos(self.document, self.new_nofo)
+        )
+        self.assertTrue(store_comparison(self.document, self.new_nofo, comparison))
+
+        stored = get_stored_comparison(self.document, self.new_nofo)
+
+        self.assertEqual(stored, comparison)
+        self.assertEqual(
+            stored[0]["subsections"][-1].section,
+            CompareSection.objects.get(document=self.document),
+        )
+
+    @override_settings(COMPARE_DIFF_TIME_BUDGET=0)
+    def test_comparisons_out_of_time_are_not_stored(self):
+        # Diffs cached by other tests would not run out of time
+        caches[DIFF_CACHE_ALIAS].clear()
+        self.document.refresh_from_db()
+        comparison = annotate_side_by_side_diffs(
+            compare_nofos(self.document, self.new_nofo)
+        )
+
+        self.assertTrue(is_degraded(comparison))
+        self.assertFalse(store_comparison(self.document, self.new_nofo, comparison))
+        self.assertIsNone(get_stored_comparison(self.document, self.new_nofo))
+
+    def test_views_reuse_the_stored_comparison(self):
+        with patch("compare.views.compare_nofos", wraps=compare_nofos) as mock_compare:
+            first = self._get("compare:compare_document_result")
+            second = self._get("compare:compare_document_result", display="single")
+            section = self._get_section()
+            single_section = self._get_section(display="single")
+            csv_response = self._get("compare:compare_document_result_csv")
+
+        self.assertEqual(mock_compare.call_count, 1)
+        self.assertEqual(ComparisonResult.objects.count(), 1)
+        self.assertContains(section, "<del>Old</del>")
+        self.assertContains(single_section, "<del>Old</del>")
+        self.assertContains(csv_response, "DELETE")
+        self.assertEqual(
+            first.context["num_changed_subsections"],
+            second.context["num_changed_subsections"],
+        )
+
+    def test_editing_a_document_recomputes_the_comparison(self):
+        self._get("compare:compare_document_result")
+
+        self.old_subsection.body = "Older body"
+        self.old_subsection.save()
+
+        # The section as it was can't be loaded any more
+        self.assertEqual(self._get_section().status_code, 404)
+
+        with patch("compare.views.compare_nofos", wraps=compare_nofos) as mock_compare:
+            self._get("compare:compare_document_result")
+
+        self.assertEqual(mock_compare.call_count, 1)
+        self.assertContains(self._get_section(), "<del>Older</del>")
+        # Results for the old revision are replaced
+        self.assertEqual(ComparisonResult.objects.count(), 1)
+
+    def test_changing_selections_recomputes_the_comparison(self):
+        self._get("compare:compare_document_result")
+
+        self.client.post(
+            reverse("compare:compare_edit", args=[self.document.pk]),
+            data=json.dumps({"subsections": {str(self.old_subsection.pk): False}}),
+            content_type="application/json",
+        )
+
+        with patch("compare.views.compare_nofos", wraps=compare_nofos) as mock_compare:
+            self._get("compare:compare_document_result")
+
+        self.assertEqual(mock_compare.call_count, 1)
+        self.assertNotContains(self._get_section(), "<del>Old</del>")
+
+    def test_page_lists_changes_and_loads_sections_separately(self):
+        response = self._get("compare:compare_document_result")
+
+        self.assertEqual(response.context["num_changed_subsections"], 2)
+        self.assertNotContains(response, "Old body")
+        self.assertContains(
+            response,
+            'data-section-url="{}?display=double"'.format(
+                reverse("compare:compare_document_result_section", args=self.args + [0])
+            ),
+        )
+        self.assertContains(response, 'data-section="section--step-1"')
+
+    def test_section_is_read_without_the_rest_of_the_comparison(self):
+        self._get("compare:compare_document_result")
+
+        with patch("compare.results.deserialize_comparison") as mock_deserialize:
+            mock_deserialize.return_value = [{"name": "Step 1", "subsections": []}]
+            self._get_section()
+
+        # Only the one section was loaded
+        mock_deserialize.assert_called_once()
+        self.assertEqual(len(mock_deserialize.call_args.args[0]), 1)
+
+    def test_sections_not_on_the_page_are_not_found(self):
+        self._get("compare:compare_document_result")
+
+        self.assertEqual(self._get_section(index=5).status_code, 404)
+
+    def _get_csv_rows(self):
+        response = self._get("compare:compare_document_result_csv")
+        self.assertTrue(response.streaming)
+        return list(csv.reader(io.StringIO(response.getvalue().decode("utf-8"))))
+
+    def test_csv_streams_the_stored_comparison_section_by_section(self):
+        self._get("compare:compare_document_result")
+
+        with patch("compare.views.get_stored_comparison") as mock_stored, patch(
+            "compare.results.deserialize_comparison", wraps=deserialize_comparison
+        ) as mock_deserialize:
+            rows = self._get_csv_rows()
+
+        mock_stored.assert_not_called()
+        self.assertEqual(mock_deserialize.call_count, 1)
+        self.assertEqual(
+            rows[0], ["Status", "Step name", "Section name", "Old value", "New value"]
+        )
+        self.assertEqual(sorted(row[0] for row in rows[1:]), ["DELETE", "UPDATE"])
+
+    def test_csv_header_comes_from_the_stored_comparison(self):
+        self._get("compare:compare_document_result")
+        ComparisonResult.objects.update(has_merged_subsection=True)
+
+        rows = self._get_csv_rows()
+
+        self.assertEqual(rows[0][4], "New section name")
+        self.assertTrue(all(len(row) == 6 for row in rows))
+
+    def test_csv_for_a_comparison_stored_without_a_header(self):
+        self._get("compare:compare_document_result")
+        ComparisonResult.objects.update(has_merged_subsection=None)
+
+        with patch("compare.views.compare_nofos", wraps=compare_nofos) as mock_compare:
+            rows = self._get_csv_rows()
+
+        mock_compare.assert_not_called()
+        self.assertEqual(len(rows[0]), 5)
+        self.assertEqual(len(rows), 3)
+
+
+class PageSummaryTests(SimpleTestCase):
+    def _section(self, name, *subsections):
+        return {
+            "name": name,
+            "html_id": name.lower().replace(" ", "-"),
+            "subsections": [
+                SubsectionDiff(
+                    name=sub_name,
+                    status=status,
+                    old_value=old_value,
+                    html_id=sub_name.lower().replace(" ", "-"),
+                )
+                for sub_name, status, old_value in subsections
+            ],
+        }
+
+    def test_intro_subsections_are_skipped(self):
+        comparison = [
+            self._section(
+                "Step 1",
+                ("Basic information", "UPDATE", ""),
+                ("", "UPDATE", "Have questions? Email us"),
+                ("Summary", "UPDATE", "Old"),
+            )
+        ]
+
+        summary = get_page_summary(comparison, hide_intro=True)
+
+        self.assertEqual(summary[0]["skip"], 2)
+        self.assertEqual([c["name"] for c in summary[0]["changes"]], ["Summary"])
+        self.assertEqual(get_page_summary(comparison)[0]["skip"], 0)
+
+    def test_sections_with_only_additions_are_hidden_and_changes_are_numbered(self):
+        comparison = [
+            self._section("Step 1", ("A", "UPDATE", "Old"), ("B", "MATCH", "Same")),
+            self._section("Step 2", ("C", "ADD", "")),
+            self._section("Step 3", ("D", "DELETE", "Gone"), ("E", "ADD", "")),
+        ]
+
+        summary = get_page_summary(comparison)
+
+        self.assertEqual([entry["index"] for entry in summary], [0, 2])
+        self.assertEqual(
+            [(c["name"], c["index_counter"]) for e in summary for c in e["changes"]],
+            [("A", 1), ("D", 2), ("E", 3)],
+        )
+
+
+class CompareBulkViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test@example.com",
+            password="testpass123",
+            force_password_reset=False,
+            group="bloom",
+        )
+        self.client.login(email="test@example.com", password="testpass123")
+
+        self.document = CompareDocument.objects.create(
+            title="Baseline", group="bloom", opdiv="CDC"
+        )
+        section = CompareSection.objects.create(
+            document=self.document, name="Step 1", order=1, html_id="step-1"
+        )
+        CompareSubsection.objects.create(
+            section=section, name="Summary", tag="h3", body="Old summary", order=1
+        )
+        CompareSubsection.objects.create(
+            section=section,
+            name="Eligibility",
+            tag="h3",
+            body="Who can apply",
+            order=2,
+            comparison_type="diff_strings",
+            diff_strings=["Tribal governments", "Nonprofits"],
+        )
+
+        self.nofos = [
+            self._nofo("NOFO-1", "Old summary", "Nonprofits and Tribal  governments"),
+            self._nofo("NOFO-2", "New summary", "Nonprofits only"),
+        ]
+        self.url = reverse("compare:compare_bulk", args=[self.document.pk])
+
+    def _nofo(self, number, summary, eligibility, group="bloom"):
+        nofo = Nofo.objects.create(
+            title="NOFO {}".format(number), number=number, group=group, opdiv="CDC"
+        )
+        section = Section.objects.create(
+            nofo=nofo, name="Step 1", order=1, html_id="step-1"
+        )
+        for order, (name, body) in enumerate(
+            [("Summary", summary), ("Eligibility", eligibility)], start=1
+        ):
+            Subsection.objects.create(
+                section=section, name=name, tag="h3", body=body, order=order
+            )
+        return nofo
+
+    def _post(self, nofos, **data):
+        return self.client.post(
+            self.url, {"nofos": "\n".join(str(n.pk) for n in nofos), **data}
+        )
+
+    def test_get_shows_the_form(self):
+        response = self.client.get(self.url)
+
+        self.assertContains(response, "Compare with many NOFOs")
+        self.assertNotIn("results", response.context)
+
+    def test_matrix_of_changes_per_nofo(self):
+        response = self._post(self.nofos)
+
+        self.assertEqual(
+            [
+                (r["nofo"], r["UPDATE"], r["missing_strings"])
+                for r in response.context["results"]
+            ],
+            [(self.nofos[0], 0, 0), (self.nofos[1], 2, 1)],
+        )
+        self.assertContains(
+            response,
+            reverse(
+                "compare:compare_document_result_csv",
+                args=[self.document.pk, self.nofos[1].pk],
+            ),
+        )
+
+    def test_comparisons_are_stored_for_the_compare_pages(self):
+        self._post(self.nofos)
+        self.assertEqual(ComparisonResult.objects.count(), 2)
+
+        with patch("compare.views.compare_nofos") as mock_compare:
+            self.client.get(
+                reverse(
+                    "compare:compare_document_result",
+                    args=[self.document.pk, self.nofos[1].pk],
+                )
+            )
+            response = self._post(self.nofos)
+
+        mock_compare.assert_not_called()
+        self.assertTrue(all(r["stored"] for r in response.context["results"]))
+
+    def test_summary_csv(self):
+        response = self._post(self.nofos, format="csv")
+
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.reader(io.StringIO(response.content.decode())))
+        self.assertEqual(rows[0][0], "NOFO ID")
+        self.assertEqual(
+            rows[1:],
+            [
+                [
+                    str(self.nofos[0].pk),
+                    "NOFO NOFO-1",
+                    "NOFO-1",
+                    "0",
+                    "0",
+                    "0",
+                    "2",
+                    "0",
+                ],
+                [
+                    str(self.nofos[1].pk),
+                    "NOFO NOFO-2",
+                    "NOFO-2",
+                    "2",
+                    "0",
+                    "0",
+                    "0",
+                    "1",
+                ],
+            ],
+        )
+
+    def test_nofos_from_other_groups_are_not_found(self):
+        self.user.group = "acf"
+        self.user.save()
+        self.document.group = "acf"
+        self.document.save()
+        other_nofo = self._nofo("NOFO-3", "Old summary", "Nonprofits", group="acf")
+
+        response = self._post([other_nofo, self.nofos[0]])
+
+        self.assertContains(response, "No NOFOs with IDs {}".format(self.nofos[0].pk))
+        self.assertNotIn("results", response.context)
+
+    def test_invalid_ids(self):
+        response = self.client.post(self.url, {"nofos": "not-a-uuid"})
+
+        self.assertContains(response, "NOFO IDs must be UUIDs.")
@@ -42,6 +42,11 @@ urlpatterns = [
         views.CompareDocumentView.as_view(),
         name="compare_document",
     ),
+    path(
+        "<uuid:pk>/document/bulk",
+        views.CompareBulkView.as_view(),
+        name="compare_bulk",
+    ),
     path(
         "<uuid:pk>/import/document",
         views.CompareImportToDocView.as_view(),
@@ -52,6 +57,11 @@ urlpatterns = [
         views.CompareDocumentView.as_view(),
         name="compare_document_result",
     ),
+    path(
+        "<uuid:pk>/document/<uuid:new_nofo_id>/section/<int:index>",
+        views.CompareDocumentSectionView.as_view(),
+        name="compare_document_result_section",
+    ),
     path(
         "<uuid:pk>/document/<uuid:new_nofo_id>/csv",
         views.CompareDocumentCSVView.as_view(),
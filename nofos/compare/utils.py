@@ -25,3 +25,66 @@ def strip_file_suffix(filename: str) -> str:
     e.g., 'Document_123_2025.08.01.docx' → 'Document_123_2025.08.01'
     """
     return os.path.splitext(filename)[0]
+
+
+def get_comparison_csv_filename(compare_doc, new_nofo):
+    return f"compare__{compare_doc.pk}__{new_nofo.pk}.csv"
+
+
+def comparison_has_merged_subsection(comparison):
+    """
+    Whether any UPDATE diff pairs subsections with different names, which
+    gives the comparison's CSV a "New section name" column.
+    """
+    return any(
+        subsection.status == "UPDATE" and (subsection.old_name != subsection.new_name)
+        for section in comparison
+        for subsection in section["subsections"]
+    )
+
+
+def get_comparison_csv_rows(comparison, has_merged_subsection=None):
+    """
+    The CSV of a comparison: a header, then a row for each subsection that
+    doesn't match.
+
+    Pass `has_merged_subsection` if it is already known, and `comparison` can
+    be any iterable of sections: rows are yielded as sections come out of it.
+    """
+    if has_merged_subsection is None:
+        has_merged_subsection = comparison_has_merged_subsection(comparison)
+
+    # Write header
+    header = ["Status", "Step name", "Section name", "Old value"]
+    if has_merged_subsection:
+        header.append("New section name")
+    header.append("New value")
+
+    yield header
+
+    for section in comparison:
+        for subsection in section["subsections"]:
+            if subsection.status == "MATCH":
+                continue
+
+            if has_merged_subsection:
+                yield [
+                    subsection.status,
+                    section["name"],
+                    subsection.old_name,
+                    subsection.old_value,
+                    subsection.new_name,  # add "New subsection name" string if has_merged_subsections
+                    subsection.new_value,
+                ]
+            else:
+                yield [
+                    subsection.status,
+                    section["name"],
+                    (
+                        subsection.new_name
+                        if subsection.status == "ADD"
+                        else subsection.old_name or subsection.new_name
+                    ),
+                    subsection.old_value,
+                    subsection.new_value,
+                ]
@@ -10,16 +10,18 @@ from bloom_nofos.error_helpers import (
     render_mistagged_heading_error,
 )
 from bloom_nofos.logs import log_exception
+from bloom_nofos.utils import streaming_csv_response
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import ValidationError
 from django.db import transaction
 from django.forms.models import model_to_dict
-from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
-from django.views.generic import DetailView, ListView, UpdateView, View
+from django.views.generic import DetailView, FormView, ListView, UpdateView, View
 
 from nofos.mixins import GroupAccessObjectMixinFactory
 from nofos.models import Nofo
@@ -35,9 +37,24 @@ from nofos.nofo_compare import annotate_side_by_side_diffs, compare_nofos
 from nofos.utils import create_nofo_audit_event
 from nofos.views import BaseNofoImportView
 
-from .forms import CompareGroupForm, CompareTitleForm
+from .bulk import SUMMARY_CSV_HEADER, bulk_compare, get_summary_csv_rows
+from .forms import CompareBulkForm, CompareGroupForm, CompareTitleForm
 from .models import CompareDocument, CompareSection, CompareSubsection
-from .utils import create_compare_document, strip_file_suffix
+from .results import (
+    count_compared_subsections,
+    get_page_summary,
+    get_stored_comparison,
+    get_stored_export,
+    get_stored_page_section,
+    get_stored_summary,
+    store_comparison,
+)
+from .utils import (
+    create_compare_document,
+    get_comparison_csv_filename,
+    get_comparison_csv_rows,
+    strip_file_suffix,
+)
 
 GroupAccessObjectMixin = GroupAccessObjectMixinFactory(CompareDocument)
 
@@ -114,6 +131,9 @@ def duplicate_compare_doc(original_doc) -> CompareDocument:
         new_subs = []
         for orig_sub in orig_subqs:
             data = model_to_dict(orig_sub, fields=fields)
+            if is_compare:
+                # Not editable, so model_to_dict leaves it out
+                data["compiled_diff_strings"] = orig_sub.compiled_diff_strings
             new_subs.append(CompareSubsection(section=new_sec, **data))
 
         CompareSubsection.objects.bulk_create(new_subs)
@@ -127,6 +147,22 @@ def duplicate_compare_doc(original_doc) -> CompareDocument:
     return compare_doc
 
 
+def get_comparison(compare_doc, new_nofo):
+    """
+    compare_nofos with side-by-side diffs, stored for the current revisions of
+    both documents so that the HTML and CSV views don't redo it.
+    """
+    comparison = get_stored_comparison(compare_doc, new_nofo)
+    if comparison is None:
+        comparison = compare_nofos(
+            compare_doc, new_nofo, workers=settings.COMPARE_DIFF_WORKERS
+        )
+        # add old_diff and new_diff
+        comparison = annotate_side_by_side_diffs(comparison)
+        store_comparison(compare_doc, new_nofo, comparison)
+    return comparison
+
+
 class CompareListView(LoginRequiredMixin, ListView):
     model = CompareDocument
     template_name = "compare/compare_index.html"
@@ -356,6 +392,8 @@ class CompareEditView(GroupAccessObjectMixin, DetailView):
                             subsections_to_update, ["comparison_type"]
                         )
                         updated_count = len(subsections_to_update)
+                        # bulk_update skips save(), which would mark the document as changed
+                        self.object.touch_updated()
 
                 except Exception as e:
                     print("Error in bulk update:", e)
@@ -536,6 +574,12 @@ class CompareImportToDocView(
 
 
 class CompareDocumentView(GroupAccessObjectMixin, LoginRequiredMixin, View):
+    """
+    The compare page. With a stored comparison, it only renders the list of
+    changes and each section's heading; compare_document.js then loads the
+    sections from CompareDocumentSectionView as they scroll into view.
+    """
+
     def get(self, request, pk, new_nofo_id=None):
         compare_doc = get_object_or_404(CompareDocument, pk=pk)
 
@@ -550,63 +594,58 @@ class CompareDocumentView(GroupAccessObjectMixin, LoginRequiredMixin, View):
         if new_nofo_id:
             new_nofo = get_object_or_404(Nofo, pk=new_nofo_id)
 
-            comparison = compare_nofos(compare_doc, new_nofo)
-            # add old_diff and new_diff
-            comparison = annotate_side_by_side_diffs(comparison)
-
-            # count subsections which are not none
-            not_none_subsection_count = (
-                CompareSubsection.objects.filter(section__document=compare_doc)
-                .exclude(comparison_type="none")
-                .count()
-            )
-
-            first_section = comparison[0]
-            if first_section["subsections"] and not_none_subsection_count > 1:
-                # Remove "Basic Information" if it's the first subsection of the first section
-                first_sub = first_section["subsections"][0]
-                if first_sub.name.strip().lower() == "basic information":
-                    print("Removing Basic Information")
-                    del first_section["subsections"][0]
-                # Remove "Have questions?" if it's the first subsection of the first section
-                next_sub = first_section["subsections"][0]
-                if "have questions?" in next_sub.old_value.strip().lower():
-                    del first_section["subsections"][0]
-
-            # Filter out sections that contain ONLY "ADDs".
-            comparison = [
-                section
-                for section in comparison
-                if not all(
-                    sub.comparison_type == "body" and sub.status == "ADD"
-                    for sub in section["subsections"]
+            summary = get_stored_summary(compare_doc, new_nofo)
+            comparison = None
+            if summary is None:
+                comparison = get_comparison(compare_doc, new_nofo)
+                summary = get_stored_summary(compare_doc, new_nofo)
+
+            if summary is None:
+                # The comparison couldn't be stored, so show every section now
+                summary = get_page_summary(
+                    comparison,
+                    hide_intro=count_compared_subsections(compare_doc) > 1,
                 )
-            ]
-
-            changed_subsections = [
-                sub
-                for section in comparison
-                for sub in section["subsections"]
-                if sub.status != "MATCH"
-            ]
-
-            # Add index counter
-            for i, sub in enumerate(changed_subsections, start=1):
-                sub.index_counter = i
+                page_sections = [
+                    {
+                        "number": number,
+                        "section": {
+                            **comparison[entry["index"]],
+                            "subsections": comparison[entry["index"]]["subsections"][
+                                entry["skip"] :
+                            ],
+                        },
+                    }
+                    for number, entry in enumerate(summary, start=1)
+                ]
+            else:
+                page_sections = [
+                    {
+                        "number": number,
+                        "section": entry,
+                        "url": reverse(
+                            "compare:compare_document_result_section",
+                            args=[compare_doc.pk, new_nofo.pk, entry["index"]],
+                        )
+                        + "?display={}".format(display_mode),
+                    }
+                    for number, entry in enumerate(summary, start=1)
+                ]
 
             sections_changed_subsections = {}
-            for subsection in changed_subsections:
-                section_name = subsection.section.name
-                sections_changed_subsections.setdefault(section_name, []).append(
-                    subsection
-                )
+            for entry in summary:
+                if entry["changes"]:
+                    sections_changed_subsections.setdefault(entry["name"], []).extend(
+                        {**change, "section_html_id": entry["html_id"]}
+                        for change in entry["changes"]
+                    )
+            num_changed_subsections = sum(len(entry["changes"]) for entry in summary)
 
             context.update(
                 {
                     "new_nofo": new_nofo,
-                    "comparison": comparison,
-                    "changed_subsections": changed_subsections,
-                    "num_changed_subsections": len(changed_subsections),
+                    "comparison": page_sections,
+                    "num_changed_subsections": num_changed_subsections,
                     "sections_changed_subsections": sections_changed_subsections,
                 }
             )
@@ -614,66 +653,95 @@ class CompareDocumentView(GroupAccessObjectMixin, LoginRequiredMixin, View):
         return render(request, "compare/compare_document.html", context)
 
 
+class CompareDocumentSectionView(GroupAccessObjectMixin, LoginRequiredMixin, View):
+    """One section of a stored comparison, for the compare page to load."""
+
+    def get(self, request, pk, new_nofo_id, index):
+        compare_doc = get_object_or_404(CompareDocument, pk=pk)
+        new_nofo = get_object_or_404(Nofo, pk=new_nofo_id)
+
+        page_section = get_stored_page_section(compare_doc, new_nofo, index)
+        if not page_section:
+            # Either document changed since the page was loaded
+            raise Http404("This comparison has changed. Reload the page to see it.")
+
+        section, number = page_section
+        return render(
+            request,
+            "compare/includes/compare_section.html",
+            {
+                "display_mode": request.GET.get("display", "double"),
+                "section": section,
+                "number": number,
+            },
+        )
+
+
 class CompareDocumentCSVView(GroupAccessObjectMixin, LoginRequiredMixin, View):
     def get(self, request, pk, new_nofo_id):
         compare_doc = get_object_or_404(CompareDocument, pk=pk)
         new_nofo = get_object_or_404(Nofo, pk=new_nofo_id)
 
-        comparison = compare_nofos(compare_doc, new_nofo)
-        comparison = annotate_side_by_side_diffs(comparison)
+        stored = get_stored_export(compare_doc, new_nofo)
+        if stored:
+            has_merged_subsection, sections = stored
+            rows = get_comparison_csv_rows(sections, has_merged_subsection)
+        else:
+            rows = get_comparison_csv_rows(get_comparison(compare_doc, new_nofo))
+
+        return streaming_csv_response(
+            rows, get_comparison_csv_filename(compare_doc, new_nofo)
+        )
+
+
+class CompareBulkView(GroupAccessObjectMixin, LoginRequiredMixin, FormView):
+    """
+    Compare a document with many NOFOs at once, and list the changes in each.
+    The "Download summary" button returns the same table as a CSV.
+    """
+
+    template_name = "compare/compare_bulk.html"
+    form_class = CompareBulkForm
 
-        # Prepare response as CSV
-        response = HttpResponse(content_type="text/csv")
-        filename = f"compare__{compare_doc.pk}__{new_nofo.pk}.csv"
-        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    def dispatch(self, request, *args, **kwargs):
+        self.document = get_object_or_404(CompareDocument, pk=kwargs.get("pk"))
+        return super().dispatch(request, *args, **kwargs)
 
-        writer = csv.writer(response)
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["document"] = self.document
+        return context
 
-        # Check if any subsection has non-matching names in UPDATE diff objects
-        has_merged_subsection = any(
-            subsection.status == "UPDATE"
-            and (subsection.old_name != subsection.new_name)
-            for section in comparison
-            for subsection in section["subsections"]
+    def form_valid(self, form):
+        ids = form.cleaned_data["nofos"]
+
+        queryset = Nofo.objects.filter(pk__in=ids)
+        # Like the compare index: non-"bloom" users only see their group's documents
+        if self.request.user.group != "bloom":
+            queryset = queryset.filter(group=self.request.user.group)
+        nofos = {str(nofo.pk): nofo for nofo in queryset}
+
+        missing = [nofo_id for nofo_id in ids if nofo_id not in nofos]
+        if missing:
+            form.add_error("nofos", "No NOFOs with IDs {}".format(", ".join(missing)))
+            return self.form_invalid(form)
+
+        results = bulk_compare(
+            self.document,
+            [nofos[nofo_id] for nofo_id in ids],
+            workers=settings.COMPARE_DIFF_WORKERS,
         )
 
-        # Write header
-        header = ["Status", "Step name", "Section name", "Old value"]
-        if has_merged_subsection:
-            header.append("New section name")
-        header.append("New value")
-
-        writer.writerow(header)
-
-        for section in comparison:
-            for subsection in section["subsections"]:
-                if subsection.status == "MATCH":
-                    continue
-
-                row = []
-
-                if has_merged_subsection:
-                    row = [
-                        subsection.status,
-                        section["name"],
-                        subsection.old_name,
-                        subsection.old_value,
-                        subsection.new_name,  # add "New subsection name" string if has_merged_subsections
-                        subsection.new_value,
-                    ]
-                else:
-                    row = [
-                        subsection.status,
-                        section["name"],
-                        (
-                            subsection.new_name
-                            if subsection.status == "ADD"
-                            else subsection.old_name or subsection.new_name
-                        ),
-                        subsection.old_value,
-                        subsection.new_value,
-                    ]
-
-                writer.writerow(row)
-
-        return response
+        if self.request.POST.get("format") == "csv":
+            response = HttpResponse(content_type="text/csv")
+            filename = f"compare__{self.document.pk}__summary.csv"
+            response["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+            writer = csv.writer(response)
+            writer.writerow(SUMMARY_CSV_HEADER)
+            writer.writerows(get_summary_csv_rows(results))
+            return response
+
+        return self.render_to_response(
+            self.get_context_data(form=form, results=results)
+        )
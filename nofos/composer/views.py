@@ -1,6 +1,8 @@
 import json
 from typing import Dict
 
+from bloom_nofos.diff_cache import html_diff_views
+from bloom_nofos.docx_export import generate_docx_download_response
 from bloom_nofos.error_helpers import (
     DOCUMENT_STRUCTURE_RECOVERY_STEPS,
     MistaggedHeadingError,
@@ -8,9 +10,7 @@ from bloom_nofos.error_helpers import (
     render_import_server_error,
     render_mistagged_heading_error,
 )
-from bloom_nofos.html_diff import has_diff, html_diff
 from bloom_nofos.logs import log_exception
-from bloom_nofos.utils import generate_docx_download_response
 from composer.utils import do_replace_variable_keys_with_values
 from django.contrib import messages
 from django.contrib.auth import REDIRECT_FIELD_NAME
@@ -42,7 +42,12 @@ from django.views.generic import (
 )
 from martor.utils import markdownify
 
-from nofos.audits import get_audit_event_by_id, safe_get_changed_fields
+from nofos.audits import (
+    get_audit_event_by_id,
+    get_body_history_diff,
+    get_history_diff,
+    safe_get_changed_fields,
+)
 from nofos.mixins import (
     GroupAccessContentGuideMixin,
     PreventIfContentGuideArchivedMixin,
@@ -53,7 +58,6 @@ from nofos.nofo import (
     add_page_breaks_to_headings,
     suggest_nofo_opdiv,
 )
-from nofos.nofo_compare import extract_new_diff, extract_old_diff
 from nofos.utils import create_nofo_audit_event, create_subsection_html_id
 from nofos.views import BaseNofoHistoryView, BaseNofoImportView
 
@@ -632,12 +636,6 @@ class ComposerHistoryView(
     def get_document_model_name(self):
         return "contentguide"
 
-    def get_section_model_name(self):
-        return "contentguidesection"
-
-    def get_subsection_model_name(self):
-        return "contentguidesubsection"
-
 
 @composer_admin_required
 def composer_section_redirect(request, pk):
@@ -1017,7 +1015,7 @@ class ComposerExportView(
             export_url=export_url,
             target_element="#download_target",
             filename_base=(document.title or "content-guide"),
-            tmp_name=str(document.pk),
+            document=document,
         )
 
 
@@ -1885,7 +1883,7 @@ class WriterInstancePreviewView(BaseComposerPreviewView):
                 export_url=export_url,
                 target_element="#download_target",
                 filename_base=document.short_name or document.title,
-                tmp_name=str(document.pk),
+                document=document,
             )
 
         return HttpResponseBadRequest("Unknown action.")
@@ -1907,12 +1905,6 @@ class WriterInstanceHistoryView(
     def get_document_model_name(self):
         return "contentguideinstance"
 
-    def get_section_model_name(self):
-        return "contentguidesection"
-
-    def get_subsection_model_name(self):
-        return "contentguidesubsection"
-
 
 class WriterInstanceHistoryCompareView(
     ComposerAdminRequiredMixin, GroupAccessContentGuideMixin, View
@@ -1943,32 +1935,33 @@ class WriterInstanceHistoryCompareView(
             "composer:writer_instance_history", kwargs={"pk": document.pk}
         )
 
+        # Diffs are stored per event, so they're only worked out once
+        diff = get_body_history_diff(event)
         changed_fields = safe_get_changed_fields(event)
-        if body := changed_fields.get("body"):
-            old, new = body
-            if has_diff(
-                diff := html_diff(
-                    markdownify(old),
-                    markdownify(new),
-                )
-            ):
-                context["diff_old"] = extract_old_diff(diff)
-                context["diff_new"] = extract_new_diff(diff)
-
-        elif variables := changed_fields.get("variables"):
+        if diff is None and (variables := changed_fields.get("variables")):
             old, new = variables
-            body_with_old = do_replace_variable_keys_with_values(
-                markdownify(subsection.body), self._parse_variables(old)
-            )
-            body_with_new = do_replace_variable_keys_with_values(
-                markdownify(subsection.body), self._parse_variables(new)
+            # The variables are shown in the current body, so that is an input too
+            diff = get_history_diff(
+                event,
+                ["variables", old, new, subsection.body],
+                lambda: self._get_variables_diff_views(subsection.body, old, new),
             )
-            if has_diff(diff := html_diff(body_with_old, body_with_new)):
-                context["diff_old"] = extract_old_diff(diff)
-                context["diff_new"] = extract_new_diff(diff)
+
+        if diff and diff.has_diff:
+            context["diff_old"] = diff.diff_old
+            context["diff_new"] = diff.diff_new
 
         return render(request, "nofos/nofo_history_compare.html", context)
 
+    @classmethod
+    def _get_variables_diff_views(cls, body, old, new):
+        """The diff of a body with the old variable values and with the new ones."""
+        html = markdownify(body)
+        return html_diff_views(
+            do_replace_variable_keys_with_values(html, cls._parse_variables(old)),
+            do_replace_variable_keys_with_values(html, cls._parse_variables(new)),
+        )
+
     @staticmethod
     def _parse_variables(vars: str):
         """
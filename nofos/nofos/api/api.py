@@ -82,7 +82,9 @@ def create_nofo(request, payload: NofoSchema):
 def get_nofo(request, nofo_id: uuid.UUID):
     """Export a NOFO by ID"""
     try:
-        nofo = Nofo.objects.get(id=nofo_id, archived__isnull=True)
+        nofo = Nofo.objects.prefetch_related("sections__subsections").get(
+            id=nofo_id, archived__isnull=True
+        )
 
         nofo_dict = NofoSchema.from_orm(nofo).dict(exclude_none=True)
         # remove blank keys from the dict
@@ -0,0 +1,225 @@
+"""
+Keeping the audit log from growing without bound.
+
+easyaudit records every save, with a JSON copy of the object and of the
+changed fields (both full bodies, for a subsection). There are two steps,
+both run by `python manage.py compact_audit_log`:
+
+- Compacting: consecutive updates to the same object by the same user on the
+  same day (older than AUDIT_COMPACT_AFTER_DAYS) are merged into the last of
+  them; an update by another user in between keeps them apart. Its
+  changed_fields keep each field's first old value and last new value, so
+  history compare still shows what changed in a body that day, and its
+  document index row counts the events merged into it (event_count), so
+  reports still add up. Custom actions (imports, prints) and compact body
+  snapshots (see nofos/audit_snapshots.py) are never compacted.
+- Archiving: the JSON of events older than AUDIT_ARCHIVE_AFTER_DAYS is moved
+  into a compressed AuditEventArchive. The event row stays, so its ID and its
+  place in history don't change, and get_event_payload reads the JSON back
+  from the archive wherever the app reads an event's JSON.
+
+Only events in the audit document index are compacted or archived.
+"""
+
+import json
+from datetime import timedelta, timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, Length
+from django.utils import timezone as django_timezone
+from easyaudit.models import CRUDEvent
+
+from .audits import safe_get_changed_fields
+from .models import AuditEventArchive, AuditEventDocument
+
+
+def get_retention_cutoffs(compact_after_days=None, archive_after_days=None):
+    """(compact before, archive before) datetimes, from settings by default."""
+    now = django_timezone.now()
+    if compact_after_days is None:
+        compact_after_days = settings.AUDIT_COMPACT_AFTER_DAYS
+    if archive_after_days is None:
+        archive_after_days = settings.AUDIT_ARCHIVE_AFTER_DAYS
+    return (
+        now - timedelta(days=compact_after_days),
+        now - timedelta(days=archive_after_days),
+    )
+
+
+def merge_changed_fields(changes):
+    """
+    Merge the changed_fields of consecutive events: a field changed more than
+    once goes from its first old value to its last new value.
+    """
+    merged = {}
+    for changed_fields in changes:
+        for key, value in changed_fields.items():
+            previous = merged.get(key)
+            if (
+                isinstance(previous, list)
+                and len(previous) == 2
+                and isinstance(value, list)
+                and len(value) == 2
+            ):
+                merged[key] = [previous[0], value[1]]
+            else:
+                merged[key] = value
+    return merged
+
+
+def get_compactable_events(before):
+    """Indexed, unarchived update events before `before` that aren't custom actions."""
+    return CRUDEvent.objects.filter(
+        event_type=CRUDEvent.UPDATE,
+        datetime__lt=before,
+        document_index__isnull=False,
+        document_index__action="",
+        archive__isnull=True,
+        # Compact body snapshots are patches from the snapshot before
+        body_snapshot__isnull=True,
+    )
+
+
+def compact_event_group(events, dry_run=False):
+    """
+    Merge events (for one object, user and day, in order) into the last one.
+    Events whose changed_fields aren't a JSON object are left alone. Returns
+    how many events were (or would be) removed.
+    """
+    changes = [(event, safe_get_changed_fields(event)) for event in events]
+    changes = [(event, changed) for event, changed in changes if changed]
+    changes = [
+        (event, changed) for event, changed in changes if isinstance(changed, dict)
+    ]
+    if len(changes) < 2:
+        return 0
+
+    merged = [event for event, _ in changes]
+    if dry_run:
+        return len(merged) - 1
+
+    summary = merged[-1]
+    with transaction.atomic():
+        summary.changed_fields = json.dumps(
+            merge_changed_fields([changed for _, changed in changes])
+        )
+        # Saving the event works out its document index row again
+        summary.save(update_fields=["changed_fields"])
+        AuditEventDocument.objects.filter(event=summary).update(
+            event_count=sum(event.document_index.event_count for event in merged)
+        )
+        CRUDEvent.objects.filter(id__in=[event.id for event in merged[:-1]]).delete()
+    return len(merged) - 1
+
+
+def compact_audit_events(before, dry_run=False, batch_size=100):
+    """
+    Compact consecutive same-day updates to an object by the same user,
+    before `before`.
+    Works through `batch_size` objects at a time. Returns stats.
+    """
+    events = get_compactable_events(before)
+    objects = list(
+        events.values_list("content_type_id", "object_id")
+        .annotate(events=Count("id"))
+        .filter(events__gt=1)
+        .order_by()
+    )
+
+    stats = {"objects": 0, "summaries": 0, "removed": 0}
+    for start in range(0, len(objects), batch_size):
+        objects_filter = Q()
+        for content_type_id, object_id, _ in objects[start : start + batch_size]:
+            objects_filter |= Q(content_type_id=content_type_id, object_id=object_id)
+
+        compactable_ids = set(
+            events.filter(objects_filter).values_list("id", flat=True)
+        )
+
+        # Runs of consecutive edits to an object by one user on one day: any
+        # other event in between (eg, an edit by someone else) starts a new
+        # run, so it is never merged into this user's edits
+        groups = []
+        previous_key = None
+        for event in (
+            CRUDEvent.objects.filter(objects_filter, datetime__lt=before)
+            .select_related("document_index")
+            .order_by("content_type_id", "object_id", "datetime", "id")
+        ):
+            if event.id not in compactable_ids:
+                previous_key = None
+                continue
+
+            day = event.datetime.astimezone(timezone.utc).date()
+            key = (event.content_type_id, event.object_id, event.user_id, day)
+            if key != previous_key:
+                groups.append((key, []))
+                previous_key = key
+            groups[-1][1].append(event)
+
+        compacted_objects = set()
+        for key, group in groups:
+            if len(group) < 2:
+                continue
+            removed = compact_event_group(group, dry_run=dry_run)
+            if removed:
+                compacted_objects.add(key[:2])
+                stats["summaries"] += 1
+                stats["removed"] += removed
+        stats["objects"] += len(compacted_objects)
+
+    return stats
+
+
+def get_archivable_events(before):
+    """Indexed events before `before` that have JSON and aren't archived yet."""
+    return CRUDEvent.objects.filter(
+        datetime__lt=before,
+        document_index__isnull=False,
+        archive__isnull=True,
+    ).exclude(
+        Q(object_json_repr__isnull=True) | Q(object_json_repr=""),
+        Q(changed_fields__isnull=True) | Q(changed_fields=""),
+    )
+
+
+def archive_audit_events(before, dry_run=False, batch_size=1000):
+    """
+    Move the JSON of events before `before` into compressed AuditEventArchives,
+    `batch_size` events at a time. Returns stats: sizes are in bytes, or in
+    characters (and not compressed) for a dry run.
+    """
+    events = get_archivable_events(before)
+
+    if dry_run:
+        totals = events.aggregate(
+            events=Count("id"),
+            size=Coalesce(Sum(Length("object_json_repr")), 0)
+            + Coalesce(Sum(Length("changed_fields")), 0),
+        )
+        return {**totals, "compressed_size": None}
+
+    stats = {"events": 0, "size": 0, "compressed_size": 0}
+    events = events.order_by("id").only("id", "object_json_repr", "changed_fields")
+    last_id = 0
+    while True:
+        batch = list(events.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        archives = [AuditEventArchive.for_event(event) for event in batch]
+        with transaction.atomic():
+            AuditEventArchive.objects.bulk_create(archives)
+            # Not saved one by one, so the document index rows are kept as they are
+            CRUDEvent.objects.filter(id__in=[event.id for event in batch]).update(
+                object_json_repr="", changed_fields=""
+            )
+
+        stats["events"] += len(batch)
+        stats["size"] += sum(archive.size for archive in archives)
+        stats["compressed_size"] += sum(len(archive.data) for archive in archives)
+
+    return stats
@@ -0,0 +1,167 @@
+"""
+Compact audit snapshots of subsection bodies.
+
+easyaudit saves the whole object with every event, and the old and new value
+of every changed field, so a one-character edit to a 20KB subsection body
+stores the body three times. With AUDIT_COMPACT_SNAPSHOTS on, updates to
+subsections are logged by CompactSnapshotBackend instead:
+
+- the body is left out of the event's object_json_repr, and its changed_fields
+  have "body": null instead of the old and new bodies
+- the new body is saved in an AuditBodySnapshot, as a diff_match_patch patch
+  from the previous snapshot, or as a full checkpoint every
+  AUDIT_SNAPSHOT_CHECKPOINT_EVERY edits (or when there is no previous
+  snapshot to follow on from)
+
+get_snapshot_bodies works the old and new body of an event back out, for
+history compare pages (see nofos.audits.get_changed_body).
+"""
+
+import hashlib
+import json
+
+from diff_match_patch import diff_match_patch
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from easyaudit.backends import ModelBackend
+from easyaudit.models import CRUDEvent
+
+from .models import AuditBodySnapshot
+
+# Subsection models (see nofos.audits.SUBSECTION_MODELS)
+SNAPSHOT_MODELS = {"subsection", "contentguidesubsection"}
+
+
+def get_body_hash(body):
+    return hashlib.sha256((body or "").encode("utf-8")).hexdigest()
+
+
+def make_patch(from_text, to_text):
+    dmp = diff_match_patch()
+    return dmp.patch_toText(dmp.patch_make(from_text or "", to_text or ""))
+
+
+def apply_patch(patch, text):
+    """Apply patch text to `text`. Returns None if it doesn't apply cleanly."""
+    dmp = diff_match_patch()
+    patched, results = dmp.patch_apply(dmp.patch_fromText(patch), text)
+    return patched if all(results) else None
+
+
+def compact_crud_info(crud_info):
+    """
+    Leave the body out of a subsection update event (see the module
+    docstring). Returns the event's details, and the (old, new) body if the
+    body changed, or None.
+    """
+    content_type = ContentType.objects.get_for_id(crud_info["content_type_id"])
+    if (
+        content_type.model not in SNAPSHOT_MODELS
+        or crud_info["event_type"] != CRUDEvent.UPDATE
+    ):
+        return crud_info, None
+
+    crud_info = dict(crud_info)
+    try:
+        objects = json.loads(crud_info["object_json_repr"])
+        for obj in objects:
+            obj.get("fields", {}).pop("body", None)
+        crud_info["object_json_repr"] = json.dumps(objects)
+    except (TypeError, ValueError, AttributeError):
+        pass
+
+    changed_fields = json.loads(crud_info.get("changed_fields") or "null")
+    if not isinstance(changed_fields, dict) or "body" not in changed_fields:
+        return crud_info, None
+
+    old_body, new_body = changed_fields["body"]
+    changed_fields["body"] = None
+    crud_info["changed_fields"] = json.dumps(changed_fields)
+    return crud_info, (old_body, new_body)
+
+
+def build_body_snapshot(event, old_body, new_body):
+    """
+    An unsaved AuditBodySnapshot of an event's new body: a patch from the
+    previous snapshot if the old body is what that snapshot left, otherwise
+    a checkpoint.
+    """
+    object_model = ContentType.objects.get_for_id(event.content_type_id).model
+    object_id = str(event.object_id)
+    previous = (
+        AuditBodySnapshot.objects.filter(object_model=object_model, object_id=object_id)
+        .order_by("-event_id")
+        .only("depth", "body_hash")
+        .first()
+    )
+    snapshot = AuditBodySnapshot(
+        event=event,
+        object_model=object_model,
+        object_id=object_id,
+        body_hash=get_body_hash(new_body),
+    )
+
+    if (
+        previous
+        and previous.body_hash == get_body_hash(old_body)
+        and previous.depth + 1 < settings.AUDIT_SNAPSHOT_CHECKPOINT_EVERY
+    ):
+        snapshot.depth = previous.depth + 1
+        snapshot.patch = make_patch(old_body, new_body)
+    else:
+        snapshot.depth = 0
+        snapshot.body = new_body or ""
+        snapshot.patch = make_patch(new_body, old_body)
+    return snapshot
+
+
+def get_snapshot_bodies(snapshot):
+    """
+    The (old, new) body of a snapshot's event, worked out from its checkpoint
+    and the patches since. Returns None if they can't be (eg, an event in
+    between was deleted).
+    """
+    if snapshot.is_checkpoint:
+        new_body = snapshot.body
+        old_body = apply_patch(snapshot.patch, new_body)
+    else:
+        # The snapshots since the checkpoint, newest first
+        previous = list(
+            AuditBodySnapshot.objects.filter(
+                object_model=snapshot.object_model,
+                object_id=snapshot.object_id,
+                event_id__lt=snapshot.event_id,
+            ).order_by("-event_id")[: snapshot.depth]
+        )
+        if [s.depth for s in previous] != list(range(snapshot.depth - 1, -1, -1)):
+            return None
+
+        # Apply the patches since the checkpoint, oldest first
+        old_body, new_body = None, previous[-1].body
+        for patch in [s.patch for s in reversed(previous[:-1])] + [snapshot.patch]:
+            old_body, new_body = new_body, apply_patch(patch, new_body)
+            if new_body is None:
+                return None
+
+    if old_body is None or new_body is None:
+        return None
+    if get_body_hash(new_body) != snapshot.body_hash:
+        return None
+    return old_body, new_body
+
+
+class CompactSnapshotBackend(ModelBackend):
+    """
+    The easyaudit logging backend: logs subsection updates with compact body
+    snapshots if AUDIT_COMPACT_SNAPSHOTS is on, and everything else as usual.
+    """
+
+    def crud(self, crud_info):
+        if not settings.AUDIT_COMPACT_SNAPSHOTS:
+            return super().crud(crud_info)
+
+        crud_info, bodies = compact_crud_info(crud_info)
+        event = super().crud(crud_info)
+        if bodies:
+            build_body_snapshot(event, *bodies).save()
+        return event
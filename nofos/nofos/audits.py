@@ -1,11 +1,83 @@
+import hashlib
 import json
 import re
 from collections import OrderedDict
+from datetime import timezone
 
+from bloom_nofos.diff_cache import markdown_diff_views
+from bloom_nofos.html_diff import HTML_DIFF_VERSION, has_diff
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
 from django.db.models import Q
 from easyaudit.models import CRUDEvent
 
-from .models import Subsection
+from .audit_snapshots import get_snapshot_bodies
+from .models import (
+    AuditBodySnapshot,
+    AuditEventArchive,
+    AuditEventDiff,
+    AuditEventDocument,
+    Subsection,
+)
+
+# Models whose audit events belong to a document's history, by model name
+DOCUMENT_MODELS = ["nofo", "contentguide", "contentguideinstance"]
+
+# Section models: (app label, model, {document field: document model name})
+SECTION_MODELS = {
+    "section": ("nofos", "Section", {"nofo": "nofo"}),
+    "contentguidesection": (
+        "composer",
+        "ContentGuideSection",
+        {
+            "content_guide": "contentguide",
+            "content_guide_instance": "contentguideinstance",
+        },
+    ),
+}
+
+# Subsection models: (app label, model, section model name)
+SUBSECTION_MODELS = {
+    "subsection": ("nofos", "Subsection", "section"),
+    "contentguidesubsection": (
+        "composer",
+        "ContentGuideSubsection",
+        "contentguidesection",
+    ),
+}
+
+# Updates that only change these fields aren't shown in history. They are either
+# not relevant to the user (e.g. updated, status) or can never be changed after
+# initial update (e.g. filename, conditional_questions).
+HIDDEN_CHANGED_FIELDS = {
+    "updated",
+    "status",
+    "hidden",
+    "optional",
+    "conditional_questions",
+    "filename",
+}
+
+# How custom actions are described in history, after the document's name
+ACTION_LABELS = {
+    "nofo_import": "imported",
+    "nofo_print": "printed",
+    "nofo_reimport": "re-imported",
+}
+
+# Fields of AuditEventDocument that project_audit_event works out
+TIMELINE_FIELDS = [
+    "timeline_key",
+    "minute",
+    "priority",
+    "changed_keys",
+    "action",
+    "action_label",
+    "print_mode",
+    "object_html_id",
+    "is_shown",
+]
 
 
 def deduplicate_audit_events_by_day_and_object(events):
@@ -39,10 +111,13 @@ def remove_model_from_description(description, model_name):
     )
 
 
-def format_audit_event(event, formatting_options=None):
+def format_audit_event(event, formatting_options=None, subsections=None):
     """
     Takes a CRUDEvent and returns a formatted dictionary for display in the UI.
     Includes enhanced labels and object details.
+
+    Uses the event's timeline fields if they were loaded with it, and
+    `subsections` (subsections by id, see format_audit_events) if given.
     """
     BASE_DOCUMENT_TYPES = ["nofo", "contentguide", "contentguideinstance"]
 
@@ -53,6 +128,11 @@ def format_audit_event(event, formatting_options=None):
     SubsectionModel = formatting_options.get("SubsectionModel", Subsection)
     document_display_prefix = formatting_options.get("document_display_prefix", "NOFO")
 
+    changed_fields = safe_get_changed_fields(event)
+    timeline = get_loaded_timeline(event) or AuditEventDocument(
+        **project_audit_event(event, changed_fields)
+    )
+
     event_details = {
         "event_id": event.id,
         "event_type": event.get_event_type_display(),
@@ -61,54 +141,43 @@ def format_audit_event(event, formatting_options=None):
         "user": event.user,
         "timestamp": event.datetime,
         "raw_event": event,
+        "object_html_id": timeline.object_html_id,
     }
 
-    # Get html_id if it's available (safe fallback)
-    try:
-        event_details["object_html_id"] = (
-            json.loads(event.object_json_repr)[0].get("fields", {}).get("html_id", "")
-        )
-    except Exception:
-        event_details["object_html_id"] = ""
-
     # Improve object description for subsection edits
     if event.content_type.model.endswith("subsection"):
-        try:
-            subsection = SubsectionModel.objects.get(id=event.object_id)
+        if subsections is None:
+            try:
+                subsection = SubsectionModel.objects.get(id=event.object_id)
+            except SubsectionModel.DoesNotExist:
+                subsection = None
+        else:
+            subsection = subsections.get(str(event.object_id))
+
+        if subsection:
             name = subsection.name or "#{}".format(subsection.order)
             event_details["object_description"] = f"{subsection.section.name} - {name}"
-        except SubsectionModel.DoesNotExist:
-            pass
 
     # Handle custom audit events
-    changed_fields = safe_get_changed_fields(event)
     if changed_fields:
         event_details["changed_fields"] = changed_fields
         if isinstance(changed_fields, dict):
             # Handle custom actions
-            if "action" in changed_fields:
+            if "action" in timeline.changed_keys:
                 event_details["object_description"] = remove_model_from_description(
                     event_details["object_description"],
                     event.content_type.model,
                 )
-                action = changed_fields["action"]
-                if action == "nofo_import":
-                    event_details["event_type"] = f"{document_display_prefix} imported"
-                elif action == "nofo_print":
-                    event_details["event_type"] = f"{document_display_prefix} printed"
-                    if "print_mode" in changed_fields:
-                        event_details[
-                            "event_type"
-                        ] += f" ({changed_fields['print_mode'][0]} mode)"
-                elif action == "nofo_reimport":
-                    event_details["event_type"] = (
-                        f"{document_display_prefix} re-imported"
+                if timeline.action_label:
+                    event_details["event_type"] = "{} {}".format(
+                        document_display_prefix, timeline.action_label
                     )
 
             # Improve object description for Nofo field changes if changed_fields is not empty
             elif event.content_type.model in BASE_DOCUMENT_TYPES:
-                field_name = next(iter(changed_fields.keys()))
-                event_details["object_description"] = format_name(field_name)
+                event_details["object_description"] = format_name(
+                    timeline.changed_keys[0]
+                )
 
     # Still do event object formatting for "created" (event_type == 1) events
     elif event.event_type == 1:
@@ -121,126 +190,351 @@ def format_audit_event(event, formatting_options=None):
     return event_details
 
 
-def get_audit_events_for_nofo(nofo, reverse=True):
-    return get_audit_events_for_document(
-        nofo,
-        document_model="nofo",
-        section_model="section",
-        subsection_model="subsection",
-        reverse=reverse,
-    )
+def format_audit_events(events, formatting_options=None):
+    """
+    format_audit_event for a list of events, looking up all of their
+    subsections in one query.
+    """
+    formatting_options = formatting_options or {}
+    SubsectionModel = formatting_options.get("SubsectionModel", Subsection)
+
+    subsection_ids = [
+        event.object_id
+        for event in events
+        if event.content_type.model.endswith("subsection")
+    ]
+    try:
+        subsections = {
+            str(subsection.id): subsection
+            for subsection in SubsectionModel.objects.filter(
+                id__in=subsection_ids
+            ).select_related("section")
+        }
+    except (ValueError, ValidationError):
+        # A malformed id: look them up one at a time instead
+        subsections = None
+
+    return [
+        format_audit_event(event, formatting_options, subsections) for event in events
+    ]
+
+
+def get_event_payload(event):
+    """
+    An event's (object_json_repr, changed_fields), from its AuditEventArchive
+    if it was archived.
+    """
+    if event.object_json_repr or event.changed_fields:
+        return event.object_json_repr, event.changed_fields
+    try:
+        return event.archive.get_payload()
+    except AuditEventArchive.DoesNotExist:
+        return event.object_json_repr, event.changed_fields
+
+
+def get_event_fields(event):
+    """
+    The serialized fields in an event's object_json_repr, which are still
+    there after the object itself is deleted. Returns {} if there are none.
+    """
+    try:
+        fields = json.loads(get_event_payload(event)[0])[0].get("fields", {})
+    except Exception:
+        return {}
+    return fields if isinstance(fields, dict) else {}
+
+
+def _get_first_row(model, pk, *fields):
+    """`fields` of the object with this pk, or None (also for malformed pks)."""
+    try:
+        return model.objects.filter(pk=pk).values_list(*fields).first()
+    except (ValueError, ValidationError):
+        return None
+
+
+def is_shown_in_history(event, changed_fields):
+    """
+    False for events that should not be displayed to the user: updates where
+    'changed_fields' is null, or where only hidden fields were changed.
+    """
+    # Include all CREATED/DELETE events
+    if event.event_type != CRUDEvent.UPDATE:
+        return True
+
+    # Exclude UPDATE events with changed fields == 'null'
+    changed_fields_json = get_event_payload(event)[1]
+    if changed_fields_json == "null" or not changed_fields_json:
+        return False
+
+    # Exclude UPDATE events that only changed hidden fields
+    changed_keys = set(changed_fields) if isinstance(changed_fields, dict) else set()
+    return not (changed_keys and changed_keys.issubset(HIDDEN_CHANGED_FIELDS))
+
+
+def get_event_priority(event, changed_fields):
+    """
+    For events in the same minute, the custom event priority:
+        0. nofo_import events
+        1. create events
+        2. update events (and any other events)
+        3. delete events
+    """
+    if (
+        isinstance(changed_fields, dict)
+        and changed_fields.get("action") == "nofo_import"
+    ):
+        return 0
+    if event.event_type == CRUDEvent.CREATE:
+        return 1
+    if event.event_type == CRUDEvent.DELETE:
+        return 3
+    return 2
+
+
+def get_action_label(changed_fields):
+    """How a custom action is described in history, or "" if it isn't one."""
+    if not isinstance(changed_fields, dict):
+        return ""
+
+    label = ACTION_LABELS.get(changed_fields.get("action"), "")
+    if changed_fields.get("action") == "nofo_print" and changed_fields.get(
+        "print_mode"
+    ):
+        label += " ({} mode)".format(changed_fields["print_mode"][0])
+    return label
+
+
+def get_print_mode(changed_fields):
+    """The mode a "nofo_print" event was printed in ("live" or "test"), or ""."""
+    print_mode = changed_fields.get("print_mode")
+    if isinstance(print_mode, list):
+        print_mode = print_mode[0] if print_mode else ""
+    return str(print_mode or "")[:20]
+
+
+def project_audit_event(event, changed_fields=None):
+    """
+    The timeline fields of an AuditEventDocument for an event (see
+    TIMELINE_FIELDS), so its JSON only has to be read once.
+
+    The timeline key sorts events by the minute they happened in, then by
+    priority, then documents before sections before subsections, then by
+    time and id. History shows events in descending order of this key.
+    """
+    if changed_fields is None:
+        changed_fields = safe_get_changed_fields(event)
+    changed_keys = list(changed_fields) if isinstance(changed_fields, dict) else []
+
+    model = ContentType.objects.get_for_id(event.content_type_id).model
+    if model in DOCUMENT_MODELS:
+        model_rank = 2
+    elif model in SECTION_MODELS:
+        model_rank = 1
+    else:
+        model_rank = 0
+
+    priority = get_event_priority(event, changed_fields)
+    dt = event.datetime.astimezone(timezone.utc)
+    minute = dt.replace(second=0, microsecond=0)
+
+    action = changed_fields.get("action") if "action" in changed_keys else ""
+    return {
+        "timeline_key": "{:%Y%m%d%H%M}{}{}{:%S%f}{:020d}".format(
+            minute, priority, model_rank, dt, event.id
+        ),
+        "minute": minute,
+        "priority": priority,
+        "changed_keys": changed_keys,
+        "action": str(action or "")[:50],
+        "action_label": get_action_label(changed_fields)[:100],
+        "print_mode": get_print_mode(changed_fields) if action == "nofo_print" else "",
+        "object_html_id": str(get_event_fields(event).get("html_id") or "")[:511],
+        "is_shown": is_shown_in_history(event, changed_fields),
+    }
 
 
-def get_audit_events_for_document(
-    document, document_model, section_model, subsection_model, reverse=True
-):
+def get_loaded_timeline(event):
     """
-    Return all audit events related to the given NOFO: the NOFO object,
-    its sections, and its subsections.
+    The event's AuditEventDocument if it was loaded along with the event
+    (with select_related), otherwise None. Never runs a query.
     """
+    if not CRUDEvent.document_index.is_cached(event):
+        return None
+    try:
+        return event.document_index
+    except AuditEventDocument.DoesNotExist:
+        return None
+
 
-    def _filter_events(events):
+class AuditEventDocumentResolver:
+    """
+    Works out which document (and section) audit events belong to, from the
+    fields in each event or else from the database. Sections that were looked
+    up are remembered, so resolving many events needs few queries.
+    """
+
+    def __init__(self):
+        self.section_documents = {}
+
+    def get_section_document(self, section_model, section_id, fields=None):
+        """(document model, document id) for a section, or None."""
+        key = (section_model, str(section_id))
+        if key in self.section_documents:
+            return self.section_documents[key]
+
+        app_label, model_name, document_fields = SECTION_MODELS[section_model]
+        values = {name: (fields or {}).get(name) for name in document_fields}
+        if not any(values.values()):
+            row = _get_first_row(
+                apps.get_model(app_label, model_name),
+                section_id,
+                *document_fields,
+            )
+            values = dict(zip(document_fields, row or []))
+
+        document = None
+        for name, document_model in document_fields.items():
+            if values.get(name):
+                document = (document_model, str(values[name]))
+                break
+        self.section_documents[key] = document
+        return document
+
+    def resolve(self, event):
         """
-        Remove events that should not be displayed to the user:
-            - where 'changed_fields' is null
-            - where only excluded fields were changed. These are excluded because they are
-                either not relevant to the user (e.g. updated, status) or can never be
-                changed after initial update (e.g. filename, conditional_questions).
+        (document model, document id, section id) for an event, or None if
+        it isn't part of a document or its document can't be found.
         """
-        EXCLUDED_FIELDS = set(
-            [
-                "updated",
-                "status",
-                "hidden",
-                "optional",
-                "conditional_questions",
-                "filename",
-            ]
+        model = ContentType.objects.get_for_id(event.content_type_id).model
+
+        if model in DOCUMENT_MODELS:
+            return (model, str(event.object_id), "")
+
+        if model in SECTION_MODELS:
+            section_model, section_id = model, event.object_id
+            fields = get_event_fields(event)
+
+        elif model in SUBSECTION_MODELS:
+            app_label, model_name, section_model = SUBSECTION_MODELS[model]
+            section_id = get_event_fields(event).get("section")
+            if not section_id:
+                row = _get_first_row(
+                    apps.get_model(app_label, model_name), event.object_id, "section_id"
+                )
+                section_id = row[0] if row else None
+            if not section_id:
+                return None
+            fields = None
+
+        else:
+            return None
+
+        document = self.get_section_document(section_model, section_id, fields)
+        if not document:
+            return None
+        return (*document, str(section_id))
+
+    def build_index(self, event):
+        """An unsaved AuditEventDocument for an event, or None."""
+        resolved = self.resolve(event)
+        if not resolved:
+            return None
+        document_model, document_id, section_id = resolved
+        return AuditEventDocument(
+            event=event,
+            document_model=document_model,
+            document_id=document_id,
+            section_id=section_id,
+            datetime=event.datetime,
+            **project_audit_event(event),
         )
-        filtered_events = []
-        for event in events:
-            # Include all CREATED/DELETE events
-            if event.event_type != CRUDEvent.UPDATE:
-                filtered_events.append(event)
-                continue
-
-            # Exclude UPDATE events with changed fields == 'null'
-            if event.changed_fields == "null" or not event.changed_fields:
-                continue
-
-            # Exclude UPDATE events that only changed excluded fields
-            changed = safe_get_changed_fields(event)
-            changed_keys = set(changed.keys())
-            if changed_keys and changed_keys.issubset(EXCLUDED_FIELDS):
-                continue
-
-            # Otherwise, include
-            filtered_events.append(event)
-
-        return filtered_events
-
-    # Get audit events for the NOFO
-    document_events = CRUDEvent.objects.filter(
-        object_id=document.id, content_type__model=document_model
-    )
-    document_events = _filter_events(document_events)
 
-    # Get audit events for Sections
-    section_ids = list(document.sections.values_list("id", flat=True))
-    section_events = CRUDEvent.objects.filter(
-        object_id__in=[str(sid) for sid in section_ids],
-        content_type__model=section_model,
+
+def save_audit_event_indexes(indexes):
+    """Save AuditEventDocuments, replacing any already saved for their events."""
+    return AuditEventDocument.objects.bulk_create(
+        indexes,
+        update_conflicts=True,
+        unique_fields=["event"],
+        update_fields=["document_model", "document_id", "section_id", "datetime"]
+        + TIMELINE_FIELDS,
     )
-    section_events = _filter_events(section_events)
 
-    # Get audit events for Subsections (even if they have been deleted)
-    subsection_filter = Q()
-    for section_id in section_ids:
-        subsection_filter |= Q(object_json_repr__contains=str(section_id))
 
-    subsection_events = CRUDEvent.objects.filter(
-        content_type__model=subsection_model
-    ).filter(subsection_filter)
+def index_audit_event(event):
+    """Record which document an audit event belongs to, if it belongs to one."""
+    index = AuditEventDocumentResolver().build_index(event)
+    if index:
+        save_audit_event_indexes([index])
+    return index
 
-    subsection_events = _filter_events(subsection_events)
 
-    # Sort and combine all events. If key datetime is the same, order by event type
-    def sort_key(event):
-        """
-        Sort by datetime first (excluding seconds/ms), then prioritize nofo_import events.
-        When datetime is equal (same minute), nofo_import actions should come first.
-        """
-        # Truncate datetime to minute level (exclude microseconds)
-        dt_truncated = event.datetime.replace(second=0, microsecond=0)
-
-        # For events in the same minute, sort based on custom event priority:
-        # 1. nofo_import events (priority 0)
-        # 2. create events
-        # 3. update events
-        # 4. delete events
-        if event.event_type == CRUDEvent.DELETE:
-            event_priority = 3
-        elif event.event_type == CRUDEvent.UPDATE:
-            event_priority = 2
-        elif event.event_type == CRUDEvent.CREATE:
-            event_priority = 1
+def get_audit_events_for_nofo(nofo, reverse=True):
+    return get_audit_events_for_document(nofo, document_model="nofo", reverse=reverse)
 
-        changed_fields = safe_get_changed_fields(event)
-        if (
-            changed_fields
-            and isinstance(changed_fields, dict)
-            and changed_fields.get("action") == "nofo_import"
-        ):
-            event_priority = 0
-
-        # Return tuple: (datetime_truncated, priority_flag)
-        # Lower priority_flag means higher priority, so comes first in sorting
-        return (dt_truncated, event_priority)
-
-    combined_events = (
-        list(document_events) + list(section_events) + list(subsection_events)
+
+def get_history_events(document, document_model):
+    """
+    The audit events shown in a document's history: events for the document,
+    its current sections and their subsections (even deleted subsections),
+    from the audit document index. Each event comes with its timeline fields.
+    """
+    section_ids = [str(sid) for sid in document.sections.values_list("id", flat=True)]
+    return (
+        CRUDEvent.objects.filter(
+            document_index__document_model=document_model,
+            document_index__document_id=str(document.id),
+            document_index__is_shown=True,
+        )
+        .filter(
+            Q(document_index__section_id="")
+            | Q(document_index__section_id__in=section_ids)
+        )
+        .select_related(
+            "content_type", "document_index", "archive", "diff", "body_snapshot"
+        )
+    )
+
+
+def get_audit_events_for_document(document, document_model, reverse=True):
+    """
+    Return all audit events related to the given document: the document
+    object, its sections, and their subsections. Newest first by default,
+    otherwise in the order they happened.
+    """
+    events = get_history_events(document, document_model)
+    if reverse:
+        return list(events.order_by("-document_index__timeline_key"))
+
+    return list(
+        events.order_by(
+            "document_index__minute", "document_index__priority", "datetime", "id"
+        )
     )
-    return sorted(combined_events, key=sort_key, reverse=reverse)
+
+
+def get_audit_events_page(document, document_model, limit, after=None):
+    """
+    A page of a document's history, newest first, and the cursor for the next
+    page (None if this is the last one).
+
+    Pages are found by timeline key rather than by offset, so each page is one
+    indexed query no matter how long the history is. Pass a page's cursor as
+    `after` to get the events after it.
+    """
+    events = get_history_events(document, document_model).select_related("user")
+    if after:
+        events = events.filter(document_index__timeline_key__lt=after)
+
+    # One extra event, to find out if there are more
+    page = list(events.order_by("-document_index__timeline_key")[: limit + 1])
+    events = page[:limit]
+
+    next_cursor = None
+    if len(page) > limit:
+        # Events that haven't been backfilled yet have no key to page from
+        next_cursor = events[-1].document_index.timeline_key or None
+    return events, next_cursor
 
 
 def get_audit_event_by_id(event_id):
@@ -259,7 +553,107 @@ def safe_get_changed_fields(event):
     Safely parse the changed_fields of a CRUDEvent.
     Returns an empty dict if parsing fails.
     """
+    changed_fields = get_event_payload(event)[1]
     try:
-        return json.loads(event.changed_fields) if event.changed_fields else {}
+        return json.loads(changed_fields) if changed_fields else {}
     except Exception:
         return {}
+
+
+def get_history_diff_hash(inputs):
+    """A hash of what a history diff is worked out from, and of the diff engine."""
+    return hashlib.sha256(
+        json.dumps([HTML_DIFF_VERSION, *inputs]).encode("utf-8")
+    ).hexdigest()
+
+
+def get_history_diff(event, inputs, get_views):
+    """
+    The AuditEventDiff for an event's history compare page.
+
+    It is stored the first time and read back after that, as long as
+    `inputs` (what the diff is worked out from, eg: the old and new body) are
+    the same. `get_views` works out the diff as DiffViews, or returns None
+    if it can't (and then so does this). Degraded diffs (that ran out of
+    time) are returned without being stored.
+    """
+    inputs_hash = get_history_diff_hash(inputs)
+    try:
+        stored = event.diff
+    except AuditEventDiff.DoesNotExist:
+        stored = None
+    if stored and stored.inputs_hash == inputs_hash:
+        return stored
+
+    views = get_views()
+    if views is None:
+        return None
+    diff = AuditEventDiff(event=event, inputs_hash=inputs_hash)
+    diff.has_diff = has_diff(views.combined)
+    diff.diff_old = views.old if diff.has_diff else ""
+    diff.diff_new = views.new if diff.has_diff else ""
+    if views.degraded:
+        return diff
+    # Two people opening the same diff at once both save it
+    AuditEventDiff.objects.bulk_create(
+        [diff],
+        update_conflicts=True,
+        unique_fields=["event"],
+        update_fields=["inputs_hash", "has_diff", "diff_old", "diff_new", "updated"],
+    )
+    event.diff = diff
+    return diff
+
+
+def get_body_snapshot(event):
+    """An event's AuditBodySnapshot, or None (see nofos/audit_snapshots.py)."""
+    try:
+        return event.body_snapshot
+    except AuditBodySnapshot.DoesNotExist:
+        return None
+
+
+def get_changed_body(event):
+    """
+    The (old, new) body of an event that changed a subsection's body, or None
+    if the body didn't change (or, for a compact snapshot, can't be worked out).
+    """
+    changed_fields = safe_get_changed_fields(event)
+    if not isinstance(changed_fields, dict) or "body" not in changed_fields:
+        return None
+
+    if changed_fields["body"] is None:
+        snapshot = get_body_snapshot(event)
+        return get_snapshot_bodies(snapshot) if snapshot else None
+    return changed_fields["body"] or None
+
+
+def get_body_history_diff(event):
+    """
+    get_history_diff for an event that changed a subsection's body, or None
+    if the body didn't change.
+    """
+    changed_fields = safe_get_changed_fields(event)
+    if not isinstance(changed_fields, dict) or "body" not in changed_fields:
+        return None
+
+    if changed_fields["body"] is None:
+        snapshot = get_body_snapshot(event)
+        if not snapshot:
+            return None
+
+        # A snapshot never changes, so its bodies are only worked out once
+        def get_views():
+            bodies = get_changed_body(event)
+            return markdown_diff_views(*bodies) if bodies else None
+
+        return get_history_diff(event, ["body_snapshot", snapshot.body_hash], get_views)
+
+    if not changed_fields["body"]:
+        return None
+    old_body, new_body = changed_fields["body"]
+    return get_history_diff(
+        event,
+        ["body", old_body, new_body],
+        lambda: markdown_diff_views(old_body, new_body),
+    )
@@ -0,0 +1,463 @@
+"""
+Print and export many NOFOs at once, eg before a publication deadline.
+
+A batch renders PDFs (with DocRaptor, using the same options as
+PrintNofoAsPDFView) and/or Word files (with the native DOCX exporter) for
+every matching NOFO. DocRaptor calls wait on the network, so they run in a
+small thread pool that never has more than `concurrency` documents in flight,
+and calls that fail for transient reasons are retried with exponential
+backoff. Building a Word file is CPU-bound, so those run in a pool of
+`processes` processes.
+
+Only the renderer calls run in the pools. Database reads, storage writes and
+audit events all happen on the calling thread, as each file is ready. A NOFO
+is only queued once there is room for it (`concurrency` + `processes` files in
+flight), so only those files are held in memory, however big the batch.
+
+Every file is written to artifact storage under "exports/<batch id>/", next
+to a manifest.json that lists each file (in NOFO order) with its timings.
+
+While a batch runs, its manifest says so ("status": "running"), and is
+written again every BATCH_HEARTBEAT_SECONDS. The batch export page runs
+batches in a background thread of the web worker (start_batch_export): if the
+worker is restarted, the batch goes with it, and once its manifest hasn't been
+updated for BATCH_STALE_SECONDS it is shown as stopped. Big batches are better
+run with `python manage.py batch_export`.
+"""
+
+import io
+import json
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import ExitStack
+from datetime import datetime
+
+import docraptor
+import urllib3
+from bloom_nofos.artifacts import open_artifact, save_artifact
+from bloom_nofos.docx_export import DOCX_CONTENT_TYPE
+from bloom_nofos.docx_writer import build_docx, get_docx_data
+from django.db import connections
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Nofo
+from .printing import (
+    build_docraptor_doc,
+    get_cached_nofo_pdf,
+    get_docraptor_client,
+    get_nofo_pdf_cache_key,
+    get_nofo_pdf_filename,
+    log_pdf_cache_result,
+    store_nofo_pdf,
+)
+from .utils import create_nofo_audit_event
+
+BATCH_FORMATS = ["pdf", "docx"]
+
+BATCH_EXPORT_PREFIX = "exports"
+
+# Defaults for the management command and the superuser page
+BATCH_CONCURRENCY = 4
+BATCH_PROCESSES = 2
+BATCH_RETRIES = 3
+BATCH_BACKOFF = 2.0
+
+# How often a running batch updates its manifest, and how long after the last
+# update a batch is taken to have stopped without finishing
+BATCH_HEARTBEAT_SECONDS = 30
+BATCH_STALE_SECONDS = 5 * 60
+
+logger = logging.getLogger("artifacts")
+
+
+class BatchExportError(RuntimeError):
+    """A document in a batch could not be rendered, even after retrying."""
+
+    def __init__(self, message, attempts=1):
+        super().__init__(message)
+        self.attempts = attempts
+
+
+def get_batch_nofos(statuses=None, groups=None, opdivs=None, ids=None):
+    """The (non-archived) NOFOs matching a batch filter, oldest first."""
+    nofos = Nofo.objects.filter(archived__isnull=True)
+    if ids:
+        nofos = nofos.filter(pk__in=ids)
+    if statuses:
+        nofos = nofos.filter(status__in=statuses)
+    if groups:
+        nofos = nofos.filter(group__in=groups)
+    if opdivs:
+        nofos = nofos.filter(opdiv__in=opdivs)
+    return nofos.order_by("created")
+
+
+def get_batch_document_url(base_url, nofo):
+    """The page DocRaptor prints, the same one as PrintNofoAsPDFView uses."""
+    return base_url.rstrip("/") + reverse("nofos:nofo_view", kwargs={"pk": nofo.id})
+
+
+def new_batch_id():
+    return "{}-{}".format(
+        timezone.now().strftime("%Y%m%d-%H%M%S"), uuid.uuid4().hex[:8]
+    )
+
+
+def get_batch_artifact_key(batch_id, filename):
+    return "{}/{}/{}".format(BATCH_EXPORT_PREFIX, batch_id, filename)
+
+
+def get_batch_manifest(batch_id):
+    """
+    The manifest of a batch, or None if it doesn't exist. Its "status" is
+    "running", "completed" or "failed", or "stopped" for a running batch that
+    hasn't updated its manifest for BATCH_STALE_SECONDS.
+    """
+    stored_file = open_artifact(get_batch_artifact_key(batch_id, "manifest.json"))
+    if not stored_file:
+        return None
+    with stored_file:
+        manifest = json.load(stored_file)
+
+    if manifest.get("status") == "running":
+        updated = datetime.fromisoformat(manifest["updated"])
+        if (timezone.now() - updated).total_seconds() > BATCH_STALE_SECONDS:
+            manifest["status"] = "stopped"
+    return manifest
+
+
+def save_batch_manifest(manifest):
+    """Write a batch's manifest.json, and return its artifact key."""
+    manifest_key = get_batch_artifact_key(manifest["batch_id"], "manifest.json")
+    save_artifact(
+        manifest_key,
+        io.BytesIO(json.dumps(manifest, indent=2).encode("utf-8")),
+        "application/json",
+    )
+    return manifest_key
+
+
+def get_running_manifest(batch_id, started, results=()):
+    """The manifest of a batch that is still running, with its progress so far."""
+    return {
+        "batch_id": batch_id,
+        "status": "running",
+        "started": started.isoformat(),
+        "updated": timezone.now().isoformat(),
+        "completed": len([r for r in results if r and r["status"] == "completed"]),
+        "failed": len([r for r in results if r and r["status"] == "failed"]),
+    }
+
+
+def is_retryable(e):
+    """Rate limits, server errors and dropped connections are worth retrying."""
+    if isinstance(e, docraptor.rest.ApiException):
+        return not e.status or e.status == 429 or e.status >= 500
+    return isinstance(e, (ConnectionError, TimeoutError, urllib3.exceptions.HTTPError))
+
+
+def call_with_retries(func, retries=BATCH_RETRIES, backoff=BATCH_BACKOFF):
+    """
+    Call `func` until it works, retrying transient errors up to `retries`
+    times and waiting `backoff`, then 2 × `backoff`, 4 × `backoff`, … between
+    attempts. Returns (result, attempts, duration in ms).
+    """
+    start = time.perf_counter()
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            result = func()
+            return result, attempts, round((time.perf_counter() - start) * 1000, 2)
+        except Exception as e:
+            if attempts > retries or not is_retryable(e):
+                if isinstance(e, docraptor.rest.ApiException):
+                    message = str(e.body or e.reason or e)
+                else:
+                    message = str(e) or e.__class__.__name__
+                raise BatchExportError(message, attempts=attempts) from e
+            time.sleep(backoff * 2 ** (attempts - 1))
+
+
+def _render_pdf(document_url, is_test_pdf):
+    return get_docraptor_client().create_doc(
+        build_docraptor_doc(document_url, is_test_pdf)
+    )
+
+
+def _build_docx(data):
+    """build_docx in a worker process, with the result call_with_retries gives."""
+    start = time.perf_counter()
+    return build_docx(data), 1, round((time.perf_counter() - start) * 1000, 2)
+
+
+def _submit_docx(pool, nofo):
+    """
+    Queue a Word file for `nofo` in `pool`. If it can't be queued (eg, a worker
+    process died and broke the pool), the future holds the error instead.
+    """
+    try:
+        # Read the database here: pool workers have their own connections
+        return pool.submit(_build_docx, get_docx_data(nofo))
+    except Exception as e:
+        future = Future()
+        future.set_exception(e)
+        return future
+
+
+def _get_docx_filename(nofo):
+    # Same name as a Word download from the export page
+    return "{}.docx".format(nofo.short_name or nofo.title)
+
+
+def run_batch_export(
+    nofos,
+    formats,
+    base_url,
+    user=None,
+    is_test_pdf=True,
+    concurrency=BATCH_CONCURRENCY,
+    processes=BATCH_PROCESSES,
+    retries=BATCH_RETRIES,
+    backoff=BATCH_BACKOFF,
+    filters=None,
+    batch_id=None,
+):
+    """
+    Render every NOFO in `nofos` in each of `formats` ("pdf", "docx").
+
+    PDFs of a NOFO revision that has been printed before come from the PDF
+    cache, new PDFs go into it, and each PDF records a "nofo_print" audit
+    event for that NOFO, as if it had been printed from its own page.
+
+    Returns the manifest, which is also stored as manifest.json.
+    """
+    user = user if (user and user.is_authenticated) else None
+    batch_id = batch_id or new_batch_id()
+    started = timezone.now()
+    start = time.perf_counter()
+
+    results = []
+    futures = {}
+    save_batch_manifest(get_running_manifest(batch_id, started))
+    heartbeat = time.perf_counter()
+    with ExitStack() as stack:
+        threads = stack.enter_context(
+            ThreadPoolExecutor(max_workers=max(concurrency, 1))
+        )
+        # Daemon processes (eg, parallel test runners) are not allowed children
+        docx_pool = threads
+        if processes > 1 and not multiprocessing.current_process().daemon:
+            docx_pool = stack.enter_context(ProcessPoolExecutor(max_workers=processes))
+
+        def beat():
+            # Update the running manifest now and then, even while no file is
+            # ready, so that a slow batch isn't taken for a stopped one
+            nonlocal heartbeat
+            if time.perf_counter() - heartbeat >= BATCH_HEARTBEAT_SECONDS:
+                save_batch_manifest(get_running_manifest(batch_id, started, results))
+                heartbeat = time.perf_counter()
+
+        def drain(limit):
+            """
+            Store each file as soon as it is ready, so it can be let go of,
+            until no more than `limit` are in flight.
+            """
+            while len(futures) > limit:
+                done = wait(
+                    futures,
+                    timeout=BATCH_HEARTBEAT_SECONDS,
+                    return_when=FIRST_COMPLETED,
+                ).done
+                for task in done:
+                    index, nofo, result = futures.pop(task)
+                    results[index] = _finish_task(
+                        batch_id, nofo, result, task, user, is_test_pdf
+                    )
+                beat()
+
+        in_flight = max(concurrency, 1) + max(processes, 1)
+
+        def add(nofo, result, task):
+            results.append(None)
+            if hasattr(task, "read"):
+                results[-1] = _finish_task(
+                    batch_id, nofo, result, task, user, is_test_pdf
+                )
+                beat()
+                return
+            futures[task] = (len(results) - 1, nofo, result)
+            # Wait for room before reading (and queueing) the next NOFO
+            drain(in_flight - 1)
+
+        for nofo in nofos:
+            if "pdf" in formats:
+                cache_key = get_nofo_pdf_cache_key(nofo, is_test_pdf)
+                result = {
+                    "format": "pdf",
+                    "filename": get_nofo_pdf_filename(nofo),
+                    "cache_key": cache_key,
+                }
+                document_url = get_batch_document_url(base_url, nofo)
+                # A stored PDF of this revision needs no rendering at all
+                add(
+                    nofo,
+                    result,
+                    get_cached_nofo_pdf(cache_key)
+                    or threads.submit(
+                        call_with_retries,
+                        lambda url=document_url: _render_pdf(url, is_test_pdf),
+                        retries,
+                        backoff,
+                    ),
+                )
+
+            if "docx" in formats:
+                result = {"format": "docx", "filename": _get_docx_filename(nofo)}
+                add(nofo, result, _submit_docx(docx_pool, nofo))
+
+        drain(0)
+
+    manifest = {
+        "batch_id": batch_id,
+        "status": "completed",
+        "started": started.isoformat(),
+        "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+        "user": user.email if user else None,
+        "filters": filters or {},
+        "formats": [f for f in BATCH_FORMATS if f in formats],
+        "is_test_pdf": is_test_pdf,
+        "concurrency": concurrency,
+        "processes": processes,
+        "completed": len([r for r in results if r["status"] == "completed"]),
+        "failed": len([r for r in results if r["status"] == "failed"]),
+        "results": results,
+    }
+    manifest["manifest_key"] = get_batch_artifact_key(batch_id, "manifest.json")
+    save_batch_manifest(manifest)
+    return manifest
+
+
+def start_batch_export(nofos, formats, base_url, **kwargs):
+    """
+    run_batch_export in a background thread. Returns the batch id straight
+    away, once a "running" manifest has been stored: get_batch_manifest
+    follows the batch from there.
+
+    If the batch fails, a manifest with just the error is stored instead.
+    """
+    batch_id = new_batch_id()
+    started = timezone.now()
+    nofos = list(nofos)
+    save_batch_manifest(get_running_manifest(batch_id, started))
+
+    def run():
+        try:
+            run_batch_export(nofos, formats, base_url, batch_id=batch_id, **kwargs)
+        except Exception as e:
+            logger.exception("Batch export failed", extra={"batch_id": batch_id})
+            save_batch_manifest(
+                {
+                    "batch_id": batch_id,
+                    "status": "failed",
+                    "started": started.isoformat(),
+                    "error": str(e),
+                }
+            )
+
+    run_in_background(run, name="batch-export-" + batch_id)
+    return batch_id
+
+
+def run_in_background(func, name):
+    """Call `func` in a daemon thread, closing its database connections after."""
+
+    def target():
+        try:
+            func()
+        finally:
+            connections.close_all()
+
+    threading.Thread(target=target, name=name, daemon=True).start()
+
+
+def _finish_task(batch_id, nofo, result, task, user, is_test_pdf):
+    """Store one rendered file and fill in its manifest entry."""
+    cache_key = result.pop("cache_key", None)
+    result = {
+        "nofo_id": str(nofo.id),
+        "number": nofo.number,
+        "title": nofo.title,
+        **result,
+        "path": "{}/{}".format(nofo.id, result["filename"].replace("/", "-")),
+        "status": "completed",
+        "cache_hit": None,
+        "attempts": 0,
+        "duration_ms": 0,
+        "error": "",
+    }
+    result["artifact_key"] = get_batch_artifact_key(batch_id, result["path"])
+
+    cache_hit = None
+    if hasattr(task, "read"):
+        fileobj = task
+        cache_hit = True
+    else:
+        try:
+            content, result["attempts"], result["duration_ms"] = task.result()
+        except Exception as e:
+            # Renderer errors (or a broken process pool) fail this file, not the batch
+            if not isinstance(e, BatchExportError):
+                logger.exception(
+                    "Batch export file failed",
+                    extra={"batch_id": batch_id, "nofo_id": str(nofo.id)},
+                )
+            result.update(
+                status="failed",
+                artifact_key="",
+                attempts=getattr(e, "attempts", 1),
+                error=str(e) or e.__class__.__name__,
+            )
+            return result
+        fileobj = io.BytesIO(content)
+
+        if result["format"] == "pdf" and store_nofo_pdf(cache_key, fileobj):
+            cache_hit = False
+        fileobj.seek(0)
+
+    with fileobj:
+        stored = save_artifact(
+            result["artifact_key"],
+            fileobj,
+            "application/pdf" if result["format"] == "pdf" else DOCX_CONTENT_TYPE,
+        )
+    if not stored:
+        result.update(
+            status="failed", artifact_key="", error="Could not write to storage."
+        )
+        return result
+
+    if result["format"] == "pdf":
+        result["cache_hit"] = cache_hit
+        if cache_hit is not None:
+            log_pdf_cache_result(nofo, cache_key, cache_hit, source="batch_export")
+        create_nofo_audit_event(
+            event_type="nofo_print",
+            document=nofo,
+            user=user,
+            is_test_pdf=is_test_pdf,
+            cache_hit=cache_hit,
+        )
+
+    return result
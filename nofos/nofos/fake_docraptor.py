@@ -0,0 +1,172 @@
+"""
+A tiny stand-in for the DocRaptor API, for local development and tests.
+
+It implements just enough of the API for printing NOFOs:
+
+- POST /docs               -> a small (valid) PDF, straight away
+- POST /async_docs         -> {"status_id": "..."}
+- GET  /status/<status_id> -> "working" for a few polls, then "completed"
+- GET  /download/<id>      -> a small (valid) PDF
+
+Point DOCRAPTOR_API_URL at it to print NOFOs without a DocRaptor account:
+
+    python manage.py fake_docraptor --port 8001
+    DOCRAPTOR_API_URL=http://localhost:8001 python manage.py runserver
+"""
+
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_PDF = (
+    b"%PDF-1.4\n"
+    b"1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
+    b"2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj\n"
+    b"3 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >> endobj\n"
+    b"trailer << /Root 1 0 R >>\n"
+    b"%%EOF\n"
+)
+
+
+class FakeDocRaptorHandler(BaseHTTPRequestHandler):
+    server_version = "FakeDocRaptor/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+
+        path = self.path.rstrip("/")
+        if path not in ["/docs", "/async_docs"]:
+            return self._send_json(404, {"message": "Not found"})
+
+        with self.server.lock:
+            self.server.create_requests += 1
+            unavailable = self.server.create_requests <= self.server.unavailable_creates
+
+        if unavailable:
+            return self._send_json(503, {"message": "Service unavailable"})
+
+        if self.server.fail_create:
+            return self._send_json(422, {"message": "Document could not be created"})
+
+        if path == "/docs":
+            with self.server.lock:
+                self.server.docs[str(uuid.uuid4())] = {"polls": 0, "doc": payload}
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(FAKE_PDF)))
+            self.end_headers()
+            self.wfile.write(FAKE_PDF)
+            return
+
+        status_id = str(uuid.uuid4())
+        with self.server.lock:
+            self.server.docs[status_id] = {"polls": 0, "doc": payload}
+        return self._send_json(200, {"status_id": status_id})
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+
+        if len(parts) == 2 and parts[0] == "status":
+            with self.server.lock:
+                doc = self.server.docs.get(parts[1])
+                if doc is None:
+                    return self._send_json(404, {"message": "Not found"})
+                doc["polls"] += 1
+                polls = doc["polls"]
+
+            if self.server.fail_render:
+                return self._send_json(
+                    200,
+                    {
+                        "status": "failed",
+                        "message": "Failed to render",
+                        "validation_errors": "Bad HTML",
+                    },
+                )
+            if polls <= self.server.working_polls:
+                return self._send_json(200, {"status": "working"})
+            return self._send_json(
+                200,
+                {
+                    "status": "completed",
+                    "download_id": parts[1],
+                    "download_url": "{}/download/{}".format(self.server.url, parts[1]),
+                    "number_of_pages": 1,
+                },
+            )
+
+        if len(parts) == 2 and parts[0] == "download":
+            if parts[1] not in self.server.docs:
+                return self._send_json(404, {"message": "Not found"})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(FAKE_PDF)))
+            self.end_headers()
+            self.wfile.write(FAKE_PDF)
+            return
+
+        return self._send_json(404, {"message": "Not found"})
+
+
+class FakeDocRaptorServer(ThreadingHTTPServer):
+    """
+    The fake DocRaptor API, run in a background thread.
+
+    working_polls: how many status checks answer "working" before "completed"
+    fail_create: reject new documents with a 422
+    fail_render: report every document as "failed"
+    unavailable_creates: answer the first few new documents with a 503
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        working_polls=1,
+        fail_create=False,
+        fail_render=False,
+        unavailable_creates=0,
+        verbose=False,
+    ):
+        super().__init__((host, port), FakeDocRaptorHandler)
+        self.working_polls = working_polls
+        self.fail_create = fail_create
+        self.fail_render = fail_render
+        self.unavailable_creates = unavailable_creates
+        self.create_requests = 0
+        self.verbose = verbose
+        self.docs = {}
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
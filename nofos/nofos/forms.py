@@ -1,4 +1,7 @@
+import uuid
+
 from django import forms
+from django.conf import settings
 from martor.fields import MartorFormField
 from users.models import BloomUser
 
@@ -337,6 +340,92 @@ class CheckNOFOLinkSingleForm(forms.Form):
     )
 
 
+def _split_list(value):
+    return [
+        item.strip()
+        for item in (value or "").replace("\n", ",").split(",")
+        if item.strip()
+    ]
+
+
+# Superusers: print or export many NOFOs at once
+class NofoBatchExportForm(forms.Form):
+    statuses = forms.CharField(
+        label="Statuses",
+        required=False,
+        help_text="Comma-separated, eg: “published, review”.",
+    )
+    groups = forms.CharField(
+        label="Groups",
+        required=False,
+        help_text="Comma-separated, eg: “bloom, acf”.",
+    )
+    opdivs = forms.CharField(
+        label="Operating divisions",
+        required=False,
+        help_text="Comma-separated, exactly as written on the NOFOs.",
+    )
+    ids = forms.CharField(
+        label="NOFO IDs",
+        required=False,
+        widget=forms.Textarea(attrs={"rows": 3}),
+        help_text="Comma-separated or one per line.",
+    )
+    formats = forms.ChoiceField(
+        label="Files",
+        choices=[("pdf", "PDF"), ("docx", "Word"), ("pdf,docx", "PDF and Word")],
+        initial="pdf",
+        widget=forms.RadioSelect,
+    )
+    print_mode = forms.ChoiceField(
+        label="PDF mode",
+        choices=[("test", "Test (watermarked)"), ("live", "Live")],
+        initial="test",
+        widget=forms.RadioSelect,
+    )
+
+    def _clean_choices(self, field_name, choices):
+        values = _split_list(self.cleaned_data.get(field_name))
+        allowed = [value for value, _ in choices]
+        invalid = [value for value in values if value not in allowed]
+        if invalid:
+            raise forms.ValidationError(
+                "Unknown value: {}. Choose from: {}.".format(
+                    ", ".join(invalid), ", ".join(allowed)
+                )
+            )
+        return values
+
+    def clean_statuses(self):
+        return self._clean_choices("statuses", STATUS_CHOICES)
+
+    def clean_groups(self):
+        return self._clean_choices("groups", settings.GROUP_CHOICES)
+
+    def clean_opdivs(self):
+        return _split_list(self.cleaned_data.get("opdivs"))
+
+    def clean_ids(self):
+        ids = _split_list(self.cleaned_data.get("ids"))
+        try:
+            return [str(uuid.UUID(nofo_id)) for nofo_id in ids]
+        except ValueError:
+            raise forms.ValidationError("NOFO IDs must be UUIDs.")
+
+    def clean_formats(self):
+        return self.cleaned_data["formats"].split(",")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not any(
+            cleaned_data.get(name) for name in ["statuses", "groups", "opdivs", "ids"]
+        ):
+            raise forms.ValidationError(
+                "Choose at least one status, group, operating division or NOFO ID."
+            )
+        return cleaned_data
+
+
 # Simple form for searching for a NOFO
 class NofoSearchForm(forms.Form):
     query = forms.CharField(
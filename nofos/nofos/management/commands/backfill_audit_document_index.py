@@ -0,0 +1,71 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from easyaudit.models import CRUDEvent
+
+from nofos.audits import (
+    DOCUMENT_MODELS,
+    SECTION_MODELS,
+    SUBSECTION_MODELS,
+    AuditEventDocumentResolver,
+    save_audit_event_indexes,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Add audit events from before the audit document index to it, and work "
+        "out the timeline fields of indexed events that don't have them yet, so "
+        "they show up in document history pages. Safe to run more than once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Events to read and index at a time (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        models = DOCUMENT_MODELS + list(SECTION_MODELS) + list(SUBSECTION_MODELS)
+        content_type_ids = ContentType.objects.filter(model__in=models).values_list(
+            "id", flat=True
+        )
+        events = (
+            CRUDEvent.objects.filter(content_type_id__in=list(content_type_ids))
+            .filter(Q(document_index__isnull=True) | Q(document_index__timeline_key=""))
+            .order_by("id")
+            .only(
+                "id",
+                "content_type_id",
+                "object_id",
+                "object_json_repr",
+                "event_type",
+                "changed_fields",
+                "datetime",
+            )
+        )
+
+        resolver = AuditEventDocumentResolver()
+        indexed = skipped = 0
+        last_id = 0
+        while True:
+            batch = list(events.filter(id__gt=last_id)[: options["batch_size"]])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            rows = [resolver.build_index(event) for event in batch]
+            rows = [row for row in rows if row]
+            save_audit_event_indexes(rows)
+            indexed += len(rows)
+            skipped += len(batch) - len(rows)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Indexed {} audit events ({} not part of a document).".format(
+                    indexed, skipped
+                )
+            )
+        )
@@ -0,0 +1,145 @@
+import json
+
+from constance import config
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from users.models import BloomUser
+
+from nofos.batch_export import (
+    BATCH_BACKOFF,
+    BATCH_CONCURRENCY,
+    BATCH_FORMATS,
+    BATCH_PROCESSES,
+    BATCH_RETRIES,
+    get_batch_nofos,
+    run_batch_export,
+)
+from nofos.models import STATUS_CHOICES
+
+
+class Command(BaseCommand):
+    help = (
+        "Print PDFs and/or export Word files for every NOFO matching a filter. "
+        "Files and a manifest.json are written to artifact storage."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--status",
+            action="append",
+            choices=[value for value, _ in STATUS_CHOICES],
+            help="Only NOFOs with this status (repeatable).",
+        )
+        parser.add_argument(
+            "--group",
+            action="append",
+            choices=[value for value, _ in settings.GROUP_CHOICES],
+            help="Only NOFOs in this group (repeatable).",
+        )
+        parser.add_argument(
+            "--opdiv", action="append", help="Only NOFOs for this OpDiv (repeatable)."
+        )
+        parser.add_argument("--id", action="append", help="A NOFO ID (repeatable).")
+        parser.add_argument(
+            "--format",
+            action="append",
+            choices=BATCH_FORMATS,
+            help="pdf and/or docx (repeatable, default: pdf).",
+        )
+        parser.add_argument(
+            "--base-url",
+            help="Where DocRaptor can reach this site, eg: https://nofo.rodeo",
+        )
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument("--live", action="store_true", help="Print live PDFs.")
+        mode.add_argument("--test", action="store_true", help="Print test PDFs.")
+        parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=BATCH_PROCESSES,
+            help="Processes to build Word files in (1 builds them in threads).",
+        )
+        parser.add_argument("--retries", type=int, default=BATCH_RETRIES)
+        parser.add_argument(
+            "--backoff",
+            type=float,
+            default=BATCH_BACKOFF,
+            help="Seconds to wait before the first retry (doubles every time).",
+        )
+        parser.add_argument(
+            "--user", help="Email of the user to record on nofo_print events."
+        )
+        parser.add_argument("--manifest", help="Also write the manifest to this file.")
+
+    def handle(self, *args, **options):
+        filters = {
+            "statuses": options["status"] or [],
+            "groups": options["group"] or [],
+            "opdivs": options["opdiv"] or [],
+            "ids": options["id"] or [],
+        }
+        filters = {name: values for name, values in filters.items() if values}
+        if not filters:
+            raise CommandError(
+                "Provide at least one --status, --group, --opdiv or --id."
+            )
+
+        formats = options["format"] or ["pdf"]
+        if "pdf" in formats and not options["base_url"]:
+            raise CommandError("--base-url is needed to print PDFs.")
+
+        user = None
+        if options["user"]:
+            user = BloomUser.objects.filter(email=options["user"]).first()
+            if not user:
+                raise CommandError("No user with email {}".format(options["user"]))
+
+        # Same default as the Print button: DOCRAPTOR_LIVE_MODE, unless told otherwise
+        is_test_pdf = not config.DOCRAPTOR_LIVE_MODE
+        if options["live"] or options["test"]:
+            is_test_pdf = options["test"]
+
+        nofos = get_batch_nofos(**filters)
+        self.stdout.write("Exporting {} NOFOs…".format(nofos.count()))
+
+        manifest = run_batch_export(
+            nofos,
+            formats=formats,
+            base_url=options["base_url"] or "",
+            user=user,
+            is_test_pdf=is_test_pdf,
+            concurrency=options["concurrency"],
+            processes=options["processes"],
+            retries=options["retries"],
+            backoff=options["backoff"],
+            filters=filters,
+        )
+
+        for result in manifest["results"]:
+            line = "{}\t{}\t{}\t{} ms\t{}".format(
+                result["nofo_id"],
+                result["format"],
+                result["status"],
+                result["duration_ms"],
+                result["artifact_key"] or result["error"],
+            )
+            if result["status"] == "completed":
+                self.stdout.write(line)
+            else:
+                self.stdout.write(self.style.ERROR(line))
+
+        if options["manifest"]:
+            with open(options["manifest"], "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                "{} files ready, {} failed, in {} ms. Manifest: {}".format(
+                    manifest["completed"],
+                    manifest["failed"],
+                    manifest["duration_ms"],
+                    manifest["manifest_key"],
+                )
+            )
+        )
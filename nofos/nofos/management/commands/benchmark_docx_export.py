@@ -0,0 +1,123 @@
+import json
+import os
+import statistics
+import time
+
+from bloom_nofos.docx_export import get_grabzit_client
+from bloom_nofos.docx_writer import build_docx, get_docx_data
+from bs4 import BeautifulSoup
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from GrabzIt import GrabzItDOCXOptions
+
+from nofos.nofo import (
+    create_nofo,
+    get_sections_from_soup,
+    get_subsections_from_sections,
+    process_nofo_html,
+    resolve_section_heading_level,
+)
+
+FIXTURES_DIR = os.path.join(settings.BASE_DIR, "nofos", "fixtures", "html")
+
+
+def import_fixture(path):
+    with open(path, encoding="utf-8") as f:
+        soup = BeautifulSoup(f.read(), "html.parser")
+
+    top_heading_level = resolve_section_heading_level(soup)
+    soup, _ = process_nofo_html(soup, top_heading_level)
+    sections = get_subsections_from_sections(
+        get_sections_from_soup(soup, top_heading_level), top_heading_level
+    )
+    return create_nofo(os.path.basename(path), sections, opdiv="Benchmark")
+
+
+def time_ms(func, repeat):
+    """Median wall time of `func` in milliseconds, and its last result."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 2), result
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DOCX export latency of the native exporter and GrabzIt "
+        "on the HTML fixtures. Prints JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "fixtures",
+            nargs="*",
+            help="HTML files to convert (default: nofos/fixtures/html/*.html)",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--grabzit",
+            action="store_true",
+            help="Also convert with GrabzIt (needs GRABZIT_APPLICATION_KEY/SECRET).",
+        )
+
+    def handle(self, *args, **options):
+        fixtures = options["fixtures"] or sorted(
+            os.path.join(FIXTURES_DIR, name)
+            for name in os.listdir(FIXTURES_DIR)
+            if name.endswith(".html")
+        )
+        use_grabzit = options["grabzit"] and bool(
+            settings.GRABZIT_APPLICATION_KEY and settings.GRABZIT_APPLICATION_SECRET
+        )
+
+        results = []
+        for path in fixtures:
+            # Imported NOFOs are rolled back so the benchmark leaves no trace
+            with transaction.atomic():
+                nofo = import_fixture(path)
+                data_ms, data = time_ms(lambda: get_docx_data(nofo), options["repeat"])
+                transaction.set_rollback(True)
+
+            build_ms, docx = time_ms(lambda: build_docx(data), options["repeat"])
+            result = {
+                "fixture": os.path.basename(path),
+                "native": {
+                    "get_docx_data_ms": data_ms,
+                    "build_docx_ms": build_ms,
+                    "total_ms": round(data_ms + build_ms, 2),
+                    "bytes": len(docx),
+                },
+                "grabzit": None,
+            }
+
+            if use_grabzit:
+                # The closest we get to the export page without a running server
+                with open(path, encoding="utf-8") as f:
+                    html = f.read()
+                grabzit_ms, content = time_ms(
+                    lambda: self.grabzit_docx(html), options["repeat"]
+                )
+                result["grabzit"] = {"total_ms": grabzit_ms, "bytes": len(content)}
+
+            results.append(result)
+
+        self.stdout.write(
+            json.dumps(
+                {
+                    "benchmark": "docx_export",
+                    "repeat": options["repeat"],
+                    "grabzit": "ran" if use_grabzit else "skipped",
+                    "results": results,
+                },
+                indent=2,
+            )
+        )
+
+    def grabzit_docx(self, html):
+        grabzit = get_grabzit_client()
+        grabzit.HTMLToDOCX(html, GrabzItDOCXOptions.GrabzItDOCXOptions())
+        return grabzit.SaveTo()
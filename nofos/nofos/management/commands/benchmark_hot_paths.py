@@ -0,0 +1,266 @@
+import json
+import os
+import random
+
+from bloom_nofos.diff_cache import DIFF_CACHE_ALIAS
+from bloom_nofos.html_diff import html_diff
+from bs4 import BeautifulSoup
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+
+from nofos.nofo import (
+    create_nofo,
+    find_matches_with_context,
+    get_sections_from_soup,
+    get_subsections_from_sections,
+    parse_uploaded_file_as_html_string,
+    process_nofo_html,
+    resolve_section_heading_level,
+)
+from nofos.nofo_compare import compare_nofos
+from nofos.nofo_markdown import md
+from nofos.views import NofosDetailView
+
+from .benchmark_docx_export import time_ms
+from .benchmark_html_diff import edit, sentence, table
+
+FIXTURES_DIR = os.path.join(settings.BASE_DIR, "nofos", "fixtures")
+
+DOCX_CONTENT_TYPE = (
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+)
+
+STEPS = [
+    "Step 1: Review the Opportunity",
+    "Step 2: Get Ready to Apply",
+    "Step 3: Prepare Your Application",
+    "Step 4: Learn About Review and Award",
+    "Step 5: Submit Your Application",
+]
+
+FIND_TEXT = "narrative"
+
+
+def synthetic_nofo_html(scale, seed=1, edit_rate=0):
+    """
+    NOFO HTML shaped like a Word import: the 5 steps (h1), each with 2 * scale
+    subsections (h2) of paragraphs, a list and every other one a table, with
+    a few h3s. About 12KB at scale 1, 1.2MB at scale 100.
+
+    With an `edit_rate`, that share of the words are changed, dropped or
+    added, but headings stay the same: a later version of the same NOFO.
+    """
+    rng = random.Random(seed)
+    # Edits come from their own generator so both versions have the same shape
+    edit_rng = random.Random(seed + 1)
+
+    def text(length):
+        words = sentence(rng, length)
+        return edit(edit_rng, words, edit_rate) if edit_rate else words
+
+    html = []
+    for step in STEPS:
+        html.append("<h1>{}</h1>".format(step))
+        for i in range(2 * scale):
+            html.append("<h2>{} {}</h2>".format(step.split(":")[0], i + 1))
+            html.extend("<p>{}</p>".format(text(30)) for _ in range(3))
+            html.append(
+                "<ul>{}</ul>".format(
+                    "".join("<li>{}</li>".format(text(8)) for _ in range(4))
+                )
+            )
+            if i % 2:
+                html.append("<h3>Requirements</h3>")
+                html.append(table([[text(5) for _ in range(3)] for _ in range(4)]))
+    return "<html><body>{}</body></html>".format("".join(html))
+
+
+def import_html(html):
+    """process_nofo_html and get_subsections_from_sections, as on import."""
+    soup = BeautifulSoup(html, "html.parser")
+    top_heading_level = resolve_section_heading_level(soup)
+    soup, _ = process_nofo_html(soup, top_heading_level)
+    return get_subsections_from_sections(
+        get_sections_from_soup(soup, top_heading_level), top_heading_level
+    )
+
+
+def create_synthetic_nofo(scale, seed, edit_rate=0):
+    html = synthetic_nofo_html(scale, seed=seed, edit_rate=edit_rate)
+    return create_nofo(
+        "Benchmark NOFO x{}".format(scale), import_html(html), opdiv="Benchmark"
+    )
+
+
+def render_nofo_view(nofo):
+    """The NOFO view page, rendered as for a PDF print."""
+    request = RequestFactory().get("/nofos/{}".format(nofo.pk))
+    request.user = AnonymousUser()
+    response = NofosDetailView.as_view()(request, pk=nofo.pk)
+    return response.render().content
+
+
+def benchmark_parse_docx(options, scale):
+    results = []
+    docx_dir = os.path.join(FIXTURES_DIR, "docx")
+    for name in sorted(os.listdir(docx_dir)):
+        with open(os.path.join(docx_dir, name), "rb") as f:
+            content = f.read()
+
+        ms, html = time_ms(
+            lambda: parse_uploaded_file_as_html_string(
+                SimpleUploadedFile(name, content, content_type=DOCX_CONTENT_TYPE)
+            ),
+            options["repeat"],
+        )
+        results.append({"fixture": name, "ms": ms, "bytes": len(html)})
+    return results
+
+
+def benchmark_import_html(options, scale):
+    results = []
+    if scale == 1:
+        with open(os.path.join(FIXTURES_DIR, "html", "nofo.html")) as f:
+            html = f.read()
+        ms, sections = time_ms(lambda: import_html(html), options["repeat"])
+        results.append({"fixture": "nofo.html", "ms": ms, "sections": len(sections)})
+
+    html = synthetic_nofo_html(scale, seed=options["seed"])
+    ms, sections = time_ms(lambda: import_html(html), options["repeat"])
+    results.append({"fixture": "synthetic", "ms": ms, "sections": len(sections)})
+    return results
+
+
+def benchmark_markdown(options, scale):
+    html = synthetic_nofo_html(scale, seed=options["seed"])
+    body = BeautifulSoup(html, "html.parser").body.decode_contents()
+    ms, markdown = time_ms(lambda: md(body, escape_misc=False), options["repeat"])
+    return [{"ms": ms, "bytes": len(body), "markdown_bytes": len(markdown)}]
+
+
+def benchmark_html_diff(options, scale):
+    original = synthetic_nofo_html(scale, seed=options["seed"])
+    modified = synthetic_nofo_html(scale, seed=options["seed"], edit_rate=0.05)
+    ms, diff = time_ms(lambda: html_diff(original, modified), options["repeat"])
+    return [
+        {
+            "ms": ms,
+            "bytes": len(original),
+            "changes": diff.count("<ins>") + diff.count("<del>"),
+        }
+    ]
+
+
+def benchmark_render_nofo_view(options, scale):
+    # The imported NOFO is rolled back so the benchmark leaves no trace
+    with transaction.atomic():
+        nofo = create_synthetic_nofo(scale, options["seed"])
+        ms, content = time_ms(lambda: render_nofo_view(nofo), options["repeat"])
+        transaction.set_rollback(True)
+    return [{"ms": ms, "bytes": len(content)}]
+
+
+def benchmark_compare_nofos(options, scale):
+    with transaction.atomic():
+        old_nofo = create_synthetic_nofo(scale, options["seed"])
+        new_nofo = create_synthetic_nofo(scale, options["seed"], edit_rate=0.05)
+
+        def compare():
+            # The diff cache is local to this process: start each run empty
+            caches[DIFF_CACHE_ALIAS].clear()
+            return compare_nofos(old_nofo, new_nofo)
+
+        ms, comparison = time_ms(compare, options["repeat"])
+        transaction.set_rollback(True)
+    return [
+        {
+            "ms": ms,
+            "changed_subsections": sum(
+                len(section["subsections"]) for section in comparison
+            ),
+        }
+    ]
+
+
+def benchmark_find_matches(options, scale):
+    with transaction.atomic():
+        nofo = create_synthetic_nofo(scale, options["seed"])
+        ms, matches = time_ms(
+            lambda: find_matches_with_context(nofo, FIND_TEXT), options["repeat"]
+        )
+        transaction.set_rollback(True)
+    return [{"ms": ms, "find_text": FIND_TEXT, "matches": len(matches)}]
+
+
+# Benchmarks that don't depend on the scale run once, at the first one
+UNSCALED = {"parse_docx"}
+
+BENCHMARKS = {
+    "parse_docx": benchmark_parse_docx,
+    "import_html": benchmark_import_html,
+    "markdown": benchmark_markdown,
+    "html_diff": benchmark_html_diff,
+    "render_nofo_view": benchmark_render_nofo_view,
+    "compare_nofos": benchmark_compare_nofos,
+    "find_matches": benchmark_find_matches,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the import, render, diff and compare hot paths on the fixtures "
+        "and on generated NOFOs at different sizes. Prints JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            type=int,
+            action="append",
+            help=(
+                "How many times bigger than the base generated NOFO, 1 to 100 "
+                "(repeatable, default: 1, 10)."
+            ),
+        )
+        parser.add_argument(
+            "--benchmark",
+            action="append",
+            choices=list(BENCHMARKS),
+            help="(repeatable)",
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        scales = options["scale"] or [1, 10]
+        if any(scale < 1 or scale > 100 for scale in scales):
+            raise CommandError("--scale must be between 1 and 100.")
+
+        results = []
+        for name in options["benchmark"] or BENCHMARKS:
+            for scale in scales[:1] if name in UNSCALED else scales:
+                for result in BENCHMARKS[name](options, scale):
+                    results.append(
+                        {
+                            "benchmark": name,
+                            "scale": None if name in UNSCALED else scale,
+                            **result,
+                        }
+                    )
+
+        self.stdout.write(
+            json.dumps(
+                {
+                    "benchmark": "hot_paths",
+                    "repeat": options["repeat"],
+                    "seed": options["seed"],
+                    "results": results,
+                },
+                indent=2,
+            )
+        )
@@ -0,0 +1,137 @@
+import json
+import random
+
+from bloom_nofos.html_diff import html_diff
+from django.core.management.base import BaseCommand
+
+from .benchmark_docx_export import time_ms
+
+WORDS = (
+    "applicants must submit a project narrative budget justification and "
+    "work plan that describes how funds will support eligible activities "
+    "in the service area during the period of performance"
+).split()
+
+
+def sentence(rng, length=12):
+    return " ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + "."
+
+
+def edit(rng, text, rate):
+    """Change, drop or add words in `text`, about `rate` of them."""
+    words = []
+    for word in text.split():
+        roll = rng.random()
+        if roll < rate / 3:
+            continue
+        if roll < 2 * rate / 3:
+            word = rng.choice(WORDS)
+        elif roll < rate:
+            words.append(rng.choice(WORDS))
+        words.append(word)
+    return " ".join(words)
+
+
+def paragraphs_case(rng, scale):
+    old = [sentence(rng, 20) for _ in range(10 * scale)]
+    new = [edit(rng, p, 0.1) if i % 3 == 0 else p for i, p in enumerate(old)]
+    return (
+        "".join(f"<p>{p}</p>" for p in old),
+        "".join(f"<p>{p}</p>" for p in new),
+    )
+
+
+def list_case(rng, scale):
+    old = [sentence(rng, 8) for _ in range(10 * scale)]
+    new = [edit(rng, item, 0.2) for item in old[::2]] + [sentence(rng, 8)]
+    return (
+        "<ul>{}</ul>".format("".join(f"<li>{item}</li>" for item in old)),
+        "<ul>{}</ul>".format("".join(f"<li>{item}</li>" for item in new)),
+    )
+
+
+def table(rows):
+    return "<table><tbody>{}</tbody></table>".format(
+        "".join(
+            "<tr>{}</tr>".format("".join(f"<td>{cell}</td>" for cell in row))
+            for row in rows
+        )
+    )
+
+
+def table_case(rng, scale):
+    old = [[sentence(rng, 6) for _ in range(4)] for _ in range(5 * scale)]
+    new = [[edit(rng, cell, 0.3) for cell in row] for row in old]
+    return table(old), table(new)
+
+
+def pathological_table_case(rng, scale):
+    """Long cells where every word is different: the worst case for char diffs."""
+    old = [[sentence(rng, 150) for _ in range(3)] for _ in range(2 * scale)]
+    new = [[sentence(rng, 150) for _ in range(3)] for _ in range(2 * scale)]
+    return table(old), table(new)
+
+
+CASES = {
+    "paragraphs": paragraphs_case,
+    "list": list_case,
+    "table": table_case,
+    "pathological_table": pathological_table_case,
+}
+
+ENGINES = {
+    # The previous engine: character diffs everywhere, no time budget
+    "char": {"word_level": False, "time_budget": None},
+    "word": {},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time html_diff on generated documents like the html_diff test cases, "
+        "scaled up, with character-level and word-level diffing. Prints JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            type=int,
+            action="append",
+            help="How many times bigger than the base case (repeatable, default: 1, 10).",
+        )
+        parser.add_argument(
+            "--case", action="append", choices=list(CASES), help="(repeatable)"
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        results = []
+        for name in options["case"] or CASES:
+            for scale in options["scale"] or [1, 10]:
+                original, modified = CASES[name](random.Random(options["seed"]), scale)
+                result = {"case": name, "scale": scale, "bytes": len(original)}
+                for engine, kwargs in ENGINES.items():
+                    ms, diff = time_ms(
+                        lambda: html_diff(original, modified, **kwargs),
+                        options["repeat"],
+                    )
+                    result[engine] = {
+                        "ms": ms,
+                        "changes": diff.count("<ins>") + diff.count("<del>"),
+                    }
+                result["speedup"] = round(
+                    result["char"]["ms"] / max(result["word"]["ms"], 0.01), 1
+                )
+                results.append(result)
+
+        self.stdout.write(
+            json.dumps(
+                {
+                    "benchmark": "html_diff",
+                    "repeat": options["repeat"],
+                    "results": results,
+                },
+                indent=2,
+            )
+        )
@@ -0,0 +1,199 @@
+import json
+import random
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from easyaudit.models import CRUDEvent
+from users.exports import export_nofo_report
+from users.models import BloomUser
+
+from nofos.audits import AuditEventDocumentResolver, save_audit_event_indexes
+from nofos.models import Nofo, Section, Subsection
+
+from .benchmark_docx_export import time_ms
+
+GROUP = "benchmark"
+
+
+class QueryCounter:
+    """An execute wrapper that counts queries (the query log only keeps 9000)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def count_edits_per_event(group):
+    """
+    How export_nofo_report counted edits before it was done in the database:
+    every event is read and parsed, with a query per subsection event.
+    """
+    events = CRUDEvent.objects.filter(
+        event_type=CRUDEvent.UPDATE,
+        content_type__model__in=["nofo", "subsection"],
+        user__in=BloomUser.objects.filter(group=group),
+    ).values("user", "object_id", "content_type__model", "changed_fields")
+
+    per_edit_counts = {}
+    for event in events.iterator(chunk_size=2000):
+        if event["content_type__model"] == "nofo":
+            nofo_id = event["object_id"]
+        else:
+            nofo_id = (
+                Subsection.objects.filter(id=event["object_id"])
+                .values_list("section__nofo_id", flat=True)
+                .first()
+            )
+            if not nofo_id:
+                continue
+
+        changed_fields = json.loads(event["changed_fields"])
+        if list(changed_fields) == ["updated"]:
+            continue
+
+        key = (event["user"], str(nofo_id))
+        per_edit_counts[key] = per_edit_counts.get(key, 0) + 1
+    return per_edit_counts
+
+
+def create_audit_table(rng, events, nofos, subsections, users):
+    """Users, NOFOs and `events` indexed update events, like a busy quarter."""
+    users = BloomUser.objects.bulk_create(
+        BloomUser(email="benchmark-{}@example.com".format(i), group=GROUP)
+        for i in range(users)
+    )
+    nofos = Nofo.objects.bulk_create(
+        Nofo(title="Benchmark NOFO {}".format(i), group=GROUP, opdiv="Benchmark")
+        for i in range(nofos)
+    )
+    sections = Section.objects.bulk_create(
+        Section(nofo=nofo, name="Step 1", html_id="step-1", order=1) for nofo in nofos
+    )
+    subsections = Subsection.objects.bulk_create(
+        Subsection(
+            section=section,
+            name="Subsection {}".format(i),
+            html_id="subsection-{}".format(i),
+            order=i + 1,
+            tag="h3",
+        )
+        for section in sections
+        for i in range(subsections)
+    )
+
+    nofo_type = ContentType.objects.get_for_model(Nofo)
+    subsection_type = ContentType.objects.get_for_model(Subsection)
+    resolver = AuditEventDocumentResolver()
+    created = 0
+    while created < events:
+        batch = []
+        for _ in range(min(5000, events - created)):
+            if rng.random() < 0.2:
+                obj, content_type, fields = rng.choice(nofos), nofo_type, {}
+            else:
+                obj = rng.choice(subsections)
+                content_type = subsection_type
+                fields = {"section": str(obj.section_id)}
+
+            if rng.random() < 0.15:
+                changed_fields = {"updated": ["2025-01-01", "2025-01-02"]}
+            else:
+                changed_fields = {"body": ["Old " * 50, "New " * 50]}
+
+            batch.append(
+                CRUDEvent(
+                    event_type=CRUDEvent.UPDATE,
+                    object_id=str(obj.id),
+                    content_type=content_type,
+                    object_repr=str(obj),
+                    object_json_repr=json.dumps([{"fields": fields}]),
+                    changed_fields=json.dumps(changed_fields),
+                    user=rng.choice(users),
+                )
+            )
+
+        # bulk_create skips the signal that indexes new events
+        batch = CRUDEvent.objects.bulk_create(batch)
+        save_audit_event_indexes([resolver.build_index(event) for event in batch])
+        created += len(batch)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the NOFO edits report on a generated audit table (100,000 events "
+        "by default), counting edits in the database and the way it used to "
+        "(event by event). The table is rolled back afterwards. Prints JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=100000)
+        parser.add_argument("--nofos", type=int, default=50)
+        parser.add_argument(
+            "--subsections", type=int, default=40, help="Subsections per NOFO."
+        )
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument(
+            "--skip-previous",
+            action="store_true",
+            help="Don't time the previous, event by event, counting.",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            create_audit_table(
+                random.Random(options["seed"]),
+                options["events"],
+                options["nofos"],
+                options["subsections"],
+                options["users"],
+            )
+            user = BloomUser.objects.filter(group=GROUP).first()
+
+            results = {}
+            queries = QueryCounter()
+            with connection.execute_wrapper(queries):
+                ms, rows = time_ms(
+                    lambda: list(export_nofo_report(None, None, user, group=GROUP)),
+                    options["repeat"],
+                )
+            results["database"] = {
+                "ms": ms,
+                "queries": queries.count // options["repeat"],
+                "rows": len(rows) - 1,
+                "edits": sum(row[-1] for row in rows[1:]),
+            }
+
+            if not options["skip_previous"]:
+                queries = QueryCounter()
+                with connection.execute_wrapper(queries):
+                    ms, counts = time_ms(lambda: count_edits_per_event(GROUP), 1)
+                results["previous"] = {
+                    "ms": ms,
+                    "queries": queries.count,
+                    "rows": len(counts),
+                    "edits": sum(counts.values()),
+                }
+                results["speedup"] = round(ms / max(results["database"]["ms"], 0.01), 1)
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            json.dumps(
+                {
+                    "benchmark": "nofo_report",
+                    "events": options["events"],
+                    "nofos": options["nofos"],
+                    "subsections_per_nofo": options["subsections"],
+                    "users": options["users"],
+                    "repeat": options["repeat"],
+                    "results": results,
+                },
+                indent=2,
+            )
+        )
@@ -0,0 +1,112 @@
+import csv
+import json
+import os
+import time
+
+from compare.bulk import SUMMARY_CSV_HEADER, bulk_compare, get_summary_csv_rows
+from compare.models import CompareDocument
+from compare.utils import get_comparison_csv_filename, get_comparison_csv_rows
+from django.core.management.base import BaseCommand, CommandError
+
+from nofos.models import Nofo
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare a compare document (or a NOFO) with one or more NOFOs. The "
+        "document is loaded once and every NOFO's diffs run in one process "
+        "pool. Comparisons with a compare document are stored for the compare "
+        "pages. Prints a summary of the changes in each NOFO."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("document", help="ID of a compare document or a NOFO.")
+        parser.add_argument("nofos", nargs="+", help="IDs of the NOFOs to compare.")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Processes to diff subsections in (default: one per CPU).",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the results as JSON."
+        )
+        parser.add_argument(
+            "--output-dir",
+            help="Write a summary.csv, and the compare page's CSV for each NOFO, here.",
+        )
+
+    def handle(self, *args, **options):
+        document = (
+            CompareDocument.objects.filter(pk=options["document"]).first()
+            or Nofo.objects.filter(pk=options["document"]).first()
+        )
+        if not document:
+            raise CommandError("No document with ID {}".format(options["document"]))
+
+        nofos = {
+            str(nofo.pk): nofo for nofo in Nofo.objects.filter(pk__in=options["nofos"])
+        }
+        missing = [pk for pk in options["nofos"] if pk not in nofos]
+        if missing:
+            raise CommandError("No NOFOs with IDs {}".format(", ".join(missing)))
+
+        start = time.perf_counter()
+        results = bulk_compare(
+            document,
+            [nofos[pk] for pk in options["nofos"]],
+            workers=options["workers"],
+            parallel_threshold=0,
+        )
+        duration_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        if options["output_dir"]:
+            self.write_csvs(options["output_dir"], document, results)
+
+        summaries = [
+            {
+                "nofo_id": str(result["nofo"].pk),
+                "title": result["nofo"].title,
+                **{
+                    key: value
+                    for key, value in result.items()
+                    if key not in ["nofo", "comparison"]
+                },
+            }
+            for result in results
+        ]
+
+        if options["json"]:
+            self.stdout.write(
+                json.dumps(
+                    {
+                        "document_id": str(document.pk),
+                        "workers": options["workers"],
+                        "duration_ms": duration_ms,
+                        "results": summaries,
+                    },
+                    indent=2,
+                )
+            )
+            return
+
+        for summary in summaries:
+            self.stdout.write(
+                "{nofo_id}\t{duration_ms} ms\t{UPDATE} updated\t{ADD} added\t"
+                "{DELETE} deleted\t{MATCH} unchanged\t"
+                "{missing_strings} missing strings".format(**summary)
+            )
+        self.stdout.write("{} NOFOs in {} ms".format(len(summaries), duration_ms))
+
+    def write_csvs(self, output_dir, document, results):
+        os.makedirs(output_dir, exist_ok=True)
+
+        with open(os.path.join(output_dir, "summary.csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(SUMMARY_CSV_HEADER)
+            writer.writerows(get_summary_csv_rows(results))
+
+        for result in results:
+            filename = get_comparison_csv_filename(document, result["nofo"])
+            with open(os.path.join(output_dir, filename), "w", newline="") as f:
+                csv.writer(f).writerows(get_comparison_csv_rows(result["comparison"]))
@@ -0,0 +1,62 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from easyaudit.models import CRUDEvent
+
+from nofos.audits import SUBSECTION_MODELS, get_body_history_diff
+
+
+class Command(BaseCommand):
+    help = (
+        "Work out and store the body diffs of subsection audit events that "
+        "don't have one yet, so history compare pages don't have to on their "
+        "first visit. Diffs of variable changes are still worked out when "
+        "first viewed. Safe to run more than once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Events to read at a time (default: 500).",
+        )
+
+    def handle(self, *args, **options):
+        content_type_ids = ContentType.objects.filter(
+            model__in=list(SUBSECTION_MODELS)
+        ).values_list("id", flat=True)
+        events = (
+            CRUDEvent.objects.filter(
+                content_type_id__in=list(content_type_ids),
+                event_type=CRUDEvent.UPDATE,
+                diff__isnull=True,
+            )
+            # Archived events have no changed_fields to search, so check them all
+            .filter(Q(changed_fields__contains='"body":') | Q(archive__isnull=False))
+            .select_related("archive")
+            .order_by("id")
+        )
+
+        stored = with_diff = 0
+        last_id = 0
+        while True:
+            batch = list(events.filter(id__gt=last_id)[: options["batch_size"]])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            for event in batch:
+                diff = get_body_history_diff(event)
+                # Degraded diffs (that ran out of time) aren't stored
+                if diff and not diff._state.adding:
+                    stored += 1
+                    with_diff += diff.has_diff
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Stored {} history diffs ({} with visible changes).".format(
+                    stored, with_diff
+                )
+            )
+        )
@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from nofos.audit_retention import (
+    archive_audit_events,
+    compact_audit_events,
+    get_retention_cutoffs,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compact old same-day updates to an object into one event, and move the "
+        "JSON of old audit events into a compressed archive. History pages and "
+        "reports read archived events like any other. Use --dry-run to see "
+        "what would change."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--compact-after",
+            type=int,
+            default=settings.AUDIT_COMPACT_AFTER_DAYS,
+            help="Compact updates older than this many days (default: {}).".format(
+                settings.AUDIT_COMPACT_AFTER_DAYS
+            ),
+        )
+        parser.add_argument(
+            "--archive-after",
+            type=int,
+            default=settings.AUDIT_ARCHIVE_AFTER_DAYS,
+            help="Archive events older than this many days (default: {}).".format(
+                settings.AUDIT_ARCHIVE_AFTER_DAYS
+            ),
+        )
+        parser.add_argument("--skip-compact", action="store_true")
+        parser.add_argument("--skip-archive", action="store_true")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the events that would be compacted and archived.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Events to archive at a time (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        compact_before, archive_before = get_retention_cutoffs(
+            options["compact_after"], options["archive_after"]
+        )
+
+        if not options["skip_compact"]:
+            stats = compact_audit_events(compact_before, dry_run=dry_run)
+            self.stdout.write(
+                "{} {} update events to {} objects before {:%Y-%m-%d} into {} "
+                "(removing {}).".format(
+                    "Would compact" if dry_run else "Compacted",
+                    stats["removed"] + stats["summaries"],
+                    stats["objects"],
+                    compact_before,
+                    stats["summaries"],
+                    stats["removed"],
+                )
+            )
+
+        if not options["skip_archive"]:
+            stats = archive_audit_events(
+                archive_before, dry_run=dry_run, batch_size=options["batch_size"]
+            )
+            if dry_run:
+                self.stdout.write(
+                    "Would archive {} events before {:%Y-%m-%d} ({} characters "
+                    "of JSON).".format(stats["events"], archive_before, stats["size"])
+                )
+            else:
+                self.stdout.write(
+                    "Archived {} events before {:%Y-%m-%d} ({} bytes of JSON, "
+                    "{} compressed).".format(
+                        stats["events"],
+                        archive_before,
+                        stats["size"],
+                        stats["compressed_size"],
+                    )
+                )
+
+        if not dry_run:
+            self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from nofos.fake_docraptor import FakeDocRaptorServer
+
+
+class Command(BaseCommand):
+    help = "Runs a fake DocRaptor API locally, for printing NOFOs without an account."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8001)
+        parser.add_argument(
+            "--working-polls",
+            type=int,
+            default=2,
+            help="How many status checks report 'working' before the PDF is ready.",
+        )
+
+    def handle(self, *args, **options):
+        server = FakeDocRaptorServer(
+            host=options["host"],
+            port=options["port"],
+            working_polls=options["working_polls"],
+            verbose=True,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Fake DocRaptor running at {}. Set DOCRAPTOR_API_URL to use it.".format(
+                    server.url
+                )
+            )
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
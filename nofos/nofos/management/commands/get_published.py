@@ -1,8 +1,10 @@
 import json
 
 from django.core.management.base import BaseCommand
+from django.db.models import Q
 from easyaudit.models import CRUDEvent
 
+from nofos.audits import get_event_payload
 from nofos.models import Nofo
 
 
@@ -46,16 +48,18 @@ class Command(BaseCommand):
 
         # Find all CRUDEvents for this NOFO with a status change to "published"
         events = CRUDEvent.objects.filter(
+            Q(changed_fields__icontains='"status":')  # Look for status changes
+            | Q(archive__isnull=False),  # Archived events are checked one by one
             content_type__model="nofo",
             object_id=nofo_id,
-            changed_fields__icontains='"status":',  # Look for status changes
-        )
+        ).select_related("archive")
 
         published_timestamps = []
 
         for event in events:
             try:
-                changed_fields = json.loads(event.changed_fields)
+                _, changed_fields = get_event_payload(event)
+                changed_fields = json.loads(changed_fields or "{}")
                 if (
                     "status" in changed_fields
                     and isinstance(changed_fields["status"], list)
@@ -0,0 +1,107 @@
+# Generated by Django 6.0.9 on 2026-10-19 06:23
+
+import uuid
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("nofos", "0129_alter_nofo_theme"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PrintJob",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("working", "Working"),
+                            ("completed", "Completed"),
+                            ("failed", "Failed"),
+                        ],
+                        default="queued",
+                        max_length=16,
+                    ),
+                ),
+                (
+                    "is_test_pdf",
+                    models.BooleanField(
+                        default=True, help_text="Test PDFs are free but watermarked."
+                    ),
+                ),
+                (
+                    "mode",
+                    models.CharField(
+                        choices=[
+                            ("attachment", "Download"),
+                            ("inline", "View in browser"),
+                        ],
+                        default="attachment",
+                        help_text="Whether the finished PDF is downloaded or shown in the browser.",
+                        max_length=16,
+                    ),
+                ),
+                (
+                    "docraptor_status_id",
+                    models.CharField(
+                        blank=True,
+                        help_text="The id used to ask DocRaptor about the status of this document.",
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "docraptor_download_id",
+                    models.CharField(
+                        blank=True,
+                        help_text="The id used to download the finished document from DocRaptor.",
+                        max_length=255,
+                    ),
+                ),
+                ("number_of_pages", models.IntegerField(blank=True, null=True)),
+                ("error_message", models.TextField(blank=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+                ("completed", models.DateTimeField(blank=True, null=True)),
+                (
+                    "nofo",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="print_jobs",
+                        to="nofos.nofo",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="The user who asked for this PDF.",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created"],
+            },
+        ),
+    ]
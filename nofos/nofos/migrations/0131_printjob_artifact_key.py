@@ -0,0 +1,30 @@
+# Generated by Django 6.0.9 on 2026-10-19 06:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("nofos", "0130_printjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="printjob",
+            name="artifact_key",
+            field=models.CharField(
+                blank=True,
+                help_text="Where the finished PDF is (or will be) kept in artifact storage.",
+                max_length=512,
+            ),
+        ),
+        migrations.AddField(
+            model_name="printjob",
+            name="cache_hit",
+            field=models.BooleanField(
+                default=False,
+                help_text="This PDF was served from artifact storage instead of being printed again.",
+            ),
+        ),
+    ]
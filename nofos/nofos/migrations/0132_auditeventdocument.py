@@ -0,0 +1,61 @@
+# Generated by Django 6.0.9 on 2026-10-19 09:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "easyaudit",
+            "0004_auto_20170620_1354_squashed_0019_alter_crudevent_changed_fields_and_more",
+        ),
+        ("nofos", "0131_printjob_artifact_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuditEventDocument",
+            fields=[
+                (
+                    "event",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="document_index",
+                        serialize=False,
+                        to="easyaudit.crudevent",
+                    ),
+                ),
+                (
+                    "document_model",
+                    models.CharField(
+                        help_text='The document\'s model, like "nofo" or "contentguideinstance".',
+                        max_length=100,
+                    ),
+                ),
+                ("document_id", models.CharField(max_length=255)),
+                (
+                    "section_id",
+                    models.CharField(
+                        blank=True,
+                        help_text="The section the event is in, if it is for a section or subsection.",
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "datetime",
+                    models.DateTimeField(help_text="When the event happened."),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["document_model", "document_id", "datetime"],
+                        name="audit_event_document_idx",
+                    )
+                ],
+            },
+        ),
+    ]
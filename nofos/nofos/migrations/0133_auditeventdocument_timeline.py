@@ -0,0 +1,88 @@
+# Generated by Django 6.0.9 on 2026-10-19 09:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "easyaudit",
+            "0004_auto_20170620_1354_squashed_0019_alter_crudevent_changed_fields_and_more",
+        ),
+        ("nofos", "0132_auditeventdocument"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="auditeventdocument",
+            name="action",
+            field=models.CharField(
+                blank=True,
+                help_text='The custom action this event records, like "nofo_import".',
+                max_length=50,
+            ),
+        ),
+        migrations.AddField(
+            model_name="auditeventdocument",
+            name="action_label",
+            field=models.CharField(
+                blank=True,
+                help_text='How the action is described in history, like "printed (full mode)".',
+                max_length=100,
+            ),
+        ),
+        migrations.AddField(
+            model_name="auditeventdocument",
+            name="changed_keys",
+            field=models.JSONField(
+                blank=True, default=list, help_text="The names of the changed fields."
+            ),
+        ),
+        migrations.AddField(
+            model_name="auditeventdocument",
+            name="is_shown",
+            field=models.BooleanField(
+                default=True,
+                help_text="False for updates that only changed fields hidden from history.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="auditeventdocument",
+            name="minute",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the event happened, to the minute.",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="auditeventdocument",
+            name="object_html_id",
+            field=models.CharField(blank=True, max_length=511),
+        ),
+        migrations.AddField(
+            model_name="auditeventdocument",
+            name="priority",
+            field=models.PositiveSmallIntegerField(
+                default=2,
+                help_text="Order of events in the same minute: imports, creates, updates, deletes.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="auditeventdocument",
+            name="timeline_key",
+            field=models.CharField(
+                blank=True,
+                help_text="Sorts events in history order: by minute, then priority, then model.",
+                max_length=50,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="auditeventdocument",
+            index=models.Index(
+                fields=["document_model", "document_id", "timeline_key"],
+                name="audit_event_timeline_idx",
+            ),
+        ),
+    ]
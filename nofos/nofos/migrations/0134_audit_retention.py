@@ -0,0 +1,49 @@
+# Generated by Django 6.0.9 on 2026-10-19 10:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "easyaudit",
+            "0004_auto_20170620_1354_squashed_0019_alter_crudevent_changed_fields_and_more",
+        ),
+        ("nofos", "0133_auditeventdocument_timeline"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuditEventArchive",
+            fields=[
+                (
+                    "event",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="archive",
+                        serialize=False,
+                        to="easyaudit.crudevent",
+                    ),
+                ),
+                ("data", models.BinaryField(help_text="zlib-compressed JSON.")),
+                (
+                    "size",
+                    models.PositiveIntegerField(
+                        help_text="Size of the JSON before it was compressed, in bytes."
+                    ),
+                ),
+                ("archived", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="auditeventdocument",
+            name="event_count",
+            field=models.PositiveIntegerField(
+                default=1,
+                help_text="How many edits this event stands for, if others were compacted into it.",
+            ),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.9 on 2026-10-19 10:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "easyaudit",
+            "0004_auto_20170620_1354_squashed_0019_alter_crudevent_changed_fields_and_more",
+        ),
+        ("nofos", "0134_audit_retention"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuditEventDiff",
+            fields=[
+                (
+                    "event",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="diff",
+                        serialize=False,
+                        to="easyaudit.crudevent",
+                    ),
+                ),
+                ("inputs_hash", models.CharField(max_length=64)),
+                (
+                    "has_diff",
+                    models.BooleanField(
+                        help_text="Whether anything visible changed (if not, there is no diff page)."
+                    ),
+                ),
+                ("diff_old", models.TextField(blank=True)),
+                ("diff_new", models.TextField(blank=True)),
+                ("updated", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
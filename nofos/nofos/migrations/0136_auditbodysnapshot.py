@@ -0,0 +1,63 @@
+# Generated by Django 6.0.9 on 2026-10-19 10:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "easyaudit",
+            "0004_auto_20170620_1354_squashed_0019_alter_crudevent_changed_fields_and_more",
+        ),
+        ("nofos", "0135_auditeventdiff"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuditBodySnapshot",
+            fields=[
+                (
+                    "event",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="body_snapshot",
+                        serialize=False,
+                        to="easyaudit.crudevent",
+                    ),
+                ),
+                ("object_model", models.CharField(max_length=50)),
+                ("object_id", models.CharField(max_length=255)),
+                (
+                    "depth",
+                    models.PositiveSmallIntegerField(
+                        help_text="Number of patches since the last checkpoint (0 for a checkpoint)."
+                    ),
+                ),
+                (
+                    "body",
+                    models.TextField(
+                        blank=True, help_text="The full body, for checkpoints."
+                    ),
+                ),
+                (
+                    "patch",
+                    models.TextField(
+                        blank=True,
+                        help_text="diff_match_patch patch text: from the previous body to this one, or for checkpoints, from this body back to the previous one.",
+                    ),
+                ),
+                ("body_hash", models.CharField(max_length=64)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["object_model", "object_id", "event"],
+                        name="audit_body_snapshot_idx",
+                    )
+                ],
+            },
+        ),
+    ]
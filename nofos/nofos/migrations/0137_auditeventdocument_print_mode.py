@@ -0,0 +1,71 @@
+# Generated by Django 6.0.9 on 2026-10-19 11:53
+
+import json
+import zlib
+
+from django.db import migrations, models
+
+
+def get_changed_fields(document):
+    """An indexed event's changed_fields, from its archive if it was archived."""
+    changed_fields = document.event.changed_fields
+    if not changed_fields:
+        archive = getattr(document.event, "archive", None)
+        if archive is None:
+            return {}
+        changed_fields = json.loads(zlib.decompress(bytes(archive.data)))[
+            "changed_fields"
+        ]
+    try:
+        changed_fields = json.loads(changed_fields or "{}")
+    except ValueError:
+        return {}
+    return changed_fields if isinstance(changed_fields, dict) else {}
+
+
+def fill_print_mode(apps, schema_editor):
+    AuditEventDocument = apps.get_model("nofos", "AuditEventDocument")
+    AuditEventArchive = apps.get_model("nofos", "AuditEventArchive")
+
+    documents = AuditEventDocument.objects.filter(action="nofo_print").select_related(
+        "event"
+    )
+    archives = {
+        archive.event_id: archive
+        for archive in AuditEventArchive.objects.filter(
+            event_id__in=documents.values("event_id")
+        )
+    }
+
+    batch = []
+    for document in documents.iterator(chunk_size=1000):
+        document.event.archive = archives.get(document.event_id)
+        print_mode = get_changed_fields(document).get("print_mode") or ""
+        if isinstance(print_mode, list):
+            print_mode = print_mode[0] if print_mode else ""
+        document.print_mode = str(print_mode)[:20]
+        batch.append(document)
+        if len(batch) >= 1000:
+            AuditEventDocument.objects.bulk_update(batch, ["print_mode"])
+            batch = []
+    AuditEventDocument.objects.bulk_update(batch, ["print_mode"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("nofos", "0136_auditbodysnapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="auditeventdocument",
+            name="print_mode",
+            field=models.CharField(
+                blank=True,
+                help_text='For "nofo_print" actions, the mode it was printed in: "live" or "test".',
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(fill_print_mode, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
+import json
 import uuid
+import zlib
 
 import cssutils
 from bloom_nofos.middleware import get_current_user
@@ -10,6 +12,7 @@ from django.forms import ValidationError
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.dateformat import format
+from easyaudit.models import CRUDEvent
 from martor.models import MartorField
 
 from .utils import add_html_id_to_subsection
@@ -847,3 +850,340 @@ class Subsection(BaseSubsection):
     section = models.ForeignKey(
         Section, on_delete=models.CASCADE, related_name="subsections"
     )
+
+
+class PrintJob(models.Model):
+    """
+    An asynchronous PDF render of a NOFO.
+
+    The job is created when a user clicks "Print", and then it is advanced by
+    polling DocRaptor's status API until the document is ready to download.
+    """
+
+    class Meta:
+        ordering = ["-created"]
+
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("working", "Working"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
+
+    MODE_CHOICES = [
+        ("attachment", "Download"),
+        ("inline", "View in browser"),
+    ]
+
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False,
+        unique=True,
+    )
+
+    nofo = models.ForeignKey(
+        Nofo,
+        on_delete=models.CASCADE,
+        related_name="print_jobs",
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        help_text="The user who asked for this PDF.",
+    )
+
+    status = models.CharField(
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default="queued",
+    )
+
+    is_test_pdf = models.BooleanField(
+        default=True,
+        help_text="Test PDFs are free but watermarked.",
+    )
+
+    mode = models.CharField(
+        max_length=16,
+        choices=MODE_CHOICES,
+        default="attachment",
+        help_text="Whether the finished PDF is downloaded or shown in the browser.",
+    )
+
+    docraptor_status_id = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="The id used to ask DocRaptor about the status of this document.",
+    )
+
+    docraptor_download_id = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="The id used to download the finished document from DocRaptor.",
+    )
+
+    number_of_pages = models.IntegerField(null=True, blank=True)
+
+    artifact_key = models.CharField(
+        max_length=512,
+        blank=True,
+        help_text="Where the finished PDF is (or will be) kept in artifact storage.",
+    )
+
+    cache_hit = models.BooleanField(
+        default=False,
+        help_text="This PDF was served from artifact storage instead of being printed again.",
+    )
+
+    error_message = models.TextField(blank=True)
+
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    completed = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return "(PrintJob {}) {}".format(self.id, self.status)
+
+    @property
+    def is_finished(self):
+        return self.status in ["completed", "failed"]
+
+    def get_absolute_url(self):
+        return reverse(
+            "nofos:print_job_detail", kwargs={"pk": self.nofo_id, "job_pk": self.id}
+        )
+
+    def get_status_url(self):
+        return reverse(
+            "nofos:print_job_status", kwargs={"pk": self.nofo_id, "job_pk": self.id}
+        )
+
+    def get_download_url(self):
+        return reverse(
+            "nofos:print_job_download", kwargs={"pk": self.nofo_id, "job_pk": self.id}
+        )
+
+
+class AuditEventDocument(models.Model):
+    """
+    The document (and section) that an audit event belongs to, and how the
+    event shows up in the document's history.
+
+    Events for sections and subsections only point at the section they were
+    in, so without this a document's history means searching the JSON of every
+    subsection event. Rows are added when events are saved (see signals.py),
+    and for older events by `python manage.py backfill_audit_document_index`.
+
+    The timeline fields are worked out from the event's JSON once, so history
+    pages can be filtered, ordered and paged through in the database.
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["document_model", "document_id", "datetime"],
+                name="audit_event_document_idx",
+            ),
+            models.Index(
+                fields=["document_model", "document_id", "timeline_key"],
+                name="audit_event_timeline_idx",
+            ),
+        ]
+
+    event = models.OneToOneField(
+        CRUDEvent,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="document_index",
+    )
+
+    document_model = models.CharField(
+        max_length=100,
+        help_text='The document\'s model, like "nofo" or "contentguideinstance".',
+    )
+    document_id = models.CharField(max_length=255)
+
+    section_id = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="The section the event is in, if it is for a section or subsection.",
+    )
+
+    datetime = models.DateTimeField(help_text="When the event happened.")
+
+    # Timeline fields
+    timeline_key = models.CharField(
+        max_length=50,
+        blank=True,
+        help_text="Sorts events in history order: by minute, then priority, then model.",
+    )
+    minute = models.DateTimeField(
+        null=True, blank=True, help_text="When the event happened, to the minute."
+    )
+    priority = models.PositiveSmallIntegerField(
+        default=2,
+        help_text="Order of events in the same minute: imports, creates, updates, deletes.",
+    )
+    changed_keys = models.JSONField(
+        default=list, blank=True, help_text="The names of the changed fields."
+    )
+    action = models.CharField(
+        max_length=50,
+        blank=True,
+        help_text='The custom action this event records, like "nofo_import".',
+    )
+    action_label = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text='How the action is described in history, like "printed (full mode)".',
+    )
+    print_mode = models.CharField(
+        max_length=20,
+        blank=True,
+        help_text='For "nofo_print" actions, the mode it was printed in: "live" or "test".',
+    )
+    object_html_id = models.CharField(max_length=511, blank=True)
+    is_shown = models.BooleanField(
+        default=True,
+        help_text="False for updates that only changed fields hidden from history.",
+    )
+    event_count = models.PositiveIntegerField(
+        default=1,
+        help_text="How many edits this event stands for, if others were compacted into it.",
+    )
+
+    def __str__(self):
+        return "(AuditEventDocument {}) {} {}".format(
+            self.event_id, self.document_model, self.document_id
+        )
+
+
+class AuditEventArchive(models.Model):
+    """
+    The JSON of an archived audit event (its object_json_repr and
+    changed_fields), compressed.
+
+    Archiving keeps the event itself, so its ID, history and document index
+    stay the same, but empties its JSON columns. Read an event's JSON with
+    nofos.audits.get_event_payload, which looks here for archived events.
+    See nofos/audit_retention.py.
+    """
+
+    event = models.OneToOneField(
+        CRUDEvent,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="archive",
+    )
+    data = models.BinaryField(help_text="zlib-compressed JSON.")
+    size = models.PositiveIntegerField(
+        help_text="Size of the JSON before it was compressed, in bytes."
+    )
+    archived = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def for_event(cls, event):
+        """An unsaved archive of an event's JSON."""
+        data = json.dumps(
+            {
+                "object_json_repr": event.object_json_repr,
+                "changed_fields": event.changed_fields,
+            }
+        ).encode("utf-8")
+        return cls(event=event, data=zlib.compress(data, 9), size=len(data))
+
+    def get_payload(self):
+        """The event's (object_json_repr, changed_fields)."""
+        data = json.loads(zlib.decompress(bytes(self.data)))
+        return data["object_json_repr"], data["changed_fields"]
+
+    def __str__(self):
+        return "(AuditEventArchive {}) {} bytes".format(self.event_id, self.size)
+
+
+class AuditEventDiff(models.Model):
+    """
+    The side-by-side diff shown on an audit event's history compare page.
+
+    Audit events don't change, so the diff is worked out once (on the first
+    visit, or by `python manage.py cache_history_diffs`) and read back after
+    that. `inputs_hash` is a hash of what it was worked out from and of the
+    diff engine version: if those change, it is worked out again.
+    See nofos.audits.get_history_diff.
+    """
+
+    event = models.OneToOneField(
+        CRUDEvent,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="diff",
+    )
+    inputs_hash = models.CharField(max_length=64)
+    has_diff = models.BooleanField(
+        help_text="Whether anything visible changed (if not, there is no diff page)."
+    )
+    diff_old = models.TextField(blank=True)
+    diff_new = models.TextField(blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return "(AuditEventDiff {})".format(self.event_id)
+
+
+class AuditBodySnapshot(models.Model):
+    """
+    The body of a subsection after an audit event, when compact audit
+    snapshots are on (AUDIT_COMPACT_SNAPSHOTS). The event itself then has
+    no copy of the body: "body" is null in its changed_fields.
+
+    Most snapshots are a patch from the previous snapshot of the same
+    subsection (`depth` counts them since the last checkpoint). Every
+    AUDIT_SNAPSHOT_CHECKPOINT_EVERY edits, or when a snapshot can't follow
+    on from the previous one, a checkpoint (depth 0) keeps the full body,
+    with a patch back to the body before the edit.
+
+    Read the bodies with nofos.audit_snapshots.get_snapshot_bodies.
+    """
+
+    event = models.OneToOneField(
+        CRUDEvent,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="body_snapshot",
+    )
+    object_model = models.CharField(max_length=50)
+    object_id = models.CharField(max_length=255)
+    depth = models.PositiveSmallIntegerField(
+        help_text="Number of patches since the last checkpoint (0 for a checkpoint)."
+    )
+    body = models.TextField(blank=True, help_text="The full body, for checkpoints.")
+    patch = models.TextField(
+        blank=True,
+        help_text=(
+            "diff_match_patch patch text: from the previous body to this one, or "
+            "for checkpoints, from this body back to the previous one."
+        ),
+    )
+    body_hash = models.CharField(max_length=64)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["object_model", "object_id", "event"],
+                name="audit_body_snapshot_idx",
+            ),
+        ]
+
+    @property
+    def is_checkpoint(self):
+        return self.depth == 0
+
+    def __str__(self):
+        return "(AuditBodySnapshot {}) {} {}".format(
+            self.event_id, self.object_model, self.object_id
+        )
@@ -1152,37 +1152,35 @@ def get_step_2_section(nofo):
     Retrieves the section that either contains 'Step 2' in its name,
     or falls back to the section with order=2. If neither exist, returns None.
     """
-    sections = nofo.sections.all()
+    # In order, and prefetched if the view prefetched them
+    sections = list(nofo.sections.all())
 
     # Try to get section containing "Step 2" (case-insensitive)
-    step_2_section = sections.filter(name__icontains="Step 2").first()
+    step_2_section = next(
+        (section for section in sections if "step 2" in section.name.lower()), None
+    )
 
     # If no match, try to get section with order=2
     if not step_2_section:
-        step_2_section = sections.filter(order=2).first()
+        step_2_section = next(
+            (section for section in sections if section.order == 2), None
+        )
 
     return step_2_section  # Returns None if nothing matches
 
 
-def _get_next_subsection(section, subsection, with_tag=False):
+def _get_next_subsection(subsections, index, with_tag=False):
     """
-    Recursively find the next subsection in the given section based on the order.
-    Optionally requires that the subsection has a non-empty tag.
+    Find the subsection after subsections[index], in a section's subsections
+    (in order). Optionally requires that the subsection has a non-empty tag.
 
     Returns:
         Subsection or None: The next subsection that meets the criteria or None if no such subsection exists.
     """
-    next_subsection = (
-        section.subsections.filter(order__gt=subsection.order).order_by("order").first()
-    )
-
-    if not next_subsection:
-        return None
-
-    if with_tag and not next_subsection.tag:
-        return _get_next_subsection(section, next_subsection, with_tag=True)
-    else:
-        return next_subsection
+    for next_subsection in subsections[index + 1 :]:
+        if next_subsection.tag or not with_tag:
+            return next_subsection
+    return None
 
 
 def find_same_or_higher_heading_levels_consecutive(nofo):
@@ -1190,11 +1188,12 @@ def find_same_or_higher_heading_levels_consecutive(nofo):
     This function will identify any headings that immediately follow each other (no subsection.body) and are the same level
     """
     same_or_higher_heading_levels = []
-    for section in nofo.sections.all().order_by("order"):
-        for subsection in section.subsections.all().order_by("order"):
+    for section in nofo.sections.all():
+        subsections = list(section.subsections.all())
+        for index, subsection in enumerate(subsections):
             # check if no body
             if not subsection.body.strip():
-                next_subsection = _get_next_subsection(section, subsection)
+                next_subsection = _get_next_subsection(subsections, index)
 
                 if next_subsection and subsection.name and next_subsection.name:
                     # Checking tag levels
@@ -1240,12 +1239,12 @@ def find_incorrectly_nested_heading_levels(nofo):
     }
 
     incorrectly_nested_heading_levels = []
-    for section in nofo.sections.all().order_by("order"):
-        subsections = section.subsections.all().order_by("order")
+    for section in nofo.sections.all():
+        subsections = list(section.subsections.all())
 
         if subsections:
             # check that first subsection is not incorrectly nested
-            first_subsection = subsections.first()
+            first_subsection = subsections[0]
             if first_subsection and first_subsection.tag in incorrect_levels["h2"]:
                 incorrectly_nested_heading_levels.append(
                     {
@@ -1258,9 +1257,9 @@ def find_incorrectly_nested_heading_levels(nofo):
                 )
 
             # check the rest of the subsections
-            for subsection in subsections:
+            for index, subsection in enumerate(subsections):
                 next_subsection = _get_next_subsection(
-                    section, subsection, with_tag=True
+                    subsections, index, with_tag=True
                 )
 
                 if next_subsection:
@@ -1515,9 +1514,9 @@ def find_external_links(nofo, with_status=False):
     """
     all_links = []
 
-    sections = nofo.sections.all().order_by("order")
+    sections = nofo.sections.all()
     for section in sections:
-        subsections = section.subsections.all().order_by("order")
+        subsections = section.subsections.all()
 
         for subsection in subsections:
             soup = BeautifulSoup(
@@ -1590,8 +1589,8 @@ def find_broken_links(nofo):
     broken_links = []
     all_ids = _get_all_id_attrs_for_nofo(nofo)
 
-    for section in nofo.sections.all().order_by("order"):
-        for subsection in section.subsections.all().order_by("order"):
+    for section in nofo.sections.all():
+        for subsection in section.subsections.all():
 
             soup = BeautifulSoup(
                 markdown.markdown(subsection.body, extensions=["extra"]), "html.parser"
@@ -1636,12 +1635,13 @@ def get_side_nav_links(nofo):
             ...
         ]
     """
-    if nofo.sections.count() == 0:
+    sections = nofo.sections.all()
+    if not sections:
         return []
 
     side_nav_links = [{"id": "summary-box-key-information", "name": "NOFO Summary"}]
 
-    for section in nofo.sections.all().order_by("order"):
+    for section in sections:
         side_nav_links.append({"id": section.html_id, "name": section.name})
 
     return side_nav_links
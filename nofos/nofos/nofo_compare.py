@@ -1,15 +1,31 @@
+import multiprocessing
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
+from functools import partial
 from typing import List, Literal, Optional
 
-from bloom_nofos.html_diff import has_diff, html_diff
+from bloom_nofos.diff_cache import (
+    cached_html_diff,
+    get_diff_cache_key,
+    html_diff_views,
+    markdown_diff_views,
+    prime_diff_cache,
+)
+from bloom_nofos.html_diff import diff_deadline, get_diff_deadline, has_diff
+from bloom_nofos.required_strings import RequiredStrings, get_required_strings
 from bs4 import BeautifulSoup
+from django.conf import settings
 from django.utils.html import escape
-from martor.utils import markdownify
 
 from .models import Nofo, Section
 from .nofo import decompose_empty_tags
 
+# Bump this when compare_nofos or annotate_side_by_side_diffs return different
+# results for the same documents, so that stored comparisons are recomputed
+COMPARE_ENGINE_VERSION = "3"
+
 
 @dataclass
 class SubsectionDiff:
@@ -25,15 +41,22 @@ class SubsectionDiff:
     old_diff: Optional[str] = None  # just the diff for the "old" document
     new_diff: Optional[str] = None  # just the diff for the "new" document
     diff_strings: List[str] = field(default_factory=list)
+    missing_strings: List[str] = field(
+        default_factory=list
+    )  # diff_strings not found in the new document
     tag: Optional[str] = ""  # metadata diffs don't have a tag (eg, nofo.number)
     html_id: Optional[str] = ""  # metadata diffs don't have an id
     index_number: Optional[int] = 0  # used for numbering the changes in the final diff
+    degraded: bool = False  # the diff ran out of time (see html_diff.DiffViews)
 
 
 def find_matching_subsection(new_subsection, old_subsections, matched_ids):
     """
     Attempts to find an unmatched old subsection that matches the given new subsection.
     Returns the matched subsection or None.
+
+    This asks the database about every candidate, so compare_sections uses a
+    SubsectionIndex instead.
     """
     for old_subsection in old_subsections:
         if old_subsection.id in matched_ids:
@@ -43,6 +66,115 @@ def find_matching_subsection(new_subsection, old_subsections, matched_ids):
     return None
 
 
+def index_subsection_names(subsections):
+    """
+    Returns the positions of named subsections, by name, and the positions of
+    unnamed subsections, for SubsectionIndex.
+    """
+    by_name = {}
+    unnamed = []
+    for position, subsection in enumerate(subsections):
+        if subsection.name:
+            by_name.setdefault(subsection.name, []).append(position)
+        else:
+            unnamed.append(position)
+    return by_name, unnamed
+
+
+class SubsectionIndex:
+    """
+    Matches the subsections of a new section against the subsections of an old
+    section, following the same rules as BaseSubsection.is_matching_subsection,
+    but in memory.
+
+    Old subsections are indexed by name (see index_subsection_names), and both
+    sections are kept as ordered lists so that the previous/next subsections
+    used to anchor unnamed subsections are just neighbouring positions.
+    """
+
+    def __init__(
+        self, old_section, new_section, old_subsections, new_subsections, names=None
+    ):
+        self.old_subsections = old_subsections
+        self.new_subsections = new_subsections
+        self.new_positions = {s.id: i for i, s in enumerate(new_subsections)}
+
+        # Subsections in the same document or in differently named sections never match
+        self.can_match = bool(
+            old_section
+            and old_section.name == new_section.name
+            and old_section.get_document().id != new_section.get_document().id
+        )
+
+        self.by_name, self.unnamed = names or index_subsection_names(old_subsections)
+
+    def _are_adjacent_matching(self, new_position, old_position, step):
+        """Walk both sections in one direction until a pair of named subsections."""
+        while True:
+            new_position += step
+            old_position += step
+            new_adjacent = self._get(self.new_subsections, new_position)
+            old_adjacent = self._get(self.old_subsections, old_position)
+
+            if not new_adjacent and not old_adjacent:
+                return True
+
+            if bool(new_adjacent) != bool(old_adjacent):
+                return False
+
+            if new_adjacent.name and old_adjacent.name:
+                return new_adjacent.name == old_adjacent.name
+
+    @staticmethod
+    def _get(subsections, position):
+        return subsections[position] if 0 <= position < len(subsections) else None
+
+    def is_matching(self, new_position, old_position):
+        new_subsection = self.new_subsections[new_position]
+        old_subsection = self.old_subsections[old_position]
+
+        if new_subsection.name and old_subsection.name:
+            return new_subsection.name == old_subsection.name
+
+        return self._are_adjacent_matching(
+            new_position, old_position, -1
+        ) and self._are_adjacent_matching(new_position, old_position, 1)
+
+    def find_match(self, new_subsection, matched_ids):
+        """
+        Returns the first unmatched old subsection that matches, like
+        find_matching_subsection, or None.
+        """
+        if not self.can_match:
+            return None
+
+        new_position = self.new_positions[new_subsection.id]
+
+        if new_subsection.name:
+            # A named subsection matches the first unmatched one with its name,
+            # unless an earlier unnamed subsection matches by adjacency
+            named = next(
+                (
+                    position
+                    for position in self.by_name.get(new_subsection.name, [])
+                    if self.old_subsections[position].id not in matched_ids
+                ),
+                None,
+            )
+            candidates = [p for p in self.unnamed if named is None or p < named]
+            if named is not None:
+                candidates.append(named)
+        else:
+            candidates = range(len(self.old_subsections))
+
+        for old_position in candidates:
+            if self.old_subsections[old_position].id in matched_ids:
+                continue
+            if self.is_matching(new_position, old_position):
+                return self.old_subsections[old_position]
+        return None
+
+
 def get_subsection_name_or_order(subsection):
     return subsection.name or "(#{})".format(subsection.order)
 
@@ -77,7 +209,25 @@ def result_match(original_subsection):
     return add_content_guide_comparison_metadata(result, original_subsection)
 
 
-def result_update(original_subsection, new_subsection):
+def get_markdown_diff_views(old_body, new_body, diffs=None):
+    """
+    markdown_diff_views, or the DiffViews already in `diffs` (from
+    run_diffs_in_parallel) for these two bodies.
+    """
+    if diffs and (old_body, new_body) in diffs:
+        return diffs[(old_body, new_body)]
+    return markdown_diff_views(old_body, new_body)
+
+
+def result_update(original_subsection, new_subsection, views=None):
+    """
+    An UPDATE for two matched subsections. `views` is the diff of their
+    (stripped) bodies, if compare_sections already has it.
+    """
+    if views is None:
+        views = markdown_diff_views(
+            original_subsection.body.strip(), new_subsection.body.strip()
+        )
     result = SubsectionDiff(
         name=get_subsection_name_or_order(original_subsection),
         section=original_subsection.section,
@@ -86,10 +236,7 @@ def result_update(original_subsection, new_subsection):
         status="UPDATE",
         old_value=original_subsection.body,
         new_value=new_subsection.body,
-        diff=html_diff(
-            markdownify(original_subsection.body), markdownify(new_subsection.body)
-        )
-        or "",
+        **get_diff_fields(views),
         tag=new_subsection.tag,
         html_id=new_subsection.html_id,
     )
@@ -108,13 +255,13 @@ def result_merged_update(
         status="UPDATE",
         old_value=old_value,
         new_value=new_value,
-        diff=html_diff(markdownify(old_value), markdownify(new_value)),
+        **get_diff_fields(markdown_diff_views(old_value, new_value)),
         diff_strings=old_subsection.diff_strings or [],
         html_id=html_id,
     )
 
 
-def result_add(new_subsection):
+def result_add(new_subsection, diffs=None):
     return SubsectionDiff(
         name=get_subsection_name_or_order(new_subsection),
         section=new_subsection.section,
@@ -123,22 +270,22 @@ def result_add(new_subsection):
         status="ADD",
         old_value="",
         new_value=new_subsection.body,
-        diff=html_diff("", markdownify(new_subsection.body)) or "",
+        **get_diff_fields(get_markdown_diff_views("", new_subsection.body, diffs)),
         tag=new_subsection.tag,
         html_id=new_subsection.html_id,
     )
 
 
-def result_delete(old_subsection):
+def result_delete(old_subsection, diffs=None):
     result = SubsectionDiff(
-        name=html_diff(get_subsection_name_or_order(old_subsection), ""),
+        name=cached_html_diff(get_subsection_name_or_order(old_subsection), ""),
         section=old_subsection.section,
         old_name=get_subsection_name_or_order(old_subsection),
         new_name="",
         status="DELETE",
         old_value=old_subsection.body,
         new_value="",
-        diff=html_diff(markdownify(old_subsection.body), "") or "",
+        **get_diff_fields(get_markdown_diff_views(old_subsection.body, "", diffs)),
         tag=old_subsection.tag,
         html_id=old_subsection.html_id,
     )
@@ -150,29 +297,29 @@ def contains_required_strings(diff_strings, body):
     Returns True if all required strings (normalized) are found in the normalized body.
     """
 
-    def normalize_whitespace(text):
-        return re.sub(r"\s+", " ", text.strip())
-
-    normalized_body = normalize_whitespace(body).lower()
-    for string in diff_strings:
-        if normalize_whitespace(string).lower() not in normalized_body:
-            return False
-    return True
+    return not get_required_strings(diff_strings).find_missing(body)
 
 
-def compare_sections(old_section, new_section):
+def match_subsections(old_section, new_section, names=None):
     """
-    Compares all subsections in a pair of NOFO sections.
-    Returns a dict with:
-        - section name
-        - comparison result for each subsection
+    Pairs up the subsections in a pair of NOFO sections, in the order they are
+    reported. Returns a list of (old subsection, new subsection) tuples:
+        - (old, new) for subsections that match
+        - (None, new) for added subsections
+        - (old, None) for deleted subsections
+
+    `names` is index_subsection_names for the old section, if already built.
     """
     # Get all subsections for comparison
     new_subsections = list(new_section.subsections.all())
     old_subsections = list(old_section.subsections.all()) if old_section else []
 
+    index = SubsectionIndex(
+        old_section, new_section, old_subsections, new_subsections, names=names
+    )
+
     matched_subsections = set()
-    subsections = []
+    pairs = []
 
     old_index = 0
     new_index = 0
@@ -181,9 +328,7 @@ def compare_sections(old_section, new_section):
         new_sub = new_subsections[new_index]
 
         # Try to find a matching old subsection
-        matched_old = find_matching_subsection(
-            new_sub, old_subsections, matched_subsections
-        )
+        matched_old = index.find_match(new_sub, matched_subsections)
 
         if matched_old:
             # Flush any unmatched old subsections that come BEFORE this match
@@ -193,26 +338,18 @@ def compare_sections(old_section, new_section):
             ):
                 old_sub = old_subsections[old_index]
                 if old_sub.id not in matched_subsections:
-                    subsections.append(result_delete(old_sub))
+                    pairs.append((old_sub, None))
                     matched_subsections.add(old_sub.id)
                 old_index += 1
 
             # Now handle the matched pair
             matched_subsections.update([new_sub.id, matched_old.id])
-            if has_diff(
-                html_diff(
-                    markdownify(matched_old.body.strip()),
-                    markdownify(new_sub.body.strip()),
-                )
-            ):
-                subsections.append(result_update(matched_old, new_sub))
-            else:
-                subsections.append(result_match(matched_old))
+            pairs.append((matched_old, new_sub))
 
             old_index += 1
         else:
             # ADD (no matching old subsection)
-            subsections.append(result_add(new_sub))
+            pairs.append((None, new_sub))
             matched_subsections.add(new_sub.id)
 
         new_index += 1
@@ -221,10 +358,44 @@ def compare_sections(old_section, new_section):
     while old_index < len(old_subsections):
         old_sub = old_subsections[old_index]
         if old_sub.id not in matched_subsections:
-            subsections.append(result_delete(old_sub))
+            pairs.append((old_sub, None))
             matched_subsections.add(old_sub.id)
         old_index += 1
 
+    return pairs
+
+
+def compare_sections(old_section, new_section, pairs=None, diffs=None):
+    """
+    Compares all subsections in a pair of NOFO sections.
+    Returns a dict with:
+        - section name
+        - comparison result for each subsection
+
+    `pairs` are the subsections from match_subsections, if already matched,
+    and `diffs` the diffs from run_diffs_in_parallel, if already run.
+    """
+    if pairs is None:
+        pairs = match_subsections(old_section, new_section)
+
+    subsections = []
+    for old_sub, new_sub in pairs:
+        if not new_sub:
+            subsections.append(result_delete(old_sub, diffs))
+            continue
+        if not old_sub:
+            subsections.append(result_add(new_sub, diffs))
+            continue
+
+        # Imported bodies end in a newline: diff them stripped, and only once
+        views = get_markdown_diff_views(
+            old_sub.body.strip(), new_sub.body.strip(), diffs
+        )
+        if has_diff(views.combined):
+            subsections.append(result_update(old_sub, new_sub, views))
+        else:
+            subsections.append(result_match(old_sub))
+
     return {
         "name": new_section.name,
         "html_id": new_section.html_id,
@@ -232,6 +403,61 @@ def compare_sections(old_section, new_section):
     }
 
 
+def get_diff_jobs(pairs):
+    """
+    The markdown diffs that compare_sections will run for some matched
+    subsections, as (old body, new body) tuples.
+    """
+    jobs = []
+    for old_sub, new_sub in pairs:
+        if not new_sub:
+            jobs.append((old_sub.body, ""))
+        elif not old_sub:
+            jobs.append(("", new_sub.body))
+        else:
+            old_body, new_body = old_sub.body.strip(), new_sub.body.strip()
+            if old_body != new_body:
+                jobs.append((old_body, new_body))
+    return jobs
+
+
+def _run_diff_job(job, deadline=None):
+    """Run one diff job in a worker process, by the diff_deadline of the caller."""
+    with diff_deadline(deadline):
+        return markdown_diff_views(*job)
+
+
+def run_diffs_in_parallel(pairs, workers, threshold=0):
+    """
+    Run the diffs for matched subsections (with their side-by-side views) in
+    a process pool of `workers` processes. Returns them as {(old body, new
+    body): DiffViews}, for compare_sections, and caches them for later.
+
+    Nothing runs (and the result is empty) when there are fewer than
+    `threshold` diffs, as starting processes isn't free.
+    """
+    jobs = list(dict.fromkeys(get_diff_jobs(pairs)))
+    # Daemon processes (eg, parallel test runners) are not allowed children
+    if (
+        workers <= 1
+        or len(jobs) < max(threshold, 2)
+        or multiprocessing.current_process().daemon
+    ):
+        return {}
+
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        run = partial(_run_diff_job, deadline=get_diff_deadline())
+        diffs = dict(zip(jobs, pool.map(run, jobs, chunksize=chunksize)))
+    prime_diff_cache(
+        {
+            get_diff_cache_key(old_body, new_body, kind="markdown"): views
+            for (old_body, new_body), views in diffs.items()
+        }
+    )
+    return diffs
+
+
 def merge_renamed_subsections(
     subsections: list[SubsectionDiff],
 ) -> list[SubsectionDiff]:
@@ -253,7 +479,7 @@ def merge_renamed_subsections(
             old_name = re.sub(r"<.*?>", "", next_item.name)  # strip tags
             html_id = current.html_id  # use the old html_id
 
-            heading_diff = html_diff(old_name, new_name)
+            heading_diff = cached_html_diff(old_name, new_name)
 
             is_rename_only = old_body == new_body
 
@@ -283,9 +509,20 @@ def merge_renamed_subsections(
     return merged
 
 
-def apply_comparison_types(subsections: list[SubsectionDiff]) -> list[SubsectionDiff]:
-    def normalize(text):
-        return re.sub(r"\s+", " ", text.strip()).lower()
+def apply_comparison_types(
+    subsections: list[SubsectionDiff], required_strings=None
+) -> list[SubsectionDiff]:
+    """
+    Applies the comparison_type of each subsection. `required_strings` maps
+    tuples of diff strings to RequiredStrings for them, if already compiled.
+    """
+    required_strings = required_strings or {}
+
+    def get_matcher(diff_strings):
+        key = tuple(diff_strings)
+        if key in required_strings:
+            return required_strings[key]
+        return get_required_strings(key)
 
     def name_modified(item: SubsectionDiff):
         return "<del>" in item.name or "<ins>" in item.name
@@ -303,13 +540,20 @@ def apply_comparison_types(subsections: list[SubsectionDiff]) -> list[Subsection
 
         if item.status == "DELETE":
             if comparison_type == "name":
-                item.diff = "—"
+                set_diff(item, "—")
 
             elif comparison_type == "diff_strings":
-                item.diff = "<ul>"
-                for s in item.diff_strings:
-                    item.diff += f"<li><del>{escape(s)}</del></li>"
-                item.diff += "</ul>"
+                item.missing_strings = list(item.diff_strings)
+                set_diff(
+                    item,
+                    "<ul>{}</ul>".format(
+                        "".join(
+                            f"<li><del>{escape(s)}</del></li>"
+                            for s in item.diff_strings
+                        )
+                    ),
+                    new_diff="<ul></ul>",
+                )
 
             results.append(item)
             continue
@@ -318,27 +562,30 @@ def apply_comparison_types(subsections: list[SubsectionDiff]) -> list[Subsection
             if comparison_type == "name":
                 if not name_modified(item):
                     item.status = "MATCH"
-                item.diff = "—"
+                set_diff(item, "—")
 
             elif comparison_type == "diff_strings":
-                diff_strings_not_matched = []
-                normalized_body = normalize(item.new_value or "")
-                for s in item.diff_strings:
-                    if normalize(s) not in normalized_body:
-                        diff_strings_not_matched.append(s)
+                diff_strings_not_matched = get_matcher(item.diff_strings).find_missing(
+                    item.new_value or ""
+                )
 
+                item.missing_strings = diff_strings_not_matched
                 if diff_strings_not_matched:
-                    item.diff = "<ul>{}</ul>".format(
-                        "".join(
-                            f"<li><del>{escape(s)}</del></li>"
-                            for s in diff_strings_not_matched
-                        )
+                    set_diff(
+                        item,
+                        "<ul>{}</ul>".format(
+                            "".join(
+                                f"<li><del>{escape(s)}</del></li>"
+                                for s in diff_strings_not_matched
+                            )
+                        ),
+                        new_diff="<ul></ul>",
                     )
                 else:
                     if not name_modified(item):
                         item.status = "MATCH"
 
-                    item.diff = "—"
+                    set_diff(item, "—")
 
             # default case, do nothing
             # elif comparison_type == "body":
@@ -378,6 +625,28 @@ def filter_comparison_by_status(comparison, statuses_to_ignore=[]):
     return [item for item in comparison if item.status not in statuses_to_ignore]
 
 
+def get_diff_fields(views):
+    """The diff, old_diff and new_diff of a SubsectionDiff, from html_diff's DiffViews."""
+    if not views.combined:
+        return {"diff": views.combined or "", "old_diff": None, "new_diff": None}
+    return {
+        "diff": views.combined,
+        "old_diff": views.old,
+        "new_diff": views.new,
+        "degraded": views.degraded,
+    }
+
+
+def set_diff(item, diff, new_diff=None):
+    """
+    Replace the diff of a SubsectionDiff with a summary that looks the same
+    on both sides of a side-by-side view, unless `new_diff` is given.
+    """
+    item.diff = diff
+    item.old_diff = diff
+    item.new_diff = diff if new_diff is None else new_diff
+
+
 def extract_old_diff(diff_html: str) -> str:
     soup = BeautifulSoup(diff_html, "html.parser")
     for ins in soup.find_all("ins"):
@@ -395,22 +664,123 @@ def extract_new_diff(diff_html: str) -> str:
 
 
 def annotate_side_by_side_diffs(comparison):
+    """
+    Fill in old_diff and new_diff. Diffs from html_diff come with them already,
+    so only diffs built some other way are split up here.
+    """
     for item in comparison:
         # Section-based comparison (has subsections)
         if isinstance(item, dict) and "subsections" in item:
             for s in item["subsections"]:
-                if s.diff:
+                if s.diff and s.old_diff is None:
                     s.old_diff = extract_old_diff(s.diff)
                     s.new_diff = extract_new_diff(s.diff)
         # Metadata or flat comparison
         elif isinstance(item, SubsectionDiff):
-            if item.diff:
+            if item.diff and item.old_diff is None:
                 item.old_diff = extract_old_diff(item.diff)
                 item.new_diff = extract_new_diff(item.diff)
     return comparison
 
 
-def compare_nofos(old_nofo, new_nofo, statuses_to_ignore=[]):
+class Baseline:
+    """
+    An old document, loaded once to be compared with any number of new ones:
+    its sections (the first of each name) and subsections, the name index of
+    each section's subsections, and its diff strings, compiled.
+    """
+
+    def __init__(self, document):
+        self.document = document
+
+        self.sections = {}
+        for section in document.sections.prefetch_related("subsections"):
+            self.sections.setdefault(section.name, section)
+
+        self.names = {}
+        self.required_strings = {}
+        for name, section in self.sections.items():
+            subsections = list(section.subsections.all())
+            self.names[name] = index_subsection_names(subsections)
+            for subsection in subsections:
+                diff_strings = getattr(subsection, "diff_strings", None)
+                if diff_strings:
+                    # Compiled when the subsection was saved
+                    self.required_strings[tuple(diff_strings)] = (
+                        RequiredStrings.from_data(
+                            subsection.compiled_diff_strings, diff_strings
+                        )
+                    )
+
+    def match(self, new_nofo):
+        """
+        Loads a new document and matches its sections and subsections with
+        this one. Returns (old section, new section, pairs) tuples, where pairs
+        come from match_subsections.
+        """
+        matched_sections = []
+        for new_section in new_nofo.sections.prefetch_related("subsections"):
+            old_section = self.sections.get(new_section.name)
+            pairs = match_subsections(
+                old_section,
+                new_section,
+                names=self.names.get(new_section.name) if old_section else None,
+            )
+            matched_sections.append((old_section, new_section, pairs))
+        return matched_sections
+
+    def compare(self, matched_sections, statuses_to_ignore=[], diffs=None):
+        """
+        The rest of compare_nofos, for sections from Baseline.match (and their
+        diffs from run_diffs_in_parallel, if already run).
+        """
+        nofo_comparison = []
+        for old_section, new_section, pairs in matched_sections:
+            comparison = compare_sections(old_section, new_section, pairs, diffs)
+
+            if comparison["subsections"]:
+                # Only add section comparison if there are changes
+                nofo_comparison.append(comparison)
+
+        for section in nofo_comparison:
+            section["subsections"] = merge_renamed_subsections(section["subsections"])
+
+        for section in nofo_comparison:
+            section["subsections"] = apply_comparison_types(
+                section["subsections"], self.required_strings
+            )
+
+        return filter_comparison_by_status(nofo_comparison, statuses_to_ignore)
+
+
+def get_compare_deadline():
+    """The diff_deadline for one comparison, from settings.COMPARE_DIFF_TIME_BUDGET."""
+    return time.time() + settings.COMPARE_DIFF_TIME_BUDGET
+
+
+def is_degraded(comparison):
+    """Whether any diff in a comparison (from compare_nofos) ran out of time."""
+    return any(
+        subsection.degraded
+        for section in comparison
+        for subsection in section["subsections"]
+    )
+
+
+def get_parallel_threshold(parallel_threshold=None):
+    if parallel_threshold is None:
+        return settings.COMPARE_PARALLEL_THRESHOLD
+    return parallel_threshold
+
+
+def compare_nofos(
+    old_nofo,
+    new_nofo,
+    statuses_to_ignore=[],
+    workers=1,
+    parallel_threshold=None,
+    baseline=None,
+):
     """
     Compares sections and subsections between an existing NOFO and a newly uploaded one.
 
@@ -418,11 +788,17 @@ def compare_nofos(old_nofo, new_nofo, statuses_to_ignore=[]):
     - Marks each subsection as "MATCH", "UPDATE", "ADD", or "DELETE".
     - Applies additional rules to detect renamed subsections and diff string requirements.
     - Respects comparison_type and diff_strings if present on ContentGuideSubsections.
+    - Its diffs share one time budget (settings.COMPARE_DIFF_TIME_BUDGET): diffs that
+      run out of it show changes as replaced whole, and are marked `degraded`.
 
     Args:
         old_nofo: The existing NOFO instance.
         new_nofo: The new NOFO instance being compared.
         statuses_to_ignore (list[str], optional): Subsection statuses to exclude from the result (e.g. ["MATCH"]).
+        workers (int, optional): Run the diffs in a pool of this many processes (see run_diffs_in_parallel).
+        parallel_threshold (int, optional): Only use the pool for at least this many diffs.
+            Defaults to settings.COMPARE_PARALLEL_THRESHOLD.
+        baseline (Baseline, optional): old_nofo, already loaded (eg, to compare it with many NOFOs).
 
     Returns:
         list[dict]: A list of sections with structural diffs, each in the format:
@@ -431,24 +807,21 @@ def compare_nofos(old_nofo, new_nofo, statuses_to_ignore=[]):
                 "subsections": list[SubsectionDiff]  # Comparison results per subsection
             }
     """
+    # Load both documents up front: the rest of the comparison runs in memory
+    baseline = baseline or Baseline(old_nofo)
+    matched_sections = baseline.match(new_nofo)
+
+    # All of the comparison's diffs share one time budget
+    with diff_deadline(get_compare_deadline()):
+        diffs = None
+        if workers > 1:
+            diffs = run_diffs_in_parallel(
+                [pair for _, _, pairs in matched_sections for pair in pairs],
+                workers,
+                threshold=get_parallel_threshold(parallel_threshold),
+            )
 
-    nofo_comparison = []
-
-    for new_section in new_nofo.sections.all():
-        old_section = old_nofo.sections.filter(name=new_section.name).first()
-        comparison = compare_sections(old_section, new_section)
-
-        if comparison["subsections"]:
-            # Only add section comparison if there are changes
-            nofo_comparison.append(comparison)
-
-    for section in nofo_comparison:
-        section["subsections"] = merge_renamed_subsections(section["subsections"])
-
-    for section in nofo_comparison:
-        section["subsections"] = apply_comparison_types(section["subsections"])
-
-    return filter_comparison_by_status(nofo_comparison, statuses_to_ignore)
+        return baseline.compare(matched_sections, statuses_to_ignore, diffs)
 
 
 def compare_nofos_metadata(old_nofo, new_nofo, statuses_to_ignore=[]):
@@ -493,13 +866,13 @@ def compare_nofos_metadata(old_nofo, new_nofo, statuses_to_ignore=[]):
         if old_value != new_value:
             if not old_value:
                 status = "ADD"
-                diff = html_diff("", new_value)
+                views = html_diff_views("", new_value)
             elif not new_value:
                 status = "DELETE"
-                diff = html_diff(old_value, "")
+                views = html_diff_views(old_value, "")
             else:
                 status = "UPDATE"
-                diff = html_diff(old_value, new_value)
+                views = html_diff_views(old_value, new_value)
 
             comparison_results.append(
                 SubsectionDiff(
@@ -507,7 +880,7 @@ def compare_nofos_metadata(old_nofo, new_nofo, statuses_to_ignore=[]):
                     status=status,
                     old_value=old_value,
                     new_value=new_value,
-                    diff=diff,
+                    **get_diff_fields(views),
                 )
             )
         else:
@@ -0,0 +1,331 @@
+"""NOFO Builder integration boundary for DocRaptor PDF rendering."""
+
+import hashlib
+import json
+import logging
+import tempfile
+
+import docraptor
+from bloom_nofos.artifacts import iter_artifact, open_artifact, save_artifact
+from bloom_nofos.utils import cast_to_boolean
+from bloom_nofos.version import get_version
+from constance import config
+from django.conf import settings
+from django.utils import timezone
+
+from .models import PrintJob
+from .utils import create_nofo_audit_event
+
+logger = logging.getLogger("artifacts")
+
+# Read the finished PDF from DocRaptor in chunks rather than all at once
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Finished PDFs bigger than this spill from memory to disk before being stored
+PDF_SPOOL_MAX_SIZE = 10 * 1024 * 1024
+
+
+class PrintJobNotReady(RuntimeError):
+    """The PDF for this print job can't be downloaded (yet)."""
+
+
+def get_docraptor_client():
+    """
+    Return a DocRaptor API client configured from our settings.
+
+    DOCRAPTOR_API_URL defaults to the real API, but it can point at a local
+    fake server for development and tests.
+    """
+    doc_api = docraptor.DocApi()
+    doc_api.api_client.configuration.username = settings.DOCRAPTOR_API_KEY
+    doc_api.api_client.configuration.host = settings.DOCRAPTOR_API_URL
+    return doc_api
+
+
+def get_nofo_print_url(request, nofo):
+    # the absolute uri points to the /edit page, so remove that from the path
+    return request.build_absolute_uri(nofo.get_absolute_url()).replace("/edit", "")
+
+
+def get_nofo_pdf_filename(nofo):
+    return "{}.pdf".format(nofo.number or nofo.short_name or nofo.title).lower()
+
+
+def get_print_mode(request):
+    mode = request.GET.get("mode", "attachment")
+    if mode not in ["attachment", "inline"]:
+        mode = "attachment"
+    return mode
+
+
+def get_is_test_pdf(request):
+    # DOCRAPTOR_LIVE_MODE config var can be set by superadmins, but is_test_pdf query param gets the last word
+    is_test_pdf = not config.DOCRAPTOR_LIVE_MODE
+    return cast_to_boolean(request.GET.get("is_test_pdf", is_test_pdf))
+
+
+def build_docraptor_doc(document_url, is_test_pdf):
+    """
+    The options we send to DocRaptor for every NOFO, whether it is printed
+    synchronously or as a print job.
+    """
+    return {
+        "test": is_test_pdf,  # test documents are free but watermarked
+        "document_url": document_url,
+        "document_type": "pdf",
+        "javascript": False,
+        "pipeline": 11,
+        "prince_options": {
+            "media": "print",  # use print styles instead of screen styles
+            "profile": "PDF/UA-1",
+        },
+    }
+
+
+def get_nofo_pdf_cache_key(nofo, is_test_pdf):
+    """
+    The artifact storage key for a printed NOFO.
+
+    Anything that changes the PDF has to change the key: the NOFO revision
+    (`updated` moves on every edit), its theme, test or live mode, and the
+    options we render with. Our templates and print styles are part of the
+    renderer too, so the app version is hashed in with the DocRaptor options.
+    """
+    renderer_options = build_docraptor_doc(document_url=None, is_test_pdf=is_test_pdf)
+    renderer_options["app_version"] = [get_version(), settings.GITHUB_SHA]
+    options_hash = hashlib.sha256(
+        json.dumps(renderer_options, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:16]
+
+    return "pdfs/{}/{}/{}/{}/{}.pdf".format(
+        nofo.id,
+        int(nofo.updated.timestamp() * 1_000_000),
+        nofo.theme,
+        "test" if is_test_pdf else "live",
+        options_hash,
+    )
+
+
+def get_cached_nofo_pdf(cache_key):
+    """Return a readable stream for a stored PDF, or None if we have to print it."""
+    if not settings.PDF_CACHE_ENABLED:
+        return None
+    return open_artifact(cache_key)
+
+
+def store_nofo_pdf(cache_key, fileobj):
+    """Keep a freshly printed PDF so the next print of this revision is free."""
+    if not settings.PDF_CACHE_ENABLED:
+        return None
+    return save_artifact(cache_key, fileobj, content_type="application/pdf")
+
+
+def log_pdf_cache_result(nofo, cache_key, cache_hit, source):
+    logger.info(
+        "PDF cache hit" if cache_hit else "PDF cache miss",
+        extra={
+            "nofo_id": str(nofo.id),
+            "artifact_key": cache_key,
+            "pdf_cache": "hit" if cache_hit else "miss",
+            "source": source,
+        },
+    )
+
+
+def start_print_job(nofo, user, document_url, is_test_pdf=True, mode="attachment"):
+    """
+    Ask DocRaptor to render a NOFO asynchronously and return the new PrintJob.
+
+    If this revision of the NOFO has already been printed with the same
+    options, the job is completed straight away from the stored PDF.
+
+    Raises docraptor.rest.ApiException if DocRaptor refuses the document, in
+    which case the job is saved as "failed".
+    """
+    user = user if (user and user.is_authenticated) else None
+    cache_key = get_nofo_pdf_cache_key(nofo, is_test_pdf)
+
+    cached_pdf = get_cached_nofo_pdf(cache_key)
+    if cached_pdf:
+        cached_pdf.close()
+        job = PrintJob.objects.create(
+            nofo=nofo,
+            user=user,
+            is_test_pdf=is_test_pdf,
+            mode=mode,
+            status="completed",
+            artifact_key=cache_key,
+            cache_hit=True,
+            completed=timezone.now(),
+        )
+        log_pdf_cache_result(nofo, cache_key, cache_hit=True, source="print_job")
+        create_nofo_audit_event(
+            event_type="nofo_print",
+            document=nofo,
+            user=user,
+            is_test_pdf=is_test_pdf,
+            cache_hit=True,
+        )
+        return job
+
+    job = PrintJob.objects.create(
+        nofo=nofo,
+        user=user,
+        is_test_pdf=is_test_pdf,
+        mode=mode,
+        artifact_key=cache_key if settings.PDF_CACHE_ENABLED else "",
+    )
+
+    try:
+        async_doc = get_docraptor_client().create_async_doc(
+            build_docraptor_doc(document_url, is_test_pdf)
+        )
+    except docraptor.rest.ApiException as e:
+        job.status = "failed"
+        job.error_message = str(e.body or e.reason or e)
+        job.save()
+        raise
+
+    job.docraptor_status_id = async_doc.status_id
+    job.save()
+    return job
+
+
+def _iter_and_store_print_job_pdf(job):
+    """
+    Yield the finished PDF from DocRaptor, keeping a copy in artifact storage
+    once the whole PDF has been read (not if the download is cut short).
+    """
+    chunks = _iter_docraptor_pdf(job.docraptor_download_id)
+
+    def _chunks():
+        with tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_SIZE) as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+
+            f.seek(0)
+            try:
+                store_nofo_pdf(job.artifact_key, f)
+            except Exception as e:
+                # the PDF was sent, it just won't be cached
+                logger.warning(
+                    "PDF cache write failed",
+                    extra={"artifact_key": job.artifact_key, "error": str(e)},
+                )
+
+    return _chunks()
+
+
+def refresh_print_job(job):
+    """
+    Ask DocRaptor how a print job is going and save the answer on the job.
+
+    When a job completes, a "nofo_print" audit event is recorded. Several
+    browser tabs can poll the same job, so the transition to "completed" is
+    a conditional update: only the request that wins it records the event.
+    """
+    if job.is_finished:
+        return job
+
+    try:
+        doc_status = get_docraptor_client().get_async_doc_status(
+            job.docraptor_status_id
+        )
+    except docraptor.rest.ApiException as e:
+        job.status = "failed"
+        job.error_message = str(e.body or e.reason or e)
+        job.save()
+        return job
+
+    if doc_status.status == "completed":
+        now = timezone.now()
+        completed_count = (
+            PrintJob.objects.filter(pk=job.pk)
+            .exclude(status="completed")
+            .update(
+                status="completed",
+                docraptor_download_id=doc_status.download_id or "",
+                number_of_pages=doc_status.number_of_pages,
+                completed=now,
+                updated=now,
+            )
+        )
+        job.refresh_from_db()
+
+        if completed_count:
+            # The PDF is copied into storage by its first download, not here
+            if job.artifact_key:
+                log_pdf_cache_result(
+                    job.nofo, job.artifact_key, cache_hit=False, source="print_job"
+                )
+            create_nofo_audit_event(
+                event_type="nofo_print",
+                document=job.nofo,
+                user=job.user,
+                is_test_pdf=job.is_test_pdf,
+                cache_hit=False if job.artifact_key else None,
+            )
+
+    elif doc_status.status == "failed":
+        job.status = "failed"
+        job.error_message = (
+            doc_status.validation_errors or doc_status.message or "Unknown error"
+        )
+        job.save()
+
+    elif doc_status.status in ["queued", "working"]:
+        if job.status != doc_status.status:
+            job.status = doc_status.status
+            job.save()
+
+    return job
+
+
+def _iter_docraptor_pdf(download_id):
+    response = get_docraptor_client().get_async_doc(download_id, _preload_content=False)
+
+    def _chunks():
+        try:
+            for chunk in response.stream(DOWNLOAD_CHUNK_SIZE):
+                yield chunk
+        finally:
+            response.release_conn()
+
+    return _chunks()
+
+
+def iter_print_job_pdf(job):
+    """
+    Yield the finished PDF for a print job in chunks, from artifact storage if
+    we kept a copy, or else straight from DocRaptor (keeping a copy as it goes).
+    """
+    if job.status != "completed":
+        raise PrintJobNotReady("This PDF isn’t ready to download yet.")
+
+    if job.artifact_key:
+        stored_pdf = get_cached_nofo_pdf(job.artifact_key)
+        if stored_pdf:
+            return iter_artifact(stored_pdf, DOWNLOAD_CHUNK_SIZE)
+
+    if not job.docraptor_download_id:
+        raise PrintJobNotReady("This PDF isn’t available any more.")
+
+    if job.artifact_key and settings.PDF_CACHE_ENABLED:
+        return _iter_and_store_print_job_pdf(job)
+    return _iter_docraptor_pdf(job.docraptor_download_id)
+
+
+def serialize_print_job(job):
+    """Return the public state of a print job, for the polling UI."""
+    return {
+        "id": str(job.id),
+        "status": job.status,
+        "status_display": job.get_status_display(),
+        "is_finished": job.is_finished,
+        "number_of_pages": job.number_of_pages,
+        "cache_hit": job.cache_hit,
+        "error_message": job.error_message,
+        "status_url": job.get_status_url(),
+        "download_url": (job.get_download_url() if job.status == "completed" else None),
+    }
@@ -0,0 +1,283 @@
+"""
+Reports on what happened to NOFOs, from the audit log: how often each NOFO was
+printed, re-imported and edited, and by whom.
+
+Every report is a few grouped queries over the audit document index (see
+AuditEventDocument), however many NOFOs it covers, instead of reading and
+parsing each NOFO's events. Reports are lists of dicts, one per row, that
+write_report writes out as TSV, CSV or JSON.
+
+The management commands (count_prints, count_reimports, count_updates) are
+thin wrappers around these functions, built on ReportCommand.
+"""
+
+import csv
+import json
+from datetime import date, datetime
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils.timezone import make_aware
+from easyaudit.models import CRUDEvent
+
+from .models import AuditEventDocument, Nofo
+
+REPORT_FORMATS = ["tsv", "csv", "json"]
+
+NOFO_URL = "https://nofo.rodeo/nofos/{}/edit"
+
+NOFO_COLUMNS = ["nofo_id", "url", "number", "status", "created", "updated"]
+
+PRINTS = Q(section_id="", action="nofo_print")
+LIVE_PRINTS = PRINTS & Q(print_mode="live")
+REIMPORTS = Q(section_id="", action="nofo_reimport")
+# Edits to the NOFO or its subsections, unless only the "updated" timestamp changed.
+# Edits are summed by event_count, since a compacted event stands for several.
+UPDATES = (
+    Q(event__content_type__model__in=["nofo", "subsection"])
+    & ~Q(changed_keys=[])
+    & ~Q(changed_keys=["updated"])
+)
+
+
+def get_report_nofos(nofo_ids=None, include_archived=False):
+    """
+    NOFO details for a report, earliest created first: the NOFOs with these
+    IDs, or else every NOFO (skipping archived ones unless `include_archived`).
+    """
+    nofos = Nofo.objects.all()
+    if nofo_ids is not None:
+        nofos = nofos.filter(id__in=nofo_ids)
+    elif not include_archived:
+        nofos = nofos.filter(archived__isnull=True)
+
+    return [
+        {
+            "nofo_id": str(nofo["id"]),
+            "url": NOFO_URL.format(nofo["id"]),
+            "number": nofo["number"],
+            "status": nofo["status"],
+            "created": nofo["created"],
+            "updated": nofo["updated"],
+        }
+        for nofo in nofos.order_by("created").values(
+            "id", "number", "status", "created", "updated"
+        )
+    ]
+
+
+def get_report_events(nofos, start_date=None, end_date=None, all_nofos=False):
+    """
+    The index rows of update events in these NOFOs (or in any NOFO, if
+    `all_nofos`), between the start of `start_date` and the end of `end_date`.
+    """
+    events = AuditEventDocument.objects.filter(
+        document_model="nofo", event__event_type=CRUDEvent.UPDATE
+    )
+    if not all_nofos:
+        events = events.filter(document_id__in=[nofo["nofo_id"] for nofo in nofos])
+
+    if start_date:
+        events = events.filter(
+            datetime__gte=make_aware(datetime.combine(start_date, datetime.min.time()))
+        )
+    if end_date:
+        events = events.filter(
+            datetime__lte=make_aware(datetime.combine(end_date, datetime.max.time()))
+        )
+    return events
+
+
+def get_nofo_activity(nofo_ids=None, start_date=None, end_date=None, **kwargs):
+    """
+    A row per NOFO with how many times it was printed, re-imported and edited,
+    and when it was last printed in live mode. Two queries.
+    """
+    nofos = get_report_nofos(nofo_ids, **kwargs)
+    counts = (
+        get_report_events(nofos, start_date, end_date, all_nofos=nofo_ids is None)
+        .values("document_id")
+        .annotate(
+            prints=Count("pk", filter=PRINTS),
+            last_live_print=Max("datetime", filter=LIVE_PRINTS),
+            reimports=Count("pk", filter=REIMPORTS),
+            updates=Coalesce(Sum("event_count", filter=UPDATES), 0),
+        )
+        .order_by()
+    )
+    counts = {row.pop("document_id"): row for row in counts}
+
+    rows = []
+    for nofo in nofos:
+        row = counts.get(nofo["nofo_id"], {})
+        last_live_print = row.get("last_live_print")
+        rows.append(
+            {
+                **nofo,
+                "prints": row.get("prints", 0),
+                "last_live_print": last_live_print,
+                "hours_to_last_live_print": (
+                    round((last_live_print - nofo["created"]).total_seconds() / 3600, 2)
+                    if last_live_print
+                    else None
+                ),
+                "reimports": row.get("reimports", 0),
+                "updates": row.get("updates", 0),
+            }
+        )
+    return rows
+
+
+def get_nofo_updates_by_user(nofo_ids=None, start_date=None, end_date=None, **kwargs):
+    """A row per NOFO and user with how many edits they made. Two queries."""
+    nofos = get_report_nofos(nofo_ids, **kwargs)
+    counts = (
+        get_report_events(nofos, start_date, end_date, all_nofos=nofo_ids is None)
+        .filter(UPDATES)
+        .values_list("document_id", "event__user__email")
+        .annotate(updates=Sum("event_count"))
+        .order_by("document_id", "event__user__email")
+    )
+
+    users_by_nofo = {}
+    for nofo_id, email, updates in counts:
+        users_by_nofo.setdefault(nofo_id, []).append((email, updates))
+
+    return [
+        {**nofo, "user_email": email or "Unknown", "updates": updates}
+        for nofo in nofos
+        for email, updates in users_by_nofo.get(nofo["nofo_id"], [])
+    ]
+
+
+def get_nofo_reimports(nofo_ids=None, start_date=None, end_date=None, **kwargs):
+    """A row per time a NOFO was re-imported, with who did it. Two queries."""
+    nofos = get_report_nofos(nofo_ids, **kwargs)
+    events = (
+        get_report_events(nofos, start_date, end_date, all_nofos=nofo_ids is None)
+        .filter(REIMPORTS)
+        .values_list("document_id", "event__user__email", "datetime")
+        .order_by("datetime")
+    )
+
+    reimports_by_nofo = {}
+    for nofo_id, email, reimported in events:
+        reimports_by_nofo.setdefault(nofo_id, []).append((email, reimported))
+
+    return [
+        {**nofo, "user_email": email or "Unknown", "datetime": reimported}
+        for nofo in nofos
+        for email, reimported in reimports_by_nofo.get(nofo["nofo_id"], [])
+    ]
+
+
+def write_report(stream, rows, columns, report_format="tsv", tsv_missing=None):
+    """
+    Write report rows to a text stream:
+        - "tsv": tab-separated, no header ("N/A" for missing values, or the
+          text for their column in `tsv_missing`)
+        - "csv": with a header row
+        - "json": a list of objects with just these columns
+    """
+    tsv_missing = tsv_missing or {}
+    rows = [{column: row.get(column) for column in columns} for row in rows]
+
+    if report_format == "json":
+        stream.write(json.dumps(rows, cls=DjangoJSONEncoder, indent=2) + "\n")
+        return
+
+    if report_format == "csv":
+        writer = csv.writer(stream)
+        writer.writerow(columns)
+        writer.writerows([row[column] for column in columns] for row in rows)
+        return
+
+    for row in rows:
+        stream.write(
+            "\t".join(
+                (
+                    tsv_missing.get(column, "N/A")
+                    if row[column] is None
+                    else str(row[column])
+                )
+                for column in columns
+            )
+            + "\n"
+        )
+
+
+class ReportCommand(BaseCommand):
+    """
+    A management command for one report, for a NOFO or for all of them.
+    Subclasses set `columns` and implement get_rows(nofo_ids, **filters).
+    """
+
+    columns = NOFO_COLUMNS
+    # Whether --all includes archived NOFOs
+    include_archived = False
+    # TSV text for missing values in these columns, instead of "N/A"
+    tsv_missing = {}
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "nofo_id", nargs="?", help="ID of a NOFO (optional if using --all)."
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="All NOFOs{}.".format(
+                "" if self.include_archived else " (skipping archived ones)"
+            ),
+        )
+        parser.add_argument(
+            "--start-date",
+            type=date.fromisoformat,
+            help="Only count events on or after this date (YYYY-MM-DD).",
+        )
+        parser.add_argument(
+            "--end-date",
+            type=date.fromisoformat,
+            help="Only count events on or before this date (YYYY-MM-DD).",
+        )
+        parser.add_argument(
+            "--format",
+            choices=REPORT_FORMATS,
+            default="tsv",
+            help="Output format (default: tsv).",
+        )
+
+    def get_rows(self, nofo_ids, **filters):
+        raise NotImplementedError
+
+    def handle(self, *args, **options):
+        filters = {
+            "start_date": options["start_date"],
+            "end_date": options["end_date"],
+            "include_archived": self.include_archived,
+        }
+
+        if options["all"]:
+            nofo_ids = None
+        elif options["nofo_id"] is not None:
+            nofo_ids = [options["nofo_id"]]
+            try:
+                exists = Nofo.objects.filter(pk=options["nofo_id"]).exists()
+            except ValidationError:
+                exists = False
+            if not exists:
+                raise CommandError(
+                    "NOFO with ID {} does not exist.".format(options["nofo_id"])
+                )
+        else:
+            raise CommandError("Please provide a NOFO ID or use --all.")
+
+        write_report(
+            self.stdout,
+            self.get_rows(nofo_ids, **filters),
+            self.columns,
+            options["format"],
+            tsv_missing=self.tsv_missing,
+        )
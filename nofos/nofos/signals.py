@@ -0,0 +1,24 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from easyaudit.models import CRUDEvent
+
+from .audits import index_audit_event
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=CRUDEvent, dispatch_uid="index_audit_event")
+def index_new_audit_event(sender, instance, created, raw=False, **kwargs):
+    """Add audit events to the audit document index, or update them there."""
+    if raw:
+        return
+    try:
+        # A savepoint, so a failed query doesn't break the caller's transaction
+        with transaction.atomic():
+            index_audit_event(instance)
+    except Exception:
+        # The event is saved either way: backfill_audit_document_index picks it up
+        logger.exception("Could not index audit event %s", instance.pk)
@@ -18,12 +18,12 @@ def add_classes_to_toc(nofo):
     count = 0
 
     # Count sections
-    sections = nofo.sections.all().order_by("order")
+    sections = nofo.sections.all()
     count += len(sections)
 
     for section in sections:
         if section.has_section_page and "contacts" not in section.name.lower():
-            for subsection in section.subsections.all().order_by("order"):
+            for subsection in section.subsections.all():
                 if subsection.tag == "h3":
                     count += 1
 
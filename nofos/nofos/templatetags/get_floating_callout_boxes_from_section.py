@@ -9,7 +9,7 @@ register = template.Library()
 def get_floating_callout_boxes_from_section(section):
     return [
         subsection
-        for subsection in section.subsections.all().order_by("order")
+        for subsection in section.subsections.all()
         if subsection.callout_box and is_floating_callout_box(subsection)
     ]
 
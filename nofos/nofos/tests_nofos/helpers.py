@@ -0,0 +1,32 @@
+import json
+
+from django.contrib.contenttypes.models import ContentType
+from easyaudit.models import CRUDEvent
+
+
+def create_audit_event(
+    obj,
+    changed_fields,
+    user=None,
+    when=None,
+    event_type=CRUDEvent.UPDATE,
+    object_json_repr="",
+):
+    """
+    A CRUDEvent for `obj`, as easyaudit logs it, with `changed_fields` as
+    JSON. It happened at `when`, or now if not given.
+    """
+    event = CRUDEvent.objects.create(
+        object_id=str(obj.id),
+        content_type=ContentType.objects.get_for_model(obj),
+        event_type=event_type,
+        object_repr=str(obj),
+        object_json_repr=object_json_repr,
+        changed_fields=json.dumps(changed_fields),
+        user=user,
+    )
+    if when:
+        # The datetime is always "now" when an event is created
+        event.datetime = when
+        event.save()
+    return event
@@ -0,0 +1,201 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from easyaudit.models import CRUDEvent
+
+from ..audit_retention import (
+    archive_audit_events,
+    compact_audit_events,
+    merge_changed_fields,
+)
+from ..audits import get_event_fields, safe_get_changed_fields
+from ..models import AuditEventArchive, AuditEventDocument, Nofo, Section, Subsection
+from ..reports import get_nofo_activity
+from .helpers import create_audit_event
+
+User = get_user_model()
+
+
+class MergeChangedFieldsTests(TestCase):
+    def test_keeps_first_old_and_last_new_value(self):
+        self.assertEqual(
+            merge_changed_fields(
+                [
+                    {"body": ["One", "Two"], "name": ["A", "B"]},
+                    {"body": ["Two", "Three"]},
+                    {"updated": ["2025-01-01", "2025-01-02"]},
+                ]
+            ),
+            {
+                "body": ["One", "Three"],
+                "name": ["A", "B"],
+                "updated": ["2025-01-01", "2025-01-02"],
+            },
+        )
+
+
+class AuditRetentionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test@example.com",
+            password="testpass123",
+            group="bloom",
+            force_password_reset=False,
+        )
+        self.other_user = User.objects.create_user(
+            email="other@example.com", password="testpass123", group="bloom"
+        )
+        self.nofo = Nofo.objects.create(
+            title="Test NOFO", number="HRSA-24-001", group="bloom", opdiv="HRSA"
+        )
+        self.section = Section.objects.create(
+            nofo=self.nofo, name="Section 1", html_id="sec-1", order=1
+        )
+        self.subsection = Subsection.objects.create(
+            section=self.section,
+            name="Subsection 1",
+            html_id="subsection-1",
+            order=1,
+            tag="h3",
+            body="Three",
+        )
+        self.old = timezone.now() - timedelta(days=400)
+
+    def create_event(self, changed_fields, user=None, when=None, obj=None):
+        obj = obj or self.subsection
+        return create_audit_event(
+            obj,
+            changed_fields,
+            user or self.user,
+            when or self.old,
+            object_json_repr=json.dumps(
+                [{"fields": {"name": str(obj), "section": str(self.section.id)}}]
+            ),
+        )
+
+    def test_compacts_same_day_updates_into_the_last_one(self):
+        first = self.create_event({"body": ["One", "Two"]})
+        second = self.create_event(
+            {"body": ["Two", "Three"], "name": ["Old", "New"]},
+            when=self.old + timedelta(minutes=5),
+        )
+        # Left alone: another user, another day, a custom action, a recent edit
+        by_other_user = self.create_event(
+            {"body": ["Three", "B"]},
+            self.other_user,
+            when=self.old + timedelta(minutes=10),
+        )
+        next_day = self.create_event(
+            {"body": ["C", "D"]}, when=self.old + timedelta(days=1)
+        )
+        action = self.create_event({"action": "nofo_print"}, obj=self.nofo)
+        self.create_event({"action": "nofo_print"}, obj=self.nofo)
+        self.create_event({"body": ["E", "F"]}, when=timezone.now())
+        self.create_event({"body": ["F", "G"]}, when=timezone.now())
+
+        stats = compact_audit_events(timezone.now() - timedelta(days=90))
+
+        self.assertEqual(stats, {"objects": 1, "summaries": 1, "removed": 1})
+        self.assertFalse(CRUDEvent.objects.filter(id=first.id).exists())
+        second.refresh_from_db()
+        self.assertEqual(
+            safe_get_changed_fields(second),
+            {"body": ["One", "Three"], "name": ["Old", "New"]},
+        )
+        self.assertEqual(second.document_index.event_count, 2)
+        self.assertEqual(second.document_index.changed_keys, ["body", "name"])
+        for event in [by_other_user, next_day, action]:
+            self.assertTrue(CRUDEvent.objects.filter(id=event.id).exists())
+        self.assertEqual(CRUDEvent.objects.count(), 7)
+
+    def test_edits_by_another_user_in_between_are_not_merged(self):
+        first = self.create_event({"body": ["One", "Two"]})
+        by_other_user = self.create_event(
+            {"body": ["Two", "Three"]},
+            self.other_user,
+            when=self.old + timedelta(minutes=5),
+        )
+        last = self.create_event(
+            {"body": ["Three", "Four"]}, when=self.old + timedelta(minutes=10)
+        )
+
+        stats = compact_audit_events(timezone.now() - timedelta(days=90))
+
+        self.assertEqual(stats, {"objects": 0, "summaries": 0, "removed": 0})
+        for event, changed_fields in [
+            (first, {"body": ["One", "Two"]}),
+            (by_other_user, {"body": ["Two", "Three"]}),
+            (last, {"body": ["Three", "Four"]}),
+        ]:
+            event.refresh_from_db()
+            self.assertEqual(safe_get_changed_fields(event), changed_fields)
+
+    def test_dry_run_and_reports_count_compacted_edits(self):
+        for minutes in range(3):
+            self.create_event(
+                {"body": ["Old", "New"]}, when=self.old + timedelta(minutes=minutes)
+            )
+        self.assertEqual(get_nofo_activity()[0]["updates"], 3)
+
+        stats = compact_audit_events(timezone.now(), dry_run=True)
+        self.assertEqual(stats, {"objects": 1, "summaries": 1, "removed": 2})
+        self.assertEqual(CRUDEvent.objects.count(), 3)
+
+        compact_audit_events(timezone.now())
+        self.assertEqual(CRUDEvent.objects.count(), 1)
+        self.assertEqual(get_nofo_activity()[0]["updates"], 3)
+
+    def test_archived_events_read_like_any_other(self):
+        event = self.create_event({"body": ["Old content", "Three"]})
+        recent = self.create_event({"body": ["Three", "Four"]}, when=timezone.now())
+
+        stats = archive_audit_events(timezone.now() - timedelta(days=365))
+
+        self.assertEqual(stats["events"], 1)
+        self.assertLess(stats["compressed_size"], stats["size"] + 20)
+        event.refresh_from_db()
+        self.assertEqual(event.changed_fields, "")
+        self.assertEqual(event.object_json_repr, "")
+        self.assertEqual(event.archive.size, stats["size"])
+        self.assertFalse(AuditEventArchive.objects.filter(event=recent).exists())
+
+        self.assertEqual(
+            safe_get_changed_fields(event), {"body": ["Old content", "Three"]}
+        )
+        self.assertEqual(get_event_fields(event)["name"], "Subsection 1")
+        # The index row is unchanged
+        self.assertEqual(
+            AuditEventDocument.objects.get(event=event).changed_keys, ["body"]
+        )
+
+        self.client.login(email="test@example.com", password="testpass123")
+        compare_url = reverse(
+            "nofos:nofo_history_compare", args=[self.nofo.id, event.id]
+        )
+        response = self.client.get(reverse("nofos:nofo_history", args=[self.nofo.id]))
+        self.assertContains(response, compare_url)
+        response = self.client.get(compare_url)
+        self.assertContains(response, "Old content")
+
+    def test_command(self):
+        self.create_event({"body": ["One", "Two"]})
+        self.create_event({"body": ["Two", "Three"]})
+
+        out = StringIO()
+        call_command("compact_audit_log", "--dry-run", stdout=out)
+        self.assertIn("Would compact 2 update events to 1 objects", out.getvalue())
+        self.assertIn("Would archive 2 events", out.getvalue())
+        self.assertEqual(CRUDEvent.objects.count(), 2)
+        self.assertFalse(AuditEventArchive.objects.exists())
+
+        out = StringIO()
+        call_command("compact_audit_log", stdout=out)
+        self.assertIn("Compacted 2 update events to 1 objects", out.getvalue())
+        self.assertIn("Archived 1 events", out.getvalue())
+        self.assertEqual(AuditEventArchive.objects.count(), 1)
@@ -0,0 +1,117 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from easyaudit.models import CRUDEvent
+
+from ..audits import get_changed_body
+from ..models import AuditBodySnapshot, Nofo, Section, Subsection
+
+User = get_user_model()
+
+
+@override_settings(AUDIT_COMPACT_SNAPSHOTS=True, AUDIT_SNAPSHOT_CHECKPOINT_EVERY=3)
+class AuditSnapshotTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test@example.com",
+            password="testpass123",
+            group="bloom",
+            force_password_reset=False,
+        )
+        self.nofo = Nofo.objects.create(
+            title="Test NOFO", number="HRSA-24-001", group="bloom", opdiv="HRSA"
+        )
+        self.section = Section.objects.create(
+            nofo=self.nofo, name="Section 1", html_id="sec-1", order=1
+        )
+        self.subsection = Subsection.objects.create(
+            section=self.section,
+            name="Subsection 1",
+            html_id="subsection-1",
+            order=1,
+            tag="h3",
+            body="Version 0",
+        )
+
+    def save_body(self, body):
+        """Save the subsection with a new body, returning its update event."""
+        self.subsection.body = body
+        # easyaudit logs updates once the transaction is committed
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subsection.save()
+        return CRUDEvent.objects.filter(
+            content_type=ContentType.objects.get_for_model(Subsection),
+            object_id=str(self.subsection.id),
+            event_type=CRUDEvent.UPDATE,
+        ).latest("id")
+
+    def test_updates_store_body_patches_with_checkpoints(self):
+        events = [self.save_body("Version {}".format(i)) for i in range(1, 6)]
+
+        for event in events:
+            self.assertIsNone(json.loads(event.changed_fields)["body"])
+            self.assertNotIn("body", json.loads(event.object_json_repr)[0]["fields"])
+        self.assertEqual(
+            [event.body_snapshot.depth for event in events], [0, 1, 2, 0, 1]
+        )
+        self.assertEqual(events[0].body_snapshot.body, "Version 1")
+        self.assertEqual(events[1].body_snapshot.body, "")
+
+        for i, event in enumerate(events):
+            self.assertEqual(
+                get_changed_body(event),
+                ("Version {}".format(i), "Version {}".format(i + 1)),
+            )
+
+    def test_changes_that_were_not_audited_start_a_checkpoint(self):
+        self.save_body("Version 1")
+        Subsection.objects.filter(id=self.subsection.id).update(body="Changed")
+        self.subsection.refresh_from_db()
+
+        event = self.save_body("Version 2")
+
+        self.assertTrue(event.body_snapshot.is_checkpoint)
+        self.assertEqual(get_changed_body(event), ("Changed", "Version 2"))
+
+    def test_a_small_edit_stores_a_fraction_of_the_body(self):
+        body = "Some words in a long subsection body. " * 600  # About 20KB
+        self.save_body(body)
+        edited = self.save_body(body.replace("long", "longer", 1))
+
+        with override_settings(AUDIT_COMPACT_SNAPSHOTS=False):
+            full = self.save_body(body)
+
+        def size(event):
+            stored = len(event.object_json_repr) + len(event.changed_fields)
+            if AuditBodySnapshot.objects.filter(event=event).exists():
+                stored += len(event.body_snapshot.body) + len(event.body_snapshot.patch)
+            return stored
+
+        self.assertLess(size(edited) * 10, size(full))
+        self.assertFalse(AuditBodySnapshot.objects.filter(event=full).exists())
+        self.assertEqual(get_changed_body(full)[1], body)
+
+    def test_history_compare_view_shows_snapshot_diffs(self):
+        self.save_body("Old content")
+        event = self.save_body("New content")
+        self.client.login(email="test@example.com", password="testpass123")
+
+        url = reverse("nofos:nofo_history_compare", args=[self.nofo.id, event.id])
+        response = self.client.get(url)
+        self.assertContains(response, "<del>Old</del>")
+
+        response = self.client.get(reverse("nofos:nofo_history", args=[self.nofo.id]))
+        self.assertContains(response, url)
+
+    def test_missing_snapshots_have_no_bodies(self):
+        self.save_body("Version 1")
+        middle = self.save_body("Version 2")
+        event = self.save_body("Version 3")
+
+        middle.delete()
+
+        event = CRUDEvent.objects.get(id=event.id)
+        self.assertIsNone(get_changed_body(event))
@@ -1,19 +1,27 @@
 import json
 from datetime import datetime, timedelta
+from io import StringIO
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from easyaudit.models import CRUDEvent
 
-from nofos.models import Nofo, Section, Subsection
+from nofos.models import AuditEventDocument, Nofo, Section, Subsection
 
 from ..audits import (
     deduplicate_audit_events_by_day_and_object,
     format_audit_event,
+    format_audit_events,
     get_audit_events_for_nofo,
+    get_audit_events_page,
 )
+from .helpers import create_audit_event
 
 
 class DeduplicateAuditEventsTests(TestCase):
@@ -418,3 +426,243 @@ class GetAuditEventsForNofoTests(TestCase):
         self.assertEqual(results[2], create_event)
         self.assertEqual(results[1], update_event)
         self.assertEqual(results[0], delete_event)
+
+
+class AuditEventDocumentIndexTests(TestCase):
+    def setUp(self):
+        self.nofo = Nofo.objects.create(
+            title="Test NOFO", group="bloom", opdiv="Test OpDiv"
+        )
+        self.section = Section.objects.create(
+            nofo=self.nofo, name="Section 1", html_id="sec-1", order=1
+        )
+        self.subsection = Subsection.objects.create(
+            section=self.section, name="Subsection 1", order=1, tag="h3"
+        )
+
+    def create_event(self, obj, object_json_repr=""):
+        return CRUDEvent.objects.create(
+            content_type=ContentType.objects.get_for_model(obj),
+            object_id=str(obj.id),
+            object_repr=str(obj),
+            object_json_repr=object_json_repr,
+            event_type=CRUDEvent.UPDATE,
+            datetime=timezone.now(),
+            changed_fields=json.dumps({"name": ["old", "new"]}),
+        )
+
+    def get_index(self, event):
+        return AuditEventDocument.objects.filter(event=event).values_list(
+            "document_model", "document_id", "section_id"
+        )[0]
+
+    def test_new_events_are_indexed_by_document_and_section(self):
+        nofo_id, section_id = str(self.nofo.id), str(self.section.id)
+
+        self.assertEqual(
+            self.get_index(self.create_event(self.nofo)), ("nofo", nofo_id, "")
+        )
+        self.assertEqual(
+            self.get_index(self.create_event(self.section)),
+            ("nofo", nofo_id, section_id),
+        )
+        self.assertEqual(
+            self.get_index(self.create_event(self.subsection)),
+            ("nofo", nofo_id, section_id),
+        )
+
+    def test_events_for_deleted_subsections_use_their_json(self):
+        event_json = json.dumps(
+            [
+                {
+                    "model": "nofos.subsection",
+                    "pk": str(self.subsection.id),
+                    "fields": {"section": str(self.section.id)},
+                }
+            ]
+        )
+        self.subsection.delete()
+
+        event = self.create_event(self.subsection, object_json_repr=event_json)
+
+        self.assertEqual(
+            self.get_index(event), ("nofo", str(self.nofo.id), str(self.section.id))
+        )
+
+    def test_events_outside_documents_are_not_indexed(self):
+        user = get_user_model().objects.create_user(
+            email="test@example.com", password="testpass123", group="bloom"
+        )
+        self.create_event(user)
+        subsection_id = self.subsection.id
+        self.subsection.delete()
+        self.subsection.id = subsection_id
+        # No JSON, and the subsection is gone
+        self.create_event(self.subsection)
+
+        self.assertEqual(AuditEventDocument.objects.count(), 0)
+
+    def test_events_are_saved_if_they_cannot_be_indexed(self):
+        with patch(
+            "nofos.signals.index_audit_event", side_effect=ValueError("Bad JSON")
+        ):
+            with self.assertLogs("nofos.signals", level="ERROR") as logs:
+                event = self.create_event(self.subsection)
+
+        self.assertTrue(CRUDEvent.objects.filter(id=event.id).exists())
+        self.assertIn("Could not index audit event", logs.output[0])
+        self.assertEqual(AuditEventDocument.objects.count(), 0)
+
+    def test_history_does_not_search_event_json(self):
+        self.create_event(self.subsection)
+
+        with CaptureQueriesContext(connection) as queries:
+            events = get_audit_events_for_nofo(self.nofo)
+
+        self.assertEqual(len(events), 1)
+        self.assertFalse(any(" LIKE " in q["sql"] for q in queries.captured_queries))
+
+    def test_backfill_indexes_older_events(self):
+        nofo_event = self.create_event(self.nofo)
+        subsection_event = self.create_event(self.subsection)
+        AuditEventDocument.objects.all().delete()
+        self.assertEqual(get_audit_events_for_nofo(self.nofo), [])
+
+        out = StringIO()
+        call_command("backfill_audit_document_index", "--batch-size", "1", stdout=out)
+        # Running it again doesn't index anything twice
+        call_command("backfill_audit_document_index", stdout=StringIO())
+
+        self.assertIn("Indexed 2 audit events", out.getvalue())
+        self.assertEqual(AuditEventDocument.objects.count(), 2)
+        self.assertEqual(
+            set(get_audit_events_for_nofo(self.nofo)), {nofo_event, subsection_event}
+        )
+
+
+class AuditEventTimelineTests(TestCase):
+    def setUp(self):
+        self.nofo = Nofo.objects.create(
+            title="Test NOFO", group="bloom", opdiv="Test OpDiv"
+        )
+        self.section = Section.objects.create(
+            nofo=self.nofo, name="Section 1", html_id="sec-1", order=1
+        )
+        self.subsection = Subsection.objects.create(
+            section=self.section, name="Subsection 1", order=1, tag="h3"
+        )
+        self.now = timezone.now().replace(second=30)
+
+    def create_event(
+        self,
+        obj,
+        event_type=CRUDEvent.UPDATE,
+        changed_fields=None,
+        minutes=0,
+        seconds=0,
+    ):
+        return create_audit_event(
+            obj,
+            changed_fields or {"name": ["old", "new"]},
+            when=self.now + timedelta(minutes=minutes, seconds=seconds),
+            event_type=event_type,
+            object_json_repr=json.dumps(
+                [{"fields": {"html_id": getattr(obj, "html_id", "")}}]
+            ),
+        )
+
+    def test_events_are_projected_when_saved(self):
+        event = self.create_event(
+            self.nofo, changed_fields={"action": "nofo_print", "print_mode": ["full"]}
+        )
+        hidden_event = self.create_event(
+            self.nofo, changed_fields={"updated": ["2023", "2024"]}
+        )
+
+        timeline = AuditEventDocument.objects.get(event=event)
+        self.assertEqual(timeline.changed_keys, ["action", "print_mode"])
+        self.assertEqual(timeline.action, "nofo_print")
+        self.assertEqual(timeline.action_label, "printed (full mode)")
+        self.assertEqual(timeline.minute, self.now.replace(second=0, microsecond=0))
+        self.assertEqual(timeline.priority, 2)
+        self.assertTrue(timeline.is_shown)
+        self.assertFalse(AuditEventDocument.objects.get(event=hidden_event).is_shown)
+
+        # Events that are changed after they are saved are projected again
+        hidden_event.changed_fields = json.dumps({"title": ["Old", "New"]})
+        hidden_event.save()
+        self.assertTrue(AuditEventDocument.objects.get(event=hidden_event).is_shown)
+
+    def test_history_order(self):
+        subsection_update = self.create_event(self.subsection, seconds=10)
+        nofo_update = self.create_event(self.nofo)
+        section_create = self.create_event(self.section, CRUDEvent.CREATE)
+        nofo_import = self.create_event(
+            self.nofo, changed_fields={"action": "nofo_import"}, seconds=20
+        )
+        subsection_delete = self.create_event(self.subsection, CRUDEvent.DELETE)
+        later_update = self.create_event(self.subsection, minutes=1)
+
+        # Newest minute first, then deletes, updates, creates and imports,
+        # with documents before sections before subsections
+        self.assertEqual(
+            get_audit_events_for_nofo(self.nofo),
+            [
+                later_update,
+                subsection_delete,
+                nofo_update,
+                subsection_update,
+                section_create,
+                nofo_import,
+            ],
+        )
+
+    def test_pages_follow_history_order(self):
+        for i in range(7):
+            self.create_event(self.subsection, minutes=i % 3, seconds=i)
+        self.create_event(self.nofo, changed_fields={"status": ["draft", "published"]})
+
+        pages, after = [], None
+        while True:
+            with self.assertNumQueries(2):
+                events, after = get_audit_events_page(
+                    self.nofo, "nofo", limit=3, after=after
+                )
+            pages.append(events)
+            if not after:
+                break
+
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(
+            [event for page in pages for event in page],
+            get_audit_events_for_nofo(self.nofo),
+        )
+
+    def test_format_audit_events_uses_the_timeline(self):
+        self.create_event(self.subsection, changed_fields={"body": ["Old", "New"]})
+        self.create_event(self.nofo, changed_fields={"action": "nofo_reimport"})
+        events, _ = get_audit_events_page(self.nofo, "nofo", limit=10)
+
+        # One query for the subsections, and no JSON is read for html ids
+        for event in events:
+            event.object_json_repr = "not-json"
+        with self.assertNumQueries(1):
+            formatted = format_audit_events(
+                events, {"document_display_prefix": "Draft NOFO"}
+            )
+
+        self.assertEqual(formatted[0]["event_type"], "Draft NOFO re-imported")
+        self.assertEqual(formatted[1]["object_description"], "Section 1 - Subsection 1")
+        self.assertEqual(formatted[1]["object_html_id"], self.subsection.html_id)
+
+    def test_backfill_projects_events_indexed_without_a_timeline(self):
+        event = self.create_event(
+            self.nofo, changed_fields={"updated": ["2023", "2024"]}
+        )
+        AuditEventDocument.objects.update(timeline_key="", is_shown=True)
+
+        call_command("backfill_audit_document_index", stdout=StringIO())
+
+        timeline = AuditEventDocument.objects.get(event=event)
+        self.assertNotEqual(timeline.timeline_key, "")
+        self.assertFalse(timeline.is_shown)
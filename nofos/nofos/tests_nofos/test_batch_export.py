@@ -0,0 +1,428 @@
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from bloom_nofos.artifacts import open_artifact
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from easyaudit.models import CRUDEvent
+from users.models import BloomUser
+
+from nofos.batch_export import (
+    BATCH_STALE_SECONDS,
+    _finish_task,
+    get_batch_manifest,
+    get_batch_nofos,
+    get_docx_data,
+    run_batch_export,
+    save_batch_manifest,
+)
+from nofos.fake_docraptor import FAKE_PDF, FakeDocRaptorServer
+from nofos.models import Nofo, Section, Subsection
+
+
+class BatchExportTestCase(TestCase):
+    server_options = {}
+
+    def setUp(self):
+        self.server = FakeDocRaptorServer(**self.server_options).start()
+        self.addCleanup(self.server.stop)
+
+        settings_override = override_settings(DOCRAPTOR_API_URL=self.server.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.nofos = [
+            self._nofo("NOFO-001", status="published", group="bloom"),
+            self._nofo("NOFO-002", status="published", group="acf"),
+            self._nofo("NOFO-003", status="draft", group="bloom"),
+        ]
+
+    def _nofo(self, number, **kwargs):
+        nofo = Nofo.objects.create(
+            title="NOFO {}".format(number),
+            short_name=number.lower(),
+            number=number,
+            opdiv="TEST",
+            **kwargs,
+        )
+        section = Section.objects.create(
+            nofo=nofo, name="Step 1", html_id="1--step-1", order=1
+        )
+        Subsection.objects.create(
+            section=section, name="Summary", tag="h3", body="Hello", order=1
+        )
+        return nofo
+
+    def _print_events(self, nofo):
+        return [
+            json.loads(event.changed_fields)
+            for event in CRUDEvent.objects.filter(
+                object_id=nofo.pk, changed_fields__contains="nofo_print"
+            ).order_by("datetime")
+        ]
+
+    def _run(self, nofos, formats=("pdf",), **kwargs):
+        kwargs.setdefault("backoff", 0)
+        return run_batch_export(
+            nofos, formats=list(formats), base_url="https://testserver", **kwargs
+        )
+
+
+class GetBatchNofosTest(BatchExportTestCase):
+    def test_filters(self):
+        published = get_batch_nofos(statuses=["published"])
+        self.assertEqual(list(published), self.nofos[:2])
+
+        self.assertEqual(
+            list(get_batch_nofos(statuses=["published"], groups=["bloom"])),
+            self.nofos[:1],
+        )
+        self.assertEqual(list(get_batch_nofos(ids=[self.nofos[2].pk])), self.nofos[2:])
+        self.assertEqual(list(get_batch_nofos(opdivs=["OTHER"])), [])
+
+    def test_archived_nofos_are_skipped(self):
+        self.nofos[0].archived = timezone.now().date()
+        self.nofos[0].save()
+
+        self.assertEqual(list(get_batch_nofos(groups=["bloom"])), self.nofos[2:])
+
+
+class RunBatchExportTest(BatchExportTestCase):
+    def test_pdfs_and_docx_are_stored_with_a_manifest(self):
+        manifest = self._run(self.nofos[:2], formats=["pdf", "docx"])
+
+        self.assertEqual(manifest["completed"], 4)
+        self.assertEqual(manifest["failed"], 0)
+        self.assertEqual(
+            [(r["number"], r["format"]) for r in manifest["results"]],
+            [
+                ("NOFO-001", "pdf"),
+                ("NOFO-001", "docx"),
+                ("NOFO-002", "pdf"),
+                ("NOFO-002", "docx"),
+            ],
+        )
+        for result in manifest["results"]:
+            self.assertEqual(result["attempts"], 1)
+            self.assertGreater(result["duration_ms"], 0)
+
+        pdf = open_artifact(manifest["results"][0]["artifact_key"])
+        with pdf:
+            self.assertEqual(pdf.read(), FAKE_PDF)
+        docx = open_artifact(manifest["results"][1]["artifact_key"])
+        with docx:
+            self.assertEqual(docx.read(2), b"PK")
+
+        with open_artifact(manifest["manifest_key"]) as f:
+            self.assertEqual(json.load(f)["batch_id"], manifest["batch_id"])
+
+        # DocRaptor printed the same page as the Print button does
+        document_urls = sorted(
+            d["doc"]["document_url"] for d in self.server.docs.values()
+        )
+        self.assertEqual(
+            document_urls,
+            sorted(
+                "https://testserver"
+                + reverse("nofos:nofo_view", kwargs={"pk": nofo.pk})
+                for nofo in self.nofos[:2]
+            ),
+        )
+
+    def test_word_files_are_built_in_processes(self):
+        if multiprocessing.current_process().daemon:
+            self.skipTest("Daemon processes (eg, parallel tests) can't start a pool")
+
+        with patch(
+            "nofos.batch_export.ProcessPoolExecutor", wraps=ProcessPoolExecutor
+        ) as pool:
+            manifest = self._run(self.nofos, formats=["docx"], processes=2)
+        pool.assert_called_once_with(max_workers=2)
+
+        self.assertEqual(manifest["completed"], 3)
+        self.assertEqual(
+            [r["number"] for r in manifest["results"]],
+            ["NOFO-001", "NOFO-002", "NOFO-003"],
+        )
+
+    def test_word_files_can_be_built_in_threads(self):
+        with patch("nofos.batch_export.ProcessPoolExecutor") as pool:
+            manifest = self._run(self.nofos, formats=["docx"], processes=1)
+        pool.assert_not_called()
+
+        self.assertEqual(manifest["completed"], 3)
+
+    def test_only_a_few_files_are_in_flight(self):
+        nofos = self.nofos + [self._nofo("NOFO-00{}".format(i)) for i in range(4, 9)]
+        counts = {"queued": 0, "finished": 0}
+        in_flight = []
+
+        def queue(nofo):
+            in_flight.append(counts["queued"] - counts["finished"])
+            counts["queued"] += 1
+            return get_docx_data(nofo)
+
+        def finish(*args):
+            counts["finished"] += 1
+            return _finish_task(*args)
+
+        with patch("nofos.batch_export.get_docx_data", side_effect=queue), patch(
+            "nofos.batch_export._finish_task", side_effect=finish
+        ):
+            manifest = self._run(nofos, formats=["docx"], concurrency=1, processes=1)
+
+        self.assertEqual(manifest["completed"], 8)
+        # concurrency + processes
+        self.assertLessEqual(max(in_flight), 2)
+        self.assertEqual(counts["finished"], 8)
+
+    def test_running_manifest_is_updated_until_the_batch_is_done(self):
+        with patch("nofos.batch_export.BATCH_HEARTBEAT_SECONDS", 0.05), patch(
+            "nofos.batch_export.save_batch_manifest", wraps=save_batch_manifest
+        ) as save:
+            manifest = self._run(self.nofos, formats=["pdf", "docx"], concurrency=1)
+
+        statuses = [call.args[0]["status"] for call in save.call_args_list]
+        self.assertEqual(statuses[0], "running")
+        self.assertEqual(statuses[-1], "completed")
+        self.assertEqual(get_batch_manifest(manifest["batch_id"])["completed"], 6)
+
+    def test_a_word_file_that_fails_does_not_stop_the_batch(self):
+        with patch(
+            "nofos.batch_export.build_docx", side_effect=ValueError("Bad table")
+        ), self.assertLogs("artifacts", level="ERROR"):
+            manifest = self._run(self.nofos[:2], formats=["pdf", "docx"], processes=1)
+
+        self.assertEqual(manifest["completed"], 2)
+        self.assertEqual(manifest["failed"], 2)
+        docx_results = [r for r in manifest["results"] if r["format"] == "docx"]
+        self.assertEqual([r["status"] for r in docx_results], ["failed", "failed"])
+        self.assertEqual(docx_results[0]["error"], "Bad table")
+        self.assertEqual(docx_results[0]["attempts"], 1)
+        with open_artifact(manifest["manifest_key"]) as f:
+            self.assertEqual(json.load(f)["failed"], 2)
+
+    def test_a_broken_process_pool_fails_its_files(self):
+        with patch(
+            "nofos.batch_export._build_docx",
+            side_effect=BrokenProcessPool("A worker process died"),
+        ), self.assertLogs("artifacts", level="ERROR"):
+            manifest = self._run(self.nofos, formats=["docx"], processes=1)
+
+        self.assertEqual(manifest["failed"], 3)
+        self.assertEqual(
+            [r["error"] for r in manifest["results"]],
+            ["A worker process died"] * 3,
+        )
+
+    def test_each_pdf_records_a_print_event(self):
+        user = BloomUser.objects.create_user(
+            email="admin@example.com", password="testpass123", group="bloom"
+        )
+        self._run(self.nofos[:2], formats=["pdf", "docx"], user=user)
+
+        for nofo in self.nofos[:2]:
+            events = self._print_events(nofo)
+            self.assertEqual(len(events), 1)
+            self.assertEqual(events[0]["print_mode"], ["test"])
+            self.assertEqual(events[0]["pdf_cache"], ["miss"])
+
+        self.assertEqual(self._print_events(self.nofos[2]), [])
+
+    def test_second_batch_uses_the_pdf_cache(self):
+        self._run(self.nofos[:1])
+        self.assertEqual(len(self.server.docs), 1)
+
+        manifest = self._run(self.nofos[:1])
+
+        self.assertEqual(len(self.server.docs), 1)
+        self.assertTrue(manifest["results"][0]["cache_hit"])
+        self.assertEqual(
+            [e["pdf_cache"] for e in self._print_events(self.nofos[0])],
+            [["miss"], ["hit"]],
+        )
+
+
+class RunBatchExportRetryTest(BatchExportTestCase):
+    server_options = {"unavailable_creates": 2}
+
+    def test_unavailable_renderer_is_retried(self):
+        manifest = self._run(self.nofos[:1], concurrency=1)
+
+        result = manifest["results"][0]
+        self.assertEqual(result["status"], "completed")
+        self.assertEqual(result["attempts"], 3)
+
+    def test_gives_up_after_retries(self):
+        manifest = self._run(self.nofos[:1], concurrency=1, retries=1)
+
+        result = manifest["results"][0]
+        self.assertEqual(result["status"], "failed")
+        self.assertEqual(result["attempts"], 2)
+        self.assertIn("Service unavailable", result["error"])
+        self.assertEqual(self._print_events(self.nofos[0]), [])
+
+
+class RunBatchExportRejectedTest(BatchExportTestCase):
+    server_options = {"fail_create": True}
+
+    def test_rejected_documents_are_not_retried(self):
+        manifest = self._run(self.nofos[:2])
+
+        self.assertEqual(manifest["failed"], 2)
+        self.assertEqual(
+            [r["attempts"] for r in manifest["results"]],
+            [1, 1],
+        )
+
+
+class BatchExportCommandTest(BatchExportTestCase):
+    def test_command_exports_matching_nofos(self):
+        out = StringIO()
+        call_command(
+            "batch_export",
+            "--status=published",
+            "--group=bloom",
+            "--format=pdf",
+            "--format=docx",
+            "--base-url=https://testserver",
+            "--backoff=0",
+            stdout=out,
+        )
+
+        self.assertIn("2 files ready, 0 failed", out.getvalue())
+        self.assertEqual(len(self._print_events(self.nofos[0])), 1)
+
+
+class BatchExportViewTest(BatchExportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = BloomUser.objects.create_superuser(
+            email="admin@example.com",
+            password="testpass123",
+            group="bloom",
+            force_password_reset=False,
+        )
+        self.client = Client()
+        self.client.login(email="admin@example.com", password="testpass123")
+        self.url = reverse("nofos:nofo_batch_export")
+
+    def test_superuser_can_run_a_batch_and_download_files(self):
+        # Run the batch straight away instead of in a thread
+        with patch("nofos.batch_export.run_in_background", lambda func, name: func()):
+            response = self.client.post(
+                self.url,
+                {"statuses": "published", "formats": "pdf", "print_mode": "test"},
+            )
+
+        self.assertEqual(response.status_code, 302)
+        response = self.client.get(response["Location"])
+        self.assertEqual(response.status_code, 200)
+        manifest = response.context["manifest"]
+        self.assertEqual(manifest["completed"], 2)
+        self.assertEqual(manifest["user"], "admin@example.com")
+
+        file_url = reverse(
+            "nofos:nofo_batch_export_file",
+            args=[manifest["batch_id"], manifest["results"][0]["path"]],
+        )
+        self.assertContains(response, file_url)
+
+        download = self.client.get(file_url)
+        self.assertEqual(download["Content-Type"], "application/pdf")
+        self.assertEqual(b"".join(download.streaming_content), FAKE_PDF)
+
+    def test_a_running_batch_refreshes_until_it_is_done(self):
+        with patch("nofos.batch_export.run_in_background") as run_in_background:
+            response = self.client.post(
+                self.url,
+                {"statuses": "published", "formats": "docx", "print_mode": "test"},
+            )
+        run_in_background.assert_called_once()
+
+        response = self.client.get(response["Location"])
+
+        self.assertEqual(response.context["manifest"]["status"], "running")
+        self.assertContains(response, "This batch is still running")
+        self.assertContains(response, 'http-equiv="refresh"')
+
+    def test_a_batch_that_stopped_updating_is_shown_as_stopped(self):
+        with patch("nofos.batch_export.run_in_background"):
+            response = self.client.post(
+                self.url,
+                {"statuses": "published", "formats": "docx", "print_mode": "test"},
+            )
+
+        # The web worker running it was restarted, long ago
+        later = timezone.now() + timedelta(seconds=BATCH_STALE_SECONDS + 1)
+        with patch("nofos.batch_export.timezone.now", return_value=later):
+            response = self.client.get(response["Location"])
+
+        self.assertEqual(response.context["manifest"]["status"], "stopped")
+        self.assertContains(response, "this batch stopped without finishing")
+        self.assertNotContains(response, 'http-equiv="refresh"')
+
+    def test_unknown_batch_is_not_found(self):
+        response = self.client.get(
+            reverse("nofos:nofo_batch_export_result", args=["nope"])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_a_batch_that_stops_shows_its_error(self):
+        with patch(
+            "nofos.batch_export.run_in_background", lambda func, name: func()
+        ), patch(
+            "nofos.batch_export.run_batch_export", side_effect=RuntimeError("Oops")
+        ), self.assertLogs(
+            "artifacts", level="ERROR"
+        ):
+            response = self.client.post(
+                self.url,
+                {"statuses": "published", "formats": "docx", "print_mode": "test"},
+            )
+
+        response = self.client.get(response["Location"])
+
+        self.assertContains(response, "this batch stopped before it was done")
+        self.assertContains(response, "Oops")
+
+    def test_missing_file_is_not_found(self):
+        response = self.client.get(
+            reverse("nofos:nofo_batch_export_file", args=["nope", "x.pdf"])
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_a_filter_is_required(self):
+        response = self.client.post(self.url, {"formats": "pdf", "print_mode": "test"})
+
+        self.assertContains(response, "Choose at least one status")
+        self.assertEqual(len(self.server.docs), 0)
+
+    def test_invalid_status_is_an_error(self):
+        response = self.client.post(
+            self.url, {"statuses": "nope", "formats": "pdf", "print_mode": "test"}
+        )
+
+        self.assertContains(response, "Unknown value: nope")
+
+    def test_only_superusers(self):
+        BloomUser.objects.create_user(
+            email="test@example.com",
+            password="testpass123",
+            group="bloom",
+            force_password_reset=False,
+        )
+        client = Client()
+        client.login(email="test@example.com", password="testpass123")
+
+        self.assertEqual(client.get(self.url).status_code, 403)
+        self.assertEqual(
+            client.post(self.url, {"statuses": "published"}).status_code, 403
+        )
@@ -1,17 +1,34 @@
+import csv
+import json
+import os
 import re
+import tempfile
 from copy import deepcopy
-
+from io import StringIO
+from unittest.mock import patch
+
+from bloom_nofos.diff_cache import DIFF_CACHE_ALIAS
+from bloom_nofos.html_diff import DiffViews, html_diff
+from bloom_nofos.required_strings import RequiredStrings
+from django.core.cache import caches
+from django.core.management import call_command
 from django.test import TestCase
 
 from ..models import Nofo, Section, Subsection
 from ..nofo_compare import (
     SubsectionDiff,
+    SubsectionIndex,
     annotate_side_by_side_diffs,
     apply_comparison_types,
     compare_nofos,
     compare_nofos_metadata,
+    compare_sections,
     filter_comparison_by_status,
+    find_matching_subsection,
+    get_diff_jobs,
+    match_subsections,
     merge_renamed_subsections,
+    run_diffs_in_parallel,
 )
 
 
@@ -340,6 +357,8 @@ class TestApplyComparisonTypes(TestCase):
 
         result = apply_comparison_types([item])
         original_item.diff = "—"
+        original_item.old_diff = "—"
+        original_item.new_diff = "—"
         self.assertEqual(result[0], original_item)
 
     def test_delete_status_comparison_type_body(self):
@@ -367,6 +386,9 @@ class TestApplyComparisonTypes(TestCase):
 
         result = apply_comparison_types([item])
         original_item.diff = "<ul><li><del>one</del></li><li><del>two</del></li><li><del>three</del></li></ul>"
+        original_item.old_diff = original_item.diff
+        original_item.new_diff = "<ul></ul>"
+        original_item.missing_strings = ["one", "two", "three"]
         self.assertEqual(result[0], original_item)
 
     def test_none_comparison_type_skips_all_statuses(self):
@@ -446,6 +468,25 @@ class TestApplyComparisonTypes(TestCase):
         result = apply_comparison_types([item])[0]
         self.assertEqual(result.status, "UPDATE")
         self.assertIn("<del>banana</del>", result.diff)
+        self.assertEqual(result.missing_strings, ["banana"])
+
+    def test_update_diff_strings_compiled_ahead_of_time(self):
+        item = SubsectionDiff(
+            name="",
+            status="UPDATE",
+            comparison_type="diff_strings",
+            diff_strings=["Data  Program"],
+            new_value="This data program is working.",
+            diff="old diff",
+        )
+        compiled = RequiredStrings(["Data  Program"])
+        with patch.object(compiled, "find_missing", wraps=compiled.find_missing) as m:
+            result = apply_comparison_types(
+                [item], required_strings={("Data  Program",): compiled}
+            )[0]
+        m.assert_called_once_with("This data program is working.")
+        self.assertEqual(result.status, "MATCH")
+        self.assertEqual(result.missing_strings, [])
 
     def test_update_diff_strings_match_all_but_name_modified(self):
         item = SubsectionDiff(
@@ -543,6 +584,20 @@ class AnnotateSideBySideDiffsTests(TestCase):
             annotated.new_diff,
         )
 
+    def test_diffs_from_html_diff_are_not_split_again(self):
+        diff = SubsectionDiff(
+            name="Update",
+            status="UPDATE",
+            diff="<p>Start <del>old</del><ins>new</ins> middle</p>",
+            old_diff="<p>Start <del>old</del> middle</p>",
+            new_diff="<p>Start <ins>new</ins> middle</p>",
+        )
+        with patch("nofos.nofo_compare.extract_old_diff") as mock_extract:
+            annotated = annotate_side_by_side_diffs([diff])[0]
+
+        mock_extract.assert_not_called()
+        self.assertEqual(annotated.old_diff, "<p>Start <del>old</del> middle</p>")
+
 
 class TestCompareNofos(TestCase):
     def setUp(self):
@@ -768,6 +823,37 @@ class TestCompareNofos(TestCase):
             subsection_merge.diff,
         )
 
+    def test_changed_subsection_is_diffed_once(self):
+        """
+        Imported bodies end in a newline: the UPDATE reuses the diff that
+        found the change, instead of diffing the raw bodies again.
+        """
+        caches[DIFF_CACHE_ALIAS].clear()
+        old_nofo = Nofo.objects.create(title="Old imported NOFO", opdiv="Test OpDiv")
+        new_nofo = Nofo.objects.create(title="New imported NOFO", opdiv="Test OpDiv")
+        for nofo, body in [
+            (old_nofo, "Submit before Jan 1.\n"),
+            (new_nofo, "Submit before Feb 1.\n"),
+        ]:
+            section = Section.objects.create(
+                name="Step 1", nofo=nofo, order=1, html_id="step-1"
+            )
+            Subsection.objects.create(
+                name="Application Process",
+                body=body,
+                section=section,
+                order=1,
+                tag="h3",
+            )
+
+        with patch("bloom_nofos.diff_cache.html_diff", wraps=html_diff) as mock_diff:
+            result = compare_nofos(old_nofo, new_nofo)
+
+        subsection = result[0]["subsections"][0]
+        self.assertEqual(subsection.status, "UPDATE")
+        self.assertIn("Submit before <del>Jan</del><ins>Feb</ins> 1.", subsection.diff)
+        self.assertEqual(mock_diff.call_count, 1)
+
 
 class TestCompareNofosOrdering(TestCase):
     def setUp(self):
@@ -1004,6 +1090,198 @@ class TestCompareNofosOrdering(TestCase):
         )
 
 
+class TestCompareNofosMatchingIndex(TestCase):
+    def _nofo(self, title, names):
+        nofo = Nofo.objects.create(title=title, opdiv="Test OpDiv")
+        section = Section.objects.create(
+            name="Main Section", nofo=nofo, order=1, html_id="main-section"
+        )
+        for order, name in enumerate(names, start=1):
+            Subsection.objects.create(
+                name=name,
+                tag="h3" if name else "",
+                body="Body {}".format(order),
+                section=section,
+                order=order,
+            )
+        return nofo
+
+    def test_index_matches_like_is_matching_subsection(self):
+        old_nofo = self._nofo("Old", ["A", "", "", "B", "", "C", "", "A", ""])
+        new_nofo = self._nofo("New", ["A", "", "B", "", "", "C", "D", "", "A", ""])
+
+        old_section = old_nofo.sections.first()
+        new_section = new_nofo.sections.first()
+        old_subsections = list(old_section.subsections.all())
+        new_subsections = list(new_section.subsections.all())
+        index = SubsectionIndex(
+            old_section, new_section, old_subsections, new_subsections
+        )
+
+        for new_subsection in new_subsections:
+            for matched_ids in [set(), {old_subsections[0].id, old_subsections[1].id}]:
+                self.assertEqual(
+                    index.find_match(new_subsection, matched_ids),
+                    find_matching_subsection(
+                        new_subsection, old_subsections, matched_ids
+                    ),
+                )
+
+    def test_subsections_in_the_same_nofo_never_match(self):
+        nofo = self._nofo("Same", ["A", "", "B"])
+        section = nofo.sections.first()
+        subsections = list(section.subsections.all())
+        index = SubsectionIndex(section, section, subsections, subsections)
+
+        self.assertIsNone(index.find_match(subsections[0], set()))
+
+    def test_number_of_queries_does_not_grow_with_subsections(self):
+        for count in [10, 50]:
+            names = ["Subsection {}".format(i) if i % 3 else "" for i in range(count)]
+            old_nofo = self._nofo("Old {}".format(count), names)
+            new_nofo = self._nofo("New {}".format(count), list(reversed(names)))
+
+            # sections + subsections, for each NOFO
+            with self.assertNumQueries(4):
+                compare_nofos(old_nofo, new_nofo)
+
+
+class TestCompareNofosInParallel(TestCase):
+    def setUp(self):
+        caches[DIFF_CACHE_ALIAS].clear()
+
+        self.old_nofo = Nofo.objects.create(title="Old NOFO", opdiv="Test OpDiv")
+        self.new_nofo = Nofo.objects.create(title="New NOFO", opdiv="Test OpDiv")
+        old_section = Section.objects.create(
+            name="Step 1", nofo=self.old_nofo, order=1, html_id="step-1"
+        )
+        new_section = Section.objects.create(
+            name="Step 1", nofo=self.new_nofo, order=1, html_id="step-1"
+        )
+        for order in range(1, 7):
+            Subsection.objects.create(
+                name="Subsection {}".format(order),
+                tag="h3",
+                body="Old body {}".format(order),
+                section=old_section,
+                order=order,
+            )
+            Subsection.objects.create(
+                name="Subsection {}".format(order + 1),
+                tag="h3",
+                body="New body {}".format(order + 1) if order % 2 else "Old body 7",
+                section=new_section,
+                order=order,
+            )
+
+    def test_diff_jobs(self):
+        pairs = [
+            (a, b)
+            for old_section, new_section in zip(
+                self.old_nofo.sections.all(), self.new_nofo.sections.all()
+            )
+            for a, b in match_subsections(old_section, new_section)
+        ]
+
+        jobs = get_diff_jobs(pairs)
+
+        self.assertIn(("Old body 1", ""), jobs)
+        self.assertIn(("Old body 2", "New body 2"), jobs)
+        self.assertIn(("", "Old body 7"), jobs)
+
+    def test_one_diff_job_per_changed_subsection(self):
+        # Imported bodies end in a newline: only the stripped pair is diffed
+        old_sub = Subsection(name="Eligibility", body="Old body\n")
+        new_sub = Subsection(name="Eligibility", body="New body\n")
+        same_sub = Subsection(name="Funding", body="Same body\n")
+
+        jobs = get_diff_jobs([(old_sub, new_sub), (same_sub, same_sub)])
+
+        self.assertEqual(jobs, [("Old body", "New body")])
+
+    def test_parallel_comparison_is_identical(self):
+        serial = annotate_side_by_side_diffs(
+            compare_nofos(self.old_nofo, self.new_nofo)
+        )
+        caches[DIFF_CACHE_ALIAS].clear()
+
+        parallel = annotate_side_by_side_diffs(
+            compare_nofos(self.old_nofo, self.new_nofo, workers=2, parallel_threshold=0)
+        )
+
+        self.assertEqual(parallel, serial)
+
+    def test_small_comparisons_stay_in_process(self):
+        pairs = match_subsections(
+            self.old_nofo.sections.first(), self.new_nofo.sections.first()
+        )
+
+        self.assertEqual(run_diffs_in_parallel(pairs, workers=2, threshold=1000), {})
+        self.assertEqual(run_diffs_in_parallel(pairs, workers=1), {})
+
+    def test_comparison_uses_the_diffs_it_is_given(self):
+        old_section = self.old_nofo.sections.first()
+        new_section = self.new_nofo.sections.first()
+        pairs = match_subsections(old_section, new_section)
+        diffs = {
+            job: DiffViews("<del>Given</del>", "<del>Given</del>", "")
+            for job in get_diff_jobs(pairs)
+        }
+
+        with patch("nofos.nofo_compare.markdown_diff_views") as markdown_diff_views:
+            comparison = compare_sections(old_section, new_section, pairs, diffs)
+
+        markdown_diff_views.assert_not_called()
+        self.assertTrue(comparison["subsections"])
+        for subsection in comparison["subsections"]:
+            self.assertEqual(subsection.diff, "<del>Given</del>")
+
+    def test_bulk_compare_command(self):
+        out = StringIO()
+        call_command(
+            "bulk_compare",
+            str(self.old_nofo.pk),
+            str(self.new_nofo.pk),
+            "--workers=2",
+            "--json",
+            stdout=out,
+        )
+
+        result = json.loads(out.getvalue())["results"][0]
+        self.assertEqual(result["nofo_id"], str(self.new_nofo.pk))
+        self.assertEqual(
+            [result[status] for status in ["MATCH", "UPDATE", "ADD", "DELETE"]],
+            [0, 5, 1, 1],
+        )
+        self.assertEqual(result["missing_strings"], 0)
+
+    def test_bulk_compare_command_writes_csvs(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            call_command(
+                "bulk_compare",
+                str(self.old_nofo.pk),
+                str(self.new_nofo.pk),
+                "--workers=1",
+                "--output-dir={}".format(output_dir),
+                stdout=StringIO(),
+            )
+
+            with open(os.path.join(output_dir, "summary.csv")) as f:
+                summary = list(csv.reader(f))
+            with open(
+                os.path.join(
+                    output_dir,
+                    "compare__{}__{}.csv".format(self.old_nofo.pk, self.new_nofo.pk),
+                )
+            ) as f:
+                rows = list(csv.reader(f))
+
+        self.assertEqual(summary[1][0], str(self.new_nofo.pk))
+        self.assertEqual(summary[1][3:], ["5", "1", "1", "0", "0"])
+        self.assertEqual(rows[0][0], "Status")
+        self.assertEqual(len(rows), 1 + 7)
+
+
 class TestCompareNofosMetadata(TestCase):
     def setUp(self):
         """
@@ -1,13 +1,19 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from bloom_nofos.html_diff import diff_deadline
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
 from django.test import TestCase
 from django.urls import reverse
 from django.utils import timezone
 from easyaudit.models import CRUDEvent
 
-from nofos.audits import remove_model_from_description
+from nofos.audits import get_body_history_diff, remove_model_from_description
 
-from ..models import Nofo, Section, Subsection
+from ..models import AuditEventDiff, Nofo, Section, Subsection
 
 User = get_user_model()
 
@@ -221,3 +227,113 @@ class NofoHistoryViewTests(TestCase):
             args=[self.nofo.id, subsection_event.id],
         )
         self.assertNotContains(response, unexpected_compare_url)
+
+    def test_history_view_pages_through_events(self):
+        """Test that history view shows events 25 at a time, newest first"""
+        for i in range(30):
+            event = CRUDEvent.objects.create(
+                event_type=CRUDEvent.UPDATE,
+                object_id=self.nofo.id,
+                content_type=self.nofo_content_type,
+                object_repr=str(self.nofo),
+                changed_fields='{"field_%02d": ["Old", "New"]}' % i,
+                user=self.user,
+            )
+            event.datetime = timezone.now() + timedelta(minutes=i)
+            event.save()
+
+        url = reverse("nofos:nofo_history", args=[self.nofo.id])
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        descriptions = [
+            e["object_description"] for e in response.context["audit_events"]
+        ]
+        self.assertEqual(descriptions, ["Field %02d" % i for i in range(29, 4, -1)])
+        self.assertContains(response, 'id="load-more-btn"')
+
+        response = self.client.get(url, {"after": response.context["next_cursor"]})
+
+        descriptions = [
+            e["object_description"] for e in response.context["audit_events"]
+        ]
+        self.assertEqual(descriptions, ["Field %02d" % i for i in range(4, -1, -1)])
+        self.assertNotContains(response, 'id="load-more-btn"')
+
+    def test_history_compare_view_stores_the_diff(self):
+        """Test that a body diff is worked out once, and again if the event changes"""
+        event = CRUDEvent.objects.create(
+            event_type=CRUDEvent.UPDATE,
+            object_id=self.subsection.id,
+            content_type=self.subsection_content_type,
+            object_repr=str(self.subsection),
+            changed_fields='{"body": ["Old content", "Test content"]}',
+            user=self.user,
+        )
+        url = reverse("nofos:nofo_history_compare", args=[self.nofo.id, event.id])
+
+        response = self.client.get(url)
+        self.assertContains(response, "<del>Old</del>")
+        diff = AuditEventDiff.objects.get(event=event)
+        self.assertTrue(diff.has_diff)
+
+        with patch("nofos.audits.markdown_diff_views") as markdown_diff_views:
+            response = self.client.get(url)
+            self.assertContains(response, "<del>Old</del>")
+            # The history page reads it back too
+            response = self.client.get(
+                reverse("nofos:nofo_history", args=[self.nofo.id])
+            )
+            self.assertContains(response, url)
+        markdown_diff_views.assert_not_called()
+
+        # eg, the event was compacted
+        event.changed_fields = '{"body": ["Other content", "Test content"]}'
+        event.save()
+        response = self.client.get(url)
+        self.assertContains(response, "<del>Other</del>")
+        self.assertNotEqual(
+            AuditEventDiff.objects.get(event=event).inputs_hash, diff.inputs_hash
+        )
+
+    def test_degraded_diffs_are_not_stored(self):
+        event = CRUDEvent.objects.create(
+            event_type=CRUDEvent.UPDATE,
+            object_id=self.subsection.id,
+            content_type=self.subsection_content_type,
+            object_repr=str(self.subsection),
+            changed_fields='{"body": ["Old degraded content", "Test content"]}',
+            user=self.user,
+        )
+
+        with diff_deadline(0):
+            diff = get_body_history_diff(event)
+
+        self.assertTrue(diff.has_diff)
+        self.assertFalse(AuditEventDiff.objects.filter(event=event).exists())
+
+    def test_cache_history_diffs_command(self):
+        """Test that the command stores body diffs that aren't stored yet"""
+        for changed_fields in [
+            '{"body": ["Old content", "Test content"]}',
+            '{"body": ["Same", "Same"]}',
+            '{"name": ["Old name", "New name"]}',
+        ]:
+            CRUDEvent.objects.create(
+                event_type=CRUDEvent.UPDATE,
+                object_id=self.subsection.id,
+                content_type=self.subsection_content_type,
+                object_repr=str(self.subsection),
+                changed_fields=changed_fields,
+                user=self.user,
+            )
+
+        out = StringIO()
+        call_command("cache_history_diffs", stdout=out)
+
+        self.assertIn("Stored 2 history diffs (1 with visible changes)", out.getvalue())
+        self.assertEqual(AuditEventDiff.objects.count(), 2)
+
+        out = StringIO()
+        call_command("cache_history_diffs", stdout=out)
+        self.assertIn("Stored 0 history diffs", out.getvalue())
@@ -0,0 +1,308 @@
+import json
+
+from bloom_nofos.artifacts import open_artifact
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from easyaudit.models import CRUDEvent
+from users.models import BloomUser
+
+from nofos.fake_docraptor import FAKE_PDF, FakeDocRaptorServer
+from nofos.models import Nofo, PrintJob
+from nofos.printing import (
+    PrintJobNotReady,
+    get_nofo_pdf_cache_key,
+    iter_print_job_pdf,
+    refresh_print_job,
+)
+
+
+class PrintJobTestCase(TestCase):
+    """
+    Print jobs run against a fake DocRaptor server, so these tests exercise the
+    real DocRaptor client over HTTP without a DocRaptor account.
+    """
+
+    server_options = {}
+
+    def setUp(self):
+        self.server = FakeDocRaptorServer(**self.server_options).start()
+        self.addCleanup(self.server.stop)
+
+        settings_override = override_settings(DOCRAPTOR_API_URL=self.server.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = BloomUser.objects.create_user(
+            email="test@example.com",
+            password="testpass123",
+            group="bloom",
+            force_password_reset=False,
+        )
+        self.client = Client()
+        self.client.login(email="test@example.com", password="testpass123")
+
+        self.nofo = Nofo.objects.create(
+            title="Test NOFO",
+            short_name="test-nofo",
+            number="NOFO-TEST-001",
+            opdiv="TEST",
+            group="bloom",
+            status="draft",
+        )
+        self.create_url = reverse("nofos:print_job_create", kwargs={"pk": self.nofo.id})
+
+    def _print_event_count(self):
+        return CRUDEvent.objects.filter(
+            object_id=self.nofo.pk, changed_fields__contains="nofo_print"
+        ).count()
+
+    def _create_job(self, query="?mode=attachment&is_test_pdf=false"):
+        response = self.client.post(self.create_url + query)
+        self.assertEqual(response.status_code, 302)
+        return PrintJob.objects.get(nofo=self.nofo)
+
+
+class PrintJobFlowTest(PrintJobTestCase):
+    server_options = {"working_polls": 1}
+
+    def test_create_redirects_to_job_page(self):
+        response = self.client.post(self.create_url + "?mode=inline")
+
+        job = PrintJob.objects.get(nofo=self.nofo)
+        self.assertRedirects(response, job.get_absolute_url())
+        self.assertEqual(job.status, "queued")
+        self.assertEqual(job.mode, "inline")
+        self.assertEqual(job.user, self.user)
+        self.assertTrue(job.docraptor_status_id)
+
+        # the document DocRaptor received points at the NOFO view page
+        doc = self.server.docs[job.docraptor_status_id]["doc"]
+        self.assertTrue(
+            doc["document_url"].endswith(
+                reverse("nofos:nofo_view", kwargs={"pk": self.nofo.id})
+            )
+        )
+
+        # nothing has been printed yet
+        self.assertEqual(self._print_event_count(), 0)
+
+    def test_get_on_create_url_is_not_allowed(self):
+        response = self.client.get(self.create_url)
+        self.assertEqual(response.status_code, 405)
+        self.assertFalse(PrintJob.objects.exists())
+
+    def test_is_test_pdf_param(self):
+        job = self._create_job(query="?is_test_pdf=false")
+        self.assertFalse(job.is_test_pdf)
+        self.assertFalse(self.server.docs[job.docraptor_status_id]["doc"]["test"])
+
+    def test_detail_page_renders_job_state(self):
+        job = self._create_job()
+        response = self.client.get(job.get_absolute_url())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'id="print-job-state"')
+        self.assertContains(response, job.get_status_url())
+
+    def test_status_polls_until_completed_then_records_one_print_event(self):
+        job = self._create_job()
+
+        # first poll: still working
+        response = self.client.get(job.get_status_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "no-store")
+        self.assertEqual(response.json()["status"], "working")
+        self.assertIsNone(response.json()["download_url"])
+        self.assertEqual(self._print_event_count(), 0)
+
+        # second poll: done
+        data = self.client.get(job.get_status_url()).json()
+        self.assertEqual(data["status"], "completed")
+        self.assertTrue(data["is_finished"])
+        self.assertEqual(data["download_url"], job.get_download_url())
+        self.assertEqual(data["number_of_pages"], 1)
+
+        # more polls don't record more print events
+        self.client.get(job.get_status_url())
+        self.assertEqual(self._print_event_count(), 1)
+
+        event = CRUDEvent.objects.get(
+            object_id=self.nofo.pk, changed_fields__contains="nofo_print"
+        )
+        self.assertEqual(event.user, self.user)
+        self.assertIn('"print_mode": ["live"]', event.changed_fields)
+
+    def test_refreshing_a_stale_copy_does_not_record_a_second_event(self):
+        job = self._create_job()
+        stale_copy = PrintJob.objects.get(pk=job.pk)
+
+        for _ in range(2):
+            refresh_print_job(job)
+        self.assertEqual(job.status, "completed")
+
+        # another tab was still holding the un-completed job
+        self.server.docs[job.docraptor_status_id]["polls"] = 10
+        refresh_print_job(stale_copy)
+        self.assertEqual(stale_copy.status, "completed")
+        self.assertEqual(self._print_event_count(), 1)
+
+    def test_download_streams_pdf(self):
+        job = self._create_job()
+        for _ in range(2):
+            self.client.get(job.get_status_url())
+
+        response = self.client.get(job.get_download_url())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertEqual(
+            response["Content-Disposition"], 'attachment; filename="nofo-test-001.pdf"'
+        )
+        self.assertEqual(b"".join(response.streaming_content), FAKE_PDF)
+
+    def test_download_before_completion_is_bad_request(self):
+        job = self._create_job()
+
+        response = self.client.get(job.get_download_url())
+        self.assertEqual(response.status_code, 400)
+
+        with self.assertRaises(PrintJobNotReady):
+            iter_print_job_pdf(job)
+
+    def test_job_from_another_nofo_is_not_found(self):
+        job = self._create_job()
+        other_nofo = Nofo.objects.create(
+            title="Other NOFO", opdiv="TEST", group="bloom"
+        )
+
+        response = self.client.get(
+            reverse(
+                "nofos:print_job_status",
+                kwargs={"pk": other_nofo.id, "job_pk": job.id},
+            )
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_other_group_cannot_see_job(self):
+        job = self._create_job()
+
+        BloomUser.objects.create_user(
+            email="acf@example.com",
+            password="testpass123",
+            group="acf",
+            force_password_reset=False,
+        )
+        client = Client()
+        client.login(email="acf@example.com", password="testpass123")
+
+        self.assertEqual(client.get(job.get_status_url()).status_code, 403)
+        self.assertEqual(client.get(job.get_download_url()).status_code, 403)
+        self.assertEqual(client.post(self.create_url).status_code, 403)
+
+
+class PrintJobCacheTest(PrintJobTestCase):
+    server_options = {"working_polls": 0}
+
+    def _print(self):
+        self.client.post(self.create_url)
+        job = PrintJob.objects.filter(nofo=self.nofo).first()
+        self.client.get(job.get_status_url())
+        job.refresh_from_db()
+        return job
+
+    def _download(self, job):
+        response = self.client.get(job.get_download_url())
+        return b"".join(response.streaming_content)
+
+    def test_finished_pdf_is_stored_by_its_first_download(self):
+        job = self._print()
+
+        self.assertEqual(job.status, "completed")
+        self.assertFalse(job.cache_hit)
+        self.assertEqual(job.artifact_key, get_nofo_pdf_cache_key(self.nofo, True))
+        # polling the job doesn't download the PDF
+        self.assertIsNone(open_artifact(job.artifact_key))
+
+        self.assertEqual(self._download(job), FAKE_PDF)
+
+        # the next download comes from storage, not DocRaptor
+        self.server.docs.clear()
+        self.assertEqual(self._download(job), FAKE_PDF)
+
+    def test_a_download_cut_short_is_not_stored(self):
+        job = self._print()
+
+        response = self.client.get(job.get_download_url())
+        next(iter(response.streaming_content))
+        response.close()
+
+        self.assertIsNone(open_artifact(job.artifact_key))
+
+    def test_printing_the_same_revision_again_skips_docraptor(self):
+        self._download(self._print())
+        self.assertEqual(len(self.server.docs), 1)
+
+        response = self.client.post(self.create_url)
+
+        job = PrintJob.objects.filter(nofo=self.nofo).first()
+        self.assertTrue(job.cache_hit)
+        self.assertEqual(job.status, "completed")
+        self.assertRedirects(
+            response, job.get_download_url(), fetch_redirect_response=False
+        )
+        self.assertEqual(len(self.server.docs), 1)
+
+        events = CRUDEvent.objects.filter(
+            object_id=self.nofo.pk, changed_fields__contains="nofo_print"
+        ).order_by("datetime")
+        self.assertEqual(
+            [json.loads(e.changed_fields)["pdf_cache"] for e in events],
+            [["miss"], ["hit"]],
+        )
+
+    def test_cache_key_changes_with_revision_theme_and_mode(self):
+        key = get_nofo_pdf_cache_key(self.nofo, True)
+
+        self.assertNotEqual(key, get_nofo_pdf_cache_key(self.nofo, False))
+
+        self.nofo.theme = "portrait-acf-white"
+        self.assertNotEqual(key, get_nofo_pdf_cache_key(self.nofo, True))
+
+        self.nofo.refresh_from_db()
+        self.assertEqual(key, get_nofo_pdf_cache_key(self.nofo, True))
+        self.nofo.touch_updated()
+        self.nofo.refresh_from_db()
+        self.assertNotEqual(key, get_nofo_pdf_cache_key(self.nofo, True))
+
+
+class PrintJobCreateFailureTest(PrintJobTestCase):
+    server_options = {"fail_create": True}
+
+    def test_rejected_document_is_bad_request(self):
+        with self.assertLogs("django.request", level="ERROR"):
+            response = self.client.post(self.create_url)
+
+        self.assertEqual(response.status_code, 400)
+        job = PrintJob.objects.get(nofo=self.nofo)
+        self.assertEqual(job.status, "failed")
+        self.assertIn("Document could not be created", job.error_message)
+        self.assertEqual(self._print_event_count(), 0)
+
+
+class PrintJobRenderFailureTest(PrintJobTestCase):
+    server_options = {"fail_render": True}
+
+    def test_failed_render_is_reported(self):
+        job = self._create_job()
+
+        data = self.client.get(job.get_status_url()).json()
+
+        self.assertEqual(data["status"], "failed")
+        self.assertTrue(data["is_finished"])
+        self.assertEqual(data["error_message"], "Bad HTML")
+        self.assertEqual(self._print_event_count(), 0)
+
+        # the detail page shows the error instead of polling
+        response = self.client.get(job.get_absolute_url())
+        self.assertContains(response, "Bad HTML")
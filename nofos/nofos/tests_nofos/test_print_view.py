@@ -1,7 +1,8 @@
+import json
 from unittest.mock import patch
 
 import docraptor
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from easyaudit.models import CRUDEvent
 from users.models import BloomUser
@@ -114,6 +115,71 @@ class PrintNofoAsPDFViewTest(TestCase):
 
         self.assertEqual(self._print_event_count(), 1)
 
+    ###################################################
+    # Printed PDFs are kept and reused per revision
+    ###################################################
+
+    @patch("nofos.views.docraptor.DocApi")
+    def test_second_print_of_same_revision_is_served_from_cache(self, mock_doc_api):
+        mock_doc_api.return_value.create_doc.return_value = b"%PDF-1.4 fake pdf"
+
+        self.client.post(self.url)
+        with self.assertLogs("artifacts", level="INFO") as logs:
+            response = self.client.post("{}?mode=inline".format(self.url))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b"".join(response.streaming_content), b"%PDF-1.4 fake pdf")
+        self.assertEqual(
+            response["Content-Disposition"], 'inline; filename="nofo-test-001.pdf"'
+        )
+        self.assertIn("PDF cache hit", "".join(logs.output))
+
+        # DocRaptor was only asked once, but both prints were audited
+        self.assertEqual(mock_doc_api.return_value.create_doc.call_count, 1)
+        self.assertEqual(self._print_event_count(), 2)
+        pdf_cache_values = [
+            json.loads(event.changed_fields)["pdf_cache"]
+            for event in CRUDEvent.objects.filter(
+                object_id=self.nofo.pk, changed_fields__contains="nofo_print"
+            ).order_by("datetime")
+        ]
+        self.assertEqual(pdf_cache_values, [["miss"], ["hit"]])
+
+    @patch("nofos.views.docraptor.DocApi")
+    def test_test_and_live_pdfs_are_cached_separately(self, mock_doc_api):
+        mock_doc_api.return_value.create_doc.return_value = b"%PDF-1.4 fake pdf"
+
+        self.client.post("{}?is_test_pdf=true".format(self.url))
+        self.client.post("{}?is_test_pdf=false".format(self.url))
+
+        self.assertEqual(mock_doc_api.return_value.create_doc.call_count, 2)
+
+    @patch("nofos.views.docraptor.DocApi")
+    def test_editing_the_nofo_prints_again(self, mock_doc_api):
+        mock_doc_api.return_value.create_doc.return_value = b"%PDF-1.4 fake pdf"
+
+        self.client.post(self.url)
+        self.nofo.title = "Test NOFO, revised"
+        self.nofo.save()
+        self.client.post(self.url)
+
+        self.assertEqual(mock_doc_api.return_value.create_doc.call_count, 2)
+
+    @override_settings(PDF_CACHE_ENABLED=False)
+    @patch("nofos.views.docraptor.DocApi")
+    def test_cache_can_be_turned_off(self, mock_doc_api):
+        mock_doc_api.return_value.create_doc.return_value = b"%PDF-1.4 fake pdf"
+
+        self.client.post(self.url)
+        self.client.post(self.url)
+
+        self.assertEqual(mock_doc_api.return_value.create_doc.call_count, 2)
+        self.assertNotIn(
+            "pdf_cache",
+            CRUDEvent.objects.filter(object_id=self.nofo.pk).first().changed_fields,
+        )
+
     ###################################################
     # Exception handling degrades gracefully
     ###################################################
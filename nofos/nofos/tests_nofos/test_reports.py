@@ -0,0 +1,224 @@
+import json
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import Nofo, Section, Subsection
+from ..reports import (
+    get_nofo_activity,
+    get_nofo_reimports,
+    get_nofo_updates_by_user,
+    write_report,
+)
+from .helpers import create_audit_event
+
+User = get_user_model()
+
+
+class ReportsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="test@example.com", password="testpass123", group="bloom"
+        )
+        self.other_user = User.objects.create_user(
+            email="other@example.com", password="testpass123", group="bloom"
+        )
+        self.nofo = Nofo.objects.create(
+            title="Test NOFO", number="HRSA-24-001", group="bloom", opdiv="HRSA"
+        )
+        self.other_nofo = Nofo.objects.create(
+            title="Other NOFO", number="HRSA-24-002", group="bloom", opdiv="HRSA"
+        )
+        self.archived_nofo = Nofo.objects.create(
+            title="Old NOFO",
+            number="HRSA-24-003",
+            group="bloom",
+            opdiv="HRSA",
+            archived=date(2024, 1, 1),
+        )
+        section = Section.objects.create(
+            nofo=self.nofo, name="Section 1", html_id="sec-1", order=1
+        )
+        self.subsection = Subsection.objects.create(
+            section=section, name="Subsection 1", order=1, tag="h3"
+        )
+
+    def create_event(self, obj, changed_fields, user=None, when=None):
+        return create_audit_event(obj, changed_fields, user or self.user, when)
+
+    def create_activity(self):
+        self.create_event(self.nofo, {"action": "nofo_print", "print_mode": ["test"]})
+        self.live_print = self.create_event(
+            self.nofo, {"action": "nofo_print", "print_mode": ["live"]}
+        )
+        self.create_event(self.nofo, {"action": "nofo_reimport"}, self.other_user)
+        self.create_event(self.nofo, {"title": ["Old", "New"]})
+        self.create_event(self.subsection, {"body": ["Old", "New"]}, self.other_user)
+        # Not edits
+        self.create_event(self.nofo, {"updated": ["Old", "New"]})
+        self.create_event(self.subsection.section, {"name": ["Old", "New"]})
+        self.create_event(self.archived_nofo, {"title": ["Old", "New"]})
+
+
+class ReportsTests(ReportsTestCase):
+    def test_nofo_activity(self):
+        self.create_activity()
+
+        with self.assertNumQueries(2):
+            rows = get_nofo_activity()
+
+        self.assertEqual(
+            [row["nofo_id"] for row in rows],
+            [str(self.nofo.id), str(self.other_nofo.id)],
+        )
+        row = rows[0]
+        self.assertEqual(row["number"], "HRSA-24-001")
+        self.assertEqual(
+            row["url"], "https://nofo.rodeo/nofos/{}/edit".format(self.nofo.id)
+        )
+        self.assertEqual(row["prints"], 2)
+        self.assertEqual(row["last_live_print"], self.live_print.datetime)
+        self.assertIsNotNone(row["hours_to_last_live_print"])
+        self.assertEqual(row["reimports"], 1)
+        # The prints and re-import are updates to the NOFO too
+        self.assertEqual(row["updates"], 5)
+        self.assertEqual(
+            {key: rows[1][key] for key in ["prints", "reimports", "updates"]},
+            {"prints": 0, "reimports": 0, "updates": 0},
+        )
+
+    def test_nofo_activity_includes_archived_nofos_if_asked(self):
+        self.create_activity()
+
+        rows = get_nofo_activity(include_archived=True)
+        self.assertEqual(rows[-1]["number"], "HRSA-24-003")
+        self.assertEqual(rows[-1]["updates"], 1)
+
+        rows = get_nofo_activity([str(self.archived_nofo.id)])
+        self.assertEqual([row["updates"] for row in rows], [1])
+
+    def test_date_range(self):
+        now = timezone.now()
+        self.create_event(
+            self.nofo, {"title": ["Old", "New"]}, when=now - timedelta(days=10)
+        )
+        self.create_event(self.nofo, {"title": ["Old", "New"]}, when=now)
+
+        rows = get_nofo_activity(
+            [self.nofo.id], start_date=(now - timedelta(days=1)).date()
+        )
+        self.assertEqual(rows[0]["updates"], 1)
+
+        rows = get_nofo_activity(
+            [self.nofo.id], end_date=(now - timedelta(days=1)).date()
+        )
+        self.assertEqual(rows[0]["updates"], 1)
+
+    def test_updates_by_user_and_reimports(self):
+        self.create_activity()
+
+        with self.assertNumQueries(2):
+            rows = get_nofo_updates_by_user([self.nofo.id])
+        self.assertEqual(
+            [(row["user_email"], row["updates"]) for row in rows],
+            [("other@example.com", 2), ("test@example.com", 3)],
+        )
+
+        rows = get_nofo_reimports()
+        self.assertEqual(
+            [(row["number"], row["user_email"]) for row in rows],
+            [("HRSA-24-001", "other@example.com")],
+        )
+
+    def test_write_report(self):
+        rows = [{"number": "HRSA-24-001", "prints": 2, "last_live_print": None}]
+        columns = ["number", "prints", "last_live_print"]
+
+        tsv, csv, json_out = StringIO(), StringIO(), StringIO()
+        write_report(tsv, rows, columns)
+        write_report(csv, rows, columns, "csv")
+        write_report(json_out, rows, columns, "json")
+
+        self.assertEqual(tsv.getvalue(), "HRSA-24-001\t2\tN/A\n")
+        self.assertEqual(
+            csv.getvalue().splitlines(),
+            ["number,prints,last_live_print", "HRSA-24-001,2,"],
+        )
+        self.assertEqual(json.loads(json_out.getvalue()), rows)
+
+
+class ReportCommandsTests(ReportsTestCase):
+    def call(self, *args):
+        out = StringIO()
+        call_command(*args, stdout=out)
+        return out.getvalue()
+
+    def test_count_prints(self):
+        self.create_activity()
+
+        rows = json.loads(self.call("count_prints", "--all", "--format", "json"))
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]["prints"], 2)
+        self.assertEqual(
+            rows[0]["last_live_print"][:19],
+            self.live_print.datetime.isoformat()[:19],
+        )
+        self.assertNotIn("updates", rows[0])
+
+    def test_count_prints_tsv_says_none_for_no_live_prints(self):
+        self.create_event(
+            self.other_nofo, {"action": "nofo_print", "print_mode": ["test"]}
+        )
+
+        output = self.call("count_prints", str(self.other_nofo.id))
+
+        self.assertTrue(output.endswith("\t1\tNone\tN/A\n"), output)
+
+    def test_live_prints_do_not_depend_on_the_action_label(self):
+        with patch.dict(
+            "nofos.audits.ACTION_LABELS", {"nofo_print": "Printed the NOFO"}
+        ):
+            self.create_activity()
+
+        rows = json.loads(self.call("count_prints", "--all", "--format", "json"))
+
+        self.assertEqual(
+            rows[0]["last_live_print"][:19],
+            self.live_print.datetime.isoformat()[:19],
+        )
+
+    def test_count_updates(self):
+        self.create_activity()
+
+        lines = self.call("count_updates", str(self.nofo.id)).splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].startswith(str(self.nofo.id) + "\t"))
+        self.assertTrue(lines[0].endswith("\t5"))
+
+        lines = self.call(
+            "count_updates", "--all", "--with-users", "--format", "csv"
+        ).splitlines()
+        self.assertEqual(lines[0].split(",")[-2:], ["user_email", "updates"])
+        # Archived NOFOs are counted too
+        self.assertEqual(len(lines), 4)
+
+    def test_count_reimports(self):
+        self.create_activity()
+
+        output = self.call("count_reimports", "--all", "--start-date", "2000-01-01")
+
+        self.assertIn("\tother@example.com\t", output)
+        self.assertEqual(len(output.splitlines()), 1)
+
+    def test_missing_nofo(self):
+        with self.assertRaisesMessage(CommandError, "does not exist"):
+            self.call("count_prints", "not-a-nofo")
+        with self.assertRaisesMessage(CommandError, "Please provide a NOFO ID"):
+            self.call("count_updates")
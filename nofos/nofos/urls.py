@@ -157,6 +157,26 @@ urlpatterns = [
         name="nofo_modifications",
     ),
     path("<uuid:pk>/print", views.PrintNofoAsPDFView.as_view(), name="print_pdf"),
+    path(
+        "<uuid:pk>/print/jobs",
+        views.PrintJobCreateView.as_view(),
+        name="print_job_create",
+    ),
+    path(
+        "<uuid:pk>/print/jobs/<uuid:job_pk>",
+        views.PrintJobDetailView.as_view(),
+        name="print_job_detail",
+    ),
+    path(
+        "<uuid:pk>/print/jobs/<uuid:job_pk>/status",
+        views.PrintJobStatusView.as_view(),
+        name="print_job_status",
+    ),
+    path(
+        "<uuid:pk>/print/jobs/<uuid:job_pk>/download",
+        views.PrintJobDownloadView.as_view(),
+        name="print_job_download",
+    ),
     path(
         "<uuid:pk>/section/<uuid:section_pk>/subsection/create",
         views.NofoSubsectionCreateView.as_view(),
@@ -188,6 +208,21 @@ urlpatterns = [
         name="nofo_check_links",
     ),
     path("search", views.NofoSearchView.as_view(), name="nofo_search"),
+    path(
+        "batch-export",
+        views.NofoBatchExportView.as_view(),
+        name="nofo_batch_export",
+    ),
+    path(
+        "batch-export/<slug:batch_id>",
+        views.NofoBatchExportResultView.as_view(),
+        name="nofo_batch_export_result",
+    ),
+    path(
+        "batch-export/<slug:batch_id>/<path:filename>",
+        views.NofoBatchExportFileView.as_view(),
+        name="nofo_batch_export_file",
+    ),
     path(
         "check-link",
         views.CheckNOFOLinkSingleView.as_view(),
@@ -19,7 +19,9 @@ def user_is_nih_group(user):
     return bool(user and hasattr(user, "group") and user.group == "nih")
 
 
-def create_nofo_audit_event(event_type, document, user, is_test_pdf=True):
+def create_nofo_audit_event(
+    event_type, document, user, is_test_pdf=True, cache_hit=None
+):
     # Define allowed event types
     allowed_event_types = ["nofo_import", "nofo_print", "nofo_reimport"]
 
@@ -39,6 +41,9 @@ def create_nofo_audit_event(event_type, document, user, is_test_pdf=True):
     # Add print_mode if the event_type involves printing
     if event_type == "nofo_print":
         changed_fields_json["print_mode"] = ["test" if is_test_pdf else "live"]
+        # Whether the PDF came from the artifact cache instead of DocRaptor
+        if cache_hit is not None:
+            changed_fields_json["pdf_cache"] = ["hit" if cache_hit else "miss"]
 
     # Create the audit log event
     CRUDEvent.objects.create(
@@ -1,9 +1,10 @@
 import io
-import json
 import uuid
 from datetime import datetime
 
 import docraptor
+from bloom_nofos.artifacts import iter_artifact, open_artifact
+from bloom_nofos.docx_export import generate_docx_download_response
 from bloom_nofos.error_helpers import (
     DOCUMENT_STRUCTURE_RECOVERY_STEPS,
     MistaggedHeadingError,
@@ -11,9 +12,8 @@ from bloom_nofos.error_helpers import (
     render_import_server_error,
     render_mistagged_heading_error,
 )
-from bloom_nofos.html_diff import has_diff, html_diff
 from bloom_nofos.logs import log_exception
-from bloom_nofos.utils import cast_to_boolean, generate_docx_download_response
+from bloom_nofos.utils import cast_to_boolean
 from bs4 import BeautifulSoup
 from constance import config
 from django.conf import settings
@@ -23,7 +23,13 @@ from django.core.exceptions import PermissionDenied, ValidationError
 from django.db import transaction
 from django.db.models import Q
 from django.forms.models import model_to_dict
-from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
 from django.utils import dateformat, dateparse, timezone
@@ -38,17 +44,22 @@ from django.views.generic import (
     UpdateView,
     View,
 )
-from martor.utils import markdownify
-
-from nofos.nofo_compare import extract_new_diff, extract_old_diff
 
 from .audits import (
     deduplicate_audit_events_by_day_and_object,
-    format_audit_event,
+    format_audit_events,
     get_audit_event_by_id,
-    get_audit_events_for_document,
     get_audit_events_for_nofo,
-    safe_get_changed_fields,
+    get_audit_events_page,
+    get_body_history_diff,
+)
+from .batch_export import (
+    BATCH_CONCURRENCY,
+    BATCH_PROCESSES,
+    get_batch_artifact_key,
+    get_batch_manifest,
+    get_batch_nofos,
+    start_batch_export,
 )
 from .forms import (
     NIH_ALLOWED_CHOICES,
@@ -57,6 +68,7 @@ from .forms import (
     InsertOrderSpaceForm,
     NofoAgencyForm,
     NofoApplicationDeadlineForm,
+    NofoBatchExportForm,
     NofoBeforeYouBeginForm,
     NofoCoachDesignerForm,
     NofoCoverImageForm,
@@ -84,7 +96,7 @@ from .mixins import (
     SuperuserRequiredMixin,
     has_group_permission_func,
 )
-from .models import THEME_CHOICES, Nofo, Section, Subsection
+from .models import THEME_CHOICES, Nofo, PrintJob, Section, Subsection
 from .nofo import (
     add_final_subsection_to_step_3,
     add_headings_to_document,
@@ -126,6 +138,23 @@ from .nofo import (
     upload_cover_image_to_s3,
 )
 from .pdf_metadata import PDF_METADATA_FIELDS, is_missing_pdf_metadata_value
+from .printing import (
+    PrintJobNotReady,
+    build_docraptor_doc,
+    get_cached_nofo_pdf,
+    get_docraptor_client,
+    get_is_test_pdf,
+    get_nofo_pdf_cache_key,
+    get_nofo_pdf_filename,
+    get_nofo_print_url,
+    get_print_mode,
+    iter_print_job_pdf,
+    log_pdf_cache_result,
+    refresh_print_job,
+    serialize_print_job,
+    start_print_job,
+    store_nofo_pdf,
+)
 from .readability import (
     ReadabilityMetricsAnalysisError,
     ReadabilityMetricsUnavailable,
@@ -270,6 +299,8 @@ class NofosListView(ListView):
 class NofosDetailView(DetailView):
     model = Nofo
     template_name = "nofos/nofo_view.html"
+    # Load every section and subsection up front, not a query per section
+    queryset = Nofo.objects.prefetch_related("sections__subsections")
 
     def dispatch(self, request, *args, **kwargs):
         nofo = get_object_or_404(Nofo, pk=kwargs.get("pk"))
@@ -336,7 +367,7 @@ class NOFOsExportView(DetailView):
             export_url=export_url,
             target_element="#download_target",
             filename_base=(nofo.short_name or nofo.title),
-            tmp_name=str(nofo.pk),
+            document=nofo,
         )
 
 
@@ -376,6 +407,8 @@ class NofoReadabilityMetricsView(GroupAccessObjectMixin, View):
 class NofosEditView(GroupAccessObjectMixin, DetailView):
     model = Nofo
     template_name = "nofos/nofo_edit.html"
+    # The checks for broken links and headings read every section and subsection
+    queryset = Nofo.objects.prefetch_related("sections__subsections")
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -1468,41 +1501,23 @@ class BaseNofoHistoryView(DetailView):
         """
         return "nofo"
 
-    def get_section_model_name(self):
-        """
-        Allows child classes to specify the section model name for audit events.
-        """
-        return "section"
-
-    def get_subsection_model_name(self):
-        """
-        Allows child classes to specify the subsection model name for audit events.
-        """
-        return "subsection"
-
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        offset = int(self.request.GET.get("offset", 0))
-        limit = self.events_per_page
         self.document = self.object
 
-        # Get audit events for this document
-        events = get_audit_events_for_document(
+        # Get a page of audit events for this document, after the cursor if given
+        events, next_cursor = get_audit_events_page(
             self.document,
             document_model=self.get_document_model_name(),
-            section_model=self.get_section_model_name(),
-            subsection_model=self.get_subsection_model_name(),
+            limit=self.events_per_page,
+            after=self.request.GET.get("after"),
         )
-        # add one extra audit event for detecting has_more
-        page = events[offset : offset + limit + 1]
 
-        # Slice the results for pagination
-        context["audit_events"] = [
-            format_audit_event(e, self.get_event_formatting_options())
-            for e in page[:limit]
-        ]
-        context["has_more"] = len(page) > limit
-        context["next_offset"] = offset + limit
+        context["audit_events"] = format_audit_events(
+            events, self.get_event_formatting_options()
+        )
+        context["has_more"] = next_cursor is not None
+        context["next_cursor"] = next_cursor
 
         return context
 
@@ -1550,16 +1565,10 @@ class NofoHistoryView(
         if "body" not in changed_fields:
             return event
 
-        old_body, new_body = changed_fields.get("body")
-        event_has_diff = has_diff(
-            html_diff(
-                markdownify(old_body),
-                markdownify(new_body),
-            )
-        )
         # If the event is for 'subsection', the 'body' was changed, and there is a displayable diff,
-        # then there should be a link to the diff view
-        if event_has_diff:
+        # then there should be a link to the diff view (the diff is stored for it)
+        diff = get_body_history_diff(event["raw_event"])
+        if diff and diff.has_diff:
             event["should_link_to_diff"] = True
         return event
 
@@ -1584,18 +1593,12 @@ class NofoHistoryCompareView(GroupAccessObjectMixin, View):
 
         context["back_url"] = reverse_lazy("nofos:nofo_history", kwargs={"pk": pk})
 
-        changed_fields = safe_get_changed_fields(event)
         # We can assume presence of 'body' on the event -- we only link to
         # this page if 'body' was changed
-        old_body, new_body = changed_fields.get("body")
-        if has_diff(
-            diff := html_diff(
-                markdownify(old_body),
-                markdownify(new_body),
-            )
-        ):
-            context["diff_old"] = extract_old_diff(diff)
-            context["diff_new"] = extract_new_diff(diff)
+        diff = get_body_history_diff(event)
+        if diff and diff.has_diff:
+            context["diff_old"] = diff.diff_old
+            context["diff_new"] = diff.diff_new
 
         return render(request, "nofos/nofo_history_compare.html", context)
 
@@ -1614,13 +1617,8 @@ class NofoModificationsHistoryView(
         modifications_date = None
 
         for event in all_events:
-            try:
-                changed = json.loads(event.changed_fields)
-            except Exception:
-                continue
-
             # set modifications_date by finding the "modifications" change event
-            if changed and "modifications" in changed:
+            if "modifications" in event.document_index.changed_keys:
                 modifications_date = event.datetime
                 break
 
@@ -1629,6 +1627,19 @@ class NofoModificationsHistoryView(
             context["modification_events"] = []
             return context
 
+        # Look up the subsections of the events after the modifications date at once
+        subsections = {
+            str(subsection.id): subsection
+            for subsection in Subsection.objects.filter(
+                id__in=[
+                    event.object_id
+                    for event in all_events
+                    if event.datetime > modifications_date
+                    and event.content_type.model == "subsection"
+                ]
+            ).select_related("section")
+        }
+
         # Gather relevant events after the modifications flag was added
         filtered_events = []
         for event in all_events:
@@ -1637,16 +1648,12 @@ class NofoModificationsHistoryView(
                 continue
 
             # Skip custom audit events
-            try:
-                changed = json.loads(event.changed_fields)
-                if changed.get("action") in [
-                    "nofo_import",
-                    "nofo_print",
-                    "nofo_reimport",
-                ]:
-                    continue
-            except Exception:
-                pass
+            if event.document_index.action in [
+                "nofo_import",
+                "nofo_print",
+                "nofo_reimport",
+            ]:
+                continue
 
             # Skip events related to "Modifications" section
             if event.content_type.model == "section":
@@ -1655,16 +1662,17 @@ class NofoModificationsHistoryView(
 
             # Skip events for subsections belonging to "Modifications" section
             if event.content_type.model == "subsection":
-                try:
-                    subsection = Subsection.objects.get(id=event.object_id)
-                    if subsection.section.name == "Modifications":
-                        continue  # Skip this event
-                except Subsection.DoesNotExist:
+                subsection = subsections.get(str(event.object_id))
+                if not subsection:
                     continue  # Skip if the subsection is gone
+                if subsection.section.name == "Modifications":
+                    continue  # Skip this event
 
-            filtered_events.append(format_audit_event(event))
+            filtered_events.append(event)
 
-        filtered_events = deduplicate_audit_events_by_day_and_object(filtered_events)
+        filtered_events = deduplicate_audit_events_by_day_and_object(
+            format_audit_events(filtered_events)
+        )
 
         context["modification_events"] = filtered_events
         context["modification_date"] = modifications_date
@@ -1914,6 +1922,88 @@ class CheckNOFOLinkSingleView(SuperuserRequiredMixin, FormView):
         return self.render_to_response(context)
 
 
+class NofoBatchExportView(SuperuserRequiredMixin, FormView):
+    """
+    Print and/or export every NOFO matching a filter.
+
+    The batch runs in the background: this redirects to
+    NofoBatchExportResultView, which lists the files once they are ready.
+    """
+
+    template_name = "nofos/nofo_batch_export.html"
+    form_class = NofoBatchExportForm
+
+    def form_valid(self, form):
+        base_url = self.request.build_absolute_uri("/")
+        formats = form.cleaned_data["formats"]
+        if "pdf" in formats and "localhost" in base_url:
+            form.add_error(None, "Can't print NOFOs on localhost.")
+            return self.form_invalid(form)
+
+        filters = {
+            name: form.cleaned_data[name]
+            for name in ["statuses", "groups", "opdivs", "ids"]
+            if form.cleaned_data[name]
+        }
+        batch_id = start_batch_export(
+            get_batch_nofos(**filters),
+            formats=formats,
+            base_url=base_url,
+            user=self.request.user,
+            is_test_pdf=form.cleaned_data["print_mode"] == "test",
+            concurrency=BATCH_CONCURRENCY,
+            processes=BATCH_PROCESSES,
+            filters=filters,
+        )
+
+        return redirect("nofos:nofo_batch_export_result", batch_id=batch_id)
+
+
+class NofoBatchExportResultView(SuperuserRequiredMixin, View):
+    """
+    A batch export that was started from NofoBatchExportView: its manifest
+    once the batch is done, or a page that refreshes itself while it runs.
+    """
+
+    def get(self, request, batch_id):
+        manifest = get_batch_manifest(batch_id)
+        if not manifest:
+            raise Http404("This batch doesn’t exist.")
+
+        return render(
+            request,
+            "nofos/nofo_batch_export_result.html",
+            {
+                "batch_id": batch_id,
+                "manifest": manifest,
+                "refresh_seconds": 5,
+            },
+        )
+
+
+class NofoBatchExportFileView(SuperuserRequiredMixin, View):
+    """Download one file (or the manifest) from a batch export."""
+
+    def get(self, request, batch_id, filename):
+        stored_file = open_artifact(get_batch_artifact_key(batch_id, filename))
+        if not stored_file:
+            raise Http404("This file doesn’t exist.")
+
+        content_type = "application/octet-stream"
+        if filename.endswith(".pdf"):
+            content_type = "application/pdf"
+        elif filename.endswith(".json"):
+            content_type = "application/json"
+
+        response = StreamingHttpResponse(
+            iter_artifact(stored_file), content_type=content_type
+        )
+        response["Content-Disposition"] = 'attachment; filename="{}"'.format(
+            filename.split("/")[-1]
+        )
+        return response
+
+
 class CheckNOFOLinksDetailView(GroupAccessObjectMixin, DetailView):
     model = Nofo
     template_name = "nofos/nofo_check_links.html"
@@ -1944,28 +2034,12 @@ class PrintNofoAsPDFView(GroupAccessObjectMixin, DetailView):
     def post(self, request, pk):
         nofo = self.get_object()
 
-        # the absolute uri points to the /edit page, so remove that from the path
-        nofo_url = request.build_absolute_uri(nofo.get_absolute_url()).replace(
-            "/edit", ""
-        )
-
-        nofo_filename = "{}.pdf".format(
-            nofo.number or nofo.short_name or nofo.title
-        ).lower()
-
-        mode = request.GET.get(
-            "mode", "attachment"
-        )  # Default to inline if not specified
-        if mode not in ["attachment", "inline"]:
-            mode = "attachment"
-
-        doc_api = docraptor.DocApi()
-        doc_api.api_client.configuration.username = settings.DOCRAPTOR_API_KEY
-        doc_api.api_client.configuration.debug = True
+        nofo_url = get_nofo_print_url(request, nofo)
+        nofo_filename = get_nofo_pdf_filename(nofo)
+        mode = get_print_mode(request)
+        is_test_pdf = get_is_test_pdf(request)
 
-        # DOCRAPTOR_LIVE_MODE config var can be set by superadmins, but is_test_pdf query param gets the last word
-        is_test_pdf = not config.DOCRAPTOR_LIVE_MODE
-        is_test_pdf = cast_to_boolean(request.GET.get("is_test_pdf", is_test_pdf))
+        doc_api = get_docraptor_client()
 
         # NOTE: uncomment this to see current values in local development
         # return HttpResponse(
@@ -1977,22 +2051,38 @@ class PrintNofoAsPDFView(GroupAccessObjectMixin, DetailView):
                 "Server error printing NOFO. Can't print a NOFO on localhost."
             )
 
-        try:
-            response = doc_api.create_doc(
-                {
-                    "test": is_test_pdf,  # test documents are free but watermarked
-                    "document_url": nofo_url,
-                    "document_type": "pdf",
-                    "javascript": False,
-                    "pipeline": 11,
-                    "prince_options": {
-                        "media": "print",  # use print styles instead of screen styles
-                        "profile": "PDF/UA-1",
-                    },
-                },
+        cache_key = get_nofo_pdf_cache_key(nofo, is_test_pdf)
+        cached_pdf = get_cached_nofo_pdf(cache_key)
+        if cached_pdf:
+            # This revision has been printed before: stream the stored PDF
+            response = StreamingHttpResponse(
+                iter_artifact(cached_pdf), content_type="application/pdf"
+            )
+            response["Content-Disposition"] = '{}; filename="{}"'.format(
+                mode, nofo_filename
+            )
+
+            log_pdf_cache_result(nofo, cache_key, cache_hit=True, source="print_pdf")
+            create_nofo_audit_event(
+                event_type="nofo_print",
+                document=nofo,
+                user=request.user,
+                is_test_pdf=is_test_pdf,
+                cache_hit=True,
             )
+            return response
+
+        try:
+            response = doc_api.create_doc(build_docraptor_doc(nofo_url, is_test_pdf))
 
             pdf_file = io.BytesIO(response)
+            cache_hit = None
+            if store_nofo_pdf(cache_key, pdf_file):
+                cache_hit = False
+                log_pdf_cache_result(
+                    nofo, cache_key, cache_hit=False, source="print_pdf"
+                )
+            pdf_file.seek(0)
 
             # Build response
             response = HttpResponse(pdf_file, content_type="application/pdf")
@@ -2006,6 +2096,7 @@ class PrintNofoAsPDFView(GroupAccessObjectMixin, DetailView):
                 document=nofo,
                 user=request.user,
                 is_test_pdf=is_test_pdf,
+                cache_hit=cache_hit,
             )
 
             return response
@@ -2021,6 +2112,117 @@ class PrintNofoAsPDFView(GroupAccessObjectMixin, DetailView):
             )
 
 
+class PrintJobCreateView(GroupAccessObjectMixin, View):
+    """
+    Start an asynchronous print job for a NOFO.
+
+    Unlike PrintNofoAsPDFView, this returns as soon as DocRaptor has accepted
+    the document, and redirects to a page that polls until the PDF is ready.
+    """
+
+    def post(self, request, pk):
+        nofo = get_object_or_404(Nofo, pk=pk)
+
+        nofo_url = get_nofo_print_url(request, nofo)
+        if "localhost" in nofo_url:
+            return HttpResponseBadRequest(
+                "Server error printing NOFO. Can't print a NOFO on localhost."
+            )
+
+        try:
+            job = start_print_job(
+                nofo,
+                user=request.user,
+                document_url=nofo_url,
+                is_test_pdf=get_is_test_pdf(request),
+                mode=get_print_mode(request),
+            )
+        except docraptor.rest.ApiException as e:
+            log_exception(
+                request,
+                e,
+                context="PrintJobCreateView:docraptor.rest.ApiException",
+                status=400,
+            )
+            return HttpResponseBadRequest(
+                "Server error printing NOFO. Check logs for error messages."
+            )
+
+        if job.cache_hit:
+            # Nothing to wait for: this revision has been printed before
+            return redirect(job.get_download_url())
+
+        return redirect(job.get_absolute_url())
+
+
+class PrintJobMixin(GroupAccessObjectMixin):
+    def dispatch(self, request, *args, **kwargs):
+        self.job = get_object_or_404(
+            PrintJob.objects.select_related("nofo"),
+            pk=kwargs.get("job_pk"),
+            nofo_id=kwargs.get("pk"),
+        )
+        return super().dispatch(request, *args, **kwargs)
+
+
+class PrintJobDetailView(PrintJobMixin, View):
+    """
+    The "Your PDF is on its way" page. JavaScript polls PrintJobStatusView and
+    sends the browser to the download once the job is complete.
+    """
+
+    def get(self, request, pk, job_pk):
+        return render(
+            request,
+            "nofos/print_job_detail.html",
+            {
+                "nofo": self.job.nofo,
+                "job": self.job,
+                "job_state": serialize_print_job(self.job),
+                "poll_interval_ms": settings.DOCRAPTOR_POLL_INTERVAL * 1000,
+            },
+        )
+
+
+class PrintJobStatusView(PrintJobMixin, View):
+    """Check on a print job, advancing it if DocRaptor has news."""
+
+    def get(self, request, pk, job_pk):
+        job = refresh_print_job(self.job)
+
+        response = JsonResponse(serialize_print_job(job))
+        response["Cache-Control"] = "no-store"
+        return response
+
+
+class PrintJobDownloadView(PrintJobMixin, View):
+    """Stream a finished PDF from DocRaptor without buffering it in memory."""
+
+    def get(self, request, pk, job_pk):
+        job = self.job
+
+        try:
+            chunks = iter_print_job_pdf(job)
+        except PrintJobNotReady as e:
+            return HttpResponseBadRequest(str(e))
+        except docraptor.rest.ApiException as e:
+            log_exception(
+                request,
+                e,
+                context="PrintJobDownloadView:docraptor.rest.ApiException",
+                status=400,
+            )
+            return HttpResponseBadRequest(
+                "Server error downloading NOFO. Check logs for error messages."
+            )
+
+        response = StreamingHttpResponse(chunks, content_type="application/pdf")
+        response["Content-Disposition"] = '{}; filename="{}"'.format(
+            job.mode, get_nofo_pdf_filename(job.nofo)
+        )
+        return response
+
+
 ###########################################################
 ##################### SECTION VIEWS #######################
 ###########################################################
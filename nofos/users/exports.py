@@ -1,11 +1,10 @@
-import json
 from datetime import datetime
 
-from django.db.models import Q
+from django.db.models import Q, Sum
 from django.utils.timezone import make_aware
 from easyaudit.models import CRUDEvent
 
-from nofos.models import Nofo, Subsection
+from nofos.models import Nofo
 
 from .models import BloomUser
 
@@ -30,12 +29,27 @@ def export_nofo_report(start_date, end_date, user, group=None):
     """
     Handles exporting all NOFOs for the logged-in user or everyone in their group.
     Now aggregates the number of edits per user and per NOFO.
+
+    Yields the CSV header straight away, then a row per user and NOFO. Edits
+    are counted in the database, grouped by user and by the NOFO each event
+    belongs to in the audit document index, so the report takes three queries
+    however many events there are.
     """
+    yield [
+        "User Email",
+        "NOFO ID",
+        "NOFO Number",
+        "NOFO Title",
+        "NOFO Status",
+        "Edits",
+    ]
 
     # Start with audit events that have been recorded.
     events_filters = {
         "event_type": 2,  # UPDATE events
         "content_type__model__in": ["nofo", "subsection"],
+        # The NOFO that the NOFO or subsection event belongs to
+        "document_index__document_model": "nofo",
     }
 
     if group:
@@ -54,49 +68,19 @@ def export_nofo_report(start_date, end_date, user, group=None):
         end_date = make_aware(datetime.combine(end_date, datetime.max.time()))
         events_filters["datetime__lte"] = end_date
 
-    # Include the "user" field in our values so we know who did the edit.
-    events = CRUDEvent.objects.filter(**events_filters).values(
-        "user", "object_id", "datetime", "content_type__model", "changed_fields"
+    # Count edits per (user, NOFO id), skipping events where the only change
+    # was the "updated" timestamp. A compacted event counts every edit it replaced.
+    per_edit_counts = (
+        CRUDEvent.objects.filter(**events_filters)
+        .exclude(document_index__changed_keys=["updated"])
+        .values_list("user", "document_index__document_id")
+        .annotate(edits=Sum("document_index__event_count"))
+        .order_by("user", "document_index__document_id")
     )
-
-    # Group edits by (user, NOFO id).
-    per_edit_counts = {}
-    for event in events:
-        current_user_id = event["user"]
-
-        # Determine the actual NOFO ID for the event.
-        model = event["content_type__model"]
-        if model == "nofo":
-            nofo_id = event["object_id"]
-        elif model == "subsection":
-            nofo_id = (
-                Subsection.objects.filter(id=event["object_id"])
-                .values_list("section__nofo_id", flat=True)
-                .first()
-            )
-            if not nofo_id:
-                continue  # Skip if unable to resolve the NOFO ID.
-        else:
-            continue
-
-        # Skip events where the only change was the "updated" timestamp.
-        try:
-            changed_fields = json.loads(event["changed_fields"])
-            if (
-                changed_fields
-                and "updated" in changed_fields
-                and len(changed_fields) == 1
-            ):
-                continue
-        except json.JSONDecodeError:
-            continue  # Skip events with invalid JSON.
-
-        # Increment the count for this (user, NOFO) pair.
-        key = (current_user_id, int(nofo_id))
-        per_edit_counts[key] = per_edit_counts.get(key, 0) + 1
+    per_edit_counts = list(per_edit_counts)
 
     # Get a distinct list of NOFO IDs involved.
-    nofo_ids = {key[1] for key in per_edit_counts.keys()}
+    nofo_ids = {nofo_id for _, nofo_id, _ in per_edit_counts}
 
     # Fetch NOFO details.
     nofos = (
@@ -104,10 +88,10 @@ def export_nofo_report(start_date, end_date, user, group=None):
         .filter(Q(archived__isnull=True))
         .values("id", "number", "title", "status")
     )
-    nofos_by_id = {n["id"]: n for n in nofos}
+    nofos_by_id = {str(n["id"]): n for n in nofos}
 
     # Fetch the users involved (only needed if exporting for a group).
-    user_ids = {key[0] for key in per_edit_counts.keys()}
+    user_ids = {user_id for user_id, _, _ in per_edit_counts}
     users_by_id = {}
     if group:
         users = BloomUser.objects.filter(id__in=user_ids).values("id", "email")
@@ -116,20 +100,7 @@ def export_nofo_report(start_date, end_date, user, group=None):
         # If not a group export, use the current user's email.
         users_by_id[user.id] = user.email
 
-    # Prepare the CSV rows.
-    # CSV Header: you can adjust the order as needed.
-    rows = [
-        [
-            "User Email",
-            "NOFO ID",
-            "NOFO Number",
-            "NOFO Title",
-            "NOFO Status",
-            "Edits",
-        ]
-    ]
-
-    for (user_id, nofo_id), edit_count in per_edit_counts.items():
+    for user_id, nofo_id, edit_count in per_edit_counts:
         # If the NOFO is archived, it won't be in nofos_by_id, so skip it.
         if nofo_id not in nofos_by_id:
             continue
@@ -137,7 +108,7 @@ def export_nofo_report(start_date, end_date, user, group=None):
         # Get the email, NOFO details, etc.
         email = users_by_id.get(user_id, "")
         nofo_details = nofos_by_id.get(nofo_id, {})
-        row = [
+        yield [
             email,
             nofo_id,
             nofo_details.get("number", ""),
@@ -145,6 +116,3 @@ def export_nofo_report(start_date, end_date, user, group=None):
             nofo_details.get("status", ""),
             edit_count,
         ]
-        rows.append(row)
-
-    return rows
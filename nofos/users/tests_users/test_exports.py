@@ -1,8 +1,18 @@
+import csv
+import io
+import json
 from datetime import date
 
+from django.contrib.contenttypes.models import ContentType
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from easyaudit.models import CRUDEvent
 
-from ..exports import get_filename
+from nofos.models import Nofo, Section, Subsection
+
+from ..exports import export_nofo_report, get_filename
+from ..models import BloomUser
 
 
 class GetFilenameTest(TestCase):
@@ -71,3 +81,114 @@ class GetFilenameTest(TestCase):
         expected = "nb_export_staging.csv"
         result = get_filename(base_filename, group, start_date, end_date)
         self.assertEqual(result, expected)
+
+
+class ExportNofoReportTest(TestCase):
+    def setUp(self):
+        self.user = BloomUser.objects.create_user(
+            email="test@example.com",
+            password="testpass123",
+            group="bloom",
+            force_password_reset=False,
+        )
+        self.nofo = Nofo.objects.create(
+            title="Test NOFO", number="HRSA-24-001", group="bloom", opdiv="HRSA"
+        )
+        section = Section.objects.create(
+            nofo=self.nofo, name="Section 1", html_id="sec-1", order=1
+        )
+        self.subsection = Subsection.objects.create(
+            section=section, name="Subsection 1", order=1, tag="h3"
+        )
+
+    def create_event(self, obj, changed_fields):
+        return CRUDEvent.objects.create(
+            object_id=str(obj.id),
+            content_type=ContentType.objects.get_for_model(obj),
+            event_type=CRUDEvent.UPDATE,
+            changed_fields=json.dumps(changed_fields),
+            object_repr=str(obj),
+            user=self.user,
+            datetime=timezone.now(),
+        )
+
+    def test_header_comes_before_any_queries(self):
+        rows = export_nofo_report(start_date=None, end_date=None, user=self.user)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(next(rows)[0], "User Email")
+
+    def test_counts_edits_per_nofo(self):
+        self.create_event(self.subsection, {"body": ["Old", "New"]})
+        self.create_event(self.nofo, {"title": ["Old", "New"]})
+        # Only the "updated" timestamp changed: not an edit
+        self.create_event(self.nofo, {"updated": ["Old", "New"]})
+
+        rows = list(export_nofo_report(start_date=None, end_date=None, user=self.user))
+
+        self.assertEqual(
+            rows[1:],
+            [
+                [
+                    "test@example.com",
+                    str(self.nofo.id),
+                    "HRSA-24-001",
+                    "Test NOFO",
+                    "draft",
+                    2,
+                ]
+            ],
+        )
+
+    def test_counts_edits_for_a_group_in_three_queries(self):
+        other_user = BloomUser.objects.create_user(
+            email="other@example.com", password="testpass123", group="bloom"
+        )
+        other_nofo = Nofo.objects.create(
+            title="Other NOFO", number="HRSA-24-002", group="bloom", opdiv="HRSA"
+        )
+        other_subsection = Subsection.objects.create(
+            section=Section.objects.create(
+                nofo=other_nofo, name="Section 1", html_id="sec-1", order=1
+            ),
+            name="Subsection 1",
+            order=1,
+            tag="h3",
+        )
+        for _ in range(5):
+            self.create_event(self.subsection, {"body": ["Old", "New"]})
+            self.create_event(other_subsection, {"body": ["Old", "New"]})
+        other_event = self.create_event(other_nofo, {"title": ["Old", "New"]})
+        other_event.user = other_user
+        other_event.save()
+
+        rows = export_nofo_report(
+            start_date=None, end_date=None, user=self.user, group="bloom"
+        )
+        next(rows)
+        with self.assertNumQueries(3):
+            rows = list(rows)
+
+        self.assertEqual(
+            sorted((row[0], row[2], row[5]) for row in rows),
+            [
+                ("other@example.com", "HRSA-24-002", 1),
+                ("test@example.com", "HRSA-24-001", 5),
+                ("test@example.com", "HRSA-24-002", 5),
+            ],
+        )
+
+    def test_view_streams_the_csv(self):
+        self.create_event(self.subsection, {"body": ["Old", "New"]})
+        self.client.login(email="test@example.com", password="testpass123")
+
+        response = self.client.post(
+            reverse("users:export_nofo_report"), {"user_scope": "user"}
+        )
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn("nofo_export_user.csv", response["Content-Disposition"])
+        rows = list(csv.reader(io.StringIO(response.getvalue().decode("utf-8"))))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][-1], "1")
@@ -1,5 +1,4 @@
-import csv
-
+from bloom_nofos.utils import streaming_csv_response
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
@@ -7,7 +6,6 @@ from django.contrib.auth.forms import SetPasswordForm
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.views import PasswordChangeView
 from django.db.models import ProtectedError
-from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render, resolve_url
 from django.urls import reverse_lazy
 from django.utils.http import url_has_allowed_host_and_scheme
@@ -481,21 +479,15 @@ class ExportNofoReportView(FormView):
             group=group,
         )
 
-        # Prepare CSV response
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = 'attachment; filename="{}"'.format(
+        return streaming_csv_response(
+            csv_rows,
             get_filename(
                 base_filename="nofo_export",
                 group=group,
                 start_date=start_date,
                 end_date=end_date,
-            )
+            ),
         )
-        writer = csv.writer(response)
-        for row in csv_rows:
-            writer.writerow(row)
-
-        return response
 
     def form_invalid(self, form):
         # If the form is invalid, simply re-render the export page with errors.